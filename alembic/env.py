@@ -10,7 +10,11 @@ from sqlalchemy.ext.asyncio import async_engine_from_config
 from alembic import context
 from src.core.orm.models.auth import AuthORM
 from src.core.orm.models.base import BaseModel
+from src.core.orm.models.directory import EmailDirectoryORM
 from src.core.orm.models.refer import ReferORM
+from src.core.orm.models.referred import ReferredORM
+from src.core.orm.models.rollup import ReferralDailyORM, RollupWatermarkORM
+from src.core.orm.models.summary import ReferralSummaryORM
 from src.core.orm.models.user import UserORM
 from src.core.settings.env import settings
 
@@ -0,0 +1,283 @@
+"""hash-partitioned refer by id_referrer
+
+Revision ID: d7e3b9a0c5f1
+Revises: c4d8a1f3e6b2
+Create Date: 2026-10-18 13:00:00.000000
+
+Online path: the partitioned table is created next to `refer`, a trigger
+mirrors new and deleted rows into it, existing rows are copied in
+batches by primary key (each batch is its own transaction), then the
+tables are swapped under a short ACCESS EXCLUSIVE lock. `refer_referred`
+keeps one referrer per user, a unique index of a partitioned table must
+include the partition key.
+
+The trigger and the swap wait for their locks at most `LOCK_TIMEOUT`:
+queued behind a long transaction, the lock would block every query of
+`refer` behind it. A timed out lock is retried `LOCK_RETRIES` times. If
+the swap still fails, run the migration again: it resumes with the
+mirrored `refer_part` and the backfill skips copied rows.
+
+"""  # noqa W291 D400
+
+import logging
+import time
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "d7e3b9a0c5f1"
+down_revision: Union[str, None] = "c4d8a1f3e6b2"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+PARTITIONS = 16
+BATCH_SIZE = 50_000
+LOCK_TIMEOUT = "5s"
+LOCK_RETRIES = 10
+LOCK_RETRY_SECONDS = 1
+
+log = logging.getLogger("alembic.runtime.migration")
+
+MIRROR_FUNCTION = """
+CREATE FUNCTION refer_mirror() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO refer_referred (id_referred)
+        VALUES (NEW.id_referred) ON CONFLICT DO NOTHING;
+        INSERT INTO refer_part (id, id_referrer, id_referred, seq, created_at)
+        VALUES (NEW.id, NEW.id_referrer, NEW.id_referred, NEW.seq,
+                NEW.created_at)
+        ON CONFLICT DO NOTHING;
+        RETURN NEW;
+    END IF;
+    DELETE FROM refer_part
+    WHERE id = OLD.id AND id_referrer = OLD.id_referrer;
+    DELETE FROM refer_referred WHERE id_referred = OLD.id_referred;
+    RETURN OLD;
+END $$
+"""
+
+BACKFILL_BATCH = """
+WITH batch AS (
+    SELECT id, id_referrer, id_referred, seq, created_at
+    FROM refer
+    WHERE id > :after
+    ORDER BY id
+    LIMIT :size
+),
+referred AS (
+    INSERT INTO refer_referred (id_referred)
+    SELECT id_referred FROM batch
+    ON CONFLICT DO NOTHING
+),
+moved AS (
+    INSERT INTO refer_part (id, id_referrer, id_referred, seq, created_at)
+    SELECT id, id_referrer, id_referred, seq, created_at FROM batch
+    ON CONFLICT DO NOTHING
+)
+SELECT (SELECT id FROM batch ORDER BY id DESC LIMIT 1), count(*)
+FROM batch
+"""
+
+BACKFILL_ALL = """
+WITH referred AS (
+    INSERT INTO refer_referred (id_referred)
+    SELECT id_referred FROM refer
+    ON CONFLICT DO NOTHING
+)
+INSERT INTO refer_part (id, id_referrer, id_referred, seq, created_at)
+SELECT id, id_referrer, id_referred, seq, created_at FROM refer
+ON CONFLICT DO NOTHING
+"""
+
+
+def _backfill() -> None:
+    """Copy existing rows of `refer` in batches of `BATCH_SIZE`."""
+    if op.get_context().as_sql:
+        op.execute(BACKFILL_ALL)
+        return
+
+    bind = op.get_bind()
+    after, moved = "00000000-0000-0000-0000-000000000000", 0
+    while True:
+        last_id, count = bind.execute(
+            sa.text(BACKFILL_BATCH), {"after": after, "size": BATCH_SIZE}
+        ).one()
+        moved += count
+        log.info("refer backfill: %d rows", moved)
+        if count < BATCH_SIZE:
+            return
+        after = last_id
+
+
+def _with_lock_timeout(statement: str) -> None:
+    """Run a statement that locks `refer`, retry if the lock times out.
+
+    Every attempt runs in a savepoint, the lock it takes is kept until
+    the migration transaction ends.
+    """
+    op.execute(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'")
+    if op.get_context().as_sql:
+        op.execute(statement)
+        return
+
+    bind = op.get_bind()
+    for attempt in range(1, LOCK_RETRIES + 1):
+        try:
+            with bind.begin_nested():
+                bind.execute(sa.text(statement))
+            return
+        except sa.exc.DBAPIError as e:
+            if "lock timeout" not in str(e) or attempt == LOCK_RETRIES:
+                raise
+            log.info("refer lock: attempt %d timed out", attempt)
+            time.sleep(LOCK_RETRY_SECONDS)
+
+
+def _resuming() -> bool:
+    """Return True if a failed run already built and mirrored the table."""
+    if op.get_context().as_sql:
+        return False
+    return sa.inspect(op.get_bind()).has_table("refer_part")
+
+
+def _create_partitioned() -> None:
+    """Create `refer_part`, its partitions and the mirror trigger."""
+    op.execute("CREATE SEQUENCE refer_seq")
+    op.create_table(
+        "refer_referred",
+        sa.Column("id_referred", sa.UUID(), nullable=False),
+        sa.ForeignKeyConstraint(["id_referred"], ["users.id"]),
+        sa.PrimaryKeyConstraint("id_referred"),
+    )
+    op.create_table(
+        "refer_part",
+        sa.Column("id", sa.UUID(), nullable=False),
+        sa.Column("id_referrer", sa.UUID(), nullable=False),
+        sa.Column("id_referred", sa.UUID(), nullable=False),
+        sa.Column(
+            "seq",
+            sa.BigInteger(),
+            server_default=sa.text("nextval('refer_seq')"),
+            nullable=False,
+        ),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.ForeignKeyConstraint(
+            ["id_referrer"], ["users.id"], name="refer_id_referrer_fkey_p"
+        ),
+        sa.ForeignKeyConstraint(
+            ["id_referred"], ["users.id"], name="refer_id_referred_fkey_p"
+        ),
+        sa.PrimaryKeyConstraint("id", "id_referrer", name="refer_pkey_p"),
+        postgresql_partition_by="HASH (id_referrer)",
+    )
+    for remainder in range(PARTITIONS):
+        op.execute(
+            f"CREATE TABLE refer_p{remainder} PARTITION OF refer_part "
+            f"FOR VALUES WITH (MODULUS {PARTITIONS}, REMAINDER {remainder})"
+        )
+    op.create_index(
+        "ix_refer_id_referrer_seq_p",
+        "refer_part",
+        ["id_referrer", "seq"],
+        unique=False,
+        postgresql_include=["id_referred"],
+    )
+    op.create_index(
+        "ix_refer_id_referred_p", "refer_part", ["id_referred"], unique=False
+    )
+    op.execute(MIRROR_FUNCTION)
+    _with_lock_timeout(
+        "CREATE TRIGGER refer_mirror AFTER INSERT OR DELETE ON refer "
+        "FOR EACH ROW EXECUTE FUNCTION refer_mirror()"
+    )
+
+
+def upgrade() -> None:
+    # ### commands auto generated by Alembic - please adjust! ###  # noqa D103
+    if _resuming():
+        log.info("refer_part exists, resuming the backfill")
+    else:
+        _create_partitioned()
+
+    with op.get_context().autocommit_block():
+        _backfill()
+
+    _with_lock_timeout("LOCK TABLE refer IN ACCESS EXCLUSIVE MODE")
+    op.execute(
+        "SELECT setval('refer_seq', "
+        "(SELECT COALESCE(max(seq), 0) + 1 FROM refer), false)"
+    )
+    op.drop_table("refer")
+    op.execute("DROP FUNCTION refer_mirror()")
+    op.rename_table("refer_part", "refer")
+    op.execute("ALTER SEQUENCE refer_seq OWNED BY refer.seq")
+    for old, new in (
+        ("refer_pkey_p", "refer_pkey"),
+        ("refer_id_referrer_fkey_p", "refer_id_referrer_fkey"),
+        ("refer_id_referred_fkey_p", "refer_id_referred_fkey"),
+    ):
+        op.execute(f"ALTER TABLE refer RENAME CONSTRAINT {old} TO {new}")
+    for old, new in (
+        ("ix_refer_id_referrer_seq_p", "ix_refer_id_referrer_seq"),
+        ("ix_refer_id_referred_p", "ix_refer_id_referred"),
+    ):
+        op.execute(f"ALTER INDEX {old} RENAME TO {new}")
+    # ### end Alembic commands ###
+
+
+def downgrade() -> None:
+    # ### commands auto generated by Alembic - please adjust! ###  # noqa D103
+    op.create_table(
+        "refer_heap",
+        sa.Column("id", sa.UUID(), nullable=False),
+        sa.Column("id_referrer", sa.UUID(), nullable=False),
+        sa.Column("id_referred", sa.UUID(), nullable=False),
+        sa.Column(
+            "seq", sa.BigInteger(), sa.Identity(always=True), nullable=False
+        ),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+    )
+    op.execute(
+        "INSERT INTO refer_heap (id, id_referrer, id_referred, seq, "
+        "created_at) OVERRIDING SYSTEM VALUE "
+        "SELECT id, id_referrer, id_referred, seq, created_at FROM refer"
+    )
+    op.execute(
+        "SELECT setval(pg_get_serial_sequence('refer_heap', 'seq'), "
+        "(SELECT COALESCE(max(seq), 0) + 1 FROM refer_heap), false)"
+    )
+    op.drop_table("refer")
+    op.drop_table("refer_referred")
+    op.rename_table("refer_heap", "refer")
+    op.create_primary_key("refer_pkey", "refer", ["id"])
+    op.create_foreign_key(
+        "refer_id_referrer_fkey", "refer", "users", ["id_referrer"], ["id"]
+    )
+    op.create_foreign_key(
+        "refer_id_referred_fkey", "refer", "users", ["id_referred"], ["id"]
+    )
+    op.create_index(
+        "ix_refer_id_referrer_seq",
+        "refer",
+        ["id_referrer", "seq"],
+        unique=False,
+        postgresql_include=["id_referred"],
+    )
+    op.create_index(
+        "ix_refer_id_referred", "refer", ["id_referred"], unique=True
+    )
+    # ### end Alembic commands ###
@@ -0,0 +1,61 @@
+"""Build the Bloom filters of referral codes and emails into Redis.
+
+Usage:
+    python -m src.commands.build_bloom_filters --loop-seconds 3600
+
+The filters are built once here instead of in every worker: emails are
+read from the primary or `email_directory`, referral codes by `SCAN` of
+Redis. Workers load the filters and follow writes made since in a Redis
+stream. With `--loop-seconds` it runs as a worker, rebuilt filters drop
+deleted codes.
+"""
+
+import argparse
+import asyncio
+import logging
+
+from src.core.controllers.depends.utils.bloom_filters import build_filters
+from src.core.controllers.depends.utils.redis_chash import (
+    close_redis,
+    setup_redis,
+)
+from src.core.orm.engine import get_engine
+from src.core.settings.env import settings
+
+
+def parse_args() -> argparse.Namespace:
+    """Return command line arguments."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--loop-seconds",
+        type=float,
+        default=settings.bloom.BLOOM_REBUILD_SECONDS,
+        help="pause between builds, 0 builds once",
+    )
+    return parser.parse_args()
+
+
+async def main(args: argparse.Namespace) -> None:
+    """Build the filters, once or in a loop."""
+    engine = await get_engine(
+        url=settings.db.get_url_database, echo=settings.db.ECHO
+    )
+    router = engine.shards
+    try:
+        while True:
+            await build_filters(
+                false_positive_rate=settings.bloom.BLOOM_FALSE_POSITIVE_RATE,
+                max_bytes=settings.bloom.max_bytes,
+            )
+            if args.loop_seconds <= 0:
+                break
+            await asyncio.sleep(args.loop_seconds)
+    finally:
+        await close_redis(await setup_redis())
+        await router.dispose()
+        await engine.async_engine.dispose()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main(parse_args()))
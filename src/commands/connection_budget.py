@@ -0,0 +1,46 @@
+"""Report connections the deployment opens to one database server.
+
+Usage:
+    python -m src.commands.connection_budget --instances 3
+"""
+
+import argparse
+
+from src.core.orm.engine import connection_budget
+from src.core.settings.env import settings
+
+
+def parse_args() -> argparse.Namespace:
+    """Return command line arguments."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--instances", type=int, default=1, help="instances of the API"
+    )
+    return parser.parse_args()
+
+
+def main(args: argparse.Namespace) -> None:
+    """Print the budget for the current settings."""
+    budget = connection_budget(
+        workers=settings.gunicorn.WORKERS,
+        pool_size=settings.db.POOL_SIZE_SQL_ALCHEMY_CONF,
+        max_overflow=settings.db.MAX_OVERFLOW,
+        instances=args.instances,
+        null_pool=settings.db.NULL_POOL,
+    )
+    if budget is None:
+        print(
+            "NULL_POOL: workers keep no connections, PgBouncer pools them, "
+            "the server gets at most the pool size of PgBouncer"
+        )
+        return
+    print(
+        f"{args.instances} instances x {settings.gunicorn.WORKERS} workers x "
+        f"({settings.db.POOL_SIZE_SQL_ALCHEMY_CONF} pool + "
+        f"{settings.db.MAX_OVERFLOW} overflow) = {budget} connections "
+        f"per server, {1 + len(settings.db.get_replica_urls)} servers"
+    )
+
+
+if __name__ == "__main__":
+    main(parse_args())
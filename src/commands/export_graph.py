@@ -0,0 +1,85 @@
+"""Export of users and referral edges to gzip CSV and Parquet/Arrow.
+
+Usage:
+    python -m src.commands.export_graph --out /data/export \
+        --state /data/export/state.json --columnar parquet
+
+With `--state` the export starts after the `seq` saved by the previous
+run and saves the new one, so a nightly job moves only new edges.
+"""
+
+import argparse
+import asyncio
+import json
+from datetime import timedelta
+from pathlib import Path
+
+from src.core.bulk.exporter import columnar_available, export_graph
+from src.core.orm.crud import create_crud_helper
+from src.core.orm.engine import get_engine
+from src.core.settings.constants import GraphExportConf, TypeEncoding
+from src.core.settings.env import settings
+
+
+def parse_args() -> argparse.Namespace:
+    """Return command line arguments."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--out", type=Path, required=True, help="directory")
+    parser.add_argument("--state", type=Path, help="file of the last seq")
+    parser.add_argument(
+        "--since",
+        type=int,
+        help="export edges after this seq, overrides state",
+    )
+    parser.add_argument("--columnar", choices=GraphExportConf.COLUMNAR)
+    parser.add_argument(
+        "--lag-seconds",
+        type=int,
+        default=GraphExportConf.LAG_SECONDS,
+        help="skip edges younger than this",
+    )
+    args = parser.parse_args()
+
+    if args.columnar is not None and not columnar_available():
+        parser.error("--columnar requires pyarrow")
+    return args
+
+
+def read_since(state: Path | None) -> int:
+    """Return `seq` saved by the previous export or 0."""
+    if state is None or not state.exists():
+        return GraphExportConf.FULL_SINCE
+    data = json.loads(state.read_text(encoding=TypeEncoding.UTF8))
+    return int(data[GraphExportConf.STATE_LAST_SEQ])
+
+
+async def main(args: argparse.Namespace) -> None:
+    """Run export and save its state."""
+    since = args.since if args.since is not None else read_since(args.state)
+    args.out.mkdir(parents=True, exist_ok=True)
+
+    engine = await get_engine(
+        url=settings.db.get_url_database, echo=settings.db.ECHO
+    )
+    try:
+        async with engine.create_session(engine.async_engine)() as session:
+            until = await export_graph(
+                session=session,
+                crud=create_crud_helper(),
+                out_dir=args.out,
+                since=since,
+                columnar=args.columnar,
+                lag=timedelta(seconds=args.lag_seconds),
+            )
+    finally:
+        await engine.async_engine.dispose()
+
+    if until is not None and args.state is not None:
+        args.state.write_text(
+            json.dumps({GraphExportConf.STATE_LAST_SEQ: until}),
+            encoding=TypeEncoding.UTF8,
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
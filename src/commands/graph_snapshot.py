@@ -0,0 +1,132 @@
+"""Build the array snapshot of the referral graph or benchmark it.
+
+Usage:
+    python -m src.commands.graph_snapshot build --out /data/graph
+    python -m src.commands.graph_snapshot bench --edges 10000000
+
+`build` appends edges added after the saved snapshot of every shard, a
+missing snapshot is built from all edges. `bench` builds a random
+forest in memory and times the snapshot operations. Both need `numpy`.
+"""
+
+import argparse
+import asyncio
+import time
+from pathlib import Path
+from typing import Callable
+
+from src.core.bulk.graph import (
+    GraphSnapshot,
+    snapshot_available,
+    update_snapshot,
+)
+from src.core.orm.crud import create_crud_helper
+from src.core.orm.engine import get_engine
+from src.core.settings.constants import GraphSnapshotConf
+from src.core.settings.env import settings
+
+
+def parse_args() -> argparse.Namespace:
+    """Return command line arguments."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="append new edges")
+    build.add_argument("--out", type=Path, required=True, help="directory")
+    bench = commands.add_parser("bench", help="time a synthetic graph")
+    bench.add_argument(
+        "--edges", type=int, default=GraphSnapshotConf.BENCH_EDGES
+    )
+    bench.add_argument(
+        "--queries", type=int, default=GraphSnapshotConf.BENCH_QUERIES
+    )
+    args = parser.parse_args()
+
+    if not snapshot_available():
+        parser.error(f"{args.command} requires numpy")
+    return args
+
+
+def timed(label: str, function: Callable, *args, **kwargs):
+    """Run a function and print its time."""
+    started = time.perf_counter()
+    result = function(*args, **kwargs)
+    print(f"{label}: {time.perf_counter() - started:.2f} s")
+    return result
+
+
+def bench(edges: int, queries: int) -> None:
+    """Time the snapshot on a random forest with `edges` edges.
+
+    Every new user is referred by a random earlier user, so the forest
+    looks like a registration log: one root and a long tail of depths.
+    """
+    import numpy
+
+    rng = numpy.random.default_rng(GraphSnapshotConf.BENCH_SEED)
+    ids = numpy.frombuffer(
+        rng.bytes((edges + 1) * 16), dtype=GraphSnapshotConf.UUID_DTYPE
+    )
+    referrers = (rng.random(edges) * numpy.arange(1, edges + 1)).astype(
+        numpy.int64
+    )
+    referred = ids[1:]
+    half = edges // 2
+
+    snapshot = timed(
+        f"append {half} edges to empty",
+        GraphSnapshot.empty().append,
+        referrers=ids[referrers[:half]],
+        referred=referred[:half],
+    )
+    snapshot = timed(
+        f"append {edges - half} edges to {len(snapshot)} nodes",
+        snapshot.append,
+        referrers=ids[referrers[half:]],
+        referred=referred[half:],
+    )
+    sample = ids[rng.integers(0, edges + 1, queries)]
+    nodes = timed(f"lookup {queries} UUIDs", snapshot.nodes, sample)
+    depths = timed("depth of all nodes", snapshot.depths)
+    timed("subtree size of all nodes", snapshot.subtree_sizes)
+    timed(
+        f"ancestors of {queries} nodes",
+        snapshot.ancestors,
+        nodes,
+        GraphSnapshotConf.BENCH_DEPTH,
+    )
+    timed(
+        f"level histogram of {queries} nodes",
+        snapshot.level_histogram,
+        nodes,
+        GraphSnapshotConf.BENCH_DEPTH,
+    )
+    print(f"max depth {depths.max()}, {snapshot.indices.nbytes >> 20} MiB")
+
+
+async def build(out: Path) -> None:
+    """Append new edges of every shard and save the snapshot."""
+    engine = await get_engine(
+        url=settings.db.get_url_database, echo=settings.db.ECHO
+    )
+    router = engine.shards
+    crud = create_crud_helper()
+    snapshot = GraphSnapshot.load(out)
+    try:
+        for shard in range(len(router)):
+            async with router.session_factory(shard)() as session:
+                snapshot = await update_snapshot(
+                    snapshot=snapshot, session=session, crud=crud, shard=shard
+                )
+    finally:
+        await router.dispose()
+        await engine.async_engine.dispose()
+    snapshot.save(out)
+    print(f"{len(snapshot)} nodes -> {out}")
+
+
+if __name__ == "__main__":
+    arguments = parse_args()
+    if arguments.command == "bench":
+        bench(edges=arguments.edges, queries=arguments.queries)
+    else:
+        asyncio.run(build(out=arguments.out))
@@ -0,0 +1,74 @@
+"""Bulk import of users and referral edges from files.
+
+Usage:
+    python -m src.commands.import_users --users users.csv \
+        --edges edges.ndjson --rejects rejected.csv
+"""
+
+import argparse
+import asyncio
+from contextlib import ExitStack
+
+from src.core.bulk.importer import import_format, import_users
+from src.core.orm.crud import create_crud_helper
+from src.core.orm.engine import get_engine
+from src.core.settings.constants import TypeEncoding
+from src.core.settings.env import settings
+
+
+def parse_args() -> argparse.Namespace:
+    """Return command line arguments."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", help="users: .csv, .ndjson or .jsonl")
+    parser.add_argument("--edges", help="edges: .csv, .ndjson or .jsonl")
+    parser.add_argument(
+        "--rejects", default="rejected.csv", help="output of rejected rows"
+    )
+    args = parser.parse_args()
+
+    if args.users is None and args.edges is None:
+        parser.error("one of --users, --edges is required")
+    for path in (args.users, args.edges):
+        if path is not None and import_format(path) is None:
+            parser.error(f"unknown format of {path}")
+    return args
+
+
+async def main(args: argparse.Namespace) -> None:
+    """Run import and print its report."""
+    engine = await get_engine(
+        url=settings.db.get_url_database, echo=settings.db.ECHO
+    )
+    try:
+        with ExitStack() as files:
+            users, edges = (
+                (
+                    None
+                    if path is None
+                    else files.enter_context(
+                        open(path, encoding=TypeEncoding.UTF8, newline="")
+                    )
+                )
+                for path in (args.users, args.edges)
+            )
+            rejects = files.enter_context(
+                open(args.rejects, "w", encoding=TypeEncoding.UTF8, newline="")
+            )
+            async with engine.create_session(engine.async_engine)() as session:
+                report = await import_users(
+                    session=session,
+                    crud=create_crud_helper(),
+                    rejects=rejects,
+                    users=users,
+                    users_format=import_format(args.users),
+                    edges=edges,
+                    edges_format=import_format(args.edges),
+                )
+        report.rejects_file = args.rejects
+        print(report.model_dump_json())
+    finally:
+        await engine.async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,135 @@
+"""Move a hash range of user IDs between shards.
+
+Usage:
+    python -m src.commands.rebalance_shards show
+    python -m src.commands.rebalance_shards pin --shard 0
+    python -m src.commands.rebalance_shards move --low L --high H --to 1
+    python -m src.commands.rebalance_shards cleanup --low L --high H --from 0
+    python -m src.commands.rebalance_shards directory
+
+`show` prints ranges of the ring and their current shards. `pin` puts
+the whole ring on one shard without moving rows: run it before the first
+start with new shards, all rows are still on the primary. `move` copies
+rows of the range to the target shard and writes the range to
+`SHARD_MAP_FILE`, workers read the file within `SHARD_MAP_CHECK_SECONDS`.
+After that `cleanup` copies rows written to the source meanwhile and
+deletes the range from the source. `directory` adds emails of all shards
+to `email_directory`.
+"""
+
+import argparse
+import asyncio
+
+from src.core.orm.crud import create_crud_helper
+from src.core.orm.engine import get_engine
+from src.core.orm.shards import ShardMap
+from src.core.settings.constants import ShardConf
+from src.core.settings.env import settings
+
+
+def parse_args() -> argparse.Namespace:
+    """Return command line arguments."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("show", help="print ring ranges and their shards")
+    commands.add_parser("directory", help="fill email_directory")
+    pin = commands.add_parser("pin", help="put the whole ring on a shard")
+    pin.add_argument("--shard", type=int, required=True)
+    for name, shard_arg, help_ in (
+        ("move", "--to", "copy a range and route it to a shard"),
+        ("cleanup", "--from", "delete a moved range from its old shard"),
+    ):
+        command = commands.add_parser(name, help=help_)
+        command.add_argument("--low", type=int, required=True)
+        command.add_argument("--high", type=int, required=True)
+        command.add_argument(shard_arg, dest="shard", type=int, required=True)
+    args = parser.parse_args()
+
+    shards = 1 + len(settings.db.get_shard_urls)
+    if getattr(args, "shard", ShardConf.PRIMARY) not in range(shards):
+        parser.error(f"shard must be in 0..{shards - 1}")
+    if args.command in ("pin", "move") and not settings.db.SHARD_MAP_FILE:
+        parser.error(f"{args.command} requires SHARD_MAP_FILE")
+    return args
+
+
+def show(shard_map: ShardMap) -> None:
+    """Print ring ranges with their ring shard and current shard."""
+    print("low high ring_shard shard")
+    for low, high, ring_shard in shard_map.ring_ranges():
+        owners = ",".join(map(str, sorted(shard_map.owners(low, high))))
+        print(low, high, ring_shard, owners)
+
+
+async def main(args: argparse.Namespace) -> None:
+    """Run the command."""
+    engine = await get_engine(
+        url=settings.db.get_url_database, echo=settings.db.ECHO
+    )
+    router = engine.shards
+    shard_map = router.map
+    crud = create_crud_helper()
+    try:
+        if args.command == "show":
+            show(shard_map=shard_map)
+
+        elif args.command == "pin":
+            shard_map.with_move(
+                low=ShardConf.MIN_HASH,
+                high=ShardConf.MAX_HASH,
+                shard=args.shard,
+            ).save(settings.db.SHARD_MAP_FILE)
+            print(f"all ranges are on shard {args.shard}")
+
+        elif args.command == "move":
+            sources = shard_map.owners(low=args.low, high=args.high)
+            if len(sources) != 1:
+                raise SystemExit(f"range is on shards {sorted(sources)}")
+            source = sources.pop()
+            if source == args.shard:
+                raise SystemExit(f"range is already on shard {source}")
+            await crud.rebalance.copy_range(
+                source=router.session_factory(source),
+                target=router.session_factory(args.shard),
+                low=args.low,
+                high=args.high,
+            )
+            shard_map.with_move(
+                low=args.low, high=args.high, shard=args.shard
+            ).save(settings.db.SHARD_MAP_FILE)
+            print(
+                f"range is routed to shard {args.shard}, run cleanup "
+                f"--from {source} after {settings.db.SHARD_MAP_CHECK_SECONDS}"
+                " seconds"
+            )
+
+        elif args.command == "cleanup":
+            targets = shard_map.owners(low=args.low, high=args.high)
+            if len(targets) != 1 or args.shard in targets:
+                raise SystemExit(f"range is on shards {sorted(targets)}")
+            await crud.rebalance.copy_range(
+                source=router.session_factory(args.shard),
+                target=router.session_factory(targets.pop()),
+                low=args.low,
+                high=args.high,
+            )
+            await crud.rebalance.delete_range(
+                session_factory=router.session_factory(args.shard),
+                low=args.low,
+                high=args.high,
+            )
+
+        elif args.command == "directory":
+            for shard in range(len(router)):
+                read = await crud.rebalance.fill_directory(
+                    source=router.session_factory(shard),
+                    primary=router.session_factory(ShardConf.PRIMARY),
+                )
+                print(f"shard {shard}: {read} emails")
+    finally:
+        await router.dispose()
+        await engine.async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
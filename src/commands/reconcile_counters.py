@@ -0,0 +1,80 @@
+"""Recompute referral counters and the leaderboard from Postgres.
+
+Usage:
+    python -m src.commands.reconcile_counters --batch 1000
+
+Counters are incremented in Redis after every committed referral; the
+command replaces them with `COUNT(*)` of the edges of every shard, run
+it after a bulk import, a Redis restart or on a schedule.
+"""
+
+import argparse
+import asyncio
+from typing import AsyncIterator
+
+from src.core.controllers.depends.utils.redis_chash import (
+    close_redis,
+    setup_redis,
+)
+from src.core.controllers.depends.utils.referral_counters import (
+    reconcile_referral_counts,
+)
+from src.core.orm.crud import Crud, create_crud_helper
+from src.core.orm.engine import get_engine
+from src.core.orm.shards import ShardRouter
+from src.core.settings.constants import Leaderboard
+from src.core.settings.env import settings
+
+
+def parse_args() -> argparse.Namespace:
+    """Return command line arguments."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--batch",
+        type=int,
+        default=Leaderboard.RECONCILE_BATCH,
+        help="referrers per Redis pipeline",
+    )
+    return parser.parse_args()
+
+
+async def counts(
+    router: ShardRouter, crud: Crud, batch_size: int
+) -> AsyncIterator[list[tuple[str, int]]]:
+    """Yield batches of `(user_id, count)` of every shard.
+
+    Edges live on the shard of their referrer, so the counts of one
+    shard are complete.
+    """
+    for shard in range(len(router)):
+        async with router.session_factory(shard)() as session:
+            result = await crud.refer.stream_referral_counts(
+                session=session, chunk_size=batch_size
+            )
+            async for rows in result.partitions():
+                yield [(str(user_id), count) for user_id, count in rows]
+
+
+async def main(args: argparse.Namespace) -> None:
+    """Rebuild the counters."""
+    engine = await get_engine(
+        url=settings.db.get_url_database, echo=settings.db.ECHO
+    )
+    router = engine.shards
+    try:
+        written = await reconcile_referral_counts(
+            batches=counts(
+                router=router,
+                crud=create_crud_helper(),
+                batch_size=args.batch,
+            )
+        )
+        print(f"{written} referrers")
+    finally:
+        await close_redis(await setup_redis())
+        await router.dispose()
+        await engine.async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
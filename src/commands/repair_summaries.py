@@ -0,0 +1,52 @@
+"""Rebuild referral summaries of all users from the referral edges.
+
+Usage:
+    python -m src.commands.repair_summaries --batch 1000
+
+Summaries are written with every edge, the command fills them after
+`referral_summary` was created empty and fixes any drift. Every batch
+of users is its own transaction on every shard.
+"""
+
+import argparse
+import asyncio
+
+from src.core.orm.crud import create_crud_helper
+from src.core.orm.engine import get_engine
+from src.core.settings.constants import ReferralSummaryConf
+from src.core.settings.env import settings
+
+
+def parse_args() -> argparse.Namespace:
+    """Return command line arguments."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--batch",
+        type=int,
+        default=ReferralSummaryConf.REPAIR_BATCH,
+        help="users per transaction",
+    )
+    return parser.parse_args()
+
+
+async def main(args: argparse.Namespace) -> None:
+    """Rebuild summaries on every shard."""
+    engine = await get_engine(
+        url=settings.db.get_url_database, echo=settings.db.ECHO
+    )
+    router = engine.shards
+    crud = create_crud_helper()
+    try:
+        for shard in range(len(router)):
+            written = await crud.summary.repair(
+                session_factory=router.session_factory(shard),
+                batch_size=args.batch,
+            )
+            print(f"shard {shard}: {written} summaries")
+    finally:
+        await router.dispose()
+        await engine.async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,119 @@
+"""Fold new referrals into daily rollups or rebuild them from an export.
+
+Usage:
+    python -m src.commands.rollup_referrals aggregate --loop-seconds 30
+    python -m src.commands.rollup_referrals backfill --export /data/export
+
+`aggregate` adds edges after the watermark of every shard to the
+`referral_daily` table, with `--loop-seconds` it runs as a worker.
+`backfill` replaces the rollup of the primary with counts of the files
+of `export_graph` and needs `pyarrow`.
+"""
+
+import argparse
+import asyncio
+from datetime import timedelta
+from pathlib import Path
+
+from src.core.bulk.exporter import columnar_available
+from src.core.bulk.rollup import backfill_rollup
+from src.core.orm.crud import Crud, create_crud_helper
+from src.core.orm.engine import get_engine
+from src.core.orm.shards import ShardRouter
+from src.core.settings.constants import RollupConf
+from src.core.settings.env import settings
+
+
+def parse_args() -> argparse.Namespace:
+    """Return command line arguments."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    aggregate = commands.add_parser("aggregate", help="fold new edges")
+    aggregate.add_argument(
+        "--batch",
+        type=int,
+        default=RollupConf.BATCH,
+        help="edges per transaction",
+    )
+    aggregate.add_argument(
+        "--lag-seconds",
+        type=int,
+        default=RollupConf.LAG_SECONDS,
+        help="skip edges younger than this",
+    )
+    aggregate.add_argument(
+        "--loop-seconds",
+        type=float,
+        default=RollupConf.LOOP_SECONDS,
+        help="pause between runs, 0 runs once",
+    )
+    backfill = commands.add_parser("backfill", help="rebuild from export")
+    backfill.add_argument(
+        "--export", type=Path, required=True, help="directory"
+    )
+    args = parser.parse_args()
+
+    if args.command == "backfill" and not columnar_available():
+        parser.error("backfill requires pyarrow")
+    return args
+
+
+async def aggregate_shards(
+    router: ShardRouter, crud: Crud, batch_size: int, lag: timedelta
+) -> int:
+    """Fold new edges of every shard, one batch per transaction.
+
+    A window of `seq` shorter than the batch means the shard is caught
+    up; gaps in `seq` cost one more empty run at most.
+
+    Returns:
+        int: Batches folded.
+    """
+    batches = 0
+    for shard in range(len(router)):
+        while True:
+            async with router.session_factory(shard)() as session:
+                async with session.begin():
+                    window = await crud.rollup.aggregate(
+                        session=session, batch_size=batch_size, lag=lag
+                    )
+            if window is None:
+                break
+            print(f"shard {shard}: seq {window[0]} -> {window[1]}")
+            batches += 1
+            if window[1] - window[0] < batch_size:
+                break
+    return batches
+
+
+async def main(args: argparse.Namespace) -> None:
+    """Run the aggregator or the backfill."""
+    engine = await get_engine(
+        url=settings.db.get_url_database, echo=settings.db.ECHO
+    )
+    router = engine.shards
+    crud = create_crud_helper()
+    try:
+        if args.command == "backfill":
+            async with engine.create_session(engine.async_engine)() as session:
+                await backfill_rollup(
+                    session=session, crud=crud, export_dir=args.export
+                )
+            return
+        while True:
+            await aggregate_shards(
+                router=router,
+                crud=crud,
+                batch_size=args.batch,
+                lag=timedelta(seconds=args.lag_seconds),
+            )
+            if args.loop_seconds <= 0:
+                break
+            await asyncio.sleep(args.loop_seconds)
+    finally:
+        await router.dispose()
+        await engine.async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
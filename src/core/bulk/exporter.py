@@ -0,0 +1,187 @@
+"""Bulk export of users and referral edges to files."""
+
+import asyncio
+import gzip
+import os
+from datetime import timedelta
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable
+
+from sqlalchemy import func, select
+from sqlalchemy.sql import Select
+
+from src.core.settings.constants import GraphExportConf
+
+try:
+    import pyarrow
+    import pyarrow.csv
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:  # optional, only for Parquet and Arrow files
+    pyarrow = None
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+    from src.core.orm.crud import Crud
+
+
+def columnar_available() -> bool:
+    """Return True if pyarrow is installed."""
+    return pyarrow is not None
+
+
+def column_types() -> dict[str, dict]:
+    """Return Arrow types of exported columns by table."""
+    return {
+        GraphExportConf.TABLE_REFER: {
+            "id": pyarrow.string(),
+            "id_referrer": pyarrow.string(),
+            "id_referred": pyarrow.string(),
+            "seq": pyarrow.int64(),
+            "created_at": pyarrow.timestamp("us", tz=GraphExportConf.TIMEZONE),
+        },
+        GraphExportConf.TABLE_USERS: {
+            "id": pyarrow.string(),
+            "name": pyarrow.string(),
+        },
+    }
+
+
+def csv_to_columnar(source: Path, target: Path, table: str, fmt: str) -> None:
+    """Convert a gzip CSV export to Parquet or Arrow IPC file.
+
+    The CSV is read by blocks of `GraphExportConf.BLOCK_SIZE` bytes and
+    every block is written as one record batch, so memory does not grow
+    with the file.
+
+    Args:
+        source (Path): Gzip CSV with header.
+        target (Path): Output file.
+        table (str): `refer` or `users`, gives column types.
+        fmt (str): `parquet` or `arrow`.
+    """
+    reader = pyarrow.csv.open_csv(
+        pyarrow.input_stream(str(source), compression=GraphExportConf.GZIP),
+        read_options=pyarrow.csv.ReadOptions(
+            block_size=GraphExportConf.BLOCK_SIZE
+        ),
+        convert_options=pyarrow.csv.ConvertOptions(
+            column_types=column_types()[table]
+        ),
+    )
+    part = target.with_name(target.name + GraphExportConf.PART_SUFFIX)
+    if fmt == GraphExportConf.PARQUET:
+        writer = pyarrow.parquet.ParquetWriter(
+            str(part),
+            reader.schema,
+            compression=GraphExportConf.PARQUET_COMPRESSION,
+        )
+    else:
+        writer = pyarrow.ipc.new_file(str(part), reader.schema)
+    with writer:
+        for batch in reader:
+            writer.write_batch(batch)
+    os.replace(part, target)
+
+
+async def _copy_to_gzip(
+    session: "AsyncSession",
+    crud: "Crud",
+    query: Select,
+    target: Path,
+) -> str:
+    """Write result of a query to gzip CSV, replace target when done."""
+    part = target.with_name(target.name + GraphExportConf.PART_SUFFIX)
+    with gzip.open(part, "wb") as file:
+
+        async def write(data: bytes) -> None:
+            file.write(data)
+
+        status = await crud.export.copy_query(
+            session=session, query=query, output=write
+        )
+    os.replace(part, target)
+    return status
+
+
+async def export_graph(
+    session: "AsyncSession",
+    crud: "Crud",
+    out_dir: Path,
+    since: int = GraphExportConf.FULL_SINCE,
+    columnar: str | None = None,
+    lag: timedelta = timedelta(seconds=GraphExportConf.LAG_SECONDS),
+    progress: Callable[[str], None] = print,
+) -> int | None:
+    """Export edges with `seq > since` and their users.
+
+    Both tables are read in one REPEATABLE READ transaction, so the files
+    are one snapshot. Rows are streamed by COPY TO into gzip CSV files,
+    `refer-<since>-<until>.csv.gz` and `users-<since>-<until>.csv.gz`,
+    then optionally converted to Parquet or Arrow. A file appears under
+    its name only when it is complete.
+
+    Args:
+        session (AsyncSession): Database session without a transaction.
+        crud (Crud): CRUD worker.
+        out_dir (Path): Directory of the files.
+        since (int): `seq` of the last exported edge, 0 for full export.
+        columnar (str | None): `parquet`, `arrow` or None for CSV only.
+        lag (timedelta): Minimal age of exported edges.
+        progress (Callable[[str], None]): Receiver of progress lines.
+
+    Returns:
+        int | None: `seq` of the last exported edge, use it as the next
+        `since`; None if there is nothing new.
+    """
+    exported: list[tuple[str, Path]] = []
+    async with session.begin():
+        await session.connection(
+            execution_options={
+                "isolation_level": GraphExportConf.ISOLATION_LEVEL,
+                "postgresql_readonly": True,
+            }
+        )
+        await session.execute(
+            select(func.set_config("TimeZone", GraphExportConf.TIMEZONE, True))
+        )
+        until = await crud.export.get_last_seq(
+            session=session, since=since, lag=lag
+        )
+        if until is None:
+            progress(f"nothing to export after seq {since}")
+            return None
+
+        for table, query in (
+            (
+                GraphExportConf.TABLE_REFER,
+                crud.export.edges_query(since=since, until=until),
+            ),
+            (
+                GraphExportConf.TABLE_USERS,
+                crud.export.users_query(since=since, until=until),
+            ),
+        ):
+            name = GraphExportConf.FILE_NAME.format(
+                table=table, since=since, until=until
+            )
+            target = out_dir / (name + GraphExportConf.CSV_SUFFIX)
+            status = await _copy_to_gzip(
+                session=session, crud=crud, query=query, target=target
+            )
+            progress(f"{table}: {status} -> {target}")
+            exported.append((table, target))
+
+    if columnar is not None:
+        for table, source in exported:
+            target = source.with_name(
+                source.name.removesuffix(GraphExportConf.CSV_SUFFIX)
+                + f".{columnar}"
+            )
+            await asyncio.to_thread(
+                csv_to_columnar, source, target, table, columnar
+            )
+            progress(f"{table}: -> {target}")
+
+    return until
@@ -0,0 +1,397 @@
+"""Array snapshot of the referral graph for analytics jobs."""
+
+import json
+import os
+from datetime import timedelta
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Iterable
+
+from src.core.settings.constants import GraphSnapshotConf, TypeEncoding
+
+try:
+    import numpy
+except ImportError:  # optional, only for graph snapshots
+    numpy = None  # type: ignore[assignment]
+
+if TYPE_CHECKING:
+    import uuid
+
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+    from src.core.orm.crud import Crud
+
+
+def snapshot_available() -> bool:
+    """Return True if numpy is installed."""
+    return numpy is not None
+
+
+def uuid_array(user_ids: Iterable["uuid.UUID"]) -> "numpy.ndarray":
+    """Return UUIDs as an array of 16-byte values, ordered like UUIDs."""
+    return numpy.frombuffer(
+        b"".join(user_id.bytes for user_id in user_ids),
+        dtype=GraphSnapshotConf.UUID_DTYPE,
+    )
+
+
+def _gather_children(
+    indptr: "numpy.ndarray", indices: "numpy.ndarray", nodes: "numpy.ndarray"
+) -> tuple["numpy.ndarray", "numpy.ndarray"]:
+    """Return children of nodes and the position of their parent in nodes."""
+    starts = indptr[nodes]
+    lengths = indptr[nodes + 1] - starts
+    owners: "numpy.ndarray" = numpy.repeat(numpy.arange(len(nodes)), lengths)
+    offsets = numpy.arange(lengths.sum()) - numpy.repeat(
+        numpy.cumsum(lengths) - lengths, lengths
+    )
+    return indices[starts[owners] + offsets], owners
+
+
+class GraphSnapshot:
+    """Referral forest in compressed sparse row arrays.
+
+    Users with an edge are nodes `0..n-1` in order of appearance:
+
+    - `ids` gives the UUID of a node, `sorted_ids` and `sorted_nodes`
+      give the node of a UUID by binary search;
+    - `parent` is the referrer of a node, `NO_NODE` for roots;
+    - children of node `i` are `indices[indptr[i]:indptr[i + 1]]` in
+      order of `seq`.
+
+    Arrays are `.npy` files opened as memory maps, so jobs share pages
+    of one snapshot and start without reading it.
+    """
+
+    def __init__(
+        self,
+        ids: "numpy.ndarray",
+        sorted_ids: "numpy.ndarray",
+        sorted_nodes: "numpy.ndarray",
+        parent: "numpy.ndarray",
+        indptr: "numpy.ndarray",
+        indices: "numpy.ndarray",
+        last_seq: dict[str, int] | None = None,
+    ) -> None:
+        """Init snapshot.
+
+        Args:
+            ids (numpy.ndarray): UUID of every node.
+            sorted_ids (numpy.ndarray): `ids` sorted.
+            sorted_nodes (numpy.ndarray): Node of every `sorted_ids` item.
+            parent (numpy.ndarray): Referrer of every node.
+            indptr (numpy.ndarray): Start of children of every node.
+            indices (numpy.ndarray): Children of all nodes.
+            last_seq (dict[str, int] | None): `seq` of the last loaded
+                edge by shard.
+        """
+        self.ids = ids
+        self.sorted_ids = sorted_ids
+        self.sorted_nodes = sorted_nodes
+        self.parent = parent
+        self.indptr = indptr
+        self.indices = indices
+        self.last_seq = dict(last_seq or {})
+        self._depths: "numpy.ndarray | None" = None
+        self._sizes: "numpy.ndarray | None" = None
+
+    def __len__(self) -> int:
+        """Return number of nodes."""
+        return len(self.ids)
+
+    @classmethod
+    def empty(cls) -> "GraphSnapshot":
+        """Return snapshot without nodes."""
+        return cls(
+            ids=numpy.empty(0, dtype=GraphSnapshotConf.UUID_DTYPE),
+            sorted_ids=numpy.empty(0, dtype=GraphSnapshotConf.UUID_DTYPE),
+            sorted_nodes=numpy.empty(0, dtype=numpy.int32),
+            parent=numpy.empty(0, dtype=numpy.int32),
+            indptr=numpy.zeros(1, dtype=numpy.int64),
+            indices=numpy.empty(0, dtype=numpy.int32),
+        )
+
+    def nodes(self, user_ids: "numpy.ndarray") -> "numpy.ndarray":
+        """Return nodes of UUIDs, `NO_NODE` for users without edges.
+
+        Args:
+            user_ids (numpy.ndarray): UUIDs, see `uuid_array`.
+
+        Returns:
+            numpy.ndarray: int32 nodes.
+        """
+        if not len(self):
+            return numpy.full(
+                len(user_ids), GraphSnapshotConf.NO_NODE, numpy.int32
+            )
+        positions = numpy.searchsorted(self.sorted_ids, user_ids)
+        positions = numpy.minimum(positions, len(self) - 1)
+        return numpy.where(
+            self.sorted_ids[positions] == user_ids,
+            self.sorted_nodes[positions],
+            GraphSnapshotConf.NO_NODE,
+        ).astype(numpy.int32)
+
+    def append(
+        self,
+        referrers: "numpy.ndarray",
+        referred: "numpy.ndarray",
+    ) -> "GraphSnapshot":
+        """Return snapshot with new edges, ordered by `seq`.
+
+        UUIDs are sorted once, lookups of sorted keys walk the index in
+        order. New users get the next nodes in order of appearance;
+        children of every node are merged in one stable sort, so old
+        edges keep their order before new ones.
+
+        Args:
+            referrers (numpy.ndarray): UUIDs of referrers.
+            referred (numpy.ndarray): UUIDs of referred users.
+
+        Returns:
+            GraphSnapshot: New snapshot in memory, save it to persist.
+        """
+        both = numpy.concatenate([referrers, referred])
+        unique_ids, first, inverse = numpy.unique(
+            both, return_index=True, return_inverse=True
+        )
+        unique_nodes = self.nodes(unique_ids)
+        new = unique_nodes == GraphSnapshotConf.NO_NODE
+        new_ids = unique_ids[new]
+        appearance = numpy.flatnonzero(new)[
+            numpy.argsort(first[new], kind="stable")
+        ]
+        unique_nodes[appearance] = numpy.arange(
+            len(self), len(self) + len(appearance), dtype=numpy.int32
+        )
+        ids = numpy.concatenate([self.ids, unique_ids[appearance]])
+        positions = numpy.searchsorted(self.sorted_ids, new_ids)
+
+        edge_nodes = unique_nodes[inverse.ravel()]
+        sources, targets = numpy.split(edge_nodes, [len(referrers)])
+        parent = numpy.concatenate(
+            [
+                self.parent,
+                numpy.full(
+                    len(new_ids), GraphSnapshotConf.NO_NODE, numpy.int32
+                ),
+            ]
+        )
+        parent[targets] = sources
+
+        old_sources: "numpy.ndarray" = numpy.repeat(
+            numpy.arange(len(self), dtype=numpy.int32),
+            numpy.diff(self.indptr),
+        )
+        all_sources = numpy.concatenate([old_sources, sources])
+        merge = numpy.argsort(all_sources, kind="stable")
+        indptr: "numpy.ndarray" = numpy.zeros(len(ids) + 1, dtype=numpy.int64)
+        numpy.cumsum(
+            numpy.bincount(all_sources, minlength=len(ids)), out=indptr[1:]
+        )
+        snapshot = GraphSnapshot(
+            ids=ids,
+            sorted_ids=numpy.insert(self.sorted_ids, positions, new_ids),
+            sorted_nodes=numpy.insert(
+                self.sorted_nodes, positions, unique_nodes[new]
+            ),
+            parent=parent,
+            indptr=indptr,
+            indices=numpy.concatenate([self.indices, targets])[merge],
+            last_seq=self.last_seq,
+        )
+        return snapshot
+
+    def depths(self) -> "numpy.ndarray":
+        """Return distance of every node from its root.
+
+        Pointer jumping: after step `k` every node knows its ancestor
+        `2 ** k` levels up, so the loop runs log2 of the deepest chain.
+        A cycle made by a bulk import stops after log2 of the node count.
+        """
+        if self._depths is None:
+            ancestor = numpy.array(self.parent)
+            depth = (ancestor != GraphSnapshotConf.NO_NODE).astype(numpy.int32)
+            for _ in range(max(len(self), 1).bit_length()):
+                has = ancestor != GraphSnapshotConf.NO_NODE
+                if not has.any():
+                    break
+                up = ancestor[has]
+                depth[has] += depth[up]
+                ancestor[has] = ancestor[up]
+            self._depths = depth
+        return self._depths
+
+    def subtree_sizes(self) -> "numpy.ndarray":
+        """Return number of descendants of every node.
+
+        Levels are folded into their parents from the deepest one up,
+        every level is one vectorized add.
+        """
+        if self._sizes is None:
+            depth = self.depths()
+            sizes: "numpy.ndarray" = numpy.ones(len(self), dtype=numpy.int64)
+            order = numpy.argsort(depth, kind="stable")
+            bounds = numpy.searchsorted(
+                depth[order], numpy.arange(1, depth.max(initial=0) + 1)
+            )
+            for nodes in reversed(numpy.split(order, bounds)[1:]):
+                numpy.add.at(sizes, self.parent[nodes], sizes[nodes])
+            self._sizes = sizes - 1
+        return self._sizes
+
+    def ancestors(self, nodes: "numpy.ndarray", depth: int) -> "numpy.ndarray":
+        """Return referrers above nodes, one row per node.
+
+        Args:
+            nodes (numpy.ndarray): Nodes, `NO_NODE` is allowed.
+            depth (int): Levels up.
+
+        Returns:
+            numpy.ndarray: int32 matrix `len(nodes) x depth`, column 0 is
+            the referrer, `NO_NODE` above the root.
+        """
+        chain: "numpy.ndarray" = numpy.full(
+            (len(nodes), depth), GraphSnapshotConf.NO_NODE, numpy.int32
+        )
+        current = numpy.asarray(nodes, dtype=numpy.int32)
+        for level in range(depth):
+            has = current != GraphSnapshotConf.NO_NODE
+            if not has.any():
+                break
+            current = numpy.where(
+                has, self.parent[numpy.where(has, current, 0)], current
+            )
+            chain[:, level] = current
+        return chain
+
+    def level_histogram(
+        self, nodes: "numpy.ndarray", depth: int
+    ) -> "numpy.ndarray":
+        """Return number of descendants on every level under nodes.
+
+        Args:
+            nodes (numpy.ndarray): Roots, `NO_NODE` is allowed.
+            depth (int): Levels down.
+
+        Returns:
+            numpy.ndarray: int64 matrix `len(nodes) x depth`, column 0 is
+            direct referrals.
+        """
+        histogram: "numpy.ndarray" = numpy.zeros(
+            (len(nodes), depth), dtype=numpy.int64
+        )
+        nodes = numpy.asarray(nodes, dtype=numpy.int32)
+        frontier = nodes[nodes != GraphSnapshotConf.NO_NODE]
+        roots = numpy.flatnonzero(nodes != GraphSnapshotConf.NO_NODE)
+        for level in range(depth):
+            if not len(frontier):
+                break
+            frontier, owners = _gather_children(
+                self.indptr, self.indices, frontier
+            )
+            roots = roots[owners]
+            histogram[:, level] = numpy.bincount(roots, minlength=len(nodes))
+        return histogram
+
+    def save(self, path: Path) -> None:
+        """Write arrays to `.npy` files of a directory.
+
+        Every file is written under a temporary name and renamed, the
+        meta file goes last, so readers see a complete snapshot.
+        """
+        path.mkdir(parents=True, exist_ok=True)
+        for name in GraphSnapshotConf.ARRAYS:
+            target = path / (name + GraphSnapshotConf.NPY_SUFFIX)
+            part = target.with_name(
+                target.name + GraphSnapshotConf.PART_SUFFIX
+            )
+            with open(part, "wb") as file:
+                numpy.save(file, getattr(self, name))
+            os.replace(part, target)
+        meta = path / GraphSnapshotConf.META_FILE
+        part = meta.with_name(meta.name + GraphSnapshotConf.PART_SUFFIX)
+        part.write_text(
+            json.dumps(
+                {
+                    GraphSnapshotConf.META_NODES: len(self),
+                    GraphSnapshotConf.META_LAST_SEQ: self.last_seq,
+                }
+            ),
+            encoding=TypeEncoding.UTF8,
+        )
+        os.replace(part, meta)
+
+    @classmethod
+    def load(cls, path: Path) -> "GraphSnapshot":
+        """Open a saved snapshot as memory maps, empty without one."""
+        meta = path / GraphSnapshotConf.META_FILE
+        if not meta.exists():
+            return cls.empty()
+        data = json.loads(meta.read_text(encoding=TypeEncoding.UTF8))
+        arrays = {
+            name: numpy.load(
+                path / (name + GraphSnapshotConf.NPY_SUFFIX), mmap_mode="r"
+            )
+            for name in GraphSnapshotConf.ARRAYS
+        }
+        return cls(**arrays, last_seq=data[GraphSnapshotConf.META_LAST_SEQ])
+
+
+async def update_snapshot(
+    snapshot: GraphSnapshot,
+    session: "AsyncSession",
+    crud: "Crud",
+    shard: int,
+    progress: Callable[[str], None] = print,
+) -> GraphSnapshot:
+    """Append edges of a shard added after the snapshot's `last_seq`.
+
+    Edges are read by a server-side cursor in one REPEATABLE READ
+    transaction, up to the window of `BulkExport.get_last_seq`, so a
+    late commit is taken by the next update.
+
+    Args:
+        snapshot (GraphSnapshot): Current snapshot.
+        session (AsyncSession): Session of the shard without a
+            transaction.
+        crud (Crud): CRUD worker.
+        shard (int): Shard number, key of `last_seq`.
+        progress (Callable[[str], None]): Receiver of progress lines.
+
+    Returns:
+        GraphSnapshot: Snapshot with the new edges.
+    """
+    since = snapshot.last_seq.get(str(shard), GraphSnapshotConf.FULL_SINCE)
+    async with session.begin():
+        await session.connection(
+            execution_options={
+                "isolation_level": GraphSnapshotConf.ISOLATION_LEVEL,
+                "postgresql_readonly": True,
+            }
+        )
+        until = await crud.export.get_last_seq(
+            session=session,
+            since=since,
+            lag=timedelta(seconds=GraphSnapshotConf.LAG_SECONDS),
+        )
+        if until is None:
+            progress(f"shard {shard}: nothing after seq {since}")
+            return snapshot
+        result = await session.stream(
+            crud.export.edges_query(
+                since=since, until=until
+            ).execution_options(yield_per=GraphSnapshotConf.CHUNK_SIZE)
+        )
+        referrers, referred = [], []
+        async for rows in result.partitions():
+            referrers.append(uuid_array(row.id_referrer for row in rows))
+            referred.append(uuid_array(row.id_referred for row in rows))
+
+    edges = sum(map(len, referrers))
+    snapshot = snapshot.append(
+        referrers=numpy.concatenate(referrers),
+        referred=numpy.concatenate(referred),
+    )
+    snapshot.last_seq[str(shard)] = until
+    progress(f"shard {shard}: {edges} edges after seq {since}")
+    return snapshot
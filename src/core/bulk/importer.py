@@ -0,0 +1,259 @@
+"""Bulk import of users and referral edges."""
+
+import asyncio
+import csv
+import json
+from itertools import islice
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Iterator, TextIO
+
+import pydantic
+
+from src.core.controllers.depends.utils.hash_password import hash_pwd
+from src.core.orm.cruds.bulk import staging_edges, staging_users
+from src.core.orm.uuid7 import uuid7
+from src.core.settings.constants import BulkImportConf
+from src.core.validators.bulk import ImportEdge, ImportReport, ImportUser
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+    from src.core.orm.crud import Crud
+
+
+def import_format(filename: str | None) -> str | None:
+    """Return format of an import file by its suffix.
+
+    Args:
+        filename (str | None): File name or path.
+
+    Returns:
+        str | None: `csv`, `ndjson` or None for unknown suffix.
+    """
+    if not filename:
+        return None
+    return BulkImportConf.FORMATS.get(Path(filename).suffix.lower())
+
+
+def read_rows(source: TextIO, fmt: str) -> Iterator[tuple[int, dict | None]]:
+    """Yield `(line, row)` of a CSV file with header or of NDJSON.
+
+    Empty values are dropped, so optional columns may be blank in CSV.
+    A row that is not a JSON object is yielded as None.
+    """
+    if fmt == BulkImportConf.FORMAT_CSV:
+        reader = csv.DictReader(source)
+        for line, row in enumerate(
+            reader, start=BulkImportConf.CSV_FIRST_LINE
+        ):
+            yield line, {key: value for key, value in row.items() if value}
+        return
+
+    for line, raw in enumerate(source, start=1):
+        if not raw.strip():
+            continue
+        try:
+            data = json.loads(raw)
+        except ValueError:
+            data = None
+        if not isinstance(data, dict):
+            yield line, None
+            continue
+        yield line, {key: value for key, value in data.items() if value}
+
+
+def _known_format(fmt: str | None) -> str:
+    """Return a format found by `import_format`, callers reject others."""
+    if fmt is None:
+        raise ValueError(BulkImportConf.UNKNOWN_FORMAT)
+    return fmt
+
+
+def _chunks(rows: Iterator, size: int) -> Iterator[list]:
+    """Split rows to lists of `size` items."""
+    while chunk := list(islice(rows, size)):
+        yield chunk
+
+
+def _reason(e: pydantic.ValidationError) -> str:
+    """Return short reason of the first validation error."""
+    error = e.errors()[0]
+    location = ".".join(str(part) for part in error["loc"])
+    return f"{location}: {error['msg']}" if location else error["msg"]
+
+
+async def _user_records(
+    chunk: list[tuple[int, dict | None]], rejects: Any
+) -> list[tuple]:
+    """Validate users of a chunk and hash plain passwords in threads."""
+    valid: list[tuple[int, ImportUser]] = []
+    for line, row in chunk:
+        if row is None:
+            rejects.writerow(
+                (
+                    BulkImportConf.KIND_USER,
+                    line,
+                    None,
+                    BulkImportConf.REJECT_INVALID_JSON,
+                )
+            )
+            continue
+        try:
+            valid.append((line, ImportUser.model_validate(row)))
+        except pydantic.ValidationError as e:
+            rejects.writerow(
+                (BulkImportConf.KIND_USER, line, row.get("email"), _reason(e))
+            )
+
+    hashes = await asyncio.gather(
+        *(
+            asyncio.to_thread(hash_pwd, user.password)
+            for _, user in valid
+            if user.password is not None
+        )
+    )
+    hashed = iter(hashes)
+    return [
+        (
+            line,
+            uuid7(),
+            user.name,
+            user.email,
+            user.hashed_password or next(hashed).decode(),
+        )
+        for line, user in valid
+    ]
+
+
+def _edge_records(
+    chunk: list[tuple[int, dict | None]], rejects: Any
+) -> list[tuple]:
+    """Validate referral edges of a chunk."""
+    records = []
+    for line, row in chunk:
+        if row is None:
+            rejects.writerow(
+                (
+                    BulkImportConf.KIND_EDGE,
+                    line,
+                    None,
+                    BulkImportConf.REJECT_INVALID_JSON,
+                )
+            )
+            continue
+        try:
+            edge = ImportEdge.model_validate(row)
+        except pydantic.ValidationError as e:
+            rejects.writerow(
+                (
+                    BulkImportConf.KIND_EDGE,
+                    line,
+                    row.get("referred_email"),
+                    _reason(e),
+                )
+            )
+            continue
+        records.append(
+            (line, uuid7(), edge.referrer_email, edge.referred_email)
+        )
+    return records
+
+
+async def import_users(
+    session: "AsyncSession",
+    crud: "Crud",
+    rejects: TextIO,
+    users: TextIO | None = None,
+    users_format: str | None = None,
+    edges: TextIO | None = None,
+    edges_format: str | None = None,
+    progress: Callable[[str], None] = print,
+    chunk_size: int = BulkImportConf.CHUNK_SIZE,
+) -> ImportReport:
+    """Import users and then referral edges in one transaction.
+
+    Rows are validated and copied to staging tables chunk by chunk with
+    COPY, so memory is bounded by `chunk_size`. Then one INSERT ... SELECT
+    per target merges them: a new email becomes users and auth rows, an
+    edge between two known emails becomes a refer row. Edges may point to
+    users of the same import. Referral summaries of referrers with new
+    edges are rebuilt in the same transaction. Rows that are not imported
+    are written to `rejects` as CSV with their line and reason.
+
+    Args:
+        session (AsyncSession): Database session without a transaction.
+        crud (Crud): CRUD worker.
+        rejects (TextIO): Output of rejected rows.
+        users (TextIO | None): Users with `name`, `email` and `password`
+            or `hashed_password` (bcrypt).
+        users_format (str | None): `csv` or `ndjson`.
+        edges (TextIO | None): Edges with `referrer_email` and
+            `referred_email`.
+        edges_format (str | None): `csv` or `ndjson`.
+        progress (Callable[[str], None]): Receiver of progress lines.
+        chunk_size (int): Rows per COPY.
+
+    Returns:
+        ImportReport: Counters of the import.
+
+    Raises:
+        ValueError: If a file is given without a known format.
+    """
+    report = ImportReport()
+    writer = csv.writer(rejects)
+    writer.writerow(BulkImportConf.REJECTS_HEADER)
+
+    async with session.begin():
+        await crud.bulk.create_staging(session=session)
+
+        if users is not None:
+            staged = 0
+            rows = read_rows(users, _known_format(users_format))
+            for chunk in _chunks(rows, chunk_size):
+                records = await _user_records(chunk=chunk, rejects=writer)
+                if records:
+                    await crud.bulk.copy_records(
+                        session=session, table=staging_users, records=records
+                    )
+                report.users_read += len(chunk)
+                staged += len(records)
+                progress(f"users: {report.users_read} read, {staged} staged")
+
+            rejected = await crud.bulk.merge_users(session=session)
+            writer.writerows(
+                (BulkImportConf.KIND_USER, *row) for row in rejected
+            )
+            report.users_imported = staged - len(rejected)
+            progress(f"users: {report.users_imported} imported")
+
+        if edges is not None:
+            staged = 0
+            rows = read_rows(edges, _known_format(edges_format))
+            for chunk in _chunks(rows, chunk_size):
+                records = _edge_records(chunk=chunk, rejects=writer)
+                if records:
+                    await crud.bulk.copy_records(
+                        session=session, table=staging_edges, records=records
+                    )
+                report.edges_read += len(chunk)
+                staged += len(records)
+                progress(f"edges: {report.edges_read} read, {staged} staged")
+
+            rejected = await crud.bulk.merge_edges(session=session)
+            summaries = await crud.summary.rebuild(
+                session=session, referrers=crud.bulk.staged_referrers()
+            )
+            writer.writerows(
+                (BulkImportConf.KIND_EDGE, *row) for row in rejected
+            )
+            report.edges_imported = staged - len(rejected)
+            progress(f"edges: {report.edges_imported} imported")
+            progress(f"summaries: {summaries} rebuilt")
+
+    report.rejected = (
+        report.users_read
+        - report.users_imported
+        + report.edges_read
+        - report.edges_imported
+    )
+    return report
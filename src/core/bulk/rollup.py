@@ -0,0 +1,158 @@
+"""Rebuild of the daily referral rollup from exported edges."""
+
+import re
+import uuid
+from datetime import date
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Iterator
+
+from src.core.bulk.exporter import column_types, columnar_available
+from src.core.settings.constants import GraphExportConf, RollupConf
+
+if columnar_available():
+    import pyarrow
+    import pyarrow.compute
+    import pyarrow.csv
+    import pyarrow.ipc
+    import pyarrow.parquet
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+    from src.core.orm.crud import Crud
+
+_WINDOW = re.compile(r"^refer-(\d+)-(\d+)\.(csv\.gz|parquet|arrow)$")
+_PREFERRED = (*GraphExportConf.COLUMNAR, GraphExportConf.CSV_SUFFIX[1:])
+
+
+def export_files(export_dir: Path) -> tuple[list[Path], int]:
+    """Return edge files of an export chain and its last `seq`.
+
+    Windows `(since, until]` must start at 0 and follow each other; of
+    several formats of one window the columnar file is taken.
+
+    Raises:
+        ValueError: If there are no files or a window is missing.
+    """
+    windows: dict[tuple[int, int], dict[str, Path]] = {}
+    for path in export_dir.glob(RollupConf.REFER_FILES):
+        match = _WINDOW.match(path.name)
+        if match:
+            since, until, fmt = match.groups()
+            windows.setdefault((int(since), int(until)), {})[fmt] = path
+
+    files, last_seq = [], GraphExportConf.FULL_SINCE
+    for since, until in sorted(windows):
+        if since != last_seq:
+            raise ValueError(f"export after seq {last_seq} is missing")
+        formats = windows[(since, until)]
+        files.append(next(formats[f] for f in _PREFERRED if f in formats))
+        last_seq = until
+    if not files:
+        raise ValueError(f"no refer files in {export_dir}")
+    return files, last_seq
+
+
+def _batches(path: Path) -> Iterator["pyarrow.RecordBatch"]:
+    """Yield record batches of `id_referrer` and `created_at` of a file."""
+    columns = ["id_referrer", "created_at"]
+    if path.name.endswith(GraphExportConf.PARQUET):
+        yield from pyarrow.parquet.ParquetFile(str(path)).iter_batches(
+            columns=columns
+        )
+    elif path.name.endswith(GraphExportConf.ARROW):
+        with pyarrow.ipc.open_file(str(path)) as reader:
+            for index in range(reader.num_record_batches):
+                yield reader.get_batch(index).select(columns)
+    else:
+        yield from pyarrow.csv.open_csv(
+            pyarrow.input_stream(str(path), compression=GraphExportConf.GZIP),
+            read_options=pyarrow.csv.ReadOptions(
+                block_size=GraphExportConf.BLOCK_SIZE
+            ),
+            convert_options=pyarrow.csv.ConvertOptions(
+                column_types=column_types()[GraphExportConf.TABLE_REFER],
+                include_columns=columns,
+            ),
+        )
+
+
+def _count_days(table: "pyarrow.Table", count: str) -> "pyarrow.Table":
+    """Group rows by referrer and day, `count` rows or sum `count`."""
+    aggregation = (
+        (RollupConf.COLUMN_DAY, "count")
+        if count == RollupConf.COLUMN_DAY
+        else (RollupConf.COLUMN_COUNT, "sum")
+    )
+    grouped = table.group_by(["id_referrer", RollupConf.COLUMN_DAY]).aggregate(
+        [aggregation]
+    )
+    return grouped.rename_columns(
+        ["id_referrer", RollupConf.COLUMN_DAY, RollupConf.COLUMN_COUNT]
+    )
+
+
+def daily_counts(files: list[Path]) -> "pyarrow.Table":
+    """Return referrals per referrer and UTC day of edge files.
+
+    `created_at` of the export is UTC, so its date is the rollup day.
+
+    Every batch is grouped by Arrow compute kernels, then the partial
+    counts of all batches are summed, so memory follows the number of
+    referrer days and not of edges.
+    """
+    partial = []
+    for path in files:
+        for batch in _batches(path):
+            days = pyarrow.compute.cast(batch["created_at"], pyarrow.date32())
+            table = pyarrow.table(
+                {
+                    "id_referrer": batch["id_referrer"],
+                    RollupConf.COLUMN_DAY: days,
+                }
+            )
+            partial.append(_count_days(table, count=RollupConf.COLUMN_DAY))
+    return _count_days(
+        pyarrow.concat_tables(partial), count=RollupConf.COLUMN_COUNT
+    )
+
+
+def _records(counts: "pyarrow.Table") -> Iterator[tuple[uuid.UUID, date, int]]:
+    """Yield rows of a count table for COPY."""
+    for batch in counts.to_batches():
+        yield from zip(
+            map(uuid.UUID, batch["id_referrer"].to_pylist()),
+            batch[RollupConf.COLUMN_DAY].to_pylist(),
+            batch[RollupConf.COLUMN_COUNT].to_pylist(),
+        )
+
+
+async def backfill_rollup(
+    session: "AsyncSession",
+    crud: "Crud",
+    export_dir: Path,
+    progress: Callable[[str], None] = print,
+) -> int:
+    """Replace the daily rollup with counts of an export directory.
+
+    The export chain of `export_graph` is read up to its last `seq`,
+    the aggregator continues after it.
+
+    Args:
+        session (AsyncSession): Database session without a transaction.
+        crud (Crud): CRUD worker.
+        export_dir (Path): Directory of `refer-<since>-<until>.*` files.
+        progress (Callable[[str], None]): Receiver of progress lines.
+
+    Returns:
+        int: `seq` of the last counted edge.
+    """
+    files, last_seq = export_files(export_dir=export_dir)
+    counts = daily_counts(files=files)
+    progress(f"{len(files)} files: {counts.num_rows} referrer days")
+    async with session.begin():
+        await crud.rollup.replace_history(
+            session=session, records=_records(counts), last_seq=last_seq
+        )
+    progress(f"rollup rebuilt up to seq {last_seq}")
+    return last_seq
@@ -0,0 +1,48 @@
+"""Admin routes."""
+
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, status
+from fastapi.responses import JSONResponse
+
+from src.core.controllers.depends.admin import admin_key_is_valid, bulk_import
+from src.core.settings.constants import AdminRoutes, MimeTypes
+from src.core.validators.bulk import ImportReport
+
+
+def create_admin_route() -> APIRouter:
+    """Create admin router, every route requires `X-Admin-Key`.
+
+    Returns:
+        APIRouter: Router with admin routes.
+    """
+    return APIRouter(
+        tags=[AdminRoutes.TAG],
+        dependencies=[Depends(admin_key_is_valid)],
+    )
+
+
+admin: APIRouter = create_admin_route()
+
+
+@admin.post(
+    path=AdminRoutes.IMPORT_PATH,
+    status_code=status.HTTP_200_OK,
+    response_model=ImportReport,
+)
+async def import_users_and_referrals(
+    report: Annotated[ImportReport, Depends(bulk_import)],
+) -> JSONResponse:
+    """Bulk import of users and referral edges.
+
+    Args:
+        report (ImportReport): Result of the import.
+
+    Returns:
+        JSONResponse: Counters of the import and path of rejects file.
+    """
+    return JSONResponse(
+        content=report.model_dump(),
+        status_code=status.HTTP_200_OK,
+        media_type=MimeTypes.APPLICATION_JSON,
+    )
@@ -0,0 +1,125 @@
+"""Depends-Admin routes."""
+
+import io
+import secrets
+from pathlib import Path
+from typing import TYPE_CHECKING, Annotated
+
+from fastapi import Depends, File, UploadFile, status
+from fastapi.security import APIKeyHeader
+
+from src.core.bulk.importer import import_format, import_users
+from src.core.controllers.depends.utils.connect_db import get_crud, get_session
+from src.core.controllers.depends.utils.return_error import http_exception
+from src.core.orm.uuid7 import uuid7
+from src.core.settings.constants import (
+    BulkImportConf,
+    Headers,
+    MessageError,
+    TypeEncoding,
+)
+from src.core.settings.env import settings
+from src.core.validators.bulk import ImportReport
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+    from src.core.orm.crud import Crud
+
+admin_key_header = APIKeyHeader(name=Headers.X_ADMIN_KEY, auto_error=False)
+
+
+async def admin_key_is_valid(
+    key: Annotated[str | None, Depends(admin_key_header)],
+) -> None:
+    """Check admin API key.
+
+    Args:
+        - key (str | None): Value of `X-Admin-Key` header.
+    Raises:
+        HTTPException:
+            - status 403 if `ADMIN_API_KEY` is not set or key is wrong.
+    """
+    expected = settings.admin.ADMIN_API_KEY
+    if (
+        expected is None
+        or key is None
+        or not secrets.compare_digest(key.encode(), expected.encode())
+    ):
+        raise http_exception(
+            status_code=status.HTTP_403_FORBIDDEN,
+            error_type=MessageError.INVALID_ADMIN_KEY_ERR,
+            error_message=MessageError.INVALID_ADMIN_KEY_ERR_MESSAGE,
+        )
+
+
+def _format_or_error_422(upload: UploadFile | None) -> str | None:
+    """Return format of an uploaded file or raise 422."""
+    if upload is None:
+        return None
+    fmt = import_format(upload.filename)
+    if fmt is None:
+        raise http_exception(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            error_type=MessageError.INVALID_QUERY_ERR,
+            error_message=MessageError.INVALID_IMPORT_FORMAT_ERR_MESSAGE,
+        )
+    return fmt
+
+
+def _text(upload: UploadFile | None) -> io.TextIOWrapper | None:
+    """Return uploaded file as text stream."""
+    if upload is None:
+        return None
+    return io.TextIOWrapper(
+        upload.file, encoding=TypeEncoding.UTF8, newline=""
+    )
+
+
+async def bulk_import(
+    crud: Annotated["Crud", Depends(get_crud)],
+    session: Annotated["AsyncSession", Depends(get_session)],
+    users: Annotated[
+        UploadFile | None,
+        File(description="Users: CSV with header or NDJSON."),
+    ] = None,
+    edges: Annotated[
+        UploadFile | None,
+        File(description="Referral edges: CSV with header or NDJSON."),
+    ] = None,
+) -> ImportReport:
+    """Import uploaded users and referral edges.
+
+    Rejected rows are written to a CSV file in `IMPORT_REJECTS_DIR`,
+    its path is returned in the report.
+
+    Args:
+        crud: CRUD operations handler
+        session: AsyncSession for database operations
+        users: Users file
+        edges: Referral edges file
+    Returns:
+        ImportReport: Counters of the import.
+    Raises:
+        HTTPException: 422 if a file has unknown suffix.
+    """
+    users_format = _format_or_error_422(upload=users)
+    edges_format = _format_or_error_422(upload=edges)
+    rejects_path = Path(settings.admin.IMPORT_REJECTS_DIR) / (
+        BulkImportConf.REJECTS_FILE.format(uuid7())
+    )
+
+    with open(
+        rejects_path, "w", encoding=TypeEncoding.UTF8, newline=""
+    ) as rejects:
+        report = await import_users(
+            session=session,
+            crud=crud,
+            rejects=rejects,
+            users=_text(upload=users),
+            users_format=users_format,
+            edges=_text(upload=edges),
+            edges_format=edges_format,
+        )
+    report.rejects_file = str(rejects_path)
+    return report
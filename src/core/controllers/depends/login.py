@@ -5,7 +5,11 @@ from typing import TYPE_CHECKING, Annotated
 from fastapi import Depends, status
 from fastapi.security import OAuth2PasswordRequestForm
 
-from src.core.controllers.depends.utils.connect_db import get_crud, get_session
+from src.core.controllers.depends.utils.connect_db import (
+    get_crud,
+    get_session,
+    get_shard_router,
+)
 from src.core.controllers.depends.utils.hash_password import validate_pwd
 from src.core.controllers.depends.utils.jsonresponse_new_jwt import (
     response_auth_tokens,
@@ -18,12 +22,14 @@ if TYPE_CHECKING:
     from sqlalchemy.ext.asyncio import AsyncSession
 
     from src.core.orm.crud import Crud
+    from src.core.orm.shards import ShardRouter
 
 
 async def login_user_form(
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
     crud: Annotated["Crud", Depends(get_crud)],
     session: Annotated["AsyncSession", Depends(get_session)],
+    shards: Annotated["ShardRouter | None", Depends(get_shard_router)],
 ) -> "JSONResponse":
     """Check user in DB than create tokens.
 
@@ -31,6 +37,7 @@ async def login_user_form(
         form_data: OAuth2PasswordRequestForm
         session: AsyncSession
         crud: Crud
+        shards: Optional[ShardRouter]
     Return:
         UserToken(access_token: str, token_type: str)
     Raises:
@@ -38,9 +45,14 @@ async def login_user_form(
     Notes:
         Return new JWT access token and refresh token.
     """
-    user_data = await crud.auth.login_user(
-        email=form_data.username, session=session
-    )
+    if shards is not None:
+        user_data = await crud.shards.login_user(
+            router=shards, email=form_data.username
+        )
+    else:
+        user_data = await crud.auth.login_user(
+            email=form_data.username, session=session
+        )
 
     if not isinstance(user_data, tuple):
         raise http_exception(
@@ -56,10 +68,15 @@ async def login_user_form(
         hash_password=user_hash_pwd.encode(),
     ):
 
-        user_profile = await crud.users.get_user(
-            id_user=user_id,
-            session=session,
-        )
+        if shards is not None:
+            user_profile = await crud.shards.get_user(
+                router=shards, id_user=user_id
+            )
+        else:
+            user_profile = await crud.users.get_user(
+                id_user=user_id,
+                session=session,
+            )
         payload = {
             JWT.PAYLOAD_SUB_KEY: str(user_id),
             JWT.PAYLOAD_USERNAME_KEY: user_profile.name,
@@ -1,93 +1,747 @@
 """Depends for referrals by user ID."""
 
+import asyncio
 import json
-from typing import TYPE_CHECKING, Annotated, cast
+import uuid
+from collections import Counter, defaultdict
+from datetime import date, datetime, timedelta, timezone
+from typing import TYPE_CHECKING, Annotated, AsyncIterator, NamedTuple
 
 import pydantic
-from fastapi import Depends, Header, Request, Response
+from fastapi import Body, Depends, Header, Query, Request, Response, status
 from jwt.exceptions import InvalidTokenError
 
 from src.core.controllers.depends.token import token_is_alive
-from src.core.controllers.depends.utils.connect_db import get_crud, get_session
+from src.core.controllers.depends.utils.bloom_filters import (
+    publish_to_filters,
+)
+from src.core.controllers.depends.utils.connect_db import (
+    get_crud,
+    get_read_session,
+    get_read_session_factory,
+    get_session_factory,
+    get_shard_router,
+)
+from src.core.controllers.depends.utils.cursor import (
+    decode_cursor_or_error_422,
+    encode_cursor,
+)
+from src.core.controllers.depends.utils.email_owners import (
+    get_email_owner,
+    set_email_owner,
+)
 from src.core.controllers.depends.utils.jsonresponse_new_jwt import (
     response_referral_tokens,
 )
+from src.core.controllers.depends.utils.last_modified import (
+    format_http_date,
+    is_not_modified_since,
+)
 from src.core.controllers.depends.utils.redis_chash import (
     cache_http_get,
     cache_http_singleton_value_by_user,
     is_alive_referral_token_in_chash,
 )
+from src.core.controllers.depends.utils.referral_batch import (
+    get_cached_pages,
+    set_cached_pages,
+)
+from src.core.controllers.depends.utils.referral_codes import (
+    check_referral_codes,
+    verify_referral_codes,
+)
+from src.core.controllers.depends.utils.referral_counters import (
+    get_referral_count,
+    get_top_referrers,
+)
+from src.core.controllers.depends.utils.referral_short_codes import (
+    drop_short_code,
+    issue_short_code,
+)
 from src.core.controllers.depends.utils.return_error import (
     raise_400_bad_req,
     raise_hht_401,
     raise_http_404,
+    valid_date_range_or_error_422,
+    valid_fields_or_error_422,
     valid_id_or_error_422,
 )
-from src.core.orm.models.refer import ReferORM
-from src.core.settings.constants import JWT, Keys, MessageError
+from src.core.settings.constants import (
+    JWT,
+    BloomConf,
+    Export,
+    Headers,
+    Keys,
+    Leaderboard,
+    MessageError,
+    Pagination,
+    ReferralSummaryConf,
+    ReferralTreeConf,
+    RollupConf,
+)
 from src.core.settings.env import settings
-from src.core.validators.token import TokenReferral
-from src.core.validators.user import User, UserReferrals
+from src.core.validators.leaderboard import ReferralCount, TopReferrers
+from src.core.validators.rollup import ReferralDay, UserReferralDaily
+from src.core.validators.token import (
+    ReferralCodes,
+    ReferralCodeStatus,
+    ReferralCodeStatuses,
+    TokenReferral,
+)
+from src.core.validators.user import (
+    ReferralBatch,
+    TreeNode,
+    User,
+    UserReferrals,
+    UserReferralsBatch,
+    UserReferralTree,
+)
 
 if TYPE_CHECKING:
-    from sqlalchemy.ext.asyncio import AsyncSession
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
     from src.core.orm.crud import Crud
+    from src.core.orm.shards import ShardRouter
+
+
+class _PageRow(NamedTuple):
+    """Referral of the first page kept in the referrer's summary."""
+
+    id_referred: uuid.UUID
+    seq: int
+    name: str | None
+
+
+def _summary_page(items: list[dict], with_names: bool) -> list[_PageRow]:
+    """Return JSONB items of a summary as rows of a referral page."""
+    return [
+        _PageRow(
+            id_referred=uuid.UUID(item[ReferralSummaryConf.ITEM_ID]),
+            seq=item[ReferralSummaryConf.ITEM_SEQ],
+            name=item[ReferralSummaryConf.ITEM_NAME] if with_names else None,
+        )
+        for item in items
+    ]
+
+
+async def _names_on_other_shards(
+    rows: list, crud: "Crud", shards: "ShardRouter | None"
+) -> dict[uuid.UUID, str]:
+    """Return names of referred users that live on other shards.
+
+    A referral edge is on the shard of the referrer, rows without a name
+    are users of other shards.
+    """
+    missing = [row.id_referred for row in rows if row.name is None]
+    if shards is None or not missing:
+        return {}
+    return await crud.shards.get_names(router=shards, user_ids=missing)
+
+
+class _TreeRow(NamedTuple):
+    """Edge of a referral tree read across shards.
+
+    `seq` is the sort key of the page: level, then `seq` and shard of
+    the edge, as sequences of shards are apart.
+    """
+
+    id_referrer: uuid.UUID
+    id_referred: uuid.UUID
+    level: int
+    seq: int
+    name: str | None
+
+
+def _tree_key(level: int, seq: int, shard: int) -> int:
+    """Return the sort key of a tree edge read from a shard."""
+    key = (level << ReferralTreeConf.SEQ_BITS) | seq
+    return (key << ReferralTreeConf.SHARD_BITS) | shard
+
+
+async def _tree_across_shards(
+    root_id: uuid.UUID,
+    depth: int,
+    limit: int,
+    after: int | None,
+    crud: "Crud",
+    shards: "ShardRouter",
+) -> tuple[list[int], list[_TreeRow]]:
+    """Return counts of levels and `limit` + 1 rows after `after`.
+
+    Rows are ordered by level, so referrers still come before their
+    referrals. Names are left out, `_names_on_other_shards` finds them.
+    """
+    edges = await crud.shards.get_tree(
+        router=shards, user_id=root_id, depth=depth
+    )
+    counts = Counter(edge[2] for edge in edges)
+    levels = [
+        counts.get(level, 0) for level in range(1, max(counts, default=0) + 1)
+    ]
+    rows = [
+        _TreeRow(
+            id_referrer=id_referrer,
+            id_referred=id_referred,
+            level=level,
+            seq=_tree_key(level=level, seq=seq, shard=shard),
+            name=None,
+        )
+        for id_referrer, id_referred, level, seq, shard in edges
+    ]
+    rows.sort(key=lambda row: row.seq)
+    if after is not None:
+        rows = [row for row in rows if row.seq > after]
+    with_next = limit + 1
+    return levels, rows[:with_next]
+
+
+def _synced(
+    seq: int | None, synced_seq: int | None, since: int | None
+) -> int | None:
+    """Return `last_seq` capped at the newest referral older than the lag.
+
+    Without such a referral the client keeps its `since`.
+    """
+    if synced_seq is None:
+        return since
+    return seq if seq is None else min(seq, synced_seq)
 
 
 @cache_http_get(
     expire=JWT.EXP_BY_EMAIL_OR_ID,
     prefix_key=JWT.PREFIX_BY_EMAIL_OR_ID,
     request_query_params=True,
+    key_query_param=Keys.USER_ID,
 )
 async def get_referrals_by_user_id(
     user_id: str,
     crud: Annotated["Crud", Depends(get_crud)],
-    session: Annotated["AsyncSession", Depends(get_session)],
+    session: Annotated["AsyncSession", Depends(get_read_session)],
+    shards: Annotated["ShardRouter | None", Depends(get_shard_router)],
     request: Request,
     response: Response,
+    limit: Annotated[
+        int,
+        Query(
+            ge=1,
+            le=Pagination.MAX_LIMIT,
+            description="Max referrals on the page.",
+        ),
+    ] = Pagination.DEFAULT_LIMIT,
+    after: Annotated[
+        str | None,
+        Query(description="`next_cursor` of the previous page."),
+    ] = None,
+    since: Annotated[
+        int | None,
+        Query(ge=0, description="`last_seq` of the last sync."),
+    ] = None,
+    fields: Annotated[
+        str | None,
+        Query(description="Comma separated fields of referrals: id,name."),
+    ] = None,
     if_none_match: str | None = Header(default=None),
+    if_modified_since: str | None = Header(default=None),
 ) -> "UserReferrals":
-    """Return referral users by user ID.
+    """Return one page of referral users by user ID.
+
+    The referrer's summary is read first: an unchanged list costs one
+    primary key lookup for `If-Modified-Since` or an up to date `since`,
+    and the first page up to `ReferralSummaryConf.PAGE_SIZE` is taken
+    from it. Without a summary the newest referral is probed.
+
+    `seq` is taken at insert and `created_at` at the start of the
+    transaction, so a referral may commit after one with a greater
+    `seq` or a later time. The sync cursors therefore stop at the newest
+    referral older than `Pagination.SYNC_LAG_SECONDS`: `last_seq` is
+    capped at its `seq`, `Last-Modified` is its `created_at` and
+    `If-Modified-Since` is checked against it. Younger referrals may be
+    on the page and come again in the next sync, clients merge by ID.
 
     Args:
         session: AsyncSession
         crud: Crud
         user_id: str
+        shards: Optional[ShardRouter]
         request: Request
         response: Response
+        limit: int
+        after: Optional[str]
+        since: Optional[int]
+        fields: Optional[str]
         if_none_match: Optional[str]
+        if_modified_since: Optional[str]
     Return:
-        UserReferrals (access_token: str, token_type: str)
+        UserReferrals (id, name, referrals, next_cursor, last_seq)
     """
-    valid_id_or_error_422(id_data=user_id)
-    user_data = await crud.refer.get_referrals_by_user_id(
-        user_id=user_id, session=session
+    referrer_id = valid_id_or_error_422(id_data=user_id)
+    selected_fields = valid_fields_or_error_422(fields=fields)
+    bounds = [since]
+    if after is not None:
+        bounds.append(decode_cursor_or_error_422(cursor=after))
+    after_seq = max((b for b in bounds if b is not None), default=None)
+
+    summary = await crud.summary.get_summary(
+        user_id=referrer_id, session=session
     )
+    if summary is not None:
+        last_seq, last_at = summary.last_seq, summary.last_at
+    else:
+        last_referral = await crud.refer.get_last_referral(
+            user_id=referrer_id, session=session
+        )
+        if last_referral is None:
+            print(request, response, if_none_match)
+            raise_http_404(
+                error_type=MessageError.TYPE_ERROR_404,
+                error_message=MessageError.MESSAGE_NO_REFERRALS_FOUND,
+            )
+        last_seq, last_at = last_referral.seq, last_referral.created_at
+
+    horizon = datetime.now(timezone.utc) - timedelta(
+        seconds=Pagination.SYNC_LAG_SECONDS
+    )
+    if last_at < horizon:
+        synced_seq: int | None = last_seq
+        synced_at: datetime | None = last_at
+    else:
+        synced = await crud.refer.get_last_referral(
+            user_id=referrer_id, before=horizon, session=session
+        )
+        synced_seq = synced.seq if synced is not None else None
+        synced_at = synced.created_at if synced is not None else None
+
+    if synced_at is not None:
+        last_modified = format_http_date(synced_at)
+        response.headers[Headers.LAST_MODIFIED] = last_modified
+        if is_not_modified_since(if_modified_since, synced_at):
+            return Response(
+                status_code=status.HTTP_304_NOT_MODIFIED,
+                headers={Headers.LAST_MODIFIED: last_modified},
+            )
+
+    if after_seq is not None and after_seq >= last_seq:
+        return UserReferrals(
+            id=user_id,
+            referrals=[],
+            last_seq=_synced(
+                seq=after_seq, synced_seq=synced_seq, since=since
+            ),
+        )
+
+    with_names = Pagination.FIELD_NAME in selected_fields
+    if (
+        summary is not None
+        and after_seq is None
+        and limit <= ReferralSummaryConf.PAGE_SIZE
+    ):
+        page = _summary_page(
+            items=summary.first_page[:limit], with_names=with_names
+        )
+        has_next = summary.count > limit
+        referrer_name = summary.name
+    else:
+        user_data = await crud.refer.get_referrals_by_user_id(
+            user_id=referrer_id,
+            limit=limit + 1,
+            after=after_seq,
+            with_names=with_names,
+            session=session,
+        )
+        page = user_data[:limit]
+        has_next = len(user_data) > limit
+        referrer_name = (
+            page[Keys.REFERRER_INDEX].referrer_name
+            if page and with_names
+            else None
+        )
+    names = await _names_on_other_shards(
+        rows=page if with_names else [], crud=crud, shards=shards
+    )
+    referrals_by_user_id = [
+        User(
+            id=str(user.id_referred),
+            name=(
+                names.get(user.id_referred, user.name) if with_names else None
+            ),
+        )
+        for user in page
+    ]
+
+    return UserReferrals(
+        id=user_id,
+        name=referrer_name if with_names else None,
+        referrals=referrals_by_user_id,
+        next_cursor=encode_cursor(key=page[-1].seq) if has_next else None,
+        last_seq=_synced(
+            seq=page[-1].seq if page else after_seq,
+            synced_seq=synced_seq,
+            since=since,
+        ),
+    )
+
+
+class _FirstPage(NamedTuple):
+    """First page of a referrer read for a batch lookup."""
+
+    name: str | None
+    rows: list
+    has_next: bool
+
+
+async def _first_pages(
+    session_factory: "async_sessionmaker[AsyncSession]",
+    crud: "Crud",
+    user_ids: list[uuid.UUID],
+    limit: int,
+) -> dict[uuid.UUID, _FirstPage]:
+    """Return first pages of referrers of one database.
+
+    Summaries of all referrers are one `ANY(:user_ids)` query; only
+    referrers without a summary, before the repair job reached them,
+    are read from the edges.
+    """
+    pages: dict[uuid.UUID, _FirstPage] = {}
+    async with session_factory() as session:
+        for summary in await crud.summary.get_summaries(
+            session=session, user_ids=user_ids
+        ):
+            pages[summary.id_referrer] = _FirstPage(
+                name=summary.name,
+                rows=_summary_page(
+                    items=summary.first_page[:limit], with_names=True
+                ),
+                has_next=summary.count > limit,
+            )
+        rest = [user_id for user_id in user_ids if user_id not in pages]
+        if not rest:
+            return pages
+        rows_by_referrer = defaultdict(list)
+        for row in await crud.refer.get_first_pages(
+            session=session, user_ids=rest, limit=limit + 1
+        ):
+            rows_by_referrer[row.id_referrer].append(row)
+    for referrer_id, rows in rows_by_referrer.items():
+        pages[referrer_id] = _FirstPage(
+            name=rows[Keys.REFERRER_INDEX].referrer_name,
+            rows=rows[:limit],
+            has_next=len(rows) > limit,
+        )
+    return pages
+
+
+async def referrals_by_user_ids(
+    batch: Annotated[ReferralBatch, Body()],
+    crud: Annotated["Crud", Depends(get_crud)],
+    read_session_factory: Annotated[
+        "async_sessionmaker[AsyncSession]", Depends(get_read_session_factory)
+    ],
+    session_factory: Annotated[
+        "async_sessionmaker[AsyncSession]", Depends(get_session_factory)
+    ],
+    shards: Annotated["ShardRouter | None", Depends(get_shard_router)],
+    limit: Annotated[
+        int,
+        Query(
+            ge=1,
+            le=ReferralSummaryConf.PAGE_SIZE,
+            description="Max referrals on the page of every referrer.",
+        ),
+    ] = Pagination.DEFAULT_LIMIT,
+) -> "UserReferralsBatch":
+    """Return the first page of referrals of many referrers.
+
+    Cached pages come with one pipelined MGET, the misses are read with
+    one `ANY(:user_ids)` query per shard, shards in parallel, and cached
+    in one pipeline. Misses written recently are read from the primary
+    and not cached, like `GET /user/referral` after a registration.
+
+    Args:
+        batch: ReferralBatch
+        crud: Crud
+        read_session_factory: async_sessionmaker
+        session_factory: async_sessionmaker
+        shards: Optional[ShardRouter]
+        limit: int
+    Return:
+        UserReferralsBatch (found, not_found)
+    """
+    user_ids = list(
+        dict.fromkeys(
+            str(valid_id_or_error_422(id_data=user_id))
+            for user_id in batch.user_ids
+        )
+    )
+    cached, recent = await get_cached_pages(user_ids=user_ids, limit=limit)
+    found = {
+        user_id: UserReferrals.model_validate_json(page)
+        for user_id, page in cached.items()
+    }
+
+    misses = [uuid.UUID(uid) for uid in user_ids if uid not in found]
+    if shards is not None:
+        by_shard = defaultdict(list)
+        for user_id in misses:
+            by_shard[shards.shard_of(user_id)].append(user_id)
+        groups = [
+            (shards.session_factory(shard), ids)
+            for shard, ids in by_shard.items()
+        ]
+    else:
+        groups = [
+            (session_factory, [u for u in misses if str(u) in recent]),
+            (
+                read_session_factory,
+                [u for u in misses if str(u) not in recent],
+            ),
+        ]
+
+    pages: dict[uuid.UUID, _FirstPage] = {}
+    for group_pages in await asyncio.gather(
+        *(
+            _first_pages(
+                session_factory=factory, crud=crud, user_ids=ids, limit=limit
+            )
+            for factory, ids in groups
+            if ids
+        )
+    ):
+        pages.update(group_pages)
+
+    names = await _names_on_other_shards(
+        rows=[row for page in pages.values() for row in page.rows],
+        crud=crud,
+        shards=shards,
+    )
+    for referrer_id, page in pages.items():
+        found[str(referrer_id)] = UserReferrals(
+            id=str(referrer_id),
+            name=page.name,
+            referrals=[
+                User(
+                    id=str(row.id_referred),
+                    name=names.get(row.id_referred, row.name),
+                )
+                for row in page.rows
+            ],
+            next_cursor=(
+                encode_cursor(key=page.rows[-1].seq) if page.has_next else None
+            ),
+            last_seq=page.rows[-1].seq,
+        )
+    await set_cached_pages(
+        pages={
+            str(referrer_id): found[str(referrer_id)].model_dump_json()
+            for referrer_id in pages
+            if str(referrer_id) not in recent
+        },
+        limit=limit,
+    )
+
+    return UserReferralsBatch(
+        found={
+            user_id: found[user_id] for user_id in user_ids if user_id in found
+        },
+        not_found=[user_id for user_id in user_ids if user_id not in found],
+    )
+
+
+@cache_http_get(
+    expire=ReferralTreeConf.CACHE_EXPIRE,
+    prefix_key=ReferralTreeConf.CACHE_PREFIX,
+    request_query_params=True,
+    key_query_param=Keys.USER_ID,
+)
+async def get_referral_tree_by_user_id(
+    user_id: str,
+    crud: Annotated["Crud", Depends(get_crud)],
+    session: Annotated["AsyncSession", Depends(get_read_session)],
+    shards: Annotated["ShardRouter | None", Depends(get_shard_router)],
+    request: Request,
+    response: Response,
+    depth: Annotated[
+        int,
+        Query(
+            ge=1,
+            le=ReferralTreeConf.MAX_DEPTH,
+            description="Levels of referrals under the user.",
+        ),
+    ] = ReferralTreeConf.DEFAULT_DEPTH,
+    limit: Annotated[
+        int,
+        Query(
+            ge=1,
+            le=Pagination.MAX_LIMIT,
+            description="Max users on the page.",
+        ),
+    ] = Pagination.DEFAULT_LIMIT,
+    after: Annotated[
+        str | None,
+        Query(description="`next_cursor` of the previous page."),
+    ] = None,
+    if_none_match: str | None = Header(default=None),
+) -> "UserReferralTree":
+    """Return referrals up to `depth` levels under a user.
 
-    user_data = cast(list[ReferORM], user_data)
+    Pages are cached per query, all pages of a root are dropped when an
+    edge is added under it, see `invalidate_referral_trees`. With shards
+    users are placed by their own ID, so the edges of a level are on the
+    shards of their referrers: the tree is read level by level across
+    shards and paged in memory.
 
-    if not user_data:
+    Args:
+        user_id: str
+        crud: Crud
+        session: AsyncSession
+        shards: Optional[ShardRouter]
+        request: Request
+        response: Response
+        depth: int
+        limit: int
+        after: Optional[str]
+        if_none_match: Optional[str]
+    Return:
+        UserReferralTree (id, depth, levels, nodes, next_cursor)
+    """
+    root_id = valid_id_or_error_422(id_data=user_id)
+    after_seq = (
+        decode_cursor_or_error_422(cursor=after) if after is not None else None
+    )
+
+    if shards is not None:
+        levels, rows = await _tree_across_shards(
+            root_id=root_id,
+            depth=depth,
+            limit=limit,
+            after=after_seq,
+            crud=crud,
+            shards=shards,
+        )
+    else:
+        levels = await crud.refer.get_tree_levels(
+            user_id=root_id, depth=depth, session=session
+        )
+        rows = await crud.refer.get_tree_page(
+            user_id=root_id,
+            depth=depth,
+            limit=limit + 1,
+            after=after_seq,
+            session=session,
+        )
+    if not levels:
         print(request, response, if_none_match)
         raise_http_404(
             error_type=MessageError.TYPE_ERROR_404,
             error_message=MessageError.MESSAGE_NO_REFERRALS_FOUND,
         )
 
-    referrals_by_user_id = [
-        User(id=str(user.id_referred), name=user.referred_user.name)
-        for user in user_data
-    ]
+    page = rows[:limit]
+    names = await _names_on_other_shards(rows=page, crud=crud, shards=shards)
 
-    return UserReferrals(
+    return UserReferralTree(
         id=user_id,
-        name=(
-            user_data[Keys.REFERRER_INDEX].referrer.name if user_data else None
+        depth=depth,
+        levels=levels,
+        nodes=[
+            TreeNode(
+                id=str(row.id_referred),
+                name=names.get(row.id_referred, row.name),
+                referrer=str(row.id_referrer),
+                level=row.level,
+            )
+            for row in page
+        ],
+        next_cursor=(
+            encode_cursor(key=page[-1].seq) if len(rows) > limit else None
         ),
-        referrals=referrals_by_user_id,
     )
 
 
+@cache_http_get(
+    expire=RollupConf.CACHE_EXPIRE,
+    prefix_key=RollupConf.CACHE_PREFIX,
+    request_query_params=True,
+    key_query_param=Keys.USER_ID,
+)
+async def get_referral_daily_by_user_id(
+    user_id: str,
+    crud: Annotated["Crud", Depends(get_crud)],
+    session: Annotated["AsyncSession", Depends(get_read_session)],
+    request: Request,
+    response: Response,
+    since: Annotated[
+        date | None,
+        Query(description="First UTC day, `until` - 29 days by default."),
+    ] = None,
+    until: Annotated[
+        date | None,
+        Query(description="Last UTC day, today by default."),
+    ] = None,
+    if_none_match: str | None = Header(default=None),
+) -> "UserReferralDaily":
+    """Return referrals of a user per day from the daily rollup.
+
+    The range is an index scan of at most `MAX_DAYS` rows, edges are
+    not read. Days after the aggregator's watermark are not counted
+    yet, the answer is cached for `CACHE_EXPIRE` seconds.
+
+    Args:
+        user_id: str
+        crud: Crud
+        session: AsyncSession
+        request: Request
+        response: Response
+        since: Optional[date]
+        until: Optional[date]
+        if_none_match: Optional[str]
+    Return:
+        UserReferralDaily (id, since, until, days)
+    """
+    referrer_id = valid_id_or_error_422(id_data=user_id)
+    if until is None:
+        until = datetime.now(timezone.utc).date()
+    if since is None:
+        since = until - timedelta(days=RollupConf.DEFAULT_DAYS - 1)
+    valid_date_range_or_error_422(
+        since=since, until=until, max_days=RollupConf.MAX_DAYS
+    )
+
+    rows = await crud.rollup.get_daily(
+        session=session, user_id=referrer_id, since=since, until=until
+    )
+    return UserReferralDaily(
+        id=user_id,
+        since=since,
+        until=until,
+        days=[ReferralDay(day=row.day, count=row.count) for row in rows],
+    )
+
+
+async def _email_owner_or_404(
+    email: str,
+    crud: "Crud",
+    session: "AsyncSession",
+    shards: "ShardRouter | None",
+) -> str:
+    """Return the user ID of an email from the database and cache it.
+
+    Raises:
+        HTTPException: 404 if the email is not registered, nothing is
+        cached then.
+    """
+    if shards is not None:
+        user_id = await crud.shards.get_user_id_by(router=shards, email=email)
+    else:
+        user_id = await crud.auth.get_user_id_by(email=email, session=session)
+    if user_id is None:
+        raise_http_404(
+            error_type=MessageError.TYPE_ERROR_404,
+            error_message=MessageError.INVALID_REF_TOKEN_ERR_MESSAGE,
+        )
+    await set_email_owner(email=email, user_id=user_id)
+    return user_id
+
+
 @cache_http_get(
     expire=JWT.EXP_BY_EMAIL_OR_ID,
     prefix_key=JWT.PREFIX_BY_EMAIL_OR_ID,
@@ -96,17 +750,22 @@ async def get_referrals_by_user_id(
 async def referral_token_by_email(
     email: pydantic.EmailStr,
     crud: Annotated["Crud", Depends(get_crud)],
-    session: Annotated["AsyncSession", Depends(get_session)],
+    session: Annotated["AsyncSession", Depends(get_read_session)],
+    shards: Annotated["ShardRouter | None", Depends(get_shard_router)],
     request: Request,
     response: Response,
     if_none_match: str | None = Header(default=None),
 ) -> "TokenReferral":
     """GET token by email.
 
+    The owner of the email is taken from the worker or Redis, see
+    `get_email_owner`; the database is read only on a miss.
+
     Args:
         email: User's email
         crud: Crud
         session: AsyncSession
+        shards: Optional[ShardRouter]
         request: Request
         response: Response
         if_none_match: Optional[str]
@@ -118,13 +777,10 @@ async def referral_token_by_email(
     Notes:
         if token is not "refresh_token", it'll raise InvalidTokenError.
     """
-    user_id_by_email = await crud.auth.get_user_id_by(
-        email=email, session=session
-    )
+    user_id_by_email = await get_email_owner(email=email)
     if user_id_by_email is None:
-        raise_http_404(
-            error_type=MessageError.TYPE_ERROR_404,
-            error_message=MessageError.INVALID_REF_TOKEN_ERR_MESSAGE,
+        user_id_by_email = await _email_owner_or_404(
+            email=email, crud=crud, session=session, shards=shards
         )
     try:
         token_data_from_chash = await is_alive_referral_token_in_chash(
@@ -149,6 +805,7 @@ async def referral_token_by_email(
 @cache_http_singleton_value_by_user(
     expire=settings.jwt.set_referral_token_expire_days,
     prefix_key=JWT.TOKEN_TYPE_REFERRAL,
+    on_delete=drop_short_code,
 )
 async def referral_token(
     token: Annotated[dict, Depends(token_is_alive)],
@@ -157,6 +814,11 @@ async def referral_token(
 ) -> "TokenReferral":
     """Referral token create.
 
+    With `REFERRAL_SHORT_CODES` the token is a short random code mapped
+    to the user in Redis, else a JWT. Deleting the token drops the
+    mapping of a short code. The code or the owner of the JWT is added to
+    the Bloom filters of all workers before the token is stored.
+
     Args:
         - token (str): Access token for authentication.
 
@@ -170,9 +832,17 @@ async def referral_token(
     try:
         type_token = token.pop(JWT.TOKEN_TYPE_FIELD)
         if type_token == JWT.TOKEN_TYPE_ACCESS:
+            if settings.jwt.referral_short_codes:
+                return await issue_short_code(
+                    owner_id=token.pop(JWT.PAYLOAD_SUB_KEY)
+                )
             payload = {
                 JWT.PAYLOAD_SUB_KEY: token.pop(JWT.PAYLOAD_SUB_KEY),
             }
+            await publish_to_filters(
+                name=BloomConf.FILTER_REFERRALS,
+                item=payload[JWT.PAYLOAD_SUB_KEY],
+            )
             return response_referral_tokens(payload=payload)
 
         raise InvalidTokenError
@@ -180,3 +850,124 @@ async def referral_token(
     except InvalidTokenError:
         print(request, response)
         raise raise_hht_401()
+
+
+async def _referrals_ndjson(
+    user_id: uuid.UUID,
+    crud: "Crud",
+    session_factory: "async_sessionmaker[AsyncSession]",
+    shards: "ShardRouter | None" = None,
+) -> AsyncIterator[str]:
+    """Yield referrals as NDJSON chunks of `Export.CHUNK_SIZE` lines.
+
+    The generator owns its session: it is iterated by the response after
+    request dependencies are closed. The next chunk is fetched only when
+    the client has taken the previous one.
+    """
+    async with session_factory() as session:
+        result = await crud.refer.stream_referrals_by_user_id(
+            user_id=user_id,
+            chunk_size=Export.CHUNK_SIZE,
+            session=session,
+        )
+        async for rows in result.partitions():
+            names = await _names_on_other_shards(
+                rows=rows, crud=crud, shards=shards
+            )
+            yield "".join(
+                User(
+                    id=str(row.id_referred),
+                    name=names.get(row.id_referred, row.name),
+                ).model_dump_json()
+                + Export.LINE_SEPARATOR
+                for row in rows
+            )
+
+
+async def export_referrals_by_user_id(
+    user_id: str,
+    crud: Annotated["Crud", Depends(get_crud)],
+    session_factory: Annotated[
+        "async_sessionmaker[AsyncSession]", Depends(get_read_session_factory)
+    ],
+    shards: Annotated["ShardRouter | None", Depends(get_shard_router)],
+) -> AsyncIterator[str]:
+    """Return all referral users by user ID as NDJSON stream.
+
+    Args:
+        user_id: str
+        crud: Crud
+        session_factory: async_sessionmaker
+        shards: Optional[ShardRouter]
+    Return:
+        AsyncIterator[str]: NDJSON chunks, one referral per line.
+    """
+    return _referrals_ndjson(
+        user_id=valid_id_or_error_422(id_data=user_id),
+        crud=crud,
+        session_factory=session_factory,
+        shards=shards,
+    )
+
+
+async def referral_count_by_user_id(user_id: str) -> "ReferralCount":
+    """Return referrals of a user and its rank from Redis counters.
+
+    Args:
+        user_id: str
+    Return:
+        ReferralCount (id, count, rank)
+    """
+    referrer_id = str(valid_id_or_error_422(id_data=user_id))
+    count, rank = await get_referral_count(user_id=referrer_id)
+    return ReferralCount(id=referrer_id, count=count, rank=rank)
+
+
+async def top_referrers(
+    limit: Annotated[
+        int,
+        Query(
+            ge=1,
+            le=Leaderboard.TOP_MAX,
+            description="Referrers on the leaderboard.",
+        ),
+    ] = Leaderboard.TOP_DEFAULT,
+) -> "TopReferrers":
+    """Return referrers with most referrals from the Redis sorted set.
+
+    Args:
+        limit: int
+    Return:
+        TopReferrers (top)
+    """
+    top = await get_top_referrers(limit=limit)
+    return TopReferrers(
+        top=[
+            ReferralCount(id=user_id, count=count, rank=place)
+            for place, (user_id, count) in enumerate(top, start=1)
+        ]
+    )
+
+
+async def referral_code_statuses(
+    batch: Annotated[ReferralCodes, Body()],
+) -> "ReferralCodeStatuses":
+    """Return statuses of many referral codes.
+
+    Signatures of JWT codes are checked in one loop in a thread, a code
+    seen before is not decoded again. Short codes and owners of valid
+    JWT codes are resolved in Redis with one MGET each.
+
+    Args:
+        batch: ReferralCodes
+    Return:
+        ReferralCodeStatuses (statuses)
+    """
+    verified = await asyncio.to_thread(verify_referral_codes, batch.codes)
+    checked = await check_referral_codes(codes=batch.codes, verified=verified)
+    return ReferralCodeStatuses(
+        statuses=[
+            ReferralCodeStatus(status=code.status, referrer=code.owner)
+            for code in checked
+        ]
+    )
@@ -1,30 +1,60 @@
 """Dependent for new users."""
 
-import uuid
+import asyncio
 from typing import TYPE_CHECKING, Annotated, Optional
 
 import pydantic
 from fastapi import Depends, Form
 
+from src.core.controllers.depends.utils.bloom_filters import (
+    may_contain,
+    publish_registered_email,
+)
 from src.core.controllers.depends.utils.check_valid_ref import (
-    user_return_from_token_in_chash_or_response_422,
+    live_referral_or_400,
+    referrer_id_or_400,
+)
+from src.core.controllers.depends.utils.connect_db import (
+    get_crud,
+    get_session,
+    get_shard_router,
 )
-from src.core.controllers.depends.utils.connect_db import get_crud, get_session
+from src.core.controllers.depends.utils.email_owners import set_email_owner
 from src.core.controllers.depends.utils.hash_password import hash_pwd
+from src.core.controllers.depends.utils.read_your_writes import (
+    mark_recent_write,
+)
+from src.core.controllers.depends.utils.referral_counters import (
+    incr_referral_count,
+)
+from src.core.controllers.depends.utils.referral_tree import (
+    invalidate_referral_trees,
+)
+from src.core.controllers.depends.utils.registration_batcher import (
+    RegistrationBatcher,
+    get_registration_batcher,
+)
 from src.core.controllers.depends.utils.return_error import (
     raise_400_bad_req,
     valid_password_or_error_422,
 )
+from src.core.orm.uuid7 import uuid7
+from src.core.settings.constants import BloomConf
 
 if TYPE_CHECKING:
     from sqlalchemy.ext.asyncio import AsyncSession
 
     from src.core.orm.crud import Crud
+    from src.core.orm.shards import ShardRouter
 
 
 async def new_user(
     crud: Annotated["Crud", Depends(get_crud)],
     session: Annotated["AsyncSession", Depends(get_session)],
+    batcher: Annotated[
+        RegistrationBatcher | None, Depends(get_registration_batcher)
+    ],
+    shards: Annotated["ShardRouter | None", Depends(get_shard_router)],
     name: Annotated[
         str,
         Form(
@@ -70,6 +100,17 @@ async def new_user(
 ) -> Optional[bool]:
     """Create a new user from form data.
 
+    Inputs are checked before the transaction: email syntax by the form,
+    then passwords match, then the referral token is verified while the
+    password is hashed in a thread. The database is touched only with
+    valid data. With Bloom filters an email that may be taken is looked
+    up and a referral code that is surely not live is rejected before
+    hashing; a surely new email skips the lookup. After the commit reads
+    about the new user and the referrer go to the primary for a while,
+    see `mark_recent_write`, the owner of the email is cached, the
+    referrer's counter in Redis is incremented and cached trees above
+    the referrer are dropped.
+
     Args:
         name: User's name
         email: User's email address
@@ -78,51 +119,72 @@ async def new_user(
         referral: referral code
         crud: CRUD operations handler
         session: AsyncSession for database operations
+        batcher: Group commit of registrations, if it is enabled
+        shards: Shards of users, if there are more than the primary
     Returns:
         JSONResponse: Confirmation of user creation or error message
     Raises:
         HTTPException
     """
     valid_password_or_error_422(pwd=password, pwd2=password_control)
+    live_referral_or_400(token=referral)
+    if may_contain(name=BloomConf.FILTER_EMAILS, item=email.lower()):
+        if shards is not None:
+            taken = await crud.shards.get_user_id_by(
+                router=shards, email=email
+            )
+        else:
+            async with session.begin():
+                taken = await crud.auth.get_user_id_by(
+                    email=email, session=session
+                )
+        if taken is not None:
+            raise_400_bad_req()
 
-    password_hash: bytes = hash_pwd(password)
+    referrer_id, password_hash = await asyncio.gather(
+        referrer_id_or_400(token=referral),
+        asyncio.to_thread(hash_pwd, password),
+    )
     new_user_ = dict(
+        id=uuid7(),
         name=name,
         hashed_password=password_hash.decode(),
         email=email,
+        id_referrer=referrer_id,
     )
 
     try:
-        async with session.begin():
-            new_uuid = uuid.uuid4().hex
-            await crud.users.new_user(
-                session=session,
-                id_user=new_uuid,
-                user_name=name,
-            )
-
-            await crud.auth.post_new_user(
-                session=session,
-                auth_user=new_user_,
-                user_id=new_uuid,
+        if shards is not None:
+            created = await crud.shards.register_user(
+                router=shards, new_user=new_user_
             )
-
-            if referral:
-                referrer_id: str = (
-                    await user_return_from_token_in_chash_or_response_422(
-                        token=referral
-                    )
-                )
-
-                await crud.refer.create_new_referral(
+        elif batcher is not None:
+            created = await batcher.submit(new_user=new_user_)
+        else:
+            async with session.begin():
+                created = await crud.registration.create_user(
+                    id_user=new_user_["id"],
+                    user_name=name,
+                    auth_user=new_user_,
                     id_referrer=referrer_id,
-                    id_referred=new_uuid,
                     session=session,
                 )
 
-        return True
-
     except Exception as e:
         print(f"Registration failed: {e}")
         raise_400_bad_req()
         return None
+
+    if not created:
+        raise_400_bad_req()
+    await publish_registered_email(email=email)
+    await set_email_owner(email=email, user_id=str(new_user_["id"]))
+    if referrer_id:
+        await incr_referral_count(user_id=str(referrer_id))
+        await invalidate_referral_trees(
+            referrer_id=referrer_id, crud=crud, session=session, shards=shards
+        )
+    await mark_recent_write(
+        user_id=str(referrer_id) if referrer_id else None, email=email
+    )
+    return True
@@ -0,0 +1,511 @@
+"""Bloom filters of live referral codes and emails, shared by workers."""
+
+import asyncio
+import hashlib
+import logging
+import math
+import struct
+import time
+from typing import AsyncIterator, Iterator
+
+from redis import asyncio as aioredis
+from redis.asyncio.client import Redis
+from sqlalchemy.exc import SQLAlchemyError
+
+from src.core.controllers.depends.utils.redis_chash import (
+    close_redis,
+    gen_key,
+    setup_redis,
+)
+from src.core.orm.crud import create_crud_helper
+from src.core.orm.engine import get_engine
+from src.core.settings.constants import JWT, BloomConf, ReferralCodeConf
+from src.core.settings.env import settings
+
+log = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    """Bit array with `hashes` bits per item.
+
+    An item that was added is always found; an item that was not is
+    found with about the configured false-positive rate while at most
+    `capacity` items are added.
+    """
+
+    def __init__(self, size: int, hashes: int, capacity: int) -> None:
+        """Init an empty filter, `sized` picks the numbers.
+
+        Args:
+            size (int): Number of bits.
+            hashes (int): Bits per item.
+            capacity (int): Items the filter was sized for.
+        """
+        self.size = size
+        self.hashes = hashes
+        self.capacity = capacity
+        self.count = 0
+        self._bits = bytearray(-(-size // 8))
+
+    @classmethod
+    def sized(
+        cls, capacity: int, false_positive_rate: float, max_bytes: int
+    ) -> "BloomFilter":
+        """Return a filter for `capacity` items of at most `max_bytes`.
+
+        Args:
+            capacity (int): Expected number of items.
+            false_positive_rate (float): Wanted rate at `capacity` items.
+            max_bytes (int): Memory limit, the rate grows if it is hit.
+        """
+        bits = -capacity * math.log(false_positive_rate) / math.log(2) ** 2
+        size = max(8, min(math.ceil(bits), max_bytes * 8))
+        hashes = max(1, round(size / capacity * math.log(2)))
+        return cls(size=size, hashes=hashes, capacity=capacity)
+
+    def dumps(self) -> bytes:
+        """Return the filter as bytes for `loads`."""
+        header = struct.pack(
+            BloomConf.HEADER,
+            self.size,
+            self.hashes,
+            self.capacity,
+            self.count,
+        )
+        return header + bytes(self._bits)
+
+    @classmethod
+    def loads(cls, data: bytes) -> "BloomFilter":
+        """Return a filter from bytes of `dumps`."""
+        size, hashes, capacity, count = struct.unpack_from(
+            BloomConf.HEADER, data
+        )
+        start = struct.calcsize(BloomConf.HEADER)
+        filter_ = cls(size=size, hashes=hashes, capacity=capacity)
+        filter_.count = count
+        filter_._bits[:] = data[start:]
+        return filter_
+
+    def _positions(self, item: str) -> Iterator[int]:
+        """Yield bits of an item, double hashing of one blake2b digest."""
+        half = BloomConf.HASH_BYTES
+        digest = hashlib.blake2b(item.encode(), digest_size=half * 2).digest()
+        first = int.from_bytes(digest[:half], "little")
+        step = int.from_bytes(digest[half:], "little") | 1
+        for index in range(self.hashes):
+            yield (first + index * step) % self.size
+
+    def add(self, item: str) -> None:
+        """Add an item."""
+        bits = self._bits
+        for position in self._positions(item):
+            bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        """Return False if the item was surely not added."""
+        bits = self._bits
+        return all(
+            bits[position >> 3] >> (position & 7) & 1
+            for position in self._positions(item)
+        )
+
+
+async def _email_source() -> tuple[int, AsyncIterator[list[str]]]:
+    """Return the number of emails and batches of them.
+
+    With shards the emails are in the directory on the primary, else in
+    `auth` of the primary.
+    """
+    engine = await get_engine(
+        url=settings.db.get_url_database, echo=settings.db.ECHO
+    )
+    crud = create_crud_helper()
+    if engine.shards:
+        return (
+            await crud.shards.count_emails(router=engine.shards),
+            crud.shards.stream_emails(
+                router=engine.shards, batch_size=BloomConf.BUILD_BATCH
+            ),
+        )
+
+    session_factory = engine.create_session(engine.async_engine)
+    async with session_factory() as session:
+        count = await crud.auth.count_emails(session=session)
+
+    async def batches() -> AsyncIterator[list[str]]:
+        async with session_factory() as session, session.begin():
+            async for emails in crud.auth.stream_emails(
+                session=session, batch_size=BloomConf.BUILD_BATCH
+            ):
+                yield emails
+
+    return count, batches()
+
+
+async def _referral_source() -> tuple[int, AsyncIterator[list[str]]]:
+    """Return an upper bound of live referral codes and batches of them.
+
+    Items are owners of cached referral tokens and short codes, found by
+    SCAN of their keys. The number of all keys is the bound.
+    """
+    redis_client: Redis = await setup_redis()
+    try:
+        count = await redis_client.dbsize()
+    except aioredis.RedisError as e:
+        raise e
+
+    async def batches() -> AsyncIterator[list[str]]:
+        for prefix_key in (
+            JWT.TOKEN_TYPE_REFERRAL,
+            ReferralCodeConf.SHORT_PREFIX,
+        ):
+            start = len(gen_key(prefix_key=prefix_key, id_user=None)) + 1
+            batch = []
+            async for key in redis_client.scan_iter(
+                match=gen_key(prefix_key=prefix_key, id_user="*"),
+                count=BloomConf.SCAN_COUNT,
+            ):
+                item = key[start:]
+                if BloomConf.SEPARATOR not in item:
+                    batch.append(item)
+                if len(batch) >= BloomConf.BUILD_BATCH:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+
+    return count, batches()
+
+
+_SOURCES = {
+    BloomConf.FILTER_EMAILS: _email_source,
+    BloomConf.FILTER_REFERRALS: _referral_source,
+}
+
+
+async def build_filters(
+    false_positive_rate: float, max_bytes: int
+) -> dict[str, int]:
+    """Build every filter from its source and store them in Redis.
+
+    A marker is added to `BloomConf.STREAM` before the sources are read
+    and its ID is stored with the filters: workers add the items of the
+    stream after it, so items written during the build are not lost.
+    The filters replace the previous ones in one `HSET`.
+
+    Args:
+        false_positive_rate (float): Wanted rate of every filter.
+        max_bytes (int): Memory limit of every filter.
+
+    Returns:
+        dict[str, int]: Items of every filter.
+    """
+    redis_client: Redis = await setup_redis()
+    stream_id = await redis_client.xadd(
+        BloomConf.STREAM,
+        {BloomConf.MARKER: ""},
+        maxlen=BloomConf.STREAM_MAXLEN,
+        approximate=True,
+    )
+    snapshot: dict[str, str | bytes] = {
+        BloomConf.SNAPSHOT_STREAM_ID: stream_id
+    }
+    items = {}
+    for name, source in _SOURCES.items():
+        count, batches = await source()
+        filter_ = BloomFilter.sized(
+            capacity=max(BloomConf.MIN_CAPACITY, count * BloomConf.GROWTH),
+            false_positive_rate=false_positive_rate,
+            max_bytes=max_bytes,
+        )
+        async for batch in batches:
+            for item in batch:
+                filter_.add(item)
+        snapshot[name] = filter_.dumps()
+        items[name] = filter_.count
+        log.info(
+            "Bloom filter %s: %d items, %d bytes, %d hashes",
+            name,
+            filter_.count,
+            filter_.size >> 3,
+            filter_.hashes,
+        )
+    await redis_client.hset(BloomConf.SNAPSHOT_KEY, mapping=snapshot)
+    return items
+
+
+class WorkerFilters:
+    """Bloom filters of one worker, loaded from Redis and kept in sync.
+
+    `build_filters` stores the filters with the ID of a stream entry.
+    The worker loads them, adds the items of `BloomConf.STREAM` written
+    after that entry and then follows the stream. Every write of an
+    email or a referral code is added to the filters of the writing
+    worker and to the stream.
+
+    The stream is capped at `BloomConf.STREAM_MAXLEN` entries. Filters
+    are trusted only while the stream still holds the entry they follow
+    from, else items may have been trimmed unseen. Without a trusted
+    filter `may_contain` returns None and callers take the full check.
+
+    Items are never removed, deleted codes stay until the worker loads
+    newer filters, it looks for them every `reload_seconds`.
+    """
+
+    def __init__(self, reload_seconds: float, redis_url: str) -> None:
+        """Init filters, they are loaded by `start`.
+
+        Args:
+            reload_seconds (float): Pause between checks for new filters.
+            redis_url (str): Redis of the filters and the stream.
+        """
+        self._reload_seconds = reload_seconds
+        self._redis_url = redis_url
+        self._filters: dict[str, BloomFilter | None] = dict.fromkeys(_SOURCES)
+        self._snapshot_id: bytes | None = None
+        self._last_id: bytes | None = None
+        self._full: set[str] = set()
+        self._tasks: set[asyncio.Task] = set()
+
+    def start(self) -> None:
+        """Start following the stream in the background."""
+        task = asyncio.create_task(self._follow())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def close(self) -> None:
+        """Stop the background tasks."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def may_contain(self, name: str, item: str) -> bool | None:
+        """Return False if the item is surely absent.
+
+        Returns:
+            bool | None: True if the item may be present, None without a
+            trusted filter.
+        """
+        filter_ = self._filters[name]
+        if filter_ is None:
+            return None
+        return item in filter_
+
+    def add(self, name: str, item: str) -> None:
+        """Add an item to the filter of the worker."""
+        filter_ = self._filters[name]
+        if filter_ is None:
+            return
+        filter_.add(item)
+        if filter_.count > filter_.capacity and name not in self._full:
+            self._full.add(name)
+            log.warning(
+                "Bloom filter %s holds more items than it was sized for, "
+                "build the filters more often",
+                name,
+            )
+
+    async def publish(self, name: str, item: str) -> None:
+        """Add an item here and in the other workers.
+
+        Raises:
+            RedisError: If the item is not added to the stream, the
+            caller must not store the item then.
+        """
+        self.add(name=name, item=item)
+        redis_client: Redis = await setup_redis()
+        try:
+            await redis_client.xadd(
+                BloomConf.STREAM,
+                {name: item},
+                maxlen=BloomConf.STREAM_MAXLEN,
+                approximate=True,
+            )
+        except aioredis.RedisError as e:
+            raise e
+
+    def _untrust(self) -> None:
+        """Drop the filters, stream entries may have been missed."""
+        self._snapshot_id = None
+        self._last_id = None
+        self._filters = dict.fromkeys(self._filters)
+
+    @staticmethod
+    def _add_entries(
+        filters: dict[str, BloomFilter | None], entries: list
+    ) -> bytes | None:
+        """Add items of stream entries, return ID of the last entry."""
+        last_id = None
+        for entry_id, fields in entries:
+            for name, item in fields.items():
+                filter_ = filters.get(name.decode())
+                if filter_ is not None:
+                    filter_.add(item.decode())
+            last_id = entry_id
+        return last_id
+
+    async def _load(self, redis_client: Redis) -> None:
+        """Load new filters of `build_filters`, catch up with the stream.
+
+        The filters are swapped in once the stream is read to its end,
+        they are dropped if the stream lost entries after the snapshot.
+        """
+        snapshot = await redis_client.hgetall(BloomConf.SNAPSHOT_KEY)
+        stream_id = snapshot.pop(BloomConf.SNAPSHOT_STREAM_ID.encode(), None)
+        if stream_id is None:
+            log.warning(
+                "No Bloom filters in Redis, "
+                "run python -m src.commands.build_bloom_filters"
+            )
+            self._untrust()
+            return
+        if stream_id == self._snapshot_id:
+            return
+        filters: dict[str, BloomFilter | None] = {
+            name: BloomFilter.loads(snapshot[name.encode()])
+            for name in self._filters
+            if name.encode() in snapshot
+        }
+        if not await self._kept(redis_client, stream_id):
+            log.warning("Bloom filters are older than the stream")
+            self._untrust()
+            return
+        last_id = stream_id
+        while True:
+            entries = await redis_client.xrange(
+                BloomConf.STREAM,
+                min=b"(" + last_id,
+                count=BloomConf.READ_COUNT,
+            )
+            last_id = self._add_entries(filters, entries) or last_id
+            if len(entries) < BloomConf.READ_COUNT:
+                break
+            await asyncio.sleep(0)
+        self._filters = dict.fromkeys(self._filters)
+        self._filters.update(filters)
+        self._snapshot_id = stream_id
+        self._last_id = last_id
+        self._full.clear()
+        log.info("Bloom filters loaded: %s", ", ".join(filters))
+
+    @staticmethod
+    async def _kept(redis_client: Redis, entry_id: bytes) -> bool:
+        """Return True if the stream still holds an entry."""
+        return bool(
+            await redis_client.xrange(
+                BloomConf.STREAM, min=entry_id, max=entry_id
+            )
+        )
+
+    def _binary_redis(self) -> Redis:
+        """Return a new client of bytes, the filters are not text.
+
+        `setup_redis` shares one client decoding responses with the app,
+        this one is closed by `_follow`.
+        """
+        return aioredis.from_url(url=self._redis_url, decode_responses=False)
+
+    async def _follow(self) -> None:
+        """Load filters, add new stream entries, reload on schedule.
+
+        After a Redis error or a full batch of entries the worker may be
+        far behind, the entry it follows from may have been trimmed, so
+        it is checked before the next read.
+        """
+        redis_client = self._binary_redis()
+        reload_at = 0.0
+        check = False
+        try:
+            while True:
+                try:
+                    if check and self._last_id is not None:
+                        if not await self._kept(redis_client, self._last_id):
+                            log.warning("Bloom filters fell behind the stream")
+                            self._untrust()
+                    check = False
+                    if self._last_id is None or time.monotonic() >= reload_at:
+                        reload_at = time.monotonic() + self._reload_seconds
+                        await self._load(redis_client)
+                    if self._last_id is None:
+                        await asyncio.sleep(BloomConf.RETRY_SECONDS)
+                        continue
+                    response = await redis_client.xread(
+                        {BloomConf.STREAM: self._last_id},
+                        count=BloomConf.READ_COUNT,
+                        block=BloomConf.READ_BLOCK_MS,
+                    )
+                    for _, entries in response:
+                        self._last_id = (
+                            self._add_entries(self._filters, entries)
+                            or self._last_id
+                        )
+                        check = len(entries) >= BloomConf.READ_COUNT
+                except aioredis.RedisError as e:
+                    log.warning("Bloom filters stream failed: %s", e)
+                    check = True
+                    await asyncio.sleep(BloomConf.RECONNECT_SECONDS)
+        finally:
+            await close_redis(redis_client)
+
+
+_filters: WorkerFilters | None = None
+
+
+def start_bloom_filters() -> None:
+    """Load the filters of the worker if they are enabled."""
+    global _filters
+    if not settings.bloom.BLOOM_FILTERS_ENABLED or _filters is not None:
+        return
+    _filters = WorkerFilters(
+        reload_seconds=BloomConf.RELOAD_SECONDS,
+        redis_url=settings.redis.redis_url,
+    )
+    _filters.start()
+
+
+async def close_bloom_filters() -> None:
+    """Stop the filters before shutdown."""
+    if _filters is not None:
+        await _filters.close()
+
+
+def may_contain(name: str, item: str) -> bool | None:
+    """Return False if the item is surely absent from a filter.
+
+    Args:
+        name (str): `BloomConf.FILTER_EMAILS` or `FILTER_REFERRALS`.
+        item (str): Lowercase email, referral owner ID or short code.
+
+    Returns:
+        bool | None: True if the item may be present, None if the
+        filters are disabled or not trusted yet.
+    """
+    if _filters is None:
+        return None
+    return _filters.may_contain(name=name, item=item)
+
+
+async def publish_to_filters(name: str, item: str) -> None:
+    """Add a written item to the filters of every worker.
+
+    Args:
+        name (str): `BloomConf.FILTER_EMAILS` or `FILTER_REFERRALS`.
+        item (str): Lowercase email, referral owner ID or short code.
+    """
+    if _filters is not None:
+        await _filters.publish(name=name, item=item)
+
+
+async def publish_registered_email(email: str) -> None:
+    """Add a new email to the filters of every worker.
+
+    A lost email only skips the lookup before hashing, the unique index
+    still rejects a duplicate, so errors are not raised.
+    """
+    try:
+        await publish_to_filters(
+            name=BloomConf.FILTER_EMAILS, item=email.lower()
+        )
+    except aioredis.RedisError as e:
+        log.warning("Bloom filters publish failed: %s", e)
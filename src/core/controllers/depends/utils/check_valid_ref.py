@@ -1,30 +1,98 @@
 """Check referral token."""
 
+import uuid
+
+import jwt
+from fastapi import HTTPException, status
 from jwt.exceptions import InvalidTokenError
 
+from src.core.controllers.depends.utils.bloom_filters import may_contain
 from src.core.controllers.depends.utils.jwt_token import decode_jwt
 from src.core.controllers.depends.utils.redis_chash import (
     is_alive_referral_token_in_chash,
 )
-from src.core.controllers.depends.utils.return_error import raise_http_404
-from src.core.settings.constants import JWT, MessageError
+from src.core.controllers.depends.utils.referral_short_codes import (
+    is_short_code,
+    owner_of_short_code,
+)
+from src.core.controllers.depends.utils.return_error import http_exception
+from src.core.settings.constants import JWT, BloomConf, MessageError
+
+
+def referral_filter_item(token: str) -> str | None:
+    """Return the item of a code in the filter of referrals.
+
+    A short code is its own item, a JWT is the owner from its payload,
+    read without the signature check.
 
+    Returns:
+        str | None: Item or None if the code cannot be a referral code.
+    """
+    if is_short_code(token):
+        return token
+    try:
+        owner = jwt.decode(jwt=token, options={"verify_signature": False}).get(
+            JWT.PAYLOAD_SUB_KEY
+        )
+    except InvalidTokenError:
+        return None
+    return owner if isinstance(owner, str) else None
 
-async def user_return_from_token_in_chash_or_response_422(token: str) -> str:
+
+def invalid_referral_400() -> HTTPException:
+    """Return the error of a dead or broken referral code.
+
+    Registration has answered such codes with 400 since before the
+    checks moved out of the transaction, clients rely on it.
+    """
+    return http_exception(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        error_type=MessageError.TYPE_ERROR_INVALID_REG,
+        error_message=MessageError.INVALID_REF_TOKEN_ERR_MESSAGE,
+    )
+
+
+def live_referral_or_400(token: str | None) -> None:
+    """Reject a code that is surely not live, without I/O.
+
+    Called before the password is hashed, so junk codes cost no bcrypt.
+    A code that cannot be decoded or whose item is absent from the Bloom
+    filter of referrals is rejected, the rest take the full check.
+
+    Raises:
+        HTTPException: A 400 error if the code is surely not live.
+    """
+    if not token:
+        return
+    item = referral_filter_item(token=token)
+    if (
+        item is None
+        or may_contain(name=BloomConf.FILTER_REFERRALS, item=item) is False
+    ):
+        raise invalid_referral_400()
+
+
+async def referral_owner_or_400(token: str) -> str:
     """Check for the existence of a referral token in the cache.
 
-    Decodes the JWT token and verifies if it is a referral type.
-    Then, checks if the token exists in the Redis cache. Raises an
-    HTTP 404 error if validation fails.
+    A short code is one GET of its owner. A JWT is decoded and checked
+    to be a referral type, then the owner's token must exist in the
+    Redis cache. Raises an HTTP 400 error if validation fails.
 
     Args:
         token (str): The JWT token to decode and verify.
 
     Raises:
-        HTTPException: A 404 error if the token is invalid or not
+        HTTPException: A 400 error if the token is invalid or not
         found in the cache.
     """
     try:
+        if is_short_code(token):
+            id_ref = await owner_of_short_code(code=token)
+            if id_ref is None:
+                raise InvalidTokenError
+            return id_ref
+
         payload = decode_jwt(jwt_token=token)
         referral_token = payload.get(JWT.TOKEN_TYPE_FIELD)
 
@@ -34,17 +102,37 @@ async def user_return_from_token_in_chash_or_response_422(token: str) -> str:
         id_ref = payload.get(JWT.PAYLOAD_SUB_KEY)
 
         if (
-            _ := await is_alive_referral_token_in_chash(
+            await is_alive_referral_token_in_chash(
                 referral_owner_id=id_ref, prefix_key=JWT.TOKEN_TYPE_REFERRAL
             )
-            is False
+            is None
         ):
             raise InvalidTokenError
 
         return id_ref
 
     except InvalidTokenError:
-        raise raise_http_404(
-            error_type=MessageError.INVALID_TOKEN_ERR,
-            error_message=MessageError.INVALID_REF_TOKEN_ERR_MESSAGE,
-        )
+        raise invalid_referral_400()
+
+
+async def referrer_id_or_400(token: str | None) -> uuid.UUID | None:
+    """Return the referrer ID of a live referral token.
+
+    Args:
+        token (str | None): Referral token from the registration form.
+
+    Returns:
+        uuid.UUID | None: Referrer's user ID or `None` without a token.
+
+    Raises:
+        HTTPException: A 400 error if the token is invalid or not
+        found in the cache.
+    """
+    if not token:
+        return None
+
+    id_ref = await referral_owner_or_400(token=token)
+    try:
+        return uuid.UUID(id_ref)
+    except (TypeError, ValueError):
+        raise invalid_referral_400()
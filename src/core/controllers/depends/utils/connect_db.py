@@ -1,16 +1,25 @@
 """Get db session and CRUDs."""
 
+import uuid
 from typing import TYPE_CHECKING, Annotated
 
-from fastapi import Depends
+from fastapi import Depends, Request
+from sqlalchemy.exc import DBAPIError
 
+from src.core.controllers.depends.utils.read_your_writes import (
+    is_recent_write,
+)
 from src.core.orm.crud import create_crud_helper
 from src.core.orm.engine import get_engine
+from src.core.settings.constants import Keys, ShardConf
 from src.core.settings.env import settings
 
 if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
     from src.core.orm.crud import Crud
     from src.core.orm.engine import ManagerDB
+    from src.core.orm.shards import ShardRouter
 
 
 def get_crud() -> "Crud":
@@ -30,10 +39,91 @@ async def disconnect_db() -> None:
         url=settings.db.get_url_database, echo=settings.db.ECHO
     )
     await connect.async_engine.dispose()
+    await connect.replicas.dispose()
+    await connect.shards.dispose()
 
 
 async def get_session(engine: Annotated["ManagerDB", Depends(_init_engine)]):
-    """Return db session."""
+    """Return db session of the primary, for writes."""
     async with engine.get_scoped_session() as session:
         yield session
         await session.close()
+
+
+async def get_session_factory(
+    engine: Annotated["ManagerDB", Depends(_init_engine)],
+) -> "async_sessionmaker[AsyncSession]":
+    """Return db session factory for work that outlives the request."""
+    return engine.create_session(engine.async_engine)
+
+
+async def get_shard_router(
+    engine: Annotated["ManagerDB", Depends(_init_engine)],
+) -> "ShardRouter | None":
+    """Return shards or `None` if the primary is the only database."""
+    return engine.shards if engine.shards else None
+
+
+def _shard_of_request(engine: "ManagerDB", request: Request) -> int:
+    """Return shard of the `user_id` query parameter, else the primary."""
+    user_id = request.query_params.get(Keys.USER_ID)
+    if not engine.shards or not user_id:
+        return ShardConf.PRIMARY
+    try:
+        return engine.shards.shard_of(uuid.UUID(user_id))
+    except ValueError:
+        return ShardConf.PRIMARY
+
+
+async def _pick_replica(engine: "ManagerDB", request: Request):
+    """Return a healthy replica or None to read from the primary."""
+    if not engine.replicas or await is_recent_write(request=request):
+        return None
+    return await engine.replicas.pick()
+
+
+async def get_read_session(
+    request: Request,
+    engine: Annotated["ManagerDB", Depends(_init_engine)],
+):
+    """Return db session for read-only dependencies.
+
+    The session is bound to a replica unless there are no healthy ones or
+    the requested user was written recently, then to the primary. A
+    replica that drops the connection is ejected. With shards a request
+    about a user of another shard reads from that shard.
+    """
+    shard = _shard_of_request(engine=engine, request=request)
+    if shard != ShardConf.PRIMARY:
+        async with engine.shards.session_factory(shard)() as session:
+            yield session
+        return
+
+    replica = await _pick_replica(engine=engine, request=request)
+    if replica is None:
+        async with engine.get_scoped_session() as session:
+            yield session
+            await session.close()
+        return
+
+    async with replica.session_factory() as session:
+        try:
+            yield session
+        except DBAPIError as e:
+            if e.connection_invalidated:
+                engine.replicas.eject(replica)
+            raise
+
+
+async def get_read_session_factory(
+    request: Request,
+    engine: Annotated["ManagerDB", Depends(_init_engine)],
+) -> "async_sessionmaker[AsyncSession]":
+    """Return db session factory of a replica or a shard for long reads."""
+    shard = _shard_of_request(engine=engine, request=request)
+    if shard != ShardConf.PRIMARY:
+        return engine.shards.session_factory(shard)
+    replica = await _pick_replica(engine=engine, request=request)
+    if replica is None:
+        return engine.create_session(engine.async_engine)
+    return replica.session_factory
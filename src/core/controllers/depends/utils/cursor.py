@@ -0,0 +1,50 @@
+"""Opaque cursors for keyset pagination."""
+
+import base64
+import binascii
+
+from fastapi import status
+
+from src.core.controllers.depends.utils.return_error import http_exception
+from src.core.settings.constants import MessageError, TypeEncoding
+
+
+def encode_cursor(key: int) -> str:
+    """Return an opaque cursor for the last key of a page.
+
+    Args:
+        key (int): Sort key of the last row on the page.
+
+    Returns:
+        str: URL safe cursor without padding.
+    """
+    return (
+        base64.urlsafe_b64encode(str(key).encode(TypeEncoding.UTF8))
+        .decode(TypeEncoding.UTF8)
+        .rstrip("=")
+    )
+
+
+def decode_cursor_or_error_422(cursor: str) -> int:
+    """Return the sort key hidden in the cursor.
+
+    Args:
+        cursor (str): Cursor from the previous page.
+
+    Raises:
+        HTTPException: If the cursor is broken,
+        raises HTTP 422 with an error message.
+    """
+    try:
+        padding = "=" * (-len(cursor) % 4)
+        return int(
+            base64.urlsafe_b64decode(cursor + padding).decode(
+                TypeEncoding.UTF8
+            )
+        )
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise http_exception(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            error_type=MessageError.INVALID_QUERY_ERR,
+            error_message=MessageError.INVALID_CURSOR_ERR_MESSAGE,
+        )
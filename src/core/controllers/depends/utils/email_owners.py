@@ -0,0 +1,69 @@
+"""Owners of emails cached in Redis and in the worker."""
+
+from collections import OrderedDict
+
+from redis import asyncio as aioredis
+
+from src.core.controllers.depends.utils.redis_chash import (
+    gen_key,
+    get_cache,
+    set_cache,
+)
+from src.core.settings.constants import EmailOwnerConf
+
+_owners: OrderedDict[str, str] = OrderedDict()
+
+
+def email_owner_key(email: str) -> str:
+    """Return key of the owner of an email, emails are case-insensitive."""
+    return gen_key(prefix_key=EmailOwnerConf.PREFIX, id_user=email.lower())
+
+
+def _remember(email: str, user_id: str) -> None:
+    """Keep an owner in the worker, the least recently used goes first."""
+    _owners[email] = user_id
+    _owners.move_to_end(email)
+    if len(_owners) > EmailOwnerConf.MEMO_SIZE:
+        _owners.popitem(last=False)
+
+
+async def get_email_owner(email: str) -> str | None:
+    """Return the user ID of an email from the worker or Redis.
+
+    An email never changes its owner, so a found owner is kept in the
+    worker for good.
+
+    Args:
+        email (str): User email.
+
+    Returns:
+        str | None: User ID or None if it is not cached.
+    """
+    email = email.lower()
+    user_id = _owners.get(email)
+    if user_id is not None:
+        _owners.move_to_end(email)
+        return user_id
+    user_id = await get_cache(cache_key=email_owner_key(email=email))
+    if user_id is not None:
+        _remember(email=email, user_id=user_id)
+    return user_id
+
+
+async def set_email_owner(email: str, user_id: str) -> None:
+    """Cache the user ID of an email in the worker and in Redis.
+
+    Args:
+        email (str): User email.
+        user_id (str): ID of the user of the email.
+    """
+    email = email.lower()
+    _remember(email=email, user_id=user_id)
+    try:
+        await set_cache(
+            cache_key=email_owner_key(email=email),
+            value=user_id,
+            ex=EmailOwnerConf.EXPIRE,
+        )
+    except aioredis.RedisError as e:
+        print(f"Email owner cache failed: {e}")
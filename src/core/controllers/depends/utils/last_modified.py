@@ -0,0 +1,60 @@
+"""Last-Modified and If-Modified-Since helpers."""
+
+import datetime
+from email.utils import format_datetime, parsedate_to_datetime
+
+
+def format_http_date(moment: datetime.datetime) -> str:
+    """Return the moment as HTTP date for `Last-Modified`.
+
+    Args:
+        moment (datetime.datetime): Time of the last change.
+
+    Returns:
+        str: Date like `Sat, 18 Oct 2026 10:00:00 GMT`.
+    """
+    return format_datetime(
+        moment.astimezone(datetime.UTC).replace(microsecond=0),
+        usegmt=True,
+    )
+
+
+def parse_http_date(value: str | None) -> datetime.datetime | None:
+    """Return an HTTP date as aware datetime.
+
+    Args:
+        value (str | None): Header value like `Last-Modified`.
+
+    Returns:
+        datetime.datetime | None: Moment in UTC, None if it is invalid.
+    """
+    if not value:
+        return None
+    try:
+        moment = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=datetime.UTC)
+    return moment
+
+
+def is_not_modified_since(
+    if_modified_since: str | None, last_modified: datetime.datetime
+) -> bool:
+    """Check `If-Modified-Since` against the time of the last change.
+
+    HTTP dates have one second resolution, so the last change is
+    truncated to seconds before comparing.
+
+    Args:
+        if_modified_since (str | None): Header value from the client.
+        last_modified (datetime.datetime): Time of the last change.
+
+    Returns:
+        bool: True if the client already has the last change.
+    """
+    since = parse_http_date(if_modified_since)
+    if since is None:
+        return False
+    return last_modified.replace(microsecond=0) <= since
@@ -0,0 +1,66 @@
+"""Read-your-writes window over read replicas."""
+
+from fastapi import Request
+from redis import asyncio as aioredis
+
+from src.core.controllers.depends.utils.redis_chash import (
+    del_cache_by_tag,
+    gen_key,
+    get_cache,
+    set_cache,
+)
+from src.core.settings.constants import JWT, ReplicaConf
+from src.core.settings.env import settings
+
+
+def write_key(value: str) -> str:
+    """Return key of the write marker of a user ID or email."""
+    return gen_key(
+        prefix_key=ReplicaConf.READ_YOUR_WRITES_PREFIX, id_user=value.lower()
+    )
+
+
+async def mark_recent_write(
+    user_id: str | None = None, email: str | None = None
+) -> None:
+    """Send reads about a user to the primary for a while after a write.
+
+    Cached referral pages of the user are dropped too, so the next read
+    does not return a page from before the write.
+
+    Args:
+        user_id (str | None): ID of the user whose data was written.
+        email (str | None): Email of the user whose data was written.
+    """
+    try:
+        for value in (user_id, email):
+            if value:
+                await set_cache(
+                    cache_key=write_key(value=value),
+                    value=ReplicaConf.MARK,
+                    ex=settings.db.READ_YOUR_WRITES_SECONDS,
+                )
+        if user_id:
+            await del_cache_by_tag(
+                prefix_key=JWT.PREFIX_BY_EMAIL_OR_ID, id_user=user_id
+            )
+    except aioredis.RedisError as e:
+        print(f"Read-your-writes mark failed: {e}")
+
+
+async def is_recent_write(request: Request) -> bool:
+    """Return True if the requested user was written recently.
+
+    The user is taken from `user_id` or `email` query parameter. If Redis
+    does not answer, the read goes to the primary.
+    """
+    for param in ReplicaConf.READ_YOUR_WRITES_PARAMS:
+        value = request.query_params.get(param)
+        if not value:
+            continue
+        try:
+            if await get_cache(cache_key=write_key(value=value)):
+                return True
+        except aioredis.RedisError:
+            return True
+    return False
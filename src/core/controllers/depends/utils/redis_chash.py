@@ -1,9 +1,12 @@
 """Cache module for caching API responses with Redis."""
 
+import asyncio
 import hashlib
 import json
+import secrets
+import time
 from functools import update_wrapper, wraps
-from typing import Any, Callable, Type
+from typing import Any, Awaitable, Callable, Type
 
 import pydantic
 from fastapi import Request, Response
@@ -11,12 +14,27 @@ from fastapi.dependencies.utils import get_typed_return_annotation
 from fastapi.responses import JSONResponse
 from redis import asyncio as aioredis
 from redis.asyncio.client import Redis
-from starlette.status import HTTP_304_NOT_MODIFIED
+from redis.commands.core import AsyncScript
+from starlette.status import (
+    HTTP_304_NOT_MODIFIED,
+    HTTP_500_INTERNAL_SERVER_ERROR,
+)
 
+from src.core.controllers.depends.utils.last_modified import (
+    is_not_modified_since,
+    parse_http_date,
+)
+from src.core.controllers.depends.utils.return_error import http_exception
 from src.core.controllers.depends.utils.token_from import (
     get_user_id_from_token,
 )
-from src.core.settings.constants import Headers, Keys, TypeEncoding
+from src.core.settings.constants import (
+    Headers,
+    Keys,
+    MessageError,
+    SingletonConf,
+    TypeEncoding,
+)
 from src.core.settings.env import settings
 from src.core.validators.cache_dto import CacheDataDTO
 
@@ -166,6 +184,19 @@ def gen_key(
     return ":".join(keys)
 
 
+def gen_tag_key(prefix_key: str, id_user: str | int) -> str:
+    """Generate key of the set of cache keys of one user.
+
+    Args:
+        prefix_key (str): Prefix for cache key.
+        id_user (str): User ID.
+
+    Returns:
+        str: Key of the tag set.
+    """
+    return ":".join((prefix_key, str(id_user), Keys.CACHE_TAG))
+
+
 def gen_etag(cached_value: str) -> str:
     """Generate ETag from cached value.
 
@@ -199,6 +230,39 @@ def set_response_headers(
     )
 
 
+def gen_last_modified_key(cache_key: str) -> str:
+    """Generate key of `Last-Modified` of a cached response.
+
+    Args:
+        cache_key (str): Key of the cached response.
+
+    Returns:
+        str: Key of the header value.
+    """
+    return ":".join((cache_key, Keys.CACHE_LAST_MODIFIED))
+
+
+def check_not_modified(
+    request: Request, response: Response, last_modified: str | None
+) -> bool:
+    """Check `If-None-Match`, else `If-Modified-Since` of a cached response.
+
+    Args:
+        request (Request): Incoming request with the conditions.
+        response (Response): Response containing ETag.
+        last_modified (str | None): `Last-Modified` of the cached response.
+
+    Returns:
+        bool: True if the client already has the response.
+    """
+    if Headers.IF_NONE_MATCH in request.headers:
+        return check_etag(request=request, response=response)
+    last_at = parse_http_date(last_modified)
+    return last_at is not None and is_not_modified_since(
+        request.headers.get(Headers.IF_MODIFIED_SINCE), last_at
+    )
+
+
 def check_etag(request: Request, response: Response) -> bool:
     """Validate ETag to check cache validity.
 
@@ -230,6 +294,27 @@ async def get_cache(cache_key: str) -> str | None:
         raise e
 
 
+async def get_cached_response(cache_key: str) -> tuple[str | None, ...]:
+    """Retrieve a cached response and its `Last-Modified` in one MGET.
+
+    Args:
+        cache_key (str): Key of the cached response.
+
+    Returns:
+        tuple[str | None, ...]: Cached data and `Last-Modified`, None if
+        absent.
+    """
+    redis_client: Redis = await setup_redis()
+    try:
+        return tuple(
+            await redis_client.mget(
+                cache_key, gen_last_modified_key(cache_key=cache_key)
+            )
+        )
+    except aioredis.RedisError as e:
+        raise e
+
+
 async def del_cache(cache_key: str) -> None:
     """Delete cached data from Redis by key.
 
@@ -246,6 +331,107 @@ async def del_cache(cache_key: str) -> None:
         raise e
 
 
+# Return the cached value, else 1 if the lock was taken, else 0.
+_GET_OR_CLAIM = """
+local value = redis.call('GET', KEYS[1])
+if value then
+    return value
+end
+if redis.call('SET', KEYS[2], ARGV[1], 'NX', 'PX', ARGV[2]) then
+    return 1
+end
+return 0
+"""
+
+# Store the value if the lock is still held, return the cached value.
+_STORE_CLAIMED = """
+if redis.call('GET', KEYS[2]) == ARGV[1] then
+    redis.call('SET', KEYS[1], ARGV[2], 'PX', ARGV[3])
+    redis.call('DEL', KEYS[2])
+    return ARGV[2]
+end
+return redis.call('GET', KEYS[1])
+"""
+
+# Drop the lock if it is still held.
+_RELEASE = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# Delete the value and a running issue, return the deleted value.
+_DROP = """
+local value = redis.call('GET', KEYS[1])
+redis.call('DEL', KEYS[1], KEYS[2])
+return value
+"""
+
+_scripts: dict[str, AsyncScript] = {}
+
+
+async def run_script(source: str, keys: list[str], args: list) -> Any:
+    """Run a Lua script by its SHA, it is loaded on the first miss.
+
+    Args:
+        source (str): Lua source.
+        keys (list[str]): KEYS of the script.
+        args (list): ARGV of the script.
+
+    Returns:
+        Any: Reply of the script.
+    """
+    redis_client: Redis = await setup_redis()
+    if source not in _scripts:
+        _scripts[source] = redis_client.register_script(source)
+    try:
+        return await _scripts[source](keys=keys, args=args)
+    except aioredis.RedisError as e:
+        raise e
+
+
+def gen_lock_key(cache_key: str) -> str:
+    """Generate key of the lock of one issue of a cached value."""
+    return ":".join((cache_key, Keys.CACHE_LOCK))
+
+
+async def drop_singleton(cache_key: str) -> str | None:
+    """Delete a singleton value and its lock in one step.
+
+    An issue that holds the lock cannot store its value afterwards.
+
+    Args:
+        cache_key (str): Key of the value.
+
+    Returns:
+        str | None: Deleted data if it was cached, else None.
+    """
+    return await run_script(
+        _DROP, keys=[cache_key, gen_lock_key(cache_key)], args=[]
+    )
+
+
+async def _wait_for_singleton(cache_key: str) -> str | None:
+    """Wait for the value of an issue that runs elsewhere.
+
+    Returns:
+        str | None: Stored value or None if the lock is gone without it.
+    """
+    redis_client: Redis = await setup_redis()
+    lock_key = gen_lock_key(cache_key)
+    deadline = time.monotonic() + SingletonConf.LOCK_MS / 1000
+    while time.monotonic() < deadline:
+        await asyncio.sleep(SingletonConf.POLL_SECONDS)
+        try:
+            value, lock = await redis_client.mget([cache_key, lock_key])
+        except aioredis.RedisError as e:
+            raise e
+        if value is not None or lock is None:
+            return value
+    return None
+
+
 async def set_cache(cache_key, value, ex) -> None:
     """Store data in Redis with expiration time.
 
@@ -268,6 +454,62 @@ async def set_cache(cache_key, value, ex) -> None:
         raise e
 
 
+async def set_cached_response(
+    cache_key: str,
+    value: str,
+    last_modified: str | None,
+    tag_key: str | None,
+    ex: int | float,
+) -> None:
+    """Store a response, its `Last-Modified` and tag in one round trip.
+
+    The tag set lives as long as the keys it holds.
+
+    Args:
+        cache_key (str): Key of the response.
+        value (str): Cached response.
+        last_modified (str | None): `Last-Modified` of the response.
+        tag_key (str | None): Key of the tag set, None without a tag.
+        ex (int): Expiration time in seconds.
+
+    Raises:
+        RedisError: If storage fails.
+    """
+    cache_keys = [cache_key]
+    redis_client: Redis = await setup_redis()
+    try:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            pipe.set(cache_key, value, ex=ex)
+            if last_modified is not None:
+                cache_keys.append(gen_last_modified_key(cache_key=cache_key))
+                pipe.set(cache_keys[-1], last_modified, ex=ex)
+            if tag_key is not None:
+                pipe.sadd(tag_key, *cache_keys)
+                pipe.expire(tag_key, ex)
+            await pipe.execute()
+    except aioredis.RedisError as e:
+        raise e
+
+
+async def del_cache_by_tag(prefix_key: str, id_user: str | int) -> None:
+    """Delete all cached pages of a user.
+
+    Args:
+        prefix_key (str): Prefix for cache key.
+        id_user (str): User ID.
+
+    Raises:
+        RedisError: If deletion fails.
+    """
+    redis_client: Redis = await setup_redis()
+    tag_key = gen_tag_key(prefix_key=prefix_key, id_user=id_user)
+    try:
+        cache_keys = await redis_client.smembers(tag_key)
+        await redis_client.delete(tag_key, *cache_keys)
+    except aioredis.RedisError as e:
+        raise e
+
+
 async def select_request_and_response(**kwargs) -> tuple[Request, Response]:
     """Select request and response from keyword arguments.
 
@@ -283,17 +525,23 @@ async def select_request_and_response(**kwargs) -> tuple[Request, Response]:
 
 
 def cache_http_get(
-    expire: int, prefix_key: str, request_query_params: bool = False
+    expire: int,
+    prefix_key: str,
+    request_query_params: bool = False,
+    key_query_param: str | None = None,
 ) -> Callable:
     """Cache decorator for GET requests.
 
     Caches the response of GET requests using Redis. Only applies to
-    requests with the GET method.
+    requests with the GET method. `Last-Modified` set by the function is
+    cached with the response, so a hit answers `If-Modified-Since` too.
 
     Args:
         expire (int): Expiration time for cached data in seconds.
         prefix_key (str): Prefix to generate the cache key.
         request_query_params (bool): apply values for cache from http request.
+        key_query_param (str | None): query param put into the key as is,
+            so every page of one user lives under `prefix:value:hash`.
 
     Returns:
         Callable: Decorator function that wraps the original function.
@@ -314,6 +562,11 @@ def cache_http_get(
                         exp=expire,
                         fun=function,
                         return_type_ob=return_type,
+                        id_pers=(
+                            request.query_params.get(key_query_param)
+                            if key_query_param
+                            else None
+                        ),
                         req=request if request_query_params else None,
                     ),
                     *args,
@@ -332,16 +585,23 @@ def cache_http_get(
 
 
 def cache_http_singleton_value_by_user(
-    expire: int | float, prefix_key: str
+    expire: int | float,
+    prefix_key: str,
+    on_delete: Callable[[str], Awaitable[None]] | None = None,
 ) -> Callable:
     """Cache decorator for singleton token operations.
 
     Caches a singleton token for POST or DELETE requests. On DELETE,
-    clears the token cache. On POST, caches the token response.
+    clears the token cache and stops a running issue in one script. On
+    POST, returns the cached token or issues one, concurrent requests of
+    a user get the same token, see `core_singleton_decorator`.
 
     Args:
         expire (int): Expiration time for cached data in seconds.
         prefix_key (str): Prefix to generate the cache key.
+        on_delete (Callable | None): Coroutine called with the deleted
+            value or an issued value that was not stored, to drop data
+            kept along with it.
 
     Returns:
         Callable: Decorator function that wraps the original function.
@@ -355,16 +615,16 @@ def cache_http_singleton_value_by_user(
             request, response = await select_request_and_response(**kwargs)
             user_id = get_user_id_from_token(request)
             if request.method == Keys.DELETE:
-                token_key = gen_key(
-                    prefix_key=prefix_key,
-                    id_user=user_id,
+                cached_value = await drop_singleton(
+                    cache_key=gen_key(prefix_key=prefix_key, id_user=user_id)
                 )
-                await del_cache(cache_key=token_key)
+                if cached_value is not None and on_delete is not None:
+                    await on_delete(cached_value)
                 return True
 
             elif request.method == Keys.POST:
 
-                return await core_chash_decorator(
+                return await core_singleton_decorator(
                     CacheDataDTO(
                         pref_key=prefix_key,
                         exp=expire,
@@ -372,6 +632,7 @@ def cache_http_singleton_value_by_user(
                         return_type_ob=return_type,
                         id_pers=user_id,
                     ),
+                    on_delete,
                     *args,
                     **kwargs,
                 )
@@ -384,6 +645,78 @@ def cache_http_singleton_value_by_user(
     return _decorator
 
 
+async def core_singleton_decorator(
+    chash_dto: CacheDataDTO,
+    on_delete: Callable[[str], Awaitable[None]] | None,
+    *args,
+    **kwargs,
+) -> Any:
+    """Return the singleton value of a user, issue it at most once.
+
+    One script returns the cached value or takes a short lock. The
+    caller with the lock issues the value and stores it only while it
+    still holds the lock; concurrent callers wait for that value and do
+    not issue. A value that was issued but not stored, because DELETE or
+    the lock timeout came first, is passed to `on_delete`; the caller
+    returns the stored value of another issue or starts again.
+
+    Raises:
+        HTTPException: 500 if no value is stored after all attempts.
+    """
+    request, response = await select_request_and_response(**kwargs)
+    cache_key = gen_key(
+        prefix_key=chash_dto.pref_key, id_user=chash_dto.id_pers
+    )
+    keys = [cache_key, gen_lock_key(cache_key)]
+    lock_owner = secrets.token_hex(SingletonConf.LOCK_OWNER_BYTES)
+
+    for _ in range(SingletonConf.ATTEMPTS):
+        claimed = await run_script(
+            _GET_OR_CLAIM, keys=keys, args=[lock_owner, SingletonConf.LOCK_MS]
+        )
+        if claimed == SingletonConf.BUSY:
+            cached_value = await _wait_for_singleton(cache_key=cache_key)
+        elif claimed == SingletonConf.CLAIMED:
+            try:
+                data_response = await chash_dto.fun(*args, **kwargs)
+            except BaseException:
+                await run_script(_RELEASE, keys=keys[1:], args=[lock_owner])
+                raise
+            if isinstance(data_response, Response):
+                await run_script(_RELEASE, keys=keys[1:], args=[lock_owner])
+                return data_response
+            issued = serialize_data(data_response)
+            cached_value = await run_script(
+                _STORE_CLAIMED,
+                keys=keys,
+                args=[lock_owner, issued, int(chash_dto.exp * 1000)],
+            )
+            if cached_value == issued:
+                set_response_headers(response, chash_dto.exp, issued)
+                return data_response
+            if on_delete is not None:
+                await on_delete(issued)
+        else:
+            cached_value = claimed
+
+        if cached_value is not None:
+            set_response_headers(
+                response=response,
+                exp=chash_dto.exp,
+                cached_value=cached_value,
+                update=True,
+            )
+            if check_etag(request=request, response=response):
+                return Response(status_code=HTTP_304_NOT_MODIFIED)
+            return deserialize_data(cached_value, chash_dto.return_type_ob)
+
+    raise http_exception(
+        status_code=HTTP_500_INTERNAL_SERVER_ERROR,
+        error_type=MessageError.TYPE_ERROR_500,
+        error_message=MessageError.MESSAGE_SERVER_ERROR,
+    )
+
+
 async def core_chash_decorator(
     chash_dto: CacheDataDTO,
     *args,
@@ -408,13 +741,25 @@ async def core_chash_decorator(
         req=chash_dto.req,
     )
 
-    cached_value = await get_cache(cache_key=cache_key)
+    cached_value, last_modified = await get_cached_response(
+        cache_key=cache_key
+    )
 
     if cached_value is None:
         data_response = await chash_dto.fun(*args, **kwargs)
+        if isinstance(data_response, Response):
+            return data_response
         cached_value = serialize_data(data_response)
-        await set_cache(
-            cache_key=cache_key, value=cached_value, ex=chash_dto.exp
+        await set_cached_response(
+            cache_key=cache_key,
+            value=cached_value,
+            last_modified=response.headers.get(Headers.LAST_MODIFIED),
+            tag_key=(
+                gen_tag_key(chash_dto.pref_key, chash_dto.id_pers)
+                if chash_dto.id_pers and chash_dto.req
+                else None
+            ),
+            ex=chash_dto.exp,
         )
         set_response_headers(response, chash_dto.exp, cached_value)
 
@@ -425,8 +770,19 @@ async def core_chash_decorator(
             cached_value=cached_value,
             update=True,
         )
-        if check_etag(request=request, response=response):
-            return Response(status_code=HTTP_304_NOT_MODIFIED)
+        if last_modified is not None:
+            response.headers[Headers.LAST_MODIFIED] = last_modified
+        if check_not_modified(
+            request=request, response=response, last_modified=last_modified
+        ):
+            return Response(
+                status_code=HTTP_304_NOT_MODIFIED,
+                headers=(
+                    {Headers.LAST_MODIFIED: last_modified}
+                    if last_modified is not None
+                    else None
+                ),
+            )
 
         data_response = deserialize_data(
             cached_value, chash_dto.return_type_ob
@@ -457,3 +813,35 @@ async def is_alive_referral_token_in_chash(
     )
     cached_token = await get_cache(cache_key=token_key)
     return cached_token if cached_token else None
+
+
+async def alive_referral_owners_in_chash(
+    prefix_key: str,
+    referral_owner_ids: list[str],
+) -> set[str]:
+    """Return owners with a referral token in cache, one MGET for all.
+
+    Args:
+        prefix_key (str): Prefix for the cache key.
+        referral_owner_ids (list[str]): Identifiers of referral owners.
+
+    Returns:
+        set[str]: Owners whose token exists in cache.
+    """
+    if not referral_owner_ids:
+        return set()
+    redis_client: Redis = await setup_redis()
+    try:
+        tokens = await redis_client.mget(
+            [
+                gen_key(prefix_key=prefix_key, id_user=owner_id)
+                for owner_id in referral_owner_ids
+            ]
+        )
+    except aioredis.RedisError as e:
+        raise e
+    return {
+        owner_id
+        for owner_id, token in zip(referral_owner_ids, tokens)
+        if token
+    }
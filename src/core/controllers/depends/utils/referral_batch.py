@@ -0,0 +1,85 @@
+"""Cached first pages of referrals for batch lookups."""
+
+from redis import asyncio as aioredis
+from redis.asyncio.client import Redis
+
+from src.core.controllers.depends.utils.read_your_writes import write_key
+from src.core.controllers.depends.utils.redis_chash import (
+    gen_key,
+    gen_tag_key,
+    setup_redis,
+)
+from src.core.settings.constants import ReferralBatchConf
+
+
+def batch_cache_key(user_id: str, limit: int) -> str:
+    """Return key of a cached first page of a referrer.
+
+    The key is under the referrer's prefix of referral pages and is
+    added to its tag set, so a new referral drops it with the pages of
+    `GET /user/referral`.
+    """
+    return ":".join(
+        (
+            gen_key(
+                prefix_key=ReferralBatchConf.CACHE_PREFIX, id_user=user_id
+            ),
+            f"{ReferralBatchConf.CACHE_SUFFIX}{limit}",
+        )
+    )
+
+
+async def get_cached_pages(
+    user_ids: list[str], limit: int
+) -> tuple[dict[str, str], set[str]]:
+    """Return cached pages and recently written users in one round trip.
+
+    One pipeline of two MGET: pages of the referrers and their
+    read-your-writes markers.
+
+    Args:
+        user_ids (list[str]): Referrers' user IDs.
+        limit (int): Referrals on the page.
+
+    Returns:
+        tuple[dict[str, str], set[str]]: Cached JSON by user ID and IDs
+        written recently.
+    """
+    redis_client: Redis = await setup_redis()
+    try:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            pipe.mget([batch_cache_key(uid, limit) for uid in user_ids])
+            pipe.mget([write_key(value=uid) for uid in user_ids])
+            pages, marks = await pipe.execute()
+    except aioredis.RedisError as e:
+        raise e
+    return (
+        {uid: page for uid, page in zip(user_ids, pages) if page is not None},
+        {uid for uid, mark in zip(user_ids, marks) if mark is not None},
+    )
+
+
+async def set_cached_pages(pages: dict[str, str], limit: int) -> None:
+    """Cache pages of referrers in one pipeline.
+
+    Args:
+        pages (dict[str, str]): JSON of the first page by user ID.
+        limit (int): Referrals on the page.
+    """
+    if not pages:
+        return
+    redis_client: Redis = await setup_redis()
+    expire = ReferralBatchConf.CACHE_EXPIRE
+    try:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for user_id, page in pages.items():
+                cache_key = batch_cache_key(user_id=user_id, limit=limit)
+                tag_key = gen_tag_key(
+                    prefix_key=ReferralBatchConf.CACHE_PREFIX, id_user=user_id
+                )
+                pipe.set(cache_key, page, ex=expire)
+                pipe.sadd(tag_key, cache_key)
+                pipe.expire(tag_key, expire)
+            await pipe.execute()
+    except aioredis.RedisError as e:
+        raise e
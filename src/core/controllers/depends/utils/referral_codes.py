@@ -0,0 +1,148 @@
+"""Check of many referral codes at once."""
+
+import asyncio
+import time
+from functools import lru_cache
+from typing import Any, NamedTuple
+
+import jwt
+from jwt.exceptions import ExpiredSignatureError, InvalidTokenError
+
+from src.core.controllers.depends.utils.bloom_filters import may_contain
+from src.core.controllers.depends.utils.redis_chash import (
+    alive_referral_owners_in_chash,
+)
+from src.core.controllers.depends.utils.referral_short_codes import (
+    is_short_code,
+    owners_of_short_codes,
+)
+from src.core.settings.constants import JWT, BloomConf, ReferralCodeConf
+from src.core.settings.env import settings
+
+
+class VerifiedCode(NamedTuple):
+    """Result of the signature check of a referral code."""
+
+    status: str
+    owner: str | None = None
+    expire: float = 0.0
+
+
+@lru_cache(maxsize=1)
+def _public_key() -> Any:
+    """Return the public key parsed once, not on every decode."""
+    return jwt.get_algorithm_by_name(settings.jwt.algorithm).prepare_key(
+        settings.jwt.jwt_public
+    )
+
+
+@lru_cache(maxsize=ReferralCodeConf.MEMO_SIZE)
+def _verify(code: str) -> VerifiedCode:
+    """Check the signature and type of a code, results are memoized.
+
+    A code is immutable, so its result holds till `expire`, which is
+    compared with the clock on every use.
+    """
+    try:
+        payload = jwt.decode(
+            jwt=code,
+            key=_public_key(),
+            algorithms=[settings.jwt.algorithm],
+            options={"require": [JWT.PAYLOAD_EXPIRE_KEY]},
+        )
+    except ExpiredSignatureError:
+        return VerifiedCode(status=ReferralCodeConf.STATUS_EXPIRED)
+    except InvalidTokenError:
+        return VerifiedCode(status=ReferralCodeConf.STATUS_INVALID)
+
+    owner = payload.get(JWT.PAYLOAD_SUB_KEY)
+    if payload.get(JWT.TOKEN_TYPE_FIELD) != JWT.TOKEN_TYPE_REFERRAL or not (
+        isinstance(owner, str) and owner
+    ):
+        return VerifiedCode(status=ReferralCodeConf.STATUS_INVALID)
+    return VerifiedCode(
+        status=ReferralCodeConf.STATUS_VALID,
+        owner=owner,
+        expire=float(payload[JWT.PAYLOAD_EXPIRE_KEY]),
+    )
+
+
+def verify_referral_codes(codes: list[str]) -> list[VerifiedCode | None]:
+    """Check signatures of JWT codes in one loop.
+
+    Args:
+        codes (list[str]): Referral tokens.
+
+    Returns:
+        list[VerifiedCode | None]: Results in the order of `codes`, None
+        for short codes, they have no signature.
+    """
+    now = time.time()
+    verified: list[VerifiedCode | None] = []
+    for code in codes:
+        if is_short_code(code):
+            verified.append(None)
+            continue
+        result = _verify(code)
+        if result.owner is not None and result.expire <= now:
+            result = VerifiedCode(status=ReferralCodeConf.STATUS_EXPIRED)
+        verified.append(result)
+    return verified
+
+
+def _maybe_live(items: set[str]) -> list[str]:
+    """Return items that are not surely absent from the referral filter."""
+    return [
+        item
+        for item in items
+        if may_contain(name=BloomConf.FILTER_REFERRALS, item=item) is not False
+    ]
+
+
+async def check_referral_codes(
+    codes: list[str], verified: list[VerifiedCode | None]
+) -> list[VerifiedCode]:
+    """Resolve short codes and check liveness of owners of JWT codes.
+
+    Owners of short codes are one MGET and liveness of owners of valid
+    JWT codes is another, as `owner_of_short_code` and
+    `is_alive_referral_token_in_chash` check one code. A short code
+    without an owner is inactive, like a JWT of an owner without a live
+    code. Codes and owners absent from the Bloom filter of referrals are
+    inactive without a lookup.
+
+    Args:
+        codes (list[str]): Referral tokens.
+        verified (list[VerifiedCode | None]): Results of
+            `verify_referral_codes`.
+
+    Returns:
+        list[VerifiedCode]: Final results in the order of `codes`.
+    """
+    short_codes = _maybe_live(
+        {code for code, result in zip(codes, verified) if result is None}
+    )
+    owners = _maybe_live(
+        {result.owner for result in verified if result and result.owner}
+    )
+    short_owners, alive = await asyncio.gather(
+        owners_of_short_codes(codes=short_codes),
+        alive_referral_owners_in_chash(
+            prefix_key=JWT.TOKEN_TYPE_REFERRAL, referral_owner_ids=owners
+        ),
+    )
+
+    inactive = VerifiedCode(status=ReferralCodeConf.STATUS_INACTIVE)
+    checked = []
+    for code, result in zip(codes, verified):
+        if result is None:
+            owner = short_owners.get(code)
+            result = (
+                VerifiedCode(status=ReferralCodeConf.STATUS_VALID, owner=owner)
+                if owner
+                else inactive
+            )
+        elif result.owner is not None and result.owner not in alive:
+            result = inactive
+        checked.append(result)
+    return checked
@@ -0,0 +1,114 @@
+"""Referral counters and the leaderboard of referrers in Redis."""
+
+from typing import AsyncIterator, Iterable
+
+from redis import asyncio as aioredis
+from redis.asyncio.client import Redis
+
+from src.core.controllers.depends.utils.redis_chash import setup_redis
+from src.core.settings.constants import Leaderboard
+
+
+async def incr_referral_count(user_id: str) -> None:
+    """Add one referral to the counter and the score of a referrer.
+
+    Call it after the edge is committed. Both commands go in one
+    MULTI, so the count and the score do not drift apart. A lost
+    increment is restored by `reconcile_referral_counts`.
+
+    Args:
+        user_id (str): Referrer's user ID.
+    """
+    redis_client: Redis = await setup_redis()
+    try:
+        async with redis_client.pipeline(transaction=True) as pipe:
+            pipe.hincrby(Leaderboard.COUNTS_KEY, user_id, 1)
+            pipe.zincrby(Leaderboard.BOARD_KEY, 1, user_id)
+            await pipe.execute()
+    except aioredis.RedisError as e:
+        print(f"Referral counter update failed: {e}")
+
+
+async def get_referral_count(user_id: str) -> tuple[int, int | None]:
+    """Return referrals of a user and its place on the leaderboard.
+
+    One round trip: HGET and ZREVRANK, the rank is O(log n).
+
+    Args:
+        user_id (str): Referrer's user ID.
+
+    Returns:
+        tuple[int, int | None]: Count and rank from 1, `None` without
+        referrals.
+    """
+    redis_client: Redis = await setup_redis()
+    try:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            pipe.hget(Leaderboard.COUNTS_KEY, user_id)
+            pipe.zrevrank(Leaderboard.BOARD_KEY, user_id)
+            count, rank = await pipe.execute()
+    except aioredis.RedisError as e:
+        raise e
+    return int(count or 0), None if rank is None else rank + 1
+
+
+async def get_top_referrers(limit: int) -> list[tuple[str, int]]:
+    """Return `limit` referrers with most referrals, the first is the top.
+
+    Args:
+        limit (int): Length of the leaderboard.
+
+    Returns:
+        list[tuple[str, int]]: Pairs of user ID and count.
+    """
+    redis_client: Redis = await setup_redis()
+    try:
+        top = await redis_client.zrevrange(
+            Leaderboard.BOARD_KEY, 0, limit - 1, withscores=True
+        )
+    except aioredis.RedisError as e:
+        raise e
+    return [(user_id, int(score)) for user_id, score in top]
+
+
+async def reconcile_referral_counts(
+    batches: AsyncIterator[Iterable[tuple[str, int]]],
+) -> int:
+    """Replace the counters and the leaderboard with counts of Postgres.
+
+    The new hash and sorted set are written under other keys and
+    renamed over the live ones in one MULTI, so readers see either the
+    old or the new board. Increments made during the rebuild are lost
+    until the next run.
+
+    Args:
+        batches (AsyncIterator): Batches of `(user_id, count)` pairs.
+
+    Returns:
+        int: Referrers written.
+    """
+    redis_client: Redis = await setup_redis()
+    counts_key = Leaderboard.COUNTS_KEY + Leaderboard.REBUILD_SUFFIX
+    board_key = Leaderboard.BOARD_KEY + Leaderboard.REBUILD_SUFFIX
+    written = 0
+    try:
+        await redis_client.delete(counts_key, board_key)
+        async for batch in batches:
+            counts = {str(user_id): count for user_id, count in batch}
+            if not counts:
+                continue
+            async with redis_client.pipeline(transaction=False) as pipe:
+                pipe.hset(counts_key, mapping=counts)
+                pipe.zadd(board_key, mapping=counts)
+                await pipe.execute()
+            written += len(counts)
+        async with redis_client.pipeline(transaction=True) as pipe:
+            if written:
+                pipe.rename(counts_key, Leaderboard.COUNTS_KEY)
+                pipe.rename(board_key, Leaderboard.BOARD_KEY)
+            else:
+                pipe.delete(Leaderboard.COUNTS_KEY, Leaderboard.BOARD_KEY)
+            await pipe.execute()
+    except aioredis.RedisError as e:
+        raise e
+    return written
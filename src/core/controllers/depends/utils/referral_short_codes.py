@@ -0,0 +1,127 @@
+"""Short random referral codes kept in Redis."""
+
+import secrets
+
+from fastapi import status
+from redis import asyncio as aioredis
+from redis.asyncio.client import Redis
+
+from src.core.controllers.depends.utils.bloom_filters import (
+    publish_to_filters,
+)
+from src.core.controllers.depends.utils.redis_chash import (
+    gen_key,
+    setup_redis,
+)
+from src.core.controllers.depends.utils.return_error import http_exception
+from src.core.settings.constants import (
+    BloomConf,
+    MessageError,
+    ReferralCodeConf,
+)
+from src.core.settings.env import settings
+from src.core.validators.token import TokenReferral
+
+
+def is_short_code(code: str) -> bool:
+    """Return True for a short code, a JWT is longer and has dots."""
+    return (
+        len(code) == ReferralCodeConf.SHORT_LENGTH
+        and ReferralCodeConf.JWT_SEPARATOR not in code
+    )
+
+
+def short_code_key(code: str) -> str:
+    """Return key of the owner of a short code."""
+    return gen_key(prefix_key=ReferralCodeConf.SHORT_PREFIX, id_user=code)
+
+
+async def issue_short_code(owner_id: str) -> TokenReferral:
+    """Return a new short code of a user, mapped to the user in Redis.
+
+    The code is `SHORT_BYTES` random bytes, 11 URL-safe characters. The
+    mapping expires with the user's cached token. SET NX keeps a code
+    of another user from being overwritten. The code goes to the Bloom
+    filters before it is stored, so no worker rejects a live code.
+
+    Args:
+        owner_id (str): Referrer's user ID.
+
+    Returns:
+        TokenReferral: The short code as the referral token.
+
+    Raises:
+        HTTPException: 500 if every attempt hit an existing code.
+    """
+    redis_client: Redis = await setup_redis()
+    for _ in range(ReferralCodeConf.SHORT_ATTEMPTS):
+        code = secrets.token_urlsafe(ReferralCodeConf.SHORT_BYTES)
+        await publish_to_filters(name=BloomConf.FILTER_REFERRALS, item=code)
+        try:
+            if await redis_client.set(
+                short_code_key(code=code),
+                owner_id,
+                ex=settings.jwt.set_referral_token_expire_days,
+                nx=True,
+            ):
+                return TokenReferral(referral_token=code)
+        except aioredis.RedisError as e:
+            raise e
+    raise http_exception(
+        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        error_type=MessageError.TYPE_ERROR_500,
+        error_message=MessageError.MESSAGE_SERVER_ERROR,
+    )
+
+
+async def owner_of_short_code(code: str) -> str | None:
+    """Return the owner of a live short code, one GET.
+
+    Args:
+        code (str): Short referral code.
+
+    Returns:
+        str | None: Referrer's user ID, None if the code is not live.
+    """
+    redis_client: Redis = await setup_redis()
+    try:
+        return await redis_client.get(short_code_key(code=code))
+    except aioredis.RedisError as e:
+        raise e
+
+
+async def owners_of_short_codes(codes: list[str]) -> dict[str, str]:
+    """Return owners of live short codes, one MGET for all.
+
+    Args:
+        codes (list[str]): Short referral codes.
+
+    Returns:
+        dict[str, str]: Referrer's user ID by live code.
+    """
+    if not codes:
+        return {}
+    redis_client: Redis = await setup_redis()
+    try:
+        owners = await redis_client.mget(
+            [short_code_key(code=code) for code in codes]
+        )
+    except aioredis.RedisError as e:
+        raise e
+    return {code: owner for code, owner in zip(codes, owners) if owner}
+
+
+async def drop_short_code(cached_token: str) -> None:
+    """Delete the mapping of a deleted referral token if it is short.
+
+    Args:
+        cached_token (str): Cached `TokenReferral` JSON of the owner.
+    """
+    code = TokenReferral.model_validate_json(cached_token).referral_token
+    if not is_short_code(code):
+        return
+    redis_client: Redis = await setup_redis()
+    try:
+        await redis_client.delete(short_code_key(code=code))
+    except aioredis.RedisError as e:
+        raise e
@@ -0,0 +1,57 @@
+"""Invalidation of cached referral trees."""
+
+import uuid
+from typing import TYPE_CHECKING
+
+from redis import asyncio as aioredis
+
+from src.core.controllers.depends.utils.redis_chash import del_cache_by_tag
+from src.core.settings.constants import ReferralTreeConf
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+    from src.core.orm.crud import Crud
+    from src.core.orm.shards import ShardRouter
+
+
+async def invalidate_referral_trees(
+    referrer_id: uuid.UUID,
+    crud: "Crud",
+    session: "AsyncSession",
+    shards: "ShardRouter | None" = None,
+) -> None:
+    """Drop cached trees that contain a new edge of a referrer.
+
+    The edge is on level 1 of the referrer's tree and one level deeper
+    for every referrer above, so trees of `ReferralTreeConf.MAX_DEPTH`
+    users up the branch are dropped with all their depths and pages.
+    With shards every edge above is on the shard of its own referrer, so
+    the branch is walked hop by hop across shards.
+
+    Args:
+        referrer_id (uuid.UUID): Referrer of the new edge.
+        crud (Crud): CRUD operations handler.
+        session (AsyncSession): Session of the database without shards.
+        shards (ShardRouter | None): Shards, if there are more than the
+            primary.
+    """
+    if shards is not None:
+        ancestors = await crud.shards.get_ancestors(
+            router=shards,
+            user_id=referrer_id,
+            depth=ReferralTreeConf.MAX_DEPTH - 1,
+        )
+    else:
+        ancestors = await crud.refer.get_ancestors(
+            user_id=referrer_id,
+            depth=ReferralTreeConf.MAX_DEPTH - 1,
+            session=session,
+        )
+    try:
+        for root in (referrer_id, *ancestors):
+            await del_cache_by_tag(
+                prefix_key=ReferralTreeConf.CACHE_PREFIX, id_user=str(root)
+            )
+    except aioredis.RedisError as e:
+        print(f"Referral tree invalidation failed: {e}")
@@ -0,0 +1,181 @@
+"""Group commit of registrations per worker."""
+
+import asyncio
+from typing import TYPE_CHECKING, Annotated
+
+from fastapi import Depends
+from sqlalchemy.exc import IntegrityError
+
+from src.core.controllers.depends.utils.connect_db import (
+    get_crud,
+    get_session_factory,
+)
+from src.core.settings.env import settings
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+    from src.core.orm.crud import Crud
+
+
+class RegistrationBatcher:
+    """Collect registrations and write them in one transaction.
+
+    A batch is flushed when it has `max_size` rows or `max_delay`
+    seconds after its first row, whatever comes first. All rows of a
+    batch are one multi-row statement and one commit, every caller gets
+    the result of its own row.
+    """
+
+    def __init__(
+        self,
+        crud: "Crud",
+        session_factory: "async_sessionmaker[AsyncSession]",
+        max_size: int,
+        max_delay: float,
+    ) -> None:
+        """Init batcher.
+
+        Args:
+            crud (Crud): CRUD worker.
+            session_factory (async_sessionmaker): Factory of db sessions.
+            max_size (int): Max rows in one batch.
+            max_delay (float): Max wait of the first row in seconds.
+        """
+        self._crud = crud
+        self._session_factory = session_factory
+        self._max_size = max_size
+        self._max_delay = max_delay
+        self._pending: list[tuple[dict, asyncio.Future]] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._writes: set[asyncio.Task] = set()
+
+    async def submit(self, new_user: dict) -> bool:
+        """Queue a new user and wait for the commit of its batch.
+
+        Args:
+            new_user (dict): Row for `Registration.create_users`.
+
+        Returns:
+            bool: `True` if created, `False` if the email is already taken.
+        """
+        loop = asyncio.get_running_loop()
+        created = loop.create_future()
+        self._pending.append((new_user, created))
+
+        if len(self._pending) >= self._max_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self._max_delay, self._flush)
+
+        return await created
+
+    async def close(self) -> None:
+        """Write queued rows and wait for all running batches."""
+        self._flush()
+        if self._writes:
+            await asyncio.gather(*self._writes, return_exceptions=True)
+
+    def _flush(self) -> None:
+        """Start writing of the queued rows."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+
+        batch, self._pending = self._pending, []
+        task = asyncio.create_task(self._write(batch))
+        self._writes.add(task)
+        task.add_done_callback(self._writes.discard)
+
+    async def _write(self, batch: list[tuple[dict, asyncio.Future]]) -> None:
+        """Write one batch and resolve futures of its callers."""
+        try:
+            results = await self._write_batch([row for row, _ in batch])
+        except Exception as e:
+            for _, created in batch:
+                if not created.done():
+                    created.set_exception(e)
+            return
+
+        for (_, created), result in zip(batch, results):
+            if not created.done():
+                created.set_result(result)
+
+    async def _write_batch(self, rows: list[dict]) -> list[bool]:
+        """Write rows in one transaction, duplicates are not created.
+
+        The first row of an email in the batch wins, the next ones are
+        taken emails. If another worker commits one of the emails in the
+        meantime, the whole statement fails on the unique index and the
+        rows are written one by one to find the loser.
+        """
+        first_by_email: dict[str, int] = {}
+        for index, row in enumerate(rows):
+            first_by_email.setdefault(row["email"].lower(), index)
+        unique_rows = [rows[index] for index in first_by_email.values()]
+
+        try:
+            async with self._session_factory() as session:
+                async with session.begin():
+                    created = await self._crud.registration.create_users(
+                        new_users=unique_rows, session=session
+                    )
+            created_ids = {
+                row["id"] for row, ok in zip(unique_rows, created) if ok
+            }
+        except IntegrityError:
+            created_ids = {
+                row["id"] for row in unique_rows if await self._write_one(row)
+            }
+
+        return [row["id"] in created_ids for row in rows]
+
+    async def _write_one(self, row: dict) -> bool:
+        """Write one row in its own transaction."""
+        try:
+            async with self._session_factory() as session:
+                async with session.begin():
+                    created = await self._crud.registration.create_users(
+                        new_users=[row], session=session
+                    )
+            return created[0]
+        except IntegrityError:
+            return False
+
+
+_batcher: RegistrationBatcher | None = None
+
+
+async def get_registration_batcher(
+    crud: Annotated["Crud", Depends(get_crud)],
+    session_factory: Annotated[
+        "async_sessionmaker[AsyncSession]", Depends(get_session_factory)
+    ],
+) -> RegistrationBatcher | None:
+    """Return batcher of the worker or `None` if batching is disabled.
+
+    A batch is one statement on one database, so there is no batching
+    with shards.
+    """
+    global _batcher
+    if (
+        not settings.registration_batch.REGISTRATION_BATCH_ENABLED
+        or settings.db.get_shard_urls
+    ):
+        return None
+    if _batcher is None:
+        _batcher = RegistrationBatcher(
+            crud=crud,
+            session_factory=session_factory,
+            max_size=settings.registration_batch.REGISTRATION_BATCH_MAX_SIZE,
+            max_delay=settings.registration_batch.max_delay,
+        )
+    return _batcher
+
+
+async def close_registration_batcher() -> None:
+    """Write queued registrations before shutdown."""
+    if _batcher is not None:
+        await _batcher.close()
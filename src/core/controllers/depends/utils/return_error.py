@@ -1,11 +1,17 @@
 """Common Raise HTTPException."""
 
 import uuid
-from typing import Optional
+from datetime import date
+from typing import NoReturn, Optional
 
 from fastapi import HTTPException, status
 
-from src.core.settings.constants import Headers, MessageError
+from src.core.settings.constants import (
+    Headers,
+    Keys,
+    MessageError,
+    Pagination,
+)
 from src.core.validators.error import ErrorMessage
 
 
@@ -36,18 +42,24 @@ def http_exception(
     )
 
 
-def valid_id_or_error_422(id_data: str):
+def valid_id_or_error_422(id_data: str) -> uuid.UUID:
     """Validate the given UUID.
 
     Args:
-        id_data (str): The identifier as a string.
+        id_data (str): The identifier as a string, UUIDv4 or UUIDv7.
+
+    Returns:
+        uuid.UUID: The identifier to bind as native UUID.
 
     Raises:
         HTTPException: If `request_id` is invalid,
         raises HTTP 422 with an error message.
     """
     try:
-        uuid.UUID(id_data, version=4)
+        id_uuid = uuid.UUID(id_data)
+        if id_uuid.version not in Keys.UUID_VERSIONS:
+            raise ValueError
+        return id_uuid
     except ValueError:
         raise http_exception(
             status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
@@ -56,6 +68,55 @@ def valid_id_or_error_422(id_data: str):
         )
 
 
+def valid_fields_or_error_422(fields: str | None) -> frozenset[str]:
+    """Return the requested sparse fieldset.
+
+    Args:
+        fields (str | None): Comma separated field names or None for all.
+
+    Raises:
+        HTTPException: If `fields` has unknown names,
+        raises HTTP 422 with an error message.
+    """
+    if fields is None:
+        return Pagination.FIELDS
+
+    selected = frozenset(
+        field.strip()
+        for field in fields.split(Pagination.FIELDS_SEPARATOR)
+        if field.strip()
+    )
+    if not selected or not selected <= Pagination.FIELDS:
+        raise http_exception(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            error_type=MessageError.INVALID_QUERY_ERR,
+            error_message=MessageError.INVALID_FIELDS_ERR_MESSAGE,
+        )
+    return selected | {Pagination.FIELD_ID}
+
+
+def valid_date_range_or_error_422(
+    since: date, until: date, max_days: int
+) -> None:
+    """Check a range of days.
+
+    Args:
+        since (date): First day.
+        until (date): Last day.
+        max_days (int): Max days in the range.
+
+    Raises:
+        HTTPException: If `until` precedes `since` or the range is longer
+        than `max_days`, raises HTTP 422 with an error message.
+    """
+    if not 0 <= (until - since).days < max_days:
+        raise http_exception(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            error_type=MessageError.INVALID_QUERY_ERR,
+            error_message=MessageError.INVALID_DATE_RANGE_ERR_MESSAGE,
+        )
+
+
 def valid_password_or_error_422(pwd: str, pwd2: str) -> None:
     """Check the given password.
 
@@ -82,7 +143,7 @@ def raise_http_404(
     error_type: str = MessageError.INVALID_ID_ERR,
     error_message: str = MessageError.INVALID_ID_ERR_MESSAGE_404,
     status_code: int = status.HTTP_404_NOT_FOUND,
-):
+) -> NoReturn:
     """Raise an HTTP 404 exception with a specified error message and type.
 
     Args:
@@ -1,14 +1,21 @@
 """Referral routes."""
 
-from typing import Annotated
+from typing import Annotated, AsyncIterator
 
-from fastapi import APIRouter, Depends, status
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Depends, Response, status
+from fastapi.responses import JSONResponse, StreamingResponse
 
 from src.core.controllers.depends.referrals import (
+    export_referrals_by_user_id,
+    get_referral_daily_by_user_id,
+    get_referral_tree_by_user_id,
     get_referrals_by_user_id,
+    referral_code_statuses,
+    referral_count_by_user_id,
     referral_token,
     referral_token_by_email,
+    referrals_by_user_ids,
+    top_referrers,
 )
 from src.core.settings.constants import (
     HTTPResponseGETReferrals,
@@ -17,9 +24,19 @@ from src.core.settings.constants import (
     ResponsesGetRef,
     UserRefRoutes,
 )
+from src.core.validators.leaderboard import ReferralCount, TopReferrers
+from src.core.validators.rollup import UserReferralDaily
 from src.core.validators.status_ok import Status
-from src.core.validators.token import TokenAuth, TokenReferral
-from src.core.validators.user import UserReferrals
+from src.core.validators.token import (
+    ReferralCodeStatuses,
+    TokenAuth,
+    TokenReferral,
+)
+from src.core.validators.user import (
+    UserReferrals,
+    UserReferralsBatch,
+    UserReferralTree,
+)
 
 
 def create_ref_route() -> APIRouter:
@@ -37,7 +54,7 @@ ref: APIRouter = create_ref_route()
     responses=ResponsesAuthUser.responses,
 )
 async def gen_referral(
-    ref_token: Annotated[TokenReferral, Depends(referral_token)]
+    ref_token: Annotated[TokenReferral, Depends(referral_token)],
 ) -> JSONResponse:
     """Generate a new referral token.
 
@@ -61,7 +78,7 @@ async def gen_referral(
     responses=ResponsesAuthUser.responses,
 )
 async def del_referral(
-    successful: Annotated[TokenAuth, Depends(referral_token)]
+    successful: Annotated[TokenAuth, Depends(referral_token)],
 ) -> JSONResponse:
     """Delete an existing referral token.
 
@@ -85,7 +102,7 @@ async def del_referral(
     responses=HTTPResponseGETReferrals.responses,
 )
 async def get_referral_by_email(
-    token: Annotated[TokenReferral, Depends(referral_token_by_email)]
+    token: Annotated[TokenReferral, Depends(referral_token_by_email)],
 ) -> JSONResponse:
     """Get referral token by email.
 
@@ -105,22 +122,217 @@ async def get_referral_by_email(
 @ref.get(
     path=UserRefRoutes.REFERRAL_GET_PATH_BY_ID,
     status_code=status.HTTP_200_OK,
-    response_model=TokenReferral,
+    response_model=UserReferrals,
+    response_model_exclude_none=True,
     responses=ResponsesGetRef.responses,
 )
 async def get_referral_by_user_id(
-    referrals: Annotated[UserReferrals, Depends(get_referrals_by_user_id)]
-) -> JSONResponse:
-    """Get referral token by user id.
+    referrals: Annotated[UserReferrals, Depends(get_referrals_by_user_id)],
+    response: Response,
+) -> Response:
+    """Get one page of referrals by user id.
 
     Args:
         referrals (UserReferrals): referrals clients.
+        response (Response): Response with cache headers of the page.
 
     Returns:
-        JSONResponse: Response containing the referral token.
+        JSONResponse: Response containing the referrals page.
+    """
+    if isinstance(referrals, Response):
+        return referrals
+
+    return JSONResponse(
+        content=referrals.model_dump(exclude_none=True),
+        status_code=status.HTTP_200_OK,
+        media_type=MimeTypes.APPLICATION_JSON,
+        headers=dict(response.headers),
+    )
+
+
+@ref.post(
+    path=UserRefRoutes.REFERRAL_CHECK_PATH,
+    status_code=status.HTTP_200_OK,
+    response_model=ReferralCodeStatuses,
+    response_model_exclude_none=True,
+    responses=ResponsesGetRef.responses,
+)
+async def validate_referral_codes(
+    checked: Annotated[ReferralCodeStatuses, Depends(referral_code_statuses)],
+) -> JSONResponse:
+    """Check many referral codes before showing signup forms.
+
+    Args:
+        checked (ReferralCodeStatuses): Status of every code.
+
+    Returns:
+        JSONResponse: Response containing the statuses.
+    """
+    return JSONResponse(
+        content=checked.model_dump(exclude_none=True),
+        status_code=status.HTTP_200_OK,
+        media_type=MimeTypes.APPLICATION_JSON,
+    )
+
+
+@ref.post(
+    path=UserRefRoutes.REFERRAL_BATCH_PATH,
+    status_code=status.HTTP_200_OK,
+    response_model=UserReferralsBatch,
+    response_model_exclude_none=True,
+    responses=ResponsesGetRef.responses,
+)
+async def get_referrals_batch(
+    batch: Annotated[UserReferralsBatch, Depends(referrals_by_user_ids)],
+) -> JSONResponse:
+    """Get the first page of referrals of many referrers.
+
+    Args:
+        batch (UserReferralsBatch): Pages by user ID and IDs not found.
+
+    Returns:
+        JSONResponse: Response containing the pages.
+    """
+    return JSONResponse(
+        content=batch.model_dump(exclude_none=True),
+        status_code=status.HTTP_200_OK,
+        media_type=MimeTypes.APPLICATION_JSON,
+    )
+
+
+@ref.get(
+    path=UserRefRoutes.REFERRAL_TREE_PATH,
+    status_code=status.HTTP_200_OK,
+    response_model=UserReferralTree,
+    response_model_exclude_none=True,
+    responses=ResponsesGetRef.responses,
+)
+async def get_referral_tree(
+    tree: Annotated[UserReferralTree, Depends(get_referral_tree_by_user_id)],
+    response: Response,
+) -> Response:
+    """Get referrals on several levels by user id.
+
+    Args:
+        tree (UserReferralTree): Level counts and a page of users.
+        response (Response): Response with cache headers of the page.
+
+    Returns:
+        JSONResponse: Response containing the tree page.
+    """
+    if isinstance(tree, Response):
+        return tree
+
+    return JSONResponse(
+        content=tree.model_dump(exclude_none=True),
+        status_code=status.HTTP_200_OK,
+        media_type=MimeTypes.APPLICATION_JSON,
+        headers=dict(response.headers),
+    )
+
+
+@ref.get(
+    path=UserRefRoutes.REFERRAL_DAILY_PATH,
+    status_code=status.HTTP_200_OK,
+    response_model=UserReferralDaily,
+    responses=ResponsesGetRef.responses,
+)
+async def get_referral_daily(
+    daily: Annotated[
+        UserReferralDaily, Depends(get_referral_daily_by_user_id)
+    ],
+    response: Response,
+) -> Response:
+    """Get referrals per day by user id.
+
+    Args:
+        daily (UserReferralDaily): Days of the range with referrals.
+        response (Response): Response with cache headers of the range.
+
+    Returns:
+        JSONResponse: Response containing the days.
+    """
+    if isinstance(daily, Response):
+        return daily
+
+    return JSONResponse(
+        content=daily.model_dump(mode="json"),
+        status_code=status.HTTP_200_OK,
+        media_type=MimeTypes.APPLICATION_JSON,
+        headers=dict(response.headers),
+    )
+
+
+@ref.get(
+    path=UserRefRoutes.REFERRAL_EXPORT_PATH,
+    status_code=status.HTTP_200_OK,
+    response_class=StreamingResponse,
+    responses=ResponsesGetRef.responses,
+)
+async def export_referrals(
+    chunks: Annotated[
+        AsyncIterator[str], Depends(export_referrals_by_user_id)
+    ],
+) -> StreamingResponse:
+    """Export all referrals by user id as NDJSON.
+
+    Args:
+        chunks (AsyncIterator[str]): NDJSON chunks of referrals.
+
+    Returns:
+        StreamingResponse: One `{"id", "name"}` object per line.
+    """
+    return StreamingResponse(
+        content=chunks,
+        status_code=status.HTTP_200_OK,
+        media_type=MimeTypes.APPLICATION_NDJSON,
+    )
+
+
+@ref.get(
+    path=UserRefRoutes.REFERRAL_COUNT_PATH,
+    status_code=status.HTTP_200_OK,
+    response_model=ReferralCount,
+    response_model_exclude_none=True,
+    responses=ResponsesGetRef.responses,
+)
+async def get_referral_count(
+    count: Annotated[ReferralCount, Depends(referral_count_by_user_id)],
+) -> JSONResponse:
+    """Get number of referrals and leaderboard rank by user id.
+
+    Args:
+        count (ReferralCount): Count and rank of the referrer.
+
+    Returns:
+        JSONResponse: Response containing the count.
+    """
+    return JSONResponse(
+        content=count.model_dump(exclude_none=True),
+        status_code=status.HTTP_200_OK,
+        media_type=MimeTypes.APPLICATION_JSON,
+    )
+
+
+@ref.get(
+    path=UserRefRoutes.REFERRAL_TOP_PATH,
+    status_code=status.HTTP_200_OK,
+    response_model=TopReferrers,
+    responses=ResponsesGetRef.responses,
+)
+async def get_top_referrers(
+    top: Annotated[TopReferrers, Depends(top_referrers)],
+) -> JSONResponse:
+    """Get referrers with most referrals.
+
+    Args:
+        top (TopReferrers): Leaderboard of referrers.
+
+    Returns:
+        JSONResponse: Response containing the leaderboard.
     """
     return JSONResponse(
-        content=referrals.model_dump(),
+        content=top.model_dump(),
         status_code=status.HTTP_200_OK,
         media_type=MimeTypes.APPLICATION_JSON,
     )
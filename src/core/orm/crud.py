@@ -1,7 +1,12 @@
 """Core ORM module."""
 
 from src.core.orm.cruds.auth import AuthUsers
+from src.core.orm.cruds.bulk import BulkExport, BulkImport
 from src.core.orm.cruds.refer import Refer
+from src.core.orm.cruds.registration import Registration
+from src.core.orm.cruds.rollup import Rollup
+from src.core.orm.cruds.shards import ShardRebalance, Shards
+from src.core.orm.cruds.summary import ReferralSummary
 from src.core.orm.cruds.user import Users
 
 
@@ -12,6 +17,13 @@ class Crud:
         users (Users): CRUD for user model.
         auth (AuthUsers): CRUD for authentication model.
         refer (Refer): CRUD for referral model.
+        registration (Registration): CRUD for new users in one statement.
+        bulk (BulkImport): CRUD for bulk import through staging tables.
+        export (BulkExport): CRUD for bulk export with COPY TO.
+        shards (Shards): CRUD routed to the shard of a user.
+        rebalance (ShardRebalance): CRUD moving hash ranges of shards.
+        summary (ReferralSummary): CRUD for referral summaries.
+        rollup (Rollup): CRUD for referrals per referrer and day.
     """
 
     def __init__(
@@ -19,6 +31,13 @@ class Crud:
         user_crud: Users,
         auth_crud: AuthUsers,
         refer: Refer,
+        registration: Registration,
+        bulk: BulkImport,
+        export: BulkExport,
+        shards: Shards,
+        rebalance: ShardRebalance,
+        summary: ReferralSummary,
+        rollup: Rollup,
     ) -> None:
         """
         Initialize Crud with CRUD instances.
@@ -27,10 +46,24 @@ class Crud:
             user_crud (Users): User model CRUD instance.
             auth_crud (AuthUsers): Auth model CRUD instance.
             refer (Refer): Referral model CRUD instance.
+            registration (Registration): Registration CRUD instance.
+            bulk (BulkImport): Bulk import CRUD instance.
+            export (BulkExport): Bulk export CRUD instance.
+            shards (Shards): Sharded CRUD instance.
+            rebalance (ShardRebalance): Rebalancing CRUD instance.
+            summary (ReferralSummary): Referral summary CRUD instance.
+            rollup (Rollup): Referral rollup CRUD instance.
         """
         self.users = user_crud
         self.auth = auth_crud
         self.refer = refer
+        self.registration = registration
+        self.bulk = bulk
+        self.export = export
+        self.shards = shards
+        self.rebalance = rebalance
+        self.summary = summary
+        self.rollup = rollup
 
 
 def create_crud_helper() -> Crud:
@@ -43,4 +76,11 @@ def create_crud_helper() -> Crud:
         user_crud=Users(),
         auth_crud=AuthUsers(),
         refer=Refer(),
+        registration=Registration(),
+        bulk=BulkImport(),
+        export=BulkExport(),
+        shards=Shards(),
+        rebalance=ShardRebalance(),
+        summary=ReferralSummary(),
+        rollup=Rollup(),
     )
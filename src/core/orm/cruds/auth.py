@@ -1,6 +1,9 @@
 """Users CRUD methods."""
 
-from sqlalchemy import bindparam, insert, select
+import uuid
+from typing import AsyncIterator
+
+from sqlalchemy import bindparam, func, insert, select
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -12,7 +15,7 @@ class AuthUsers:
 
     @staticmethod
     async def post_new_user(
-        user_id: str,
+        user_id: uuid.UUID,
         session: AsyncSession,
         auth_user: dict,
         table_auth: AuthORM = AuthORM,
@@ -20,7 +23,7 @@ class AuthUsers:
         """Add a new user to the database.
 
         Args:
-            user_id (str): Unique user ID.
+            user_id (uuid.UUID): Unique user ID.
             session (AsyncSession): Database session.
             auth_user (dict): User data for the auth table.
             table_auth (AuthORM): Auth ORM model (default is `AuthORM`).
@@ -34,7 +37,7 @@ class AuthUsers:
         session: AsyncSession,
         auth_user: type[AuthORM] = AuthORM,
     ) -> tuple:
-        """Authenticate a user by email.
+        """Authenticate a user by case-insensitive email.
 
         Args:
             email (str): User email.
@@ -48,10 +51,10 @@ class AuthUsers:
             user: AuthORM = await session.scalar(
                 statement=(
                     select(auth_user).where(
-                        auth_user.email == bindparam("email")
+                        auth_user.email_lower == bindparam("email")
                     )
                 ),
-                params={"email": email},
+                params={"email": email.lower()},
             )
 
             if user:
@@ -69,7 +72,7 @@ class AuthUsers:
         session: AsyncSession,
         auth_user: type[AuthORM] = AuthORM,
     ) -> str | None:
-        """Retrieve user ID by email.
+        """Retrieve user ID by case-insensitive email.
 
         Args:
             email (str): User email.
@@ -81,10 +84,10 @@ class AuthUsers:
         """
         try:
             statement = select(auth_user).where(
-                auth_user.email == bindparam("email")
+                auth_user.email_lower == bindparam("email")
             )
             user: AuthORM = await session.scalar(
-                statement, params={"email": email}
+                statement, params={"email": email.lower()}
             )
 
             return str(user.user_id) if user else None
@@ -92,3 +95,34 @@ class AuthUsers:
         except SQLAlchemyError as e:
             print(f"Error querying user by email: {e}")
             return None
+
+    @staticmethod
+    async def count_emails(
+        session: AsyncSession,
+        auth_user: type[AuthORM] = AuthORM,
+    ) -> int:
+        """Return the number of registered emails."""
+        return await session.scalar(
+            select(func.count()).select_from(auth_user)
+        )
+
+    @staticmethod
+    async def stream_emails(
+        session: AsyncSession,
+        batch_size: int,
+        auth_user: type[AuthORM] = AuthORM,
+    ) -> AsyncIterator[list[str]]:
+        """Yield lowercase emails of all users in batches.
+
+        Args:
+            session (AsyncSession): Database session in a transaction.
+            batch_size (int): Emails per batch.
+            auth_user (AuthORM): Auth ORM model (default is `AuthORM`).
+        """
+        result = await session.stream_scalars(
+            select(auth_user.email_lower).execution_options(
+                yield_per=batch_size
+            )
+        )
+        async for emails in result.partitions():
+            yield list(emails)
@@ -0,0 +1,399 @@
+"""Bulk import and export CRUD methods."""
+
+from datetime import timedelta
+from typing import Awaitable, Callable, Iterable
+
+from sqlalchemy import (
+    UUID,
+    BigInteger,
+    Column,
+    MetaData,
+    String,
+    Table,
+    case,
+    exists,
+    func,
+    literal,
+    or_,
+    select,
+    true,
+)
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.schema import CreateTable
+from sqlalchemy.sql import Select
+
+from src.core.orm.models.auth import AuthORM
+from src.core.orm.models.refer import ReferORM
+from src.core.orm.models.referred import ReferredORM
+from src.core.orm.models.user import UserORM
+from src.core.settings.constants import BulkImportConf, GraphExportConf
+
+staging = MetaData()
+
+staging_users = Table(
+    "import_users",
+    staging,
+    Column("line", BigInteger),
+    Column("id", UUID),
+    Column("name", String),
+    Column("email", String),
+    Column("hashed_password", String),
+    prefixes=["TEMPORARY"],
+    postgresql_on_commit="DROP",
+)
+
+staging_edges = Table(
+    "import_edges",
+    staging,
+    Column("line", BigInteger),
+    Column("id", UUID),
+    Column("referrer_email", String),
+    Column("referred_email", String),
+    prefixes=["TEMPORARY"],
+    postgresql_on_commit="DROP",
+)
+
+
+class BulkImport:
+    """COPY rows into staging tables and merge them set-based.
+
+    Staging tables live until the end of the transaction, so the whole
+    import runs in one `session.begin()`.
+    """
+
+    @staticmethod
+    async def create_staging(session: AsyncSession) -> None:
+        """Create temporary staging tables for users and edges.
+
+        Args:
+            session (AsyncSession): Database session in a transaction.
+        """
+        for table in (staging_users, staging_edges):
+            await session.execute(CreateTable(table))
+
+    @staticmethod
+    async def copy_records(
+        session: AsyncSession,
+        table: Table,
+        records: Iterable[tuple],
+    ) -> None:
+        """Stream records into a staging table with asyncpg COPY.
+
+        Args:
+            session (AsyncSession): Database session in a transaction.
+            table (Table): `staging_users` or `staging_edges`.
+            records (Iterable[tuple]): Rows in the column order of table.
+        """
+        connection = await session.connection()
+        raw_connection = await connection.get_raw_connection()
+        await raw_connection.driver_connection.copy_records_to_table(
+            table.name,
+            records=records,
+            columns=[column.name for column in table.columns],
+        )
+
+    @staticmethod
+    async def merge_users(
+        session: AsyncSession,
+        user_table: type[UserORM] = UserORM,
+        auth_table: type[AuthORM] = AuthORM,
+    ) -> list[tuple[int, str, str]]:
+        """Insert staged users with free emails into users and auth.
+
+        Args:
+            session (AsyncSession): Database session in a transaction.
+            user_table (UserORM): User ORM model (default is `UserORM`).
+            auth_table (AuthORM): Auth ORM model (default is `AuthORM`).
+
+        Returns:
+            list[tuple[int, str, str]]: Rejected `(line, email, reason)`.
+        """
+        ranked = select(
+            staging_users,
+            func.row_number()
+            .over(
+                partition_by=func.lower(staging_users.c.email),
+                order_by=staging_users.c.line,
+            )
+            .label("rank"),
+        ).cte("ranked")
+        fresh = (
+            select(ranked)
+            .where(
+                ranked.c.rank == 1,
+                ~exists().where(
+                    auth_table.email_lower == func.lower(ranked.c.email)
+                ),
+            )
+            .cte("fresh")
+        )
+        new_user = (
+            insert(user_table)
+            .from_select(["id", "name"], select(fresh.c.id, fresh.c.name))
+            .returning(user_table.id)
+            .cte("new_user")
+        )
+        new_auth = (
+            insert(auth_table)
+            .from_select(
+                ["user_id", "hashed_password", "email", "active"],
+                select(
+                    fresh.c.id,
+                    fresh.c.hashed_password,
+                    fresh.c.email,
+                    true(),
+                ).join(new_user, new_user.c.id == fresh.c.id),
+            )
+            .returning(auth_table.user_id)
+            .cte("new_auth")
+        )
+        rejected = await session.execute(
+            select(
+                ranked.c.line,
+                ranked.c.email,
+                case(
+                    (ranked.c.rank > 1, BulkImportConf.REJECT_DUPLICATE_EMAIL),
+                    else_=literal(BulkImportConf.REJECT_EMAIL_TAKEN),
+                ),
+            )
+            .where(~exists().where(new_auth.c.user_id == ranked.c.id))
+            .order_by(ranked.c.line)
+        )
+        return [tuple(row) for row in rejected]
+
+    @staticmethod
+    async def merge_edges(
+        session: AsyncSession,
+        auth_table: type[AuthORM] = AuthORM,
+        refer_table: type[ReferORM] = ReferORM,
+        referred_table: type[ReferredORM] = ReferredORM,
+    ) -> list[tuple[int, str, str]]:
+        """Insert staged referral edges between known emails.
+
+        A referred user gets an edge only if its `refer_referred` row is
+        new, so a user never has two referrers.
+
+        Args:
+            session (AsyncSession): Database session in a transaction.
+            auth_table (AuthORM): Auth ORM model (default is `AuthORM`).
+            refer_table (ReferORM): Referral ORM model (default is `ReferORM`).
+            referred_table (ReferredORM): Referred users ORM model
+                (default is `ReferredORM`).
+
+        Returns:
+            list[tuple[int, str, str]]: Rejected `(line, email, reason)`,
+            where email is the referred user's one.
+        """
+        referrer = auth_table.__table__.alias("referrer")
+        referred = auth_table.__table__.alias("referred")
+        resolved = (
+            select(
+                staging_edges.c.line,
+                staging_edges.c.id,
+                staging_edges.c.referred_email,
+                referrer.c.user_id.label("id_referrer"),
+                referred.c.user_id.label("id_referred"),
+                func.row_number()
+                .over(
+                    partition_by=func.lower(staging_edges.c.referred_email),
+                    order_by=staging_edges.c.line,
+                )
+                .label("rank"),
+            )
+            .outerjoin(
+                referrer,
+                referrer.c.email_lower
+                == func.lower(staging_edges.c.referrer_email),
+            )
+            .outerjoin(
+                referred,
+                referred.c.email_lower
+                == func.lower(staging_edges.c.referred_email),
+            )
+            .cte("resolved")
+        )
+        new_referred = (
+            insert(referred_table)
+            .from_select(
+                ["id_referred"],
+                select(resolved.c.id_referred).where(
+                    resolved.c.rank == 1,
+                    resolved.c.id_referrer.is_not(None),
+                    resolved.c.id_referred.is_not(None),
+                    resolved.c.id_referrer != resolved.c.id_referred,
+                ),
+            )
+            .on_conflict_do_nothing(index_elements=["id_referred"])
+            .returning(referred_table.id_referred)
+            .cte("new_referred")
+        )
+        new_refer = (
+            insert(refer_table)
+            .from_select(
+                ["id", "id_referrer", "id_referred"],
+                select(
+                    resolved.c.id,
+                    resolved.c.id_referrer,
+                    resolved.c.id_referred,
+                ).join(
+                    new_referred,
+                    new_referred.c.id_referred == resolved.c.id_referred,
+                ),
+            )
+            .returning(refer_table.id)
+            .cte("new_refer")
+        )
+        rejected = await session.execute(
+            select(
+                resolved.c.line,
+                resolved.c.referred_email,
+                case(
+                    (
+                        resolved.c.id_referrer.is_(None),
+                        BulkImportConf.REJECT_UNKNOWN_REFERRER,
+                    ),
+                    (
+                        resolved.c.id_referred.is_(None),
+                        BulkImportConf.REJECT_UNKNOWN_REFERRED,
+                    ),
+                    (
+                        resolved.c.id_referrer == resolved.c.id_referred,
+                        BulkImportConf.REJECT_SELF_REFERRAL,
+                    ),
+                    (
+                        resolved.c.rank > 1,
+                        BulkImportConf.REJECT_DUPLICATE_REFERRED,
+                    ),
+                    else_=literal(BulkImportConf.REJECT_HAS_REFERRER),
+                ),
+            )
+            .where(~exists().where(new_refer.c.id == resolved.c.id))
+            .order_by(resolved.c.line)
+        )
+        return [tuple(row) for row in rejected]
+
+    @staticmethod
+    def staged_referrers(auth_table: type[AuthORM] = AuthORM) -> Select:
+        """Return select of known referrers of staged edges."""
+        return (
+            select(auth_table.user_id)
+            .join(
+                staging_edges,
+                auth_table.email_lower
+                == func.lower(staging_edges.c.referrer_email),
+            )
+            .distinct()
+        )
+
+
+class BulkExport:
+    """Read `users` and `refer` with COPY TO for offline analytics.
+
+    Edges are selected by `seq` window `(since, until]`, so an export can
+    continue from the `until` of the previous one.
+    """
+
+    @staticmethod
+    async def get_last_seq(
+        session: AsyncSession,
+        since: int,
+        lag: timedelta,
+        refer_table: type[ReferORM] = ReferORM,
+    ) -> int | None:
+        """Return the upper bound of the next export window.
+
+        `seq` is taken at insert, but a transaction may commit after one
+        with a greater `seq`. Edges younger than `lag` are left for the
+        next export, so a late commit is not skipped.
+
+        Args:
+            session (AsyncSession): Database session.
+            since (int): `seq` of the last exported edge.
+            lag (timedelta): Minimal age of exported edges.
+            refer_table (ReferORM): Referral ORM model (default is `ReferORM`).
+
+        Returns:
+            int | None: Max `seq` to export or None if there are no edges.
+        """
+        result = await session.execute(
+            select(func.max(refer_table.seq)).where(
+                refer_table.seq > since,
+                refer_table.created_at < func.now() - lag,
+            )
+        )
+        return result.scalar()
+
+    @staticmethod
+    def edges_query(
+        since: int,
+        until: int,
+        refer_table: type[ReferORM] = ReferORM,
+    ) -> Select:
+        """Return query of edges in the window ordered by `seq`."""
+        return (
+            select(
+                refer_table.id,
+                refer_table.id_referrer,
+                refer_table.id_referred,
+                refer_table.seq,
+                refer_table.created_at,
+            )
+            .where(refer_table.seq > since, refer_table.seq <= until)
+            .order_by(refer_table.seq)
+        )
+
+    @staticmethod
+    def users_query(
+        since: int,
+        until: int,
+        user_table: type[UserORM] = UserORM,
+        refer_table: type[ReferORM] = ReferORM,
+    ) -> Select:
+        """Return query of users, only ones of the window's edges if `since`.
+
+        A full export (`since` is 0) has all users, also ones without
+        edges. An incremental one has both ends of its edges.
+        """
+        stmt = select(user_table.id, user_table.name)
+        if since == GraphExportConf.FULL_SINCE:
+            return stmt
+        return stmt.where(
+            exists().where(
+                refer_table.seq > since,
+                refer_table.seq <= until,
+                or_(
+                    refer_table.id_referrer == user_table.id,
+                    refer_table.id_referred == user_table.id,
+                ),
+            )
+        )
+
+    @staticmethod
+    async def copy_query(
+        session: AsyncSession,
+        query: Select,
+        output: Callable[[bytes], Awaitable[None]],
+    ) -> str:
+        """Stream result of a query as CSV with header via COPY TO.
+
+        Args:
+            session (AsyncSession): Database session in a transaction.
+            query (Select): Query with integer parameters only.
+            output (Callable): Coroutine that receives CSV chunks.
+
+        Returns:
+            str: Status of COPY, like `COPY 100`.
+        """
+        sql = str(
+            query.compile(
+                dialect=postgresql.dialect(),
+                compile_kwargs={"literal_binds": True},
+            )
+        )
+        connection = await session.connection()
+        raw_connection = await connection.get_raw_connection()
+        return await raw_connection.driver_connection.copy_from_query(
+            sql, output=output, format="csv", header=True
+        )
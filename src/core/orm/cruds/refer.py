@@ -1,12 +1,32 @@
 """Refer CRUD methods."""
 
 import uuid
+from datetime import datetime
 
-from sqlalchemy import Sequence, insert, select
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
+from sqlalchemy import (
+    CTE,
+    Integer,
+    Row,
+    Sequence,
+    Uuid,
+    all_,
+    any_,
+    bindparam,
+    func,
+    insert,
+    literal_column,
+    select,
+    true,
+)
+from sqlalchemy.dialects.postgresql import ARRAY, array
+from sqlalchemy.ext.asyncio import AsyncResult, AsyncSession
+from sqlalchemy.orm import aliased
 
+from src.core.orm.cruds.summary import ReferralSummary
 from src.core.orm.models.refer import ReferORM
+from src.core.orm.models.referred import ReferredORM
+from src.core.orm.models.user import UserORM
+from src.core.orm.uuid7 import uuid7
 
 
 class Refer:
@@ -14,55 +34,416 @@ class Refer:
 
     @staticmethod
     async def create_new_referral(
-        id_referrer: str,
-        id_referred: str,
+        id_referrer: uuid.UUID,
+        id_referred: uuid.UUID,
         session: AsyncSession,
         refer_table: type[ReferORM] = ReferORM,
+        referred_table: type[ReferredORM] = ReferredORM,
     ) -> bool:
         """Add a new referral record.
 
         Args:
-            id_referrer (str): Referrer's user ID.
-            id_referred (str): Referred user's ID.
+            id_referrer (uuid.UUID): Referrer's user ID.
+            id_referred (uuid.UUID): Referred user's ID.
             session (AsyncSession): Database session.
             refer_table (ReferORM): Referral ORM model (default is `ReferORM`).
+            referred_table (ReferredORM): Referred users ORM model
+                (default is `ReferredORM`).
 
         Returns:
             bool: `True` if creation is successful.
+
+        Raises:
+            IntegrityError: If the referred user already has a referrer.
         """
-        stmt = insert(refer_table).values(
-            id=uuid.uuid4().hex,
-            id_referrer=id_referrer,
-            id_referred=id_referred,
+        await session.execute(
+            insert(referred_table).values(id_referred=id_referred)
+        )
+        await Refer.add_edge(
+            id_referrer=id_referrer, id_referred=id_referred, session=session
         )
-
-        await session.execute(stmt)
         return True
 
+    @staticmethod
+    async def add_edge(
+        id_referrer: uuid.UUID,
+        id_referred: uuid.UUID,
+        session: AsyncSession,
+        refer_table: type[ReferORM] = ReferORM,
+        user_table: type[UserORM] = UserORM,
+    ) -> None:
+        """Insert a referral edge and update the summary of the referrer.
+
+        Both are one statement, the `refer_referred` row is the caller's.
+
+        Args:
+            id_referrer (uuid.UUID): Referrer's user ID.
+            id_referred (uuid.UUID): Referred user's ID.
+            session (AsyncSession): Database session.
+            refer_table (ReferORM): Referral ORM model (default is `ReferORM`).
+            user_table (UserORM): User ORM model (default is `UserORM`).
+        """
+        new_refer = (
+            insert(refer_table)
+            .values(
+                id=uuid7(),
+                id_referrer=id_referrer,
+                id_referred=id_referred,
+            )
+            .returning(
+                refer_table.id_referrer,
+                refer_table.id_referred,
+                refer_table.seq,
+                refer_table.created_at,
+            )
+            .cte("new_refer")
+        )
+        new_summary = ReferralSummary.add_edges(
+            edges=select(
+                new_refer.c.id_referrer,
+                new_refer.c.id_referred,
+                user_table.name,
+                new_refer.c.seq,
+                new_refer.c.created_at,
+            ).outerjoin(user_table, user_table.id == new_refer.c.id_referred)
+        ).cte("new_summary")
+        await session.execute(select(func.count()).select_from(new_summary))
+
     @staticmethod
     async def get_referrals_by_user_id(
         session: AsyncSession,
-        user_id: str,
+        user_id: uuid.UUID,
+        limit: int,
+        after: int | None = None,
+        with_names: bool = True,
         refer_table: type[ReferORM] = ReferORM,
-    ) -> Sequence[ReferORM]:
-        """Fetch referrals by user ID.
+        user_table: type[UserORM] = UserORM,
+    ) -> Sequence[Row]:
+        """Fetch one page of referrals by user ID.
+
+        Rows are ordered by `seq`, so a page is a range scan of the
+        `(id_referrer, seq)` index. Without names the users table is not
+        joined at all. With shards the name of a referred user on another
+        shard is `None`.
 
         Args:
             session (AsyncSession): Database session.
-            user_id (str): Referrer's user ID.
+            user_id (uuid.UUID): Referrer's user ID.
+            limit (int): Max rows of the page.
+            after (int | None): Last `seq` seen by the client.
+            with_names (bool): Join names of referred users and referrer.
             refer_table (ReferORM): Referral ORM model (default is `ReferORM`).
+            user_table (UserORM): User ORM model (default is `UserORM`).
 
         Returns:
-            Sequence[ReferORM]: List of referral records.
+            Sequence[Row]: Rows `(id_referred, seq[, name, referrer_name])`.
         """
-        stmt = (
-            select(refer_table)
+        if with_names:
+            referrer = aliased(user_table)
+            referrer_name = (
+                select(referrer.name)
+                .where(referrer.id == user_id)
+                .scalar_subquery()
+            )
+            stmt = select(
+                refer_table.id_referred,
+                refer_table.seq,
+                user_table.name,
+                referrer_name.label("referrer_name"),
+            ).outerjoin(user_table, user_table.id == refer_table.id_referred)
+        else:
+            stmt = select(refer_table.id_referred, refer_table.seq)
+
+        stmt = stmt.where(refer_table.id_referrer == user_id)
+        if after is not None:
+            stmt = stmt.where(refer_table.seq > after)
+
+        referrals = await session.execute(
+            stmt.order_by(refer_table.seq).limit(limit)
+        )
+        return referrals.all()
+
+    @staticmethod
+    async def get_first_pages(
+        session: AsyncSession,
+        user_ids: list[uuid.UUID],
+        limit: int,
+        refer_table: type[ReferORM] = ReferORM,
+        user_table: type[UserORM] = UserORM,
+    ) -> Sequence[Row]:
+        """Fetch the first page of referrals of many referrers at once.
+
+        Referrers are found by `id = ANY(:user_ids)`, a LATERAL subquery
+        takes `limit` edges of each of them from the `(id_referrer, seq)`
+        index, so a popular referrer costs no more than its page.
+
+        Args:
+            session (AsyncSession): Database session.
+            user_ids (list[uuid.UUID]): Referrers' user IDs.
+            limit (int): Max referrals per referrer.
+            refer_table (ReferORM): Referral ORM model (default is `ReferORM`).
+            user_table (UserORM): User ORM model (default is `UserORM`).
+
+        Returns:
+            Sequence[Row]: Rows `(id_referrer, referrer_name, id_referred,
+            seq, name)` ordered by referrer and `seq`.
+        """
+        ids = bindparam("user_ids", value=user_ids, type_=ARRAY(Uuid))
+        referrer = aliased(user_table)
+        page = (
+            select(refer_table.id_referred, refer_table.seq)
+            .where(refer_table.id_referrer == referrer.id)
+            .order_by(refer_table.seq)
+            .limit(limit)
+            .lateral("page")
+        )
+        referrals = await session.execute(
+            select(
+                referrer.id.label("id_referrer"),
+                referrer.name.label("referrer_name"),
+                page.c.id_referred,
+                page.c.seq,
+                user_table.name,
+            )
+            .select_from(referrer)
+            .join(page, true())
+            .outerjoin(user_table, user_table.id == page.c.id_referred)
+            .where(referrer.id == any_(ids))
+            .order_by(referrer.id, page.c.seq)
+        )
+        return referrals.all()
+
+    @staticmethod
+    def tree(
+        user_id: uuid.UUID,
+        depth: int,
+        refer_table: type[ReferORM] = ReferORM,
+    ) -> CTE:
+        """Return recursive CTE of edges under a user up to `depth` levels.
+
+        Columns are `id_referrer`, `id_referred`, `seq` and `level` from
+        1 for direct referrals. `path` keeps users of the branch, an edge
+        back to one of them is not followed, so a cycle made by a bulk
+        import does not loop.
+
+        Args:
+            user_id (uuid.UUID): Root user ID.
+            depth (int): Max level.
+            refer_table (ReferORM): Referral ORM model (default is `ReferORM`).
+
+        Returns:
+            CTE: Edges of the tree.
+        """
+        tree = (
+            select(
+                refer_table.id_referrer,
+                refer_table.id_referred,
+                refer_table.seq,
+                literal_column("1", Integer).label("level"),
+                array(
+                    [refer_table.id_referrer, refer_table.id_referred]
+                ).label("path"),
+            )
             .where(refer_table.id_referrer == user_id)
-            .options(
-                selectinload(refer_table.referred_user),
-                selectinload(refer_table.referrer),
+            .cte("tree", recursive=True)
+        )
+        return tree.union_all(
+            select(
+                refer_table.id_referrer,
+                refer_table.id_referred,
+                refer_table.seq,
+                tree.c.level + 1,
+                func.array_append(tree.c.path, refer_table.id_referred),
+            )
+            .join(tree, refer_table.id_referrer == tree.c.id_referred)
+            .where(
+                tree.c.level < depth,
+                refer_table.id_referred != all_(tree.c.path),
+            )
+        )
+
+    @staticmethod
+    async def get_tree_levels(
+        session: AsyncSession,
+        user_id: uuid.UUID,
+        depth: int,
+    ) -> list[int]:
+        """Count referrals on every level under a user.
+
+        Args:
+            session (AsyncSession): Database session.
+            user_id (uuid.UUID): Root user ID.
+            depth (int): Max level.
+
+        Returns:
+            list[int]: Counts of levels 1..`depth` without empty levels
+            at the end, empty without referrals.
+        """
+        tree = Refer.tree(user_id=user_id, depth=depth)
+        rows = await session.execute(
+            select(tree.c.level, func.count()).group_by(tree.c.level)
+        )
+        counts = dict(rows.all())
+        return [
+            counts.get(level, 0)
+            for level in range(1, max(counts, default=0) + 1)
+        ]
+
+    @staticmethod
+    async def get_tree_page(
+        session: AsyncSession,
+        user_id: uuid.UUID,
+        depth: int,
+        limit: int,
+        after: int | None = None,
+        user_table: type[UserORM] = UserORM,
+    ) -> Sequence[Row]:
+        """Fetch one page of users under a user up to `depth` levels.
+
+        Rows are ordered by `seq` of their edge: a user joins after its
+        referrer, so referrers come before their referrals.
+
+        Args:
+            session (AsyncSession): Database session.
+            user_id (uuid.UUID): Root user ID.
+            depth (int): Max level.
+            limit (int): Max rows of the page.
+            after (int | None): Last `seq` seen by the client.
+            user_table (UserORM): User ORM model (default is `UserORM`).
+
+        Returns:
+            Sequence[Row]: Rows `(id_referrer, id_referred, level, seq,
+            name)`. With shards the name of a user on another shard is
+            `None`.
+        """
+        tree = Refer.tree(user_id=user_id, depth=depth)
+        stmt = select(
+            tree.c.id_referrer,
+            tree.c.id_referred,
+            tree.c.level,
+            tree.c.seq,
+            user_table.name,
+        ).outerjoin(user_table, user_table.id == tree.c.id_referred)
+        if after is not None:
+            stmt = stmt.where(tree.c.seq > after)
+        rows = await session.execute(stmt.order_by(tree.c.seq).limit(limit))
+        return rows.all()
+
+    @staticmethod
+    async def get_ancestors(
+        session: AsyncSession,
+        user_id: uuid.UUID,
+        depth: int,
+        refer_table: type[ReferORM] = ReferORM,
+    ) -> list[uuid.UUID]:
+        """Fetch referrers above a user up to `depth` levels.
+
+        Args:
+            session (AsyncSession): Database session.
+            user_id (uuid.UUID): User ID.
+            depth (int): Max level.
+            refer_table (ReferORM): Referral ORM model (default is `ReferORM`).
+
+        Returns:
+            list[uuid.UUID]: Referrer first, then its referrer and so on.
+        """
+        up = (
+            select(
+                refer_table.id_referrer,
+                literal_column("1", Integer).label("level"),
             )
+            .where(refer_table.id_referred == user_id)
+            .cte("up", recursive=True)
+        )
+        up = up.union_all(
+            select(refer_table.id_referrer, up.c.level + 1)
+            .join(up, refer_table.id_referred == up.c.id_referrer)
+            .where(up.c.level < depth, refer_table.id_referrer != user_id)
+        )
+        rows = await session.scalars(
+            select(up.c.id_referrer).order_by(up.c.level)
+        )
+        return list(rows.all())
+
+    @staticmethod
+    async def get_last_referral(
+        session: AsyncSession,
+        user_id: uuid.UUID,
+        before: datetime | None = None,
+        refer_table: type[ReferORM] = ReferORM,
+    ) -> Row | None:
+        """Fetch `seq` and `created_at` of the newest referral by user ID.
+
+        One backward probe of the `(id_referrer, seq)` index; with
+        `before` the probe also skips the younger referrals.
+
+        Args:
+            session (AsyncSession): Database session.
+            user_id (uuid.UUID): Referrer's user ID.
+            before (datetime | None): Only referrals created before it.
+            refer_table (ReferORM): Referral ORM model (default is `ReferORM`).
+
+        Returns:
+            Row | None: Row `(seq, created_at)` or `None` without referrals.
+        """
+        stmt = select(refer_table.seq, refer_table.created_at).where(
+            refer_table.id_referrer == user_id
         )
+        if before is not None:
+            stmt = stmt.where(refer_table.created_at < before)
+        stmt = stmt.order_by(refer_table.seq.desc()).limit(1)
+        last = await session.execute(stmt)
+        return last.first()
+
+    @staticmethod
+    async def stream_referrals_by_user_id(
+        session: AsyncSession,
+        user_id: uuid.UUID,
+        chunk_size: int,
+        refer_table: type[ReferORM] = ReferORM,
+        user_table: type[UserORM] = UserORM,
+    ) -> AsyncResult:
+        """Stream all referrals by user ID through a server-side cursor.
+
+        Args:
+            session (AsyncSession): Database session.
+            user_id (uuid.UUID): Referrer's user ID.
+            chunk_size (int): Rows fetched from the cursor at once.
+            refer_table (ReferORM): Referral ORM model (default is `ReferORM`).
+            user_table (UserORM): User ORM model (default is `UserORM`).
 
-        referrals = await session.execute(stmt)
-        return referrals.scalars().all()
+        Returns:
+            AsyncResult: Rows `(id_referred, name)`, read by partitions.
+            With shards the name of a user on another shard is `None`.
+        """
+        stmt = (
+            select(refer_table.id_referred, user_table.name)
+            .outerjoin(user_table, user_table.id == refer_table.id_referred)
+            .where(refer_table.id_referrer == user_id)
+            .order_by(refer_table.seq)
+            .execution_options(yield_per=chunk_size)
+        )
+        return await session.stream(stmt)
+
+    @staticmethod
+    async def stream_referral_counts(
+        session: AsyncSession,
+        chunk_size: int,
+        refer_table: type[ReferORM] = ReferORM,
+    ) -> AsyncResult:
+        """Stream the number of referrals of every referrer.
+
+        Args:
+            session (AsyncSession): Database session.
+            chunk_size (int): Rows fetched from the cursor at once.
+            refer_table (ReferORM): Referral ORM model (default is `ReferORM`).
+
+        Returns:
+            AsyncResult: Rows `(id_referrer, count)`, read by partitions.
+        """
+        stmt = (
+            select(refer_table.id_referrer, func.count())
+            .group_by(refer_table.id_referrer)
+            .execution_options(yield_per=chunk_size)
+        )
+        return await session.stream(stmt)
@@ -0,0 +1,210 @@
+"""Registration CRUD methods."""
+
+import uuid
+
+from sqlalchemy import (
+    UUID,
+    String,
+    cast,
+    column,
+    exists,
+    func,
+    insert,
+    select,
+    true,
+    values,
+)
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.core.orm.cruds.summary import ReferralSummary
+from src.core.orm.models.auth import AuthORM
+from src.core.orm.models.refer import ReferORM
+from src.core.orm.models.referred import ReferredORM
+from src.core.orm.models.user import UserORM
+from src.core.orm.uuid7 import uuid7
+
+
+class Registration:
+    """Write new users to users, auth and refer in one statement."""
+
+    @staticmethod
+    async def create_user(
+        id_user: uuid.UUID,
+        user_name: str,
+        auth_user: dict,
+        session: AsyncSession,
+        id_referrer: uuid.UUID | None = None,
+    ) -> bool:
+        """Add a new user with auth data and optional referral edge.
+
+        Args:
+            id_user (uuid.UUID): New user ID.
+            user_name (str): Name of the user.
+            auth_user (dict): `hashed_password` and `email`.
+            session (AsyncSession): Active database session.
+            id_referrer (uuid.UUID | None): Referrer's user ID.
+
+        Returns:
+            bool: `True` if created, `False` if the email is already taken.
+
+        Raises:
+            IntegrityError: If the same email is registered concurrently.
+        """
+        created = await Registration.create_users(
+            new_users=[
+                dict(
+                    id=id_user,
+                    name=user_name,
+                    hashed_password=auth_user["hashed_password"],
+                    email=auth_user["email"],
+                    id_referrer=id_referrer,
+                )
+            ],
+            session=session,
+        )
+        return created[0]
+
+    @staticmethod
+    async def create_users(
+        new_users: list[dict],
+        session: AsyncSession,
+        user_table: type[UserORM] = UserORM,
+        auth_table: type[AuthORM] = AuthORM,
+        refer_table: type[ReferORM] = ReferORM,
+        referred_table: type[ReferredORM] = ReferredORM,
+    ) -> list[bool]:
+        """Add new users with auth data and optional referral edges.
+
+        All inserts are data-modifying CTEs of one statement over a
+        multi-row VALUES list, so the database is reached once for the
+        whole list. A users row is inserted only if its email is free,
+        the auth, refer and refer_referred rows follow the users row,
+        the referral summary follows the refer rows.
+
+        Args:
+            new_users (list[dict]): Rows with `id`, `name`,
+                `hashed_password`, `email` and `id_referrer` (or `None`).
+                Emails must be unique inside the list.
+            session (AsyncSession): Active database session.
+            user_table (UserORM): User ORM model (default is `UserORM`).
+            auth_table (AuthORM): Auth ORM model (default is `AuthORM`).
+            refer_table (ReferORM): Referral ORM model (default is `ReferORM`).
+            referred_table (ReferredORM): Referred users ORM model
+                (default is `ReferredORM`).
+
+        Returns:
+            list[bool]: Per row `True` if created, `False` if the email
+            is already taken.
+
+        Raises:
+            IntegrityError: If one of the emails is registered concurrently.
+        """
+        new_rows = (
+            select(
+                values(
+                    column("id", UUID),
+                    column("name", String),
+                    column("hashed_password", String),
+                    column("email", String),
+                    column("id_referrer", UUID),
+                    column("id_refer", UUID),
+                    name="input",
+                ).data(
+                    [
+                        (
+                            row["id"],
+                            row["name"],
+                            row["hashed_password"],
+                            row["email"],
+                            row["id_referrer"],
+                            uuid7(),
+                        )
+                        for row in new_users
+                    ]
+                )
+            )
+        ).cte("new_rows")
+
+        new_user = (
+            insert(user_table)
+            .from_select(
+                ["id", "name"],
+                select(new_rows.c.id, new_rows.c.name).where(
+                    ~exists().where(
+                        auth_table.email_lower == func.lower(new_rows.c.email)
+                    )
+                ),
+            )
+            .returning(user_table.id)
+            .cte("new_user")
+        )
+        new_auth = (
+            insert(auth_table)
+            .from_select(
+                ["user_id", "hashed_password", "email", "active"],
+                select(
+                    new_rows.c.id,
+                    new_rows.c.hashed_password,
+                    new_rows.c.email,
+                    true(),
+                ).join(new_user, new_user.c.id == new_rows.c.id),
+            )
+            .returning(auth_table.user_id)
+            .cte("new_auth")
+        )
+        new_refer = (
+            insert(refer_table)
+            .from_select(
+                ["id", "id_referrer", "id_referred"],
+                select(
+                    new_rows.c.id_refer,
+                    # NULL of VALUES is text if no row has a referrer
+                    cast(new_rows.c.id_referrer, UUID),
+                    new_auth.c.user_id,
+                )
+                .join(new_auth, new_auth.c.user_id == new_rows.c.id)
+                .where(new_rows.c.id_referrer.is_not(None)),
+            )
+            .returning(
+                refer_table.id_referrer,
+                refer_table.id_referred,
+                refer_table.seq,
+                refer_table.created_at,
+            )
+            .cte("new_refer")
+        )
+        new_referred = (
+            insert(referred_table)
+            .from_select(
+                ["id_referred"],
+                select(new_refer.c.id_referred),
+            )
+            .returning(referred_table.id_referred)
+            .cte("new_referred")
+        )
+
+        new_summary = ReferralSummary.add_edges(
+            edges=select(
+                new_refer.c.id_referrer,
+                new_refer.c.id_referred,
+                new_rows.c.name,
+                new_refer.c.seq,
+                new_refer.c.created_at,
+            ).join(new_rows, new_rows.c.id == new_refer.c.id_referred)
+        ).cte("new_summary")
+
+        result = await session.execute(
+            select(
+                new_auth.c.user_id,
+                select(func.count())
+                .select_from(new_referred)
+                .scalar_subquery()
+                .label("referred"),
+                select(func.count())
+                .select_from(new_summary)
+                .scalar_subquery()
+                .label("summaries"),
+            )
+        )
+        created = {row.user_id for row in result}
+        return [row["id"] in created for row in new_users]
@@ -0,0 +1,196 @@
+"""Referral rollup CRUD methods."""
+
+import uuid
+from datetime import date, timedelta
+from typing import Iterable
+
+from sqlalchemy import Date, Row, Sequence, cast, delete, func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.core.orm.models.refer import ReferORM
+from src.core.orm.models.rollup import ReferralDailyORM, RollupWatermarkORM
+from src.core.settings.constants import RollupConf
+
+
+class Rollup:
+    """Referrals per referrer and UTC day, folded from new edges.
+
+    The watermark is the `seq` of the last folded edge. It is locked and
+    moved in the transaction that adds the counts, so concurrent runs
+    wait for each other and no edge is counted twice.
+    """
+
+    @staticmethod
+    async def lock_watermark(
+        session: AsyncSession,
+        rollup: str = RollupConf.NAME,
+        watermark_table: type[RollupWatermarkORM] = RollupWatermarkORM,
+    ) -> int:
+        """Return the watermark of a rollup, locked till the commit.
+
+        Args:
+            session (AsyncSession): Database session in a transaction.
+            rollup (str): Name of the rollup.
+            watermark_table (RollupWatermarkORM): Watermark ORM model
+                (default is `RollupWatermarkORM`).
+
+        Returns:
+            int: `seq` of the last folded edge, 0 before the first run.
+        """
+        await session.execute(
+            pg_insert(watermark_table)
+            .values(rollup=rollup, last_seq=RollupConf.FULL_SINCE)
+            .on_conflict_do_nothing()
+        )
+        return await session.scalar(
+            select(watermark_table.last_seq)
+            .where(watermark_table.rollup == rollup)
+            .with_for_update()
+        )
+
+    @staticmethod
+    async def set_watermark(
+        session: AsyncSession,
+        last_seq: int,
+        rollup: str = RollupConf.NAME,
+        watermark_table: type[RollupWatermarkORM] = RollupWatermarkORM,
+    ) -> None:
+        """Move the watermark of a rollup.
+
+        Args:
+            session (AsyncSession): Database session in a transaction.
+            last_seq (int): `seq` of the last folded edge.
+            rollup (str): Name of the rollup.
+            watermark_table (RollupWatermarkORM): Watermark ORM model
+                (default is `RollupWatermarkORM`).
+        """
+        stmt = pg_insert(watermark_table).values(
+            rollup=rollup, last_seq=last_seq
+        )
+        await session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[watermark_table.rollup],
+                set_=dict(last_seq=stmt.excluded.last_seq),
+            )
+        )
+
+    @staticmethod
+    async def aggregate(
+        session: AsyncSession,
+        batch_size: int = RollupConf.BATCH,
+        lag: timedelta = timedelta(seconds=RollupConf.LAG_SECONDS),
+        refer_table: type[ReferORM] = ReferORM,
+        daily_table: type[ReferralDailyORM] = ReferralDailyORM,
+    ) -> tuple[int, int] | None:
+        """Fold up to `batch_size` edges after the watermark into days.
+
+        Edges younger than `lag` are left for the next run: `seq` is
+        taken at insert, a transaction may commit after one with a
+        greater `seq`. The edges are a range scan of `ix_refer_seq`.
+
+        Args:
+            session (AsyncSession): Database session in a transaction.
+            batch_size (int): Max edges of the run.
+            lag (timedelta): Minimal age of folded edges.
+            refer_table (ReferORM): Referral ORM model (default is `ReferORM`).
+            daily_table (ReferralDailyORM): Rollup ORM model
+                (default is `ReferralDailyORM`).
+
+        Returns:
+            tuple[int, int] | None: Old and new watermark, None if there
+            is nothing new.
+        """
+        since = await Rollup.lock_watermark(session=session)
+        window = (
+            select(refer_table.seq)
+            .where(
+                refer_table.seq > since,
+                refer_table.created_at < func.now() - lag,
+            )
+            .order_by(refer_table.seq)
+            .limit(batch_size)
+            .subquery()
+        )
+        until = await session.scalar(select(func.max(window.c.seq)))
+        if until is None:
+            return None
+
+        day = cast(
+            func.timezone(RollupConf.TIMEZONE, refer_table.created_at), Date
+        )
+        stmt = pg_insert(daily_table).from_select(
+            ["id_referrer", "day", "count"],
+            select(refer_table.id_referrer, day, func.count())
+            .where(refer_table.seq > since, refer_table.seq <= until)
+            .group_by(refer_table.id_referrer, day),
+        )
+        await session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[daily_table.id_referrer, daily_table.day],
+                set_=dict(count=daily_table.count + stmt.excluded.count),
+            )
+        )
+        await Rollup.set_watermark(session=session, last_seq=until)
+        return since, until
+
+    @staticmethod
+    async def get_daily(
+        session: AsyncSession,
+        user_id: uuid.UUID,
+        since: date,
+        until: date,
+        daily_table: type[ReferralDailyORM] = ReferralDailyORM,
+    ) -> Sequence[Row]:
+        """Fetch referrals of a referrer per day in `[since, until]`.
+
+        Args:
+            session (AsyncSession): Database session.
+            user_id (uuid.UUID): Referrer's user ID.
+            since (date): First day.
+            until (date): Last day.
+            daily_table (ReferralDailyORM): Rollup ORM model
+                (default is `ReferralDailyORM`).
+
+        Returns:
+            Sequence[Row]: Rows `(day, count)` of days with referrals.
+        """
+        rows = await session.execute(
+            select(daily_table.day, daily_table.count)
+            .where(
+                daily_table.id_referrer == user_id,
+                daily_table.day.between(since, until),
+            )
+            .order_by(daily_table.day)
+        )
+        return rows.all()
+
+    @staticmethod
+    async def replace_history(
+        session: AsyncSession,
+        records: Iterable[tuple[uuid.UUID, date, int]],
+        last_seq: int,
+        daily_table: type[ReferralDailyORM] = ReferralDailyORM,
+    ) -> None:
+        """Replace the rollup with counts computed outside the database.
+
+        Rows are streamed by asyncpg COPY and the watermark is set to
+        `last_seq`, so the aggregator continues after them.
+
+        Args:
+            session (AsyncSession): Database session in a transaction.
+            records (Iterable[tuple]): Rows `(id_referrer, day, count)`.
+            last_seq (int): `seq` of the last counted edge.
+            daily_table (ReferralDailyORM): Rollup ORM model
+                (default is `ReferralDailyORM`).
+        """
+        await Rollup.lock_watermark(session=session)
+        await session.execute(delete(daily_table))
+        connection = await session.connection()
+        raw_connection = await connection.get_raw_connection()
+        await raw_connection.driver_connection.copy_records_to_table(
+            daily_table.__tablename__,
+            records=records,
+            columns=["id_referrer", "day", "count"],
+        )
+        await Rollup.set_watermark(session=session, last_seq=last_seq)
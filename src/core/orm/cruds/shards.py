@@ -0,0 +1,619 @@
+"""Sharded CRUD methods, every query goes to the owning shard."""
+
+import asyncio
+import uuid
+from collections import defaultdict
+from typing import TYPE_CHECKING, AsyncIterator, Callable
+
+from sqlalchemy import (
+    ColumnElement,
+    delete,
+    func,
+    insert,
+    or_,
+    select,
+    text,
+)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from src.core.orm.cruds.auth import AuthUsers
+from src.core.orm.cruds.refer import Refer
+from src.core.orm.cruds.registration import Registration
+from src.core.orm.cruds.summary import ReferralSummary
+from src.core.orm.cruds.user import Users
+from src.core.orm.models.auth import AuthORM
+from src.core.orm.models.directory import EmailDirectoryORM
+from src.core.orm.models.refer import ReferORM
+from src.core.orm.models.referred import ReferredORM
+from src.core.orm.models.summary import ReferralSummaryORM
+from src.core.orm.models.user import UserORM
+from src.core.orm.shards import hash_sql
+from src.core.settings.constants import ShardConf
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+    from src.core.orm.shards import ShardRouter
+
+
+class Shards:
+    """CRUD operations over shards keyed by user ID.
+
+    Users, their auth rows and `refer_referred` rows live on the shard of
+    the user, referral edges on the shard of the referrer, emails in
+    `email_directory` on the primary. Every method opens its own
+    sessions, one transaction per shard.
+
+    A user and its referrer are on one shard only by chance, so a walk
+    of the graph over more than one edge, as `get_tree` and
+    `get_ancestors`, reads every hop from the shard it is on.
+    """
+
+    @staticmethod
+    async def claim_email(
+        router: "ShardRouter",
+        email: str,
+        user_id: uuid.UUID,
+        directory_table: type[EmailDirectoryORM] = EmailDirectoryORM,
+    ) -> bool:
+        """Reserve an email for a user in the directory.
+
+        Args:
+            router (ShardRouter): Shards.
+            email (str): User email.
+            user_id (uuid.UUID): New user ID.
+            directory_table (EmailDirectoryORM): Directory ORM model
+                (default is `EmailDirectoryORM`).
+
+        Returns:
+            bool: `True` if reserved, `False` if the email is taken.
+        """
+        session_factory = router.session_factory(ShardConf.PRIMARY)
+        async with session_factory() as session, session.begin():
+            claimed = await session.scalar(
+                pg_insert(directory_table)
+                .values(email_lower=email.lower(), user_id=user_id)
+                .on_conflict_do_nothing()
+                .returning(directory_table.user_id)
+            )
+        return claimed is not None
+
+    @staticmethod
+    async def release_email(
+        router: "ShardRouter",
+        email: str,
+        user_id: uuid.UUID,
+        directory_table: type[EmailDirectoryORM] = EmailDirectoryORM,
+    ) -> None:
+        """Drop an email reserved by `claim_email` for a user."""
+        session_factory = router.session_factory(ShardConf.PRIMARY)
+        async with session_factory() as session, session.begin():
+            await session.execute(
+                delete(directory_table).where(
+                    directory_table.email_lower == email.lower(),
+                    directory_table.user_id == user_id,
+                )
+            )
+
+    @staticmethod
+    async def get_user_id_by(
+        router: "ShardRouter",
+        email: str,
+        directory_table: type[EmailDirectoryORM] = EmailDirectoryORM,
+    ) -> str | None:
+        """Retrieve user ID by case-insensitive email from the directory.
+
+        Args:
+            router (ShardRouter): Shards.
+            email (str): User email.
+            directory_table (EmailDirectoryORM): Directory ORM model
+                (default is `EmailDirectoryORM`).
+
+        Returns:
+            str | None: User ID if found, else `None`.
+        """
+        session_factory = router.session_factory(ShardConf.PRIMARY)
+        async with session_factory() as session:
+            user_id = await session.scalar(
+                select(directory_table.user_id).where(
+                    directory_table.email_lower == email.lower()
+                )
+            )
+        return str(user_id) if user_id else None
+
+    @staticmethod
+    async def count_emails(
+        router: "ShardRouter",
+        directory_table: type[EmailDirectoryORM] = EmailDirectoryORM,
+    ) -> int:
+        """Return the number of emails in the directory."""
+        session_factory = router.session_factory(ShardConf.PRIMARY)
+        async with session_factory() as session:
+            return await session.scalar(
+                select(func.count()).select_from(directory_table)
+            )
+
+    @staticmethod
+    async def stream_emails(
+        router: "ShardRouter",
+        batch_size: int,
+        directory_table: type[EmailDirectoryORM] = EmailDirectoryORM,
+    ) -> AsyncIterator[list[str]]:
+        """Yield emails of the directory in batches, one transaction."""
+        session_factory = router.session_factory(ShardConf.PRIMARY)
+        async with session_factory() as session, session.begin():
+            result = await session.stream_scalars(
+                select(directory_table.email_lower).execution_options(
+                    yield_per=batch_size
+                )
+            )
+            async for emails in result.partitions():
+                yield list(emails)
+
+    @staticmethod
+    async def login_user(router: "ShardRouter", email: str) -> tuple:
+        """Authenticate a user on the shard found by the directory.
+
+        Returns:
+            tuple: User password hash and ID if exists, else `(None, None)`.
+        """
+        user_id = await Shards.get_user_id_by(router=router, email=email)
+        if user_id is None:
+            return None, None
+        session_factory = router.session_factory(
+            router.shard_of(uuid.UUID(user_id))
+        )
+        async with session_factory() as session:
+            return await AuthUsers.login_user(email=email, session=session)
+
+    @staticmethod
+    async def get_user(
+        router: "ShardRouter", id_user: uuid.UUID
+    ) -> "UserORM | None":
+        """Fetch a user by ID from its shard."""
+        session_factory = router.session_factory(router.shard_of(id_user))
+        async with session_factory() as session:
+            return await Users.get_user(id_user=id_user, session=session)
+
+    @staticmethod
+    async def get_names(
+        router: "ShardRouter",
+        user_ids: list[uuid.UUID],
+        user_table: type[UserORM] = UserORM,
+    ) -> dict[uuid.UUID, str]:
+        """Fetch names of users, one query per shard, shards in parallel.
+
+        Args:
+            router (ShardRouter): Shards.
+            user_ids (list[uuid.UUID]): User IDs.
+            user_table (UserORM): User ORM model (default is `UserORM`).
+
+        Returns:
+            dict[uuid.UUID, str]: Names by user ID of found users.
+        """
+        by_shard: dict[int, list[uuid.UUID]] = defaultdict(list)
+        for user_id in user_ids:
+            by_shard[router.shard_of(user_id)].append(user_id)
+
+        async def names_of(shard: int, ids: list[uuid.UUID]) -> list:
+            async with router.session_factory(shard)() as session:
+                rows = await session.execute(
+                    select(user_table.id, user_table.name).where(
+                        user_table.id.in_(ids)
+                    )
+                )
+                return rows.all()
+
+        names: dict[uuid.UUID, str] = {}
+        for rows in await asyncio.gather(
+            *(names_of(shard, ids) for shard, ids in by_shard.items())
+        ):
+            names.update((row.id, row.name) for row in rows)
+        return names
+
+    @staticmethod
+    async def get_tree(
+        router: "ShardRouter",
+        user_id: uuid.UUID,
+        depth: int,
+        refer_table: type[ReferORM] = ReferORM,
+    ) -> list[tuple]:
+        """Fetch edges under a user up to `depth` levels, level by level.
+
+        An edge lives on the shard of its referrer, so the edges of a
+        level are read from the shards of the users of the level above,
+        one query per shard, shards in parallel. A user met again, by a
+        cycle of a bulk import, is not followed.
+
+        Args:
+            router (ShardRouter): Shards.
+            user_id (uuid.UUID): Root user ID.
+            depth (int): Max level.
+            refer_table (ReferORM): Referral ORM model (default is `ReferORM`).
+
+        Returns:
+            list[tuple]: `(id_referrer, id_referred, level, seq, shard)`
+            ordered by level, then shard and `seq`. Sequences of shards
+            are apart, so `seq` is unique on its shard only.
+        """
+
+        async def edges_of(shard: int, ids: list[uuid.UUID]) -> list:
+            async with router.session_factory(shard)() as session:
+                rows = await session.execute(
+                    select(
+                        refer_table.id_referrer,
+                        refer_table.id_referred,
+                        refer_table.seq,
+                    ).where(refer_table.id_referrer.in_(ids))
+                )
+                return rows.all()
+
+        seen = {user_id}
+        users = [user_id]
+        edges = []
+        for level in range(1, depth + 1):
+            by_shard: dict[int, list[uuid.UUID]] = defaultdict(list)
+            for id_user in users:
+                by_shard[router.shard_of(id_user)].append(id_user)
+            users = []
+            shards = sorted(by_shard)
+            for shard, rows in zip(
+                shards,
+                await asyncio.gather(
+                    *(edges_of(shard, by_shard[shard]) for shard in shards)
+                ),
+            ):
+                for row in sorted(rows, key=lambda row: row.seq):
+                    if row.id_referred in seen:
+                        continue
+                    seen.add(row.id_referred)
+                    users.append(row.id_referred)
+                    edges.append(
+                        (
+                            row.id_referrer,
+                            row.id_referred,
+                            level,
+                            row.seq,
+                            shard,
+                        )
+                    )
+            if not users:
+                break
+        return edges
+
+    @staticmethod
+    async def get_ancestors(
+        router: "ShardRouter",
+        user_id: uuid.UUID,
+        depth: int,
+        refer_table: type[ReferORM] = ReferORM,
+    ) -> list[uuid.UUID]:
+        """Fetch referrers above a user up to `depth` levels, hop by hop.
+
+        The edge to a user lives on the shard of its unknown referrer, so
+        every hop asks all shards in parallel, an index lookup by
+        `id_referred` on each.
+
+        Args:
+            router (ShardRouter): Shards.
+            user_id (uuid.UUID): User ID.
+            depth (int): Max level.
+            refer_table (ReferORM): Referral ORM model (default is `ReferORM`).
+
+        Returns:
+            list[uuid.UUID]: Referrer first, then its referrer and so on.
+        """
+
+        async def referrer_on(shard: int, id_referred: uuid.UUID):
+            async with router.session_factory(shard)() as session:
+                return await session.scalar(
+                    select(refer_table.id_referrer)
+                    .where(refer_table.id_referred == id_referred)
+                    .limit(1)
+                )
+
+        ancestors: list[uuid.UUID] = []
+        current = user_id
+        for _ in range(depth):
+            found = [
+                referrer
+                for referrer in await asyncio.gather(
+                    *(
+                        referrer_on(shard, current)
+                        for shard in range(len(router))
+                    )
+                )
+                if referrer is not None
+            ]
+            if not found or found[0] == user_id or found[0] in ancestors:
+                break
+            current = found[0]
+            ancestors.append(current)
+        return ancestors
+
+    @staticmethod
+    async def register_user(router: "ShardRouter", new_user: dict) -> bool:
+        """Add a new user with auth data and optional referral edge.
+
+        The email is reserved in the directory first. The user lives on
+        the shard its ID hashes to, IDs are not chosen to follow the
+        referrer, so shards fill evenly. If the referrer is on the same
+        shard, the user, the auth row and the edge are one statement, as
+        without shards; else the edge is written across shards by
+        `create_new_referral`. Failed steps after the reservation are
+        undone. Trees and branches of referrals span shards then, their
+        readers are `get_tree` and `get_ancestors`.
+
+        Args:
+            router (ShardRouter): Shards.
+            new_user (dict): `id`, `name`, `hashed_password`, `email` and
+                `id_referrer` (or `None`).
+
+        Returns:
+            bool: `True` if created, `False` if the email is already taken.
+        """
+        id_referrer = new_user["id_referrer"]
+        user_id = new_user["id"]
+        shard = router.shard_of(user_id)
+        local = id_referrer is None or router.shard_of(id_referrer) == shard
+
+        if not await Shards.claim_email(
+            router=router, email=new_user["email"], user_id=user_id
+        ):
+            return False
+        created = False
+        try:
+            async with router.session_factory(shard)() as session:
+                async with session.begin():
+                    created = (
+                        await Registration.create_users(
+                            new_users=[
+                                dict(
+                                    new_user,
+                                    id_referrer=id_referrer if local else None,
+                                )
+                            ],
+                            session=session,
+                        )
+                    )[0]
+            if created and not local:
+                await Shards.create_new_referral(
+                    router=router,
+                    id_referrer=id_referrer,
+                    id_referred=user_id,
+                )
+        except Exception:
+            if created:
+                await Shards.delete_user(router=router, user_id=user_id)
+            await Shards.release_email(
+                router=router, email=new_user["email"], user_id=user_id
+            )
+            raise
+
+        if not created:
+            await Shards.release_email(
+                router=router, email=new_user["email"], user_id=user_id
+            )
+        return created
+
+    @staticmethod
+    async def create_new_referral(
+        router: "ShardRouter",
+        id_referrer: uuid.UUID,
+        id_referred: uuid.UUID,
+        referred_table: type[ReferredORM] = ReferredORM,
+    ) -> bool:
+        """Add a referral edge, across shards if the users are apart.
+
+        On one shard it is one transaction. Across shards it is two: the
+        `refer_referred` row on the shard of the referred user, then the
+        edge on the shard of the referrer. A failed edge deletes the
+        `refer_referred` row again. The order keeps one referrer per
+        user: a crash between the steps leaves a user without a
+        referrer, never with two.
+
+        Args:
+            router (ShardRouter): Shards.
+            id_referrer (uuid.UUID): Referrer's user ID.
+            id_referred (uuid.UUID): Referred user's ID.
+            referred_table (ReferredORM): Referred users ORM model
+                (default is `ReferredORM`).
+
+        Returns:
+            bool: `True` if creation is successful.
+
+        Raises:
+            IntegrityError: If the referred user already has a referrer.
+        """
+        referrer_shard = router.shard_of(id_referrer)
+        referred_shard = router.shard_of(id_referred)
+        if referrer_shard == referred_shard:
+            async with router.session_factory(referrer_shard)() as session:
+                async with session.begin():
+                    return await Refer.create_new_referral(
+                        id_referrer=id_referrer,
+                        id_referred=id_referred,
+                        session=session,
+                    )
+
+        async with router.session_factory(referred_shard)() as session:
+            async with session.begin():
+                await session.execute(
+                    insert(referred_table).values(id_referred=id_referred)
+                )
+        try:
+            async with router.session_factory(referrer_shard)() as session:
+                async with session.begin():
+                    await Refer.add_edge(
+                        id_referrer=id_referrer,
+                        id_referred=id_referred,
+                        session=session,
+                    )
+        except Exception:
+            async with router.session_factory(referred_shard)() as session:
+                async with session.begin():
+                    await session.execute(
+                        delete(referred_table).where(
+                            referred_table.id_referred == id_referred
+                        )
+                    )
+            raise
+        return True
+
+    @staticmethod
+    async def delete_user(
+        router: "ShardRouter",
+        user_id: uuid.UUID,
+        user_table: type[UserORM] = UserORM,
+        auth_table: type[AuthORM] = AuthORM,
+        refer_table: type[ReferORM] = ReferORM,
+        referred_table: type[ReferredORM] = ReferredORM,
+    ) -> None:
+        """Delete a user without referrals of its own from its shard.
+
+        Undoes a registration: the edge to the user, written on its shard
+        only when the referrer is there too, goes first with the summary
+        of its referrer, then `refer_referred`, auth and users rows.
+        """
+        async with router.session_factory(
+            router.shard_of(user_id)
+        )() as session:
+            async with session.begin():
+                referrers = await session.scalars(
+                    delete(refer_table)
+                    .where(refer_table.id_referred == user_id)
+                    .returning(refer_table.id_referrer)
+                )
+                await ReferralSummary.rebuild(
+                    session=session, referrers=referrers.all()
+                )
+                for table, column in (
+                    (referred_table, referred_table.id_referred),
+                    (auth_table, auth_table.user_id),
+                    (user_table, user_table.id),
+                ):
+                    await session.execute(
+                        delete(table).where(column == user_id)
+                    )
+
+
+class ShardRebalance:
+    """Move rows of a hash range of user IDs between shards.
+
+    Tables are listed parents first with the column that gives the
+    owner of a row: users, auth and `refer_referred` follow their user,
+    edges and summaries follow their referrer.
+    """
+
+    tables = (
+        (UserORM, UserORM.id),
+        (AuthORM, AuthORM.user_id),
+        (ReferredORM, ReferredORM.id_referred),
+        (ReferORM, ReferORM.id_referrer),
+        (ReferralSummaryORM, ReferralSummaryORM.id_referrer),
+    )
+
+    @staticmethod
+    def range_filter(column: ColumnElement, low: int, high: int):
+        """Return condition `key_hash(column)` in `[low, high]` with wrap."""
+        position = hash_sql(column)
+        if low <= high:
+            return position.between(low, high)
+        return or_(position >= low, position <= high)
+
+    @staticmethod
+    async def copy_range(
+        source: "async_sessionmaker[AsyncSession]",
+        target: "async_sessionmaker[AsyncSession]",
+        low: int,
+        high: int,
+        batch_size: int = ShardConf.COPY_BATCH,
+        progress: Callable[[str], None] = print,
+    ) -> None:
+        """Copy rows of a hash range, rows already on target are skipped.
+
+        The source is read by a server-side cursor in one snapshot, every
+        batch of `batch_size` rows is its own transaction on the target,
+        so the copy can be repeated after a failure. `refer_seq` of the
+        target is moved past the copied edges and summaries of the range
+        are rebuilt from the copied edges.
+
+        Args:
+            source (async_sessionmaker): Sessions of the source shard.
+            target (async_sessionmaker): Sessions of the target shard.
+            low (int): First hash of the range.
+            high (int): Last hash of the range, less than `low` to wrap.
+            batch_size (int): Rows per target transaction.
+            progress (Callable[[str], None]): Receiver of progress lines.
+        """
+        async with source() as reader, reader.begin():
+            for table, owner in ShardRebalance.tables:
+                result = await reader.stream(
+                    select(*table.__table__.columns)
+                    .where(ShardRebalance.range_filter(owner, low, high))
+                    .execution_options(yield_per=batch_size)
+                )
+                copied = 0
+                async for rows in result.mappings().partitions():
+                    async with target() as writer, writer.begin():
+                        await writer.execute(
+                            pg_insert(table)
+                            .values([dict(row) for row in rows])
+                            .on_conflict_do_nothing()
+                        )
+                    copied += len(rows)
+                progress(f"{table.__tablename__}: {copied} rows copied")
+        async with target() as writer, writer.begin():
+            await writer.execute(text(ShardConf.SYNC_REFER_SEQ))
+        await ReferralSummary.repair(
+            session_factory=target,
+            where=ShardRebalance.range_filter(UserORM.id, low, high),
+            progress=progress,
+        )
+
+    @staticmethod
+    async def delete_range(
+        session_factory: "async_sessionmaker[AsyncSession]",
+        low: int,
+        high: int,
+        progress: Callable[[str], None] = print,
+    ) -> None:
+        """Delete rows of a hash range from a shard, children first."""
+        for table, owner in reversed(ShardRebalance.tables):
+            async with session_factory() as session, session.begin():
+                result = await session.execute(
+                    delete(table).where(
+                        ShardRebalance.range_filter(owner, low, high)
+                    )
+                )
+            progress(f"{table.__tablename__}: {result.rowcount} rows deleted")
+
+    @staticmethod
+    async def fill_directory(
+        source: "async_sessionmaker[AsyncSession]",
+        primary: "async_sessionmaker[AsyncSession]",
+        batch_size: int = ShardConf.COPY_BATCH,
+        auth_table: type[AuthORM] = AuthORM,
+        directory_table: type[EmailDirectoryORM] = EmailDirectoryORM,
+    ) -> int:
+        """Add emails of a shard missing in the directory on the primary.
+
+        Returns:
+            int: Rows read from the shard.
+        """
+        read = 0
+        async with source() as reader, reader.begin():
+            result = await reader.stream(
+                select(
+                    auth_table.email_lower, auth_table.user_id
+                ).execution_options(yield_per=batch_size)
+            )
+            async for rows in result.mappings().partitions():
+                async with primary() as writer, writer.begin():
+                    await writer.execute(
+                        pg_insert(directory_table)
+                        .values([dict(row) for row in rows])
+                        .on_conflict_do_nothing()
+                    )
+                read += len(rows)
+        return read
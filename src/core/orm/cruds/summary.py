@@ -0,0 +1,357 @@
+"""Referral summary CRUD methods."""
+
+import uuid
+from typing import TYPE_CHECKING, Callable, Iterable
+
+from sqlalchemy import (
+    BigInteger,
+    String,
+    Uuid,
+    and_,
+    any_,
+    bindparam,
+    case,
+    cast,
+    column,
+    delete,
+    exists,
+    func,
+    literal,
+    select,
+)
+from sqlalchemy.dialects.postgresql import (
+    ARRAY,
+    JSONB,
+    JSONPATH,
+    aggregate_order_by,
+)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import ColumnElement, Insert, Select
+
+from src.core.orm.models.refer import ReferORM
+from src.core.orm.models.summary import ReferralSummaryORM
+from src.core.orm.models.user import UserORM
+from src.core.settings.constants import ReferralSummaryConf
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+
+
+def _item(id_referred, name, seq):
+    """Return JSONB item of the first page."""
+    return func.jsonb_build_object(
+        ReferralSummaryConf.ITEM_ID,
+        id_referred,
+        ReferralSummaryConf.ITEM_NAME,
+        name,
+        ReferralSummaryConf.ITEM_SEQ,
+        seq,
+    )
+
+
+def _item_seq(item):
+    """Return `seq` of a JSONB item."""
+    return cast(item[ReferralSummaryConf.ITEM_SEQ].astext, BigInteger)
+
+
+def _page(items):
+    """Return the first `PAGE_SIZE` of ordered items as a JSONB array."""
+    return func.jsonb_path_query_array(
+        items, cast(literal(ReferralSummaryConf.PAGE_PATH, String), JSONPATH)
+    )
+
+
+class ReferralSummary:
+    """Read model of referrals per referrer, updated with the edges.
+
+    `add_edges` is a part of the statement that writes the edges, so a
+    summary is in the same transaction as its edges. `rebuild` computes
+    summaries from `refer` and `users` again.
+    """
+
+    @staticmethod
+    def add_edges(
+        edges: Select,
+        summary_table: type[ReferralSummaryORM] = ReferralSummaryORM,
+        user_table: type[UserORM] = UserORM,
+    ) -> Insert:
+        """Return upsert of summaries for new edges.
+
+        The first page is rewritten only while new edges can get on it:
+        it is not full or an edge of a concurrent transaction has a
+        smaller `seq` than its last item. Items of both are merged by
+        `seq`, a full page of a popular referrer is not touched.
+
+        Args:
+            edges (Select): New edges with columns `id_referrer`,
+                `id_referred`, `name` of the referred user, `seq` and
+                `created_at`.
+            summary_table (ReferralSummaryORM): Summary ORM model
+                (default is `ReferralSummaryORM`).
+            user_table (UserORM): User ORM model (default is `UserORM`).
+
+        Returns:
+            Insert: Statement returning `id_referrer`, use it as a CTE.
+        """
+        new = edges.subquery("new_edges")
+        stmt = pg_insert(summary_table).from_select(
+            [
+                "id_referrer",
+                "name",
+                "count",
+                "first_page",
+                "last_seq",
+                "last_at",
+            ],
+            select(
+                new.c.id_referrer,
+                user_table.name,
+                func.count(),
+                _page(
+                    func.jsonb_agg(
+                        aggregate_order_by(
+                            _item(new.c.id_referred, new.c.name, new.c.seq),
+                            new.c.seq,
+                        )
+                    )
+                ),
+                func.max(new.c.seq),
+                func.max(new.c.created_at),
+            )
+            .join(user_table, user_table.id == new.c.id_referrer)
+            .group_by(new.c.id_referrer, user_table.name),
+        )
+        current, added = summary_table.first_page, stmt.excluded.first_page
+
+        items = (
+            func.jsonb_array_elements(current.concat(added))
+            .table_valued(column("value", JSONB))
+            .render_derived(name="items")
+        )
+        merged = select(
+            items.c.value, _item_seq(items.c.value).label("seq")
+        ).subquery("merged")
+        merged_page = select(
+            _page(
+                func.jsonb_agg(
+                    aggregate_order_by(merged.c.value, merged.c.seq)
+                )
+            )
+        ).scalar_subquery()
+
+        return stmt.on_conflict_do_update(
+            index_elements=[summary_table.id_referrer],
+            set_=dict(
+                count=summary_table.count + stmt.excluded.count,
+                first_page=case(
+                    (
+                        and_(
+                            func.jsonb_array_length(current)
+                            >= ReferralSummaryConf.PAGE_SIZE,
+                            _item_seq(added[0]) > _item_seq(current[-1]),
+                        ),
+                        current,
+                    ),
+                    else_=merged_page,
+                ),
+                last_seq=func.greatest(
+                    summary_table.last_seq, stmt.excluded.last_seq
+                ),
+                last_at=func.greatest(
+                    summary_table.last_at, stmt.excluded.last_at
+                ),
+            ),
+        ).returning(summary_table.id_referrer)
+
+    @staticmethod
+    async def get_summary(
+        session: AsyncSession,
+        user_id: uuid.UUID,
+        summary_table: type[ReferralSummaryORM] = ReferralSummaryORM,
+    ) -> ReferralSummaryORM | None:
+        """Fetch the summary of a referrer.
+
+        Args:
+            session (AsyncSession): Database session.
+            user_id (uuid.UUID): Referrer's user ID.
+            summary_table (ReferralSummaryORM): Summary ORM model
+                (default is `ReferralSummaryORM`).
+
+        Returns:
+            ReferralSummaryORM | None: Summary, `None` without referrals
+            or before the repair job reached the referrer.
+        """
+        return await session.get(summary_table, user_id)
+
+    @staticmethod
+    async def get_summaries(
+        session: AsyncSession,
+        user_ids: list[uuid.UUID],
+        summary_table: type[ReferralSummaryORM] = ReferralSummaryORM,
+    ) -> list[ReferralSummaryORM]:
+        """Fetch summaries of many referrers in one query.
+
+        The IDs are one array parameter, `id_referrer = ANY(:user_ids)`
+        has the same plan for any number of them.
+
+        Args:
+            session (AsyncSession): Database session.
+            user_ids (list[uuid.UUID]): Referrers' user IDs.
+            summary_table (ReferralSummaryORM): Summary ORM model
+                (default is `ReferralSummaryORM`).
+
+        Returns:
+            list[ReferralSummaryORM]: Summaries of referrers with them.
+        """
+        ids = bindparam("user_ids", value=user_ids, type_=ARRAY(Uuid))
+        summaries = await session.scalars(
+            select(summary_table).where(summary_table.id_referrer == any_(ids))
+        )
+        return list(summaries.all())
+
+    @staticmethod
+    async def rebuild(
+        session: AsyncSession,
+        referrers: Select | Iterable[uuid.UUID],
+        summary_table: type[ReferralSummaryORM] = ReferralSummaryORM,
+        refer_table: type[ReferORM] = ReferORM,
+        user_table: type[UserORM] = UserORM,
+    ) -> int:
+        """Compute summaries of referrers from `refer` and `users`.
+
+        Summaries of referrers without edges are deleted. The first page
+        of every referrer is a range scan of the `(id_referrer, seq)`
+        index.
+
+        Args:
+            session (AsyncSession): Database session in a transaction.
+            referrers (Select | Iterable[uuid.UUID]): Referrer IDs or a
+                select of them.
+            summary_table (ReferralSummaryORM): Summary ORM model
+                (default is `ReferralSummaryORM`).
+            refer_table (ReferORM): Referral ORM model (default is `ReferORM`).
+            user_table (UserORM): User ORM model (default is `UserORM`).
+
+        Returns:
+            int: Summaries written.
+        """
+        await session.execute(
+            delete(summary_table).where(
+                summary_table.id_referrer.in_(referrers),
+                ~exists().where(
+                    refer_table.id_referrer == summary_table.id_referrer
+                ),
+            )
+        )
+
+        referred = user_table.__table__.alias("referred")
+        first = (
+            select(
+                refer_table.id_referred,
+                refer_table.seq,
+                referred.c.name,
+            )
+            .outerjoin(referred, referred.c.id == refer_table.id_referred)
+            .where(refer_table.id_referrer == user_table.id)
+            .order_by(refer_table.seq)
+            .limit(ReferralSummaryConf.PAGE_SIZE)
+            .correlate(user_table)
+            .subquery("first")
+        )
+        totals = (
+            select(
+                func.count().label("count"),
+                func.max(refer_table.seq).label("last_seq"),
+                func.max(refer_table.created_at).label("last_at"),
+            )
+            .where(refer_table.id_referrer == user_table.id)
+            .lateral("totals")
+        )
+        first_page = (
+            select(
+                func.jsonb_agg(
+                    aggregate_order_by(
+                        _item(first.c.id_referred, first.c.name, first.c.seq),
+                        first.c.seq,
+                    )
+                )
+            )
+            .select_from(first)
+            .scalar_subquery()
+        )
+        stmt = pg_insert(summary_table).from_select(
+            [
+                "id_referrer",
+                "name",
+                "count",
+                "first_page",
+                "last_seq",
+                "last_at",
+            ],
+            select(
+                user_table.id,
+                user_table.name,
+                totals.c.count,
+                first_page,
+                totals.c.last_seq,
+                totals.c.last_at,
+            )
+            .join(totals, totals.c.count > 0)
+            .where(user_table.id.in_(referrers)),
+        )
+        result = await session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[summary_table.id_referrer],
+                set_=dict(
+                    name=stmt.excluded.name,
+                    count=stmt.excluded.count,
+                    first_page=stmt.excluded.first_page,
+                    last_seq=stmt.excluded.last_seq,
+                    last_at=stmt.excluded.last_at,
+                ),
+            )
+        )
+        return result.rowcount
+
+    @staticmethod
+    async def repair(
+        session_factory: "async_sessionmaker[AsyncSession]",
+        where: ColumnElement[bool] | None = None,
+        batch_size: int = ReferralSummaryConf.REPAIR_BATCH,
+        progress: Callable[[str], None] = print,
+        user_table: type[UserORM] = UserORM,
+    ) -> int:
+        """Rebuild summaries of all users in batches by user ID.
+
+        Every batch of `batch_size` users is its own transaction, so
+        writes wait for one batch at most and the job can be stopped.
+
+        Args:
+            session_factory (async_sessionmaker): Sessions of the database.
+            where (ColumnElement[bool] | None): Condition on users.
+            batch_size (int): Users per transaction.
+            progress (Callable[[str], None]): Receiver of progress lines.
+            user_table (UserORM): User ORM model (default is `UserORM`).
+
+        Returns:
+            int: Summaries written.
+        """
+        after, users, written = None, 0, 0
+        while True:
+            stmt = select(user_table.id).order_by(user_table.id)
+            if where is not None:
+                stmt = stmt.where(where)
+            if after is not None:
+                stmt = stmt.where(user_table.id > after)
+            async with session_factory() as session, session.begin():
+                ids = (await session.scalars(stmt.limit(batch_size))).all()
+                if ids:
+                    written += await ReferralSummary.rebuild(
+                        session=session, referrers=ids
+                    )
+            users += len(ids)
+            progress(f"summaries: {users} users, {written} written")
+            if len(ids) < batch_size:
+                return written
+            after = ids[-1]
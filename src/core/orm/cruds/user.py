@@ -17,7 +17,7 @@ class Users:
 
     @staticmethod
     async def get_user(
-        id_user: str, session: AsyncSession, user_table=UserORM
+        id_user: uuid.UUID, session: AsyncSession, user_table=UserORM
     ) -> Optional["UserORM"]:
         """Fetch a user by ID.
 
@@ -39,7 +39,7 @@ class Users:
 
     @staticmethod
     async def get_referred_by_user_id(
-        id_user: str,
+        id_user: uuid.UUID,
         session: AsyncSession,
         user_table: type[UserORM] = UserORM,
         ref_table: type[ReferORM] = ReferORM,
@@ -71,7 +71,7 @@ class Users:
 
     @staticmethod
     async def new_user(
-        id_user: str,
+        id_user: uuid.UUID,
         user_name: str,
         session: AsyncSession,
         user_table: type[UserORM] = UserORM,
@@ -1,6 +1,7 @@
 """SQLAlchemy engine."""
 
 import asyncio
+import uuid
 from asyncio import current_task
 from typing import Any, Optional
 
@@ -11,13 +12,75 @@ from sqlalchemy.ext.asyncio import (
     async_sessionmaker,
     create_async_engine,
 )
+from sqlalchemy.pool import NullPool
 
 from src.core.orm.models.auth import AuthORM  # noqa
 from src.core.orm.models.base import BaseModel
+from src.core.orm.models.directory import EmailDirectoryORM  # noqa
+from src.core.orm.models.referred import ReferredORM  # noqa
+from src.core.orm.models.rollup import (  # noqa
+    ReferralDailyORM,
+    RollupWatermarkORM,
+)
+from src.core.orm.models.summary import ReferralSummaryORM  # noqa
 from src.core.orm.models.user import UserORM  # noqa
+from src.core.orm.replicas import Replica, ReplicaPool
+from src.core.orm.shards import Shard, ShardRouter
+from src.core.settings.constants import PgBouncerConf
 from src.core.settings.env import settings
 
 
+def connection_budget(
+    workers: int,
+    pool_size: int,
+    max_overflow: int,
+    instances: int = 1,
+    null_pool: bool = False,
+) -> int | None:
+    """Return max connections the deployment opens to one database server.
+
+    Every gunicorn worker has its own pool of `pool_size` connections and
+    up to `max_overflow` more under load. The primary and every replica
+    get the same number, it must stay below `max_connections` of the
+    server (or `max_client_conn` of PgBouncer in front of it).
+
+    With `NULL_POOL` workers keep no pool, a connection per checkout is
+    opened to PgBouncer, so the pool settings bound nothing: the server
+    gets what the pool of PgBouncer allows, and None is returned.
+
+    Args:
+        workers (int): Gunicorn workers per instance.
+        pool_size (int): `POOL_SIZE_SQL_ALCHEMY_CONF`.
+        max_overflow (int): `MAX_OVERFLOW`.
+        instances (int): Instances of the API.
+        null_pool (bool): `NULL_POOL`.
+
+    Returns:
+        int | None: Connections to one server at peak, None if PgBouncer
+        sets them.
+
+    Example:
+        >>> connection_budget(workers=8, pool_size=30, max_overflow=20)
+        400
+        >>> connection_budget(
+        ...     workers=8, pool_size=30, max_overflow=20, instances=3
+        ... )
+        1200
+        >>> connection_budget(
+        ...     workers=8, pool_size=30, max_overflow=20, null_pool=True
+        ... ) is None
+        True
+    """
+    if null_pool:
+        return None
+    return instances * workers * (pool_size + max_overflow)
+
+
+def _prepared_statement_name() -> str:
+    """Return a name that is unique across PgBouncer server connections."""
+    return PgBouncerConf.STATEMENT_NAME.format(uuid.uuid4())
+
+
 class ManagerDB:
     """Async engine manager."""
 
@@ -36,6 +99,8 @@ class ManagerDB:
             self.__echo = echo
             self.async_engine = self.create_async_engine()
             self._session = self.create_session(self.async_engine)
+            self.replicas = self.create_replicas()
+            self.shards = self.create_shards()
 
             self._initialize_tables = False
 
@@ -60,16 +125,76 @@ class ManagerDB:
             scopefunc=current_task,
         )
 
-    def create_async_engine(self) -> "AsyncEngine":
-        """Create async engine."""
-        return create_async_engine(
-            url=self.__url,
-            echo=self.__echo,
-            pool_pre_ping=True,
+    def create_replicas(self) -> ReplicaPool:
+        """Create engines of read replicas."""
+        replicas = []
+        for url in settings.db.get_replica_urls:
+            engine = self.create_async_engine(url=url)
+            replicas.append(
+                Replica(
+                    engine=engine,
+                    session_factory=self.create_session(engine),
+                )
+            )
+        return ReplicaPool(
+            replicas=replicas,
+            eject_seconds=settings.db.REPLICA_EJECT_SECONDS,
+            max_lag=settings.db.REPLICA_MAX_LAG_SECONDS,
+            check_interval=settings.db.REPLICA_CHECK_SECONDS,
+        )
+
+    def create_shards(self) -> ShardRouter:
+        """Create engines of shards, the primary is shard 0."""
+        shards = [
+            Shard(engine=self.async_engine, session_factory=self._session)
+        ]
+        for url in settings.db.get_shard_urls:
+            engine = self.create_async_engine(url=url)
+            shards.append(
+                Shard(
+                    engine=engine,
+                    session_factory=self.create_session(engine),
+                )
+            )
+        return ShardRouter(
+            shards=shards,
+            vnodes=settings.db.SHARD_VNODES,
+            map_file=settings.db.SHARD_MAP_FILE,
+            check_interval=settings.db.SHARD_MAP_CHECK_SECONDS,
+        )
+
+    def create_async_engine(self, url: str | None = None) -> "AsyncEngine":
+        """Create async engine, of the primary if url is not given.
+
+        In PgBouncer mode (transaction pooling) a session does not keep
+        its server connection between transactions, so asyncpg statement
+        caches are disabled and prepared statements get unique names.
+        With `NULL_POOL` connections are not kept by workers at all and
+        PgBouncer is the only pool.
+        """
+        pool_args: dict[str, Any] = dict(
             pool_size=settings.db.POOL_SIZE_SQL_ALCHEMY_CONF,
             pool_timeout=settings.db.POOL_TIMEOUT,
             max_overflow=settings.db.MAX_OVERFLOW,
         )
+        if settings.db.NULL_POOL:
+            pool_args = dict(poolclass=NullPool)
+
+        connect_args: dict[str, Any] = {}
+        if settings.db.PGBOUNCER_MODE:
+            connect_args = dict(
+                statement_cache_size=0,
+                prepared_statement_cache_size=0,
+                prepared_statement_name_func=_prepared_statement_name,
+            )
+
+        return create_async_engine(
+            url=url or self.__url,
+            echo=self.__echo,
+            pool_pre_ping=True,
+            connect_args=connect_args,
+            **pool_args,
+        )
 
     async def initialize(self):
         """Initialize the database by creating tables."""
@@ -78,10 +203,12 @@ class ManagerDB:
             self._initialize_tables = True
 
     async def _create_tables(self):
-        """Create table if not exist."""
-        async with self.async_engine.begin() as conn:
-            # todo: add logger INIT DB TABLES
-            await conn.run_sync(BaseModel.metadata.create_all)
+        """Create table if not exist, on the primary and every shard."""
+        for shard in range(len(self.shards)):
+            engine = self.shards.engine(shard)
+            async with engine.begin() as conn:
+                # todo: add logger INIT DB TABLES
+                await conn.run_sync(BaseModel.metadata.create_all)
 
 
 lock = asyncio.Lock()
@@ -1,9 +1,10 @@
 """SQLAlchemy UsersAuthORM model."""
 
+import uuid
 from datetime import datetime
 
-from sqlalchemy import UUID, ForeignKey, String, func
-from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import UUID, ForeignKey, Index, String, func, text
+from sqlalchemy.orm import Mapped, column_property, mapped_column
 
 from src.core.orm.models.base import BaseModel
 
@@ -12,13 +13,18 @@ class AuthORM(BaseModel):
     """UsersAuthORM model."""
 
     __tablename__ = "auth"
-    user_id: Mapped[str] = mapped_column(
+    __table_args__ = (
+        Index("ix_auth_email_lower", text("lower(email)"), unique=True),
+    )
+    user_id: Mapped[uuid.UUID] = mapped_column(
         UUID,
         ForeignKey("users.id"),
         primary_key=True,
-        unique=True,
     )
     hashed_password: Mapped[str] = mapped_column(String, nullable=False)
-    email: Mapped[str] = mapped_column(unique=True, nullable=False)
+    email: Mapped[str] = mapped_column(nullable=False)
+    email_lower: Mapped[str] = column_property(
+        func.lower(email).label("email_lower")
+    )
     created_at: Mapped[datetime] = mapped_column(server_default=func.now())
     active: Mapped[bool] = mapped_column(default=True)
@@ -0,0 +1,20 @@
+"""SQLAlchemy EmailDirectoryORM model."""
+
+import uuid
+
+from sqlalchemy import UUID, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from src.core.orm.models.base import BaseModel
+
+
+class EmailDirectoryORM(BaseModel):
+    """Owner of every email, kept on the primary.
+
+    With shards `auth` rows live on the shard of their user, so emails
+    are unique and found by login only through this table.
+    """
+
+    __tablename__ = "email_directory"
+    email_lower: Mapped[str] = mapped_column(String, primary_key=True)
+    user_id: Mapped[uuid.UUID] = mapped_column(UUID, nullable=False)
@@ -1,34 +1,80 @@
 """SQLAlchemy UserORM model."""
 
+import uuid
+from datetime import datetime
 from typing import TYPE_CHECKING
 
-from sqlalchemy import UUID, ForeignKey
+from sqlalchemy import (
+    DDL,
+    UUID,
+    BigInteger,
+    DateTime,
+    ForeignKey,
+    Index,
+    Sequence,
+    event,
+    func,
+)
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from src.core.orm.models.base import BaseModel
+from src.core.settings.constants import ReferPartitionConf
 
 if TYPE_CHECKING:
     from src.core.orm.models.user import UserORM
 
 
+refer_seq = Sequence("refer_seq")
+
+
 class ReferORM(BaseModel):
-    """Refer ORM model."""
+    """Refer ORM model.
+
+    The table is hash-partitioned by `id_referrer`, so all referrals of
+    one user are in one partition. The primary key has to include the
+    partition key, and one referrer per user is kept by `ReferredORM`.
+    `ix_refer_seq` serves readers of new edges: export and rollups.
+
+    With shards an edge lives on the shard of its referrer, the referred
+    user may live on another one, so `id_referred` has no foreign key.
+    """
 
     __tablename__ = "refer"
+    __table_args__ = (
+        Index(
+            "ix_refer_id_referrer_seq",
+            "id_referrer",
+            "seq",
+            postgresql_include=["id_referred"],
+        ),
+        Index("ix_refer_seq", "seq"),
+        {"postgresql_partition_by": "HASH (id_referrer)"},
+    )
+
+    id: Mapped[uuid.UUID] = mapped_column(UUID, primary_key=True)
 
-    id: Mapped[UUID] = mapped_column(UUID, primary_key=True)
+    id_referrer: Mapped[uuid.UUID] = mapped_column(
+        UUID, ForeignKey("users.id"), primary_key=True
+    )
+
+    id_referred: Mapped[uuid.UUID] = mapped_column(
+        UUID, index=True, nullable=False
+    )
 
-    id_referrer: Mapped[UUID] = mapped_column(
-        UUID, ForeignKey("users.id"), index=True, nullable=False
+    seq: Mapped[int] = mapped_column(
+        BigInteger,
+        refer_seq,
+        server_default=refer_seq.next_value(),
+        nullable=False,
     )
 
-    id_referred: Mapped[UUID] = mapped_column(
-        UUID, ForeignKey("users.id"), index=True, nullable=False
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
     )
 
     referred_user: Mapped["UserORM"] = relationship(
         "UserORM",
-        foreign_keys=id_referred,
+        primaryjoin="UserORM.id == foreign(ReferORM.id_referred)",
         back_populates="referred_by",
         overlaps="referred_by",
     )
@@ -39,3 +85,15 @@ class ReferORM(BaseModel):
         back_populates="invited_by",
         overlaps="invited_by",
     )
+
+
+for remainder in range(ReferPartitionConf.PARTITIONS):
+    event.listen(
+        ReferORM.__table__,
+        "after_create",
+        DDL(
+            ReferPartitionConf.CREATE_PARTITION.format(
+                modulus=ReferPartitionConf.PARTITIONS, remainder=remainder
+            )
+        ),
+    )
@@ -0,0 +1,21 @@
+"""SQLAlchemy ReferredORM model."""
+
+import uuid
+
+from sqlalchemy import UUID, ForeignKey
+from sqlalchemy.orm import Mapped, mapped_column
+
+from src.core.orm.models.base import BaseModel
+
+
+class ReferredORM(BaseModel):
+    """Users that have a referrer, at most one row per user.
+
+    A unique index of partitioned `refer` must include `id_referrer`, so
+    this table keeps `id_referred` unique across all partitions.
+    """
+
+    __tablename__ = "refer_referred"
+    id_referred: Mapped[uuid.UUID] = mapped_column(
+        UUID, ForeignKey("users.id"), primary_key=True
+    )
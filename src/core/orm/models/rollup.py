@@ -0,0 +1,28 @@
+"""SQLAlchemy ReferralDailyORM and RollupWatermarkORM models."""
+
+import uuid
+from datetime import date
+
+from sqlalchemy import UUID, BigInteger, Date, ForeignKey, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from src.core.orm.models.base import BaseModel
+
+
+class ReferralDailyORM(BaseModel):
+    """Referrals of a referrer per UTC day of the edge."""
+
+    __tablename__ = "referral_daily"
+    id_referrer: Mapped[uuid.UUID] = mapped_column(
+        UUID, ForeignKey("users.id"), primary_key=True
+    )
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    count: Mapped[int] = mapped_column(BigInteger, nullable=False)
+
+
+class RollupWatermarkORM(BaseModel):
+    """`seq` of the last edge folded into a rollup."""
+
+    __tablename__ = "rollup_watermark"
+    rollup: Mapped[str] = mapped_column(String, primary_key=True)
+    last_seq: Mapped[int] = mapped_column(BigInteger, nullable=False)
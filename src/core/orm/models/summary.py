@@ -0,0 +1,31 @@
+"""SQLAlchemy ReferralSummaryORM model."""
+
+import uuid
+from datetime import datetime
+
+from sqlalchemy import UUID, BigInteger, DateTime, ForeignKey, String
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Mapped, mapped_column
+
+from src.core.orm.models.base import BaseModel
+
+
+class ReferralSummaryORM(BaseModel):
+    """Referrals of one referrer, written with every new edge.
+
+    `first_page` is the first page of the referral list, items
+    `{"id", "name", "seq"}` ordered by `seq`, so the list without a
+    cursor is one primary key lookup.
+    """
+
+    __tablename__ = "referral_summary"
+    id_referrer: Mapped[uuid.UUID] = mapped_column(
+        UUID, ForeignKey("users.id"), primary_key=True
+    )
+    name: Mapped[str] = mapped_column(String, nullable=False)
+    count: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    first_page: Mapped[list] = mapped_column(JSONB, nullable=False)
+    last_seq: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    last_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False
+    )
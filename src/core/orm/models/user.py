@@ -1,5 +1,6 @@
 """SQLAlchemy UserORM model."""
 
+import uuid
 from typing import TYPE_CHECKING
 
 from sqlalchemy import UUID
@@ -15,12 +16,12 @@ class UserORM(BaseModel):
     """User ORM model."""
 
     __tablename__ = "users"
-    id: Mapped[UUID] = mapped_column(UUID, primary_key=True)
+    id: Mapped[uuid.UUID] = mapped_column(UUID, primary_key=True)
     name: Mapped[str] = mapped_column(nullable=False)
 
     referred_by: Mapped[list["ReferORM"]] = relationship(
         "ReferORM",
-        foreign_keys="[ReferORM.id_referred]",
+        primaryjoin="UserORM.id == foreign(ReferORM.id_referred)",
         back_populates="referred_user",
         overlaps="referred_user",
     )
@@ -0,0 +1,110 @@
+"""Read replicas with health-based ejection."""
+
+import time
+
+from sqlalchemy import case, func, select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+)
+
+REPLICATION_LAG = select(
+    case(
+        (func.pg_last_wal_receive_lsn() == func.pg_last_wal_replay_lsn(), 0),
+        else_=func.extract(
+            "epoch", func.now() - func.pg_last_xact_replay_timestamp()
+        ),
+    )
+)
+
+
+class Replica:
+    """Engine of one replica and its health state."""
+
+    def __init__(
+        self,
+        engine: AsyncEngine,
+        session_factory: "async_sessionmaker[AsyncSession]",
+    ) -> None:
+        """Init replica.
+
+        Args:
+            engine (AsyncEngine): Engine of the replica.
+            session_factory (async_sessionmaker): Factory of its sessions.
+        """
+        self.engine = engine
+        self.session_factory = session_factory
+        self.ejected_until = 0.0
+        self.checked_at = 0.0
+
+
+class ReplicaPool:
+    """Round robin over healthy replicas.
+
+    A replica is checked at most once per `check_interval`: it must
+    answer and replay WAL not later than `max_lag` seconds. A failed
+    replica is ejected for `eject_seconds`, then it is checked again.
+    """
+
+    def __init__(
+        self,
+        replicas: list[Replica],
+        eject_seconds: float,
+        max_lag: float,
+        check_interval: float,
+    ) -> None:
+        """Init pool.
+
+        Args:
+            replicas (list[Replica]): Replicas, may be empty.
+            eject_seconds (float): Time out of rotation after a failure.
+            max_lag (float): Max replication lag in seconds.
+            check_interval (float): Time between health checks.
+        """
+        self._replicas = replicas
+        self._eject_seconds = eject_seconds
+        self._max_lag = max_lag
+        self._check_interval = check_interval
+        self._next = 0
+
+    def __bool__(self) -> bool:
+        """Return True if there are replicas."""
+        return bool(self._replicas)
+
+    async def pick(self) -> Replica | None:
+        """Return the next healthy replica or None if there is no one."""
+        for _ in range(len(self._replicas)):
+            replica = self._replicas[self._next % len(self._replicas)]
+            self._next += 1
+            now = time.monotonic()
+            if replica.ejected_until > now:
+                continue
+            if now - replica.checked_at >= self._check_interval:
+                replica.checked_at = now
+                if not await self._is_healthy(replica):
+                    self.eject(replica)
+                    continue
+            return replica
+        return None
+
+    def eject(self, replica: Replica) -> None:
+        """Take a replica out of rotation for `eject_seconds`."""
+        replica.ejected_until = time.monotonic() + self._eject_seconds
+        print(f"Replica ejected: {replica.engine.url.host}")
+
+    async def _is_healthy(self, replica: Replica) -> bool:
+        """Check that replica answers and its lag is not too big."""
+        try:
+            async with replica.engine.connect() as connection:
+                lag = await connection.scalar(REPLICATION_LAG)
+        except (SQLAlchemyError, OSError) as e:
+            print(f"Replica check failed: {e}")
+            return False
+        return lag is None or lag <= self._max_lag
+
+    async def dispose(self) -> None:
+        """Close connection pools of all replicas."""
+        for replica in self._replicas:
+            await replica.engine.dispose()
@@ -0,0 +1,281 @@
+"""Shards of users and the referral graph keyed by user ID."""
+
+import hashlib
+import json
+import os
+import time
+import uuid
+from bisect import bisect_left, bisect_right
+from pathlib import Path
+from typing import Iterator
+
+from sqlalchemy import BigInteger, Text, cast, func, literal
+from sqlalchemy.dialects.postgresql import BIT
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+)
+from sqlalchemy.sql.elements import ColumnElement
+
+from src.core.settings.constants import ShardConf
+
+
+def key_hash(key: str | uuid.UUID) -> int:
+    """Return position of a key on the ring, a signed 64-bit integer.
+
+    The first 8 bytes of md5 of the text form, the same number as
+    `hash_sql` computes in Postgres.
+
+    Example:
+        >>> key_hash("00000000-0000-0000-0000-000000000000")
+        -6950804328280008906
+    """
+    digest = hashlib.md5(str(key).encode()).digest()
+    return int.from_bytes(digest[:8], "big", signed=True)
+
+
+def hash_sql(column: ColumnElement) -> ColumnElement:
+    """Return `key_hash` of a column as a Postgres expression."""
+    hex_prefix = func.substr(func.md5(cast(column, Text)), 1, 16)
+    return cast(cast(literal("x") + hex_prefix, BIT(64)), BigInteger)
+
+
+def in_range(key: int, low: int, high: int) -> bool:
+    """Return True if key is in `[low, high]`, the range may wrap around."""
+    if low <= high:
+        return low <= key <= high
+    return key >= low or key <= high
+
+
+def split_range(low: int, high: int) -> list[tuple[int, int]]:
+    """Return a range wrapping around the ring as ranges without wrap."""
+    if low <= high:
+        return [(low, high)]
+    return [(low, ShardConf.MAX_HASH), (ShardConf.MIN_HASH, high)]
+
+
+class ShardMap:
+    """Consistent hashing with virtual nodes and moved hash ranges.
+
+    Every shard has `vnodes` points on the ring, a key belongs to the
+    first point at or after its hash. Adding a shard takes about
+    `1 / shards` of the keys from the others. Ranges moved by the
+    rebalancing command override the ring until their data is moved
+    back or the ring is changed.
+    """
+
+    def __init__(
+        self,
+        shards: int,
+        vnodes: int,
+        moves: list[tuple[int, int, int]] | None = None,
+    ) -> None:
+        """Init map.
+
+        Args:
+            shards (int): Number of shards, the primary is shard 0.
+            vnodes (int): Points of every shard on the ring.
+            moves (list | None): Sorted `(low, high, shard)` ranges
+                without wrap and overlaps.
+        """
+        self.shards = shards
+        self.vnodes = vnodes
+        points = sorted(
+            (
+                key_hash(ShardConf.POINT_KEY.format(shard=shard, vnode=vnode)),
+                shard,
+            )
+            for shard in range(shards)
+            for vnode in range(vnodes)
+        )
+        self._points = [point for point, _ in points]
+        self._owners = [shard for _, shard in points]
+        self.moves = list(moves or [])
+        self._move_lows = [low for low, _, _ in self.moves]
+
+    def ring_owner(self, key: int) -> int:
+        """Return shard of a ring position without moves."""
+        index = bisect_left(self._points, key) % len(self._points)
+        return self._owners[index]
+
+    def owner(self, key: int) -> int:
+        """Return shard of a ring position."""
+        index = bisect_right(self._move_lows, key) - 1
+        if index >= 0 and key <= self.moves[index][1]:
+            return self.moves[index][2]
+        return self.ring_owner(key)
+
+    def shard_of(self, user_id: uuid.UUID) -> int:
+        """Return shard of a user."""
+        return self.owner(key_hash(user_id))
+
+    def owners(self, low: int, high: int) -> set[int]:
+        """Return shards owning some part of `[low, high]`.
+
+        Ownership changes only where a ring range or a move starts, so
+        the owners of those starts inside the range are all owners.
+        """
+        owners = set()
+        for start, end in split_range(low, high):
+            owners.add(self.owner(start))
+            bounds = [point + 1 for point in self._points] + [
+                bound
+                for move_low, move_high, _ in self.moves
+                for bound in (move_low, move_high + 1)
+            ]
+            owners.update(
+                self.owner(bound) for bound in bounds if start < bound <= end
+            )
+        return owners
+
+    def ring_ranges(self) -> Iterator[tuple[int, int, int]]:
+        """Yield `(low, high, shard)` ranges of the ring points.
+
+        The first range wraps around: it starts after the last point.
+        """
+        previous = self._points[-1]
+        for point, shard in zip(self._points, self._owners):
+            low = (
+                ShardConf.MIN_HASH
+                if previous == ShardConf.MAX_HASH
+                else previous + 1
+            )
+            yield low, point, shard
+            previous = point
+
+    def with_move(self, low: int, high: int, shard: int) -> "ShardMap":
+        """Return a copy of the map where `[low, high]` is on a shard."""
+        moves = self.moves
+        for start, end in split_range(low, high):
+            kept = []
+            for move_low, move_high, move_shard in moves:
+                if move_high < start or move_low > end:
+                    kept.append((move_low, move_high, move_shard))
+                    continue
+                if move_low < start:
+                    kept.append((move_low, start - 1, move_shard))
+                if move_high > end:
+                    kept.append((end + 1, move_high, move_shard))
+            moves = sorted(kept + [(start, end, shard)])
+        return ShardMap(shards=self.shards, vnodes=self.vnodes, moves=moves)
+
+    @classmethod
+    def load(cls, path: str, shards: int, vnodes: int) -> "ShardMap":
+        """Return map with moves of a JSON file, the file may not exist."""
+        moves = []
+        if path and Path(path).exists():
+            with open(path) as file:
+                moves = [
+                    tuple(move) for move in json.load(file)[ShardConf.MOVES]
+                ]
+        return cls(shards=shards, vnodes=vnodes, moves=moves)
+
+    def save(self, path: str) -> None:
+        """Write moves to a JSON file, replace it when done."""
+        part = path + ShardConf.MAP_PART_SUFFIX
+        with open(part, "w") as file:
+            json.dump({ShardConf.MOVES: self.moves}, file)
+        os.replace(part, path)
+
+
+class Shard:
+    """Engine of one shard."""
+
+    def __init__(
+        self,
+        engine: AsyncEngine,
+        session_factory: "async_sessionmaker[AsyncSession]",
+    ) -> None:
+        """Init shard.
+
+        Args:
+            engine (AsyncEngine): Engine of the shard.
+            session_factory (async_sessionmaker): Factory of its sessions.
+        """
+        self.engine = engine
+        self.session_factory = session_factory
+
+
+class ShardRouter:
+    """Route work about a user to the shard owning the user ID.
+
+    The map file is checked at most once per `check_interval`, so moved
+    ranges reach every worker without a restart.
+    """
+
+    def __init__(
+        self,
+        shards: list[Shard],
+        vnodes: int,
+        map_file: str,
+        check_interval: float,
+    ) -> None:
+        """Init router.
+
+        Args:
+            shards (list[Shard]): Shards, the primary first.
+            vnodes (int): Points of every shard on the ring.
+            map_file (str): JSON file of moved ranges, may be empty.
+            check_interval (float): Time between checks of the file.
+        """
+        self._shards = shards
+        self._vnodes = vnodes
+        self._map_file = map_file
+        self._check_interval = check_interval
+        self._map = ShardMap.load(
+            path=map_file, shards=len(shards), vnodes=vnodes
+        )
+        self._map_mtime = self._mtime()
+        self._checked_at = time.monotonic()
+
+    def __bool__(self) -> bool:
+        """Return True if there is more than the primary."""
+        return len(self._shards) > 1
+
+    def __len__(self) -> int:
+        """Return number of shards."""
+        return len(self._shards)
+
+    def _mtime(self) -> float:
+        """Return modification time of the map file, 0 without it."""
+        try:
+            return os.stat(self._map_file).st_mtime
+        except OSError:
+            return 0.0
+
+    @property
+    def map(self) -> ShardMap:
+        """Return current map, reload the file if it was changed."""
+        now = time.monotonic()
+        if now - self._checked_at >= self._check_interval:
+            self._checked_at = now
+            mtime = self._mtime()
+            if mtime != self._map_mtime:
+                self._map = ShardMap.load(
+                    path=self._map_file,
+                    shards=len(self._shards),
+                    vnodes=self._vnodes,
+                )
+                self._map_mtime = mtime
+        return self._map
+
+    def shard_of(self, user_id: uuid.UUID) -> int:
+        """Return shard of a user."""
+        return self.map.shard_of(user_id)
+
+    def engine(self, shard: int) -> AsyncEngine:
+        """Return engine of a shard."""
+        return self._shards[shard].engine
+
+    def session_factory(
+        self, shard: int
+    ) -> "async_sessionmaker[AsyncSession]":
+        """Return session factory of a shard."""
+        return self._shards[shard].session_factory
+
+    async def dispose(self) -> None:
+        """Close connection pools of the shards after the primary."""
+        for index, shard in enumerate(self._shards):
+            if index != ShardConf.PRIMARY:
+                await shard.engine.dispose()
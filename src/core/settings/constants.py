@@ -30,6 +30,20 @@ class UserRefRoutes:
     REFERRAL_TOKEN_GET_PATH_BY_EMAIL = "/user/referral/email"
     REFERRAL_GET_PATH_BY_ID = "/user/referral"
     REFERRAL_DELETE_PATH = "/user/referral"
+    REFERRAL_EXPORT_PATH = "/user/referral/export"
+    REFERRAL_COUNT_PATH = "/user/referral/count"
+    REFERRAL_TOP_PATH = "/user/referral/top"
+    REFERRAL_TREE_PATH = "/user/referral/tree"
+    REFERRAL_DAILY_PATH = "/user/referral/daily"
+    REFERRAL_BATCH_PATH = "/user/referral/batch"
+    REFERRAL_CHECK_PATH = "/user/referral/check"
+
+
+class AdminRoutes:
+    """Admin routes."""
+
+    TAG = "ADMIN"
+    IMPORT_PATH = "/admin/import"
 
 
 class DetailError:
@@ -149,6 +163,7 @@ class MimeTypes:
     """МIME types constants."""
 
     APPLICATION_JSON = "application/json"
+    APPLICATION_NDJSON = "application/x-ndjson"
 
 
 class JWT:
@@ -174,6 +189,102 @@ class JWT:
     EXP_BY_EMAIL_OR_ID = 10
 
 
+class Pagination:
+    """Keyset pagination of referrals."""
+
+    DEFAULT_LIMIT = 100
+    MAX_LIMIT = 1000
+    FIELDS_SEPARATOR = ","
+    FIELD_ID = "id"
+    FIELD_NAME = "name"
+    FIELDS = frozenset({FIELD_ID, FIELD_NAME})
+    SYNC_LAG_SECONDS = 10
+
+
+class ReferralSummaryConf:
+    """Referral summaries maintained on write."""
+
+    PAGE_SIZE = Pagination.DEFAULT_LIMIT
+    PAGE_PATH = f"$[0 to {PAGE_SIZE - 1}]"
+    ITEM_ID = "id"
+    ITEM_NAME = "name"
+    ITEM_SEQ = "seq"
+    REPAIR_BATCH = 1000
+
+
+class ReferralCodeConf:
+    """Batch check of referral codes."""
+
+    MAX_CODES = 1000
+    MEMO_SIZE = 50_000
+    STATUS_VALID = "valid"
+    STATUS_INVALID = "invalid"
+    STATUS_EXPIRED = "expired"
+    STATUS_INACTIVE = "inactive"
+    JWT_SEPARATOR = "."
+    SHORT_PREFIX = "referral_code"
+    SHORT_BYTES = 8
+    SHORT_LENGTH = -(-SHORT_BYTES * 4 // 3)
+    SHORT_ATTEMPTS = 3
+
+
+class SingletonConf:
+    """One cached token per user issued at most once at a time."""
+
+    LOCK_MS = 2000
+    LOCK_OWNER_BYTES = 8
+    POLL_SECONDS = 0.01
+    ATTEMPTS = 3
+    CLAIMED = 1
+    BUSY = 0
+
+
+class EmailOwnerConf:
+    """User IDs of emails cached for lookups by email."""
+
+    PREFIX = "email_owner"
+    EXPIRE = 30 * 24 * 60 * 60
+    MEMO_SIZE = 50_000
+
+
+class ReferralBatchConf:
+    """First pages of referrals of many referrers in one request."""
+
+    MAX_IDS = 100
+    CACHE_PREFIX = JWT.PREFIX_BY_EMAIL_OR_ID
+    CACHE_EXPIRE = JWT.EXP_BY_EMAIL_OR_ID
+    CACHE_SUFFIX = "batch"
+
+
+class ReferralTreeConf:
+    """Referrals on several levels under a referrer."""
+
+    DEFAULT_DEPTH = 3
+    MAX_DEPTH = 5
+    CACHE_PREFIX = "referral_tree"
+    CACHE_EXPIRE = 60
+    SEQ_BITS = 64
+    SHARD_BITS = 16
+
+
+class Leaderboard:
+    """Referral counters of referrers in Redis."""
+
+    COUNTS_KEY = "referral_count"
+    BOARD_KEY = "referral_top"
+    REBUILD_SUFFIX = ":rebuild"
+    TOP_DEFAULT = 10
+    TOP_MAX = 100
+    RECONCILE_BATCH = 1000
+
+
+class Export:
+    """Streaming export of referrals."""
+
+    CHUNK_SIZE = 1000
+    LINE_SEPARATOR = "\n"
+
+
 class CommonConfSettings:
     """Common configurate."""
 
@@ -193,6 +304,57 @@ class DBconf:
     DB_NAME = "referral"
 
 
+class ReferPartitionConf:
+    """Hash partitions of refer."""
+
+    PARTITIONS = 16
+    CREATE_PARTITION = (
+        "CREATE TABLE refer_p{remainder} PARTITION OF refer "
+        "FOR VALUES WITH (MODULUS {modulus}, REMAINDER {remainder})"
+    )
+
+
+class PgBouncerConf:
+    """PgBouncer transaction pooling."""
+
+    ENABLED = False
+    NULL_POOL = False
+    STATEMENT_NAME = "__asyncpg_{}__"
+
+
+class ReplicaConf:
+    """Read replicas."""
+
+    URLS_SEPARATOR = ","
+    EJECT_SECONDS = 30
+    MAX_LAG_SECONDS = 5
+    CHECK_SECONDS = 5
+    READ_YOUR_WRITES_SECONDS = 10
+    READ_YOUR_WRITES_PREFIX = "recent_write"
+    READ_YOUR_WRITES_PARAMS = ("user_id", "email")
+    MARK = "1"
+
+
+class ShardConf:
+    """Shards of users and the referral graph."""
+
+    PRIMARY = 0
+    URLS_SEPARATOR = ","
+    VNODES = 64
+    MAP_CHECK_SECONDS = 5
+    POINT_KEY = "shard-{shard}-{vnode}"
+    MIN_HASH = -(2**63)
+    MAX_HASH = 2**63 - 1
+    COPY_BATCH = 10_000
+    MOVES = "moves"
+    MAP_PART_SUFFIX = ".part"
+    SYNC_REFER_SEQ = (
+        "SELECT setval('refer_seq', GREATEST("
+        "(SELECT COALESCE(max(seq), 1) FROM refer), "
+        "(SELECT last_value FROM refer_seq)))"
+    )
+
+
 class JWTconf:
     """Conf for settings."""
 
@@ -201,6 +363,7 @@ class JWTconf:
     ACCESS_EXPIRE_MINUTES = 15
     REFRESH_EXPIRE_DAYS = 30
     REFERRAL_EXPIRE_DAYS = 100
+    REFERRAL_SHORT_CODES = False
     PRIVATE_KEY = "private_key"
     PUBLIC_KEY = "public_key"
 
@@ -218,6 +381,141 @@ class GunicornConf:
     MIN_WORKERS = 1
 
 
+class RegistrationBatchConf:
+    """Group commit of registrations."""
+
+    ENABLED = False
+    MAX_SIZE = 100
+    MAX_DELAY_MS = 5
+    MS_IN_SECOND = 1000
+
+
+class BloomConf:
+    """Per-worker Bloom filters of live referral codes and emails."""
+
+    ENABLED = False
+    FALSE_POSITIVE_RATE = 0.01
+    MAX_MEMORY_MB = 64
+    BYTES_IN_MB = 1 << 20
+    REBUILD_SECONDS = 3600
+    RELOAD_SECONDS = 60
+    RECONNECT_SECONDS = 1
+    RETRY_SECONDS = 60
+    GROWTH = 2
+    MIN_CAPACITY = 1024
+    BUILD_BATCH = 1000
+    SCAN_COUNT = 1000
+    HASH_BYTES = 8
+    HEADER = "!QIQQ"
+    STREAM = "bloom_filters"
+    STREAM_MAXLEN = 1_000_000
+    READ_COUNT = 1000
+    READ_BLOCK_MS = 5000
+    MARKER = "snapshot"
+    SNAPSHOT_KEY = "bloom_filters:snapshot"
+    SNAPSHOT_STREAM_ID = "stream_id"
+    SEPARATOR = ":"
+    FILTER_EMAILS = "emails"
+    FILTER_REFERRALS = "referrals"
+
+
+class BulkImportConf:
+    """Bulk import of users and referral edges."""
+
+    CHUNK_SIZE = 10_000
+    FORMAT_CSV = "csv"
+    FORMAT_NDJSON = "ndjson"
+    FORMATS = {
+        ".csv": FORMAT_CSV,
+        ".ndjson": FORMAT_NDJSON,
+        ".jsonl": FORMAT_NDJSON,
+    }
+    CSV_FIRST_LINE = 2
+    REJECTS_DIR = "/tmp"
+    REJECTS_FILE = "rejected-{}.csv"
+    REJECTS_HEADER = ("kind", "line", "email", "reason")
+    KIND_USER = "user"
+    KIND_EDGE = "edge"
+    HASHED_PASSWORD_PATTERN = r"^\$2[aby]\$\d{2}\$[./A-Za-z0-9]{53}$"
+    UNKNOWN_FORMAT = "unknown format of import file"
+    REJECT_INVALID_JSON = "invalid JSON"
+    REJECT_PASSWORD_REQUIRED = "exactly one of password, hashed_password"
+    REJECT_DUPLICATE_EMAIL = "duplicate email in file"
+    REJECT_EMAIL_TAKEN = "email already registered"
+    REJECT_UNKNOWN_REFERRER = "unknown referrer"
+    REJECT_UNKNOWN_REFERRED = "unknown referred user"
+    REJECT_SELF_REFERRAL = "self referral"
+    REJECT_DUPLICATE_REFERRED = "duplicate referred user in file"
+    REJECT_HAS_REFERRER = "referred user already has a referrer"
+
+
+class GraphExportConf:
+    """Export of users and referral edges."""
+
+    FULL_SINCE = 0
+    LAG_SECONDS = 60
+    TIMEZONE = "UTC"
+    ISOLATION_LEVEL = "REPEATABLE READ"
+    FILE_NAME = "{table}-{since}-{until}"
+    CSV_SUFFIX = ".csv.gz"
+    PART_SUFFIX = ".part"
+    GZIP = "gzip"
+    PARQUET = "parquet"
+    ARROW = "arrow"
+    COLUMNAR = (PARQUET, ARROW)
+    PARQUET_COMPRESSION = "zstd"
+    BLOCK_SIZE = 1 << 20
+    STATE_LAST_SEQ = "last_seq"
+    TABLE_REFER = "refer"
+    TABLE_USERS = "users"
+
+
+class GraphSnapshotConf:
+    """Array snapshot of the referral graph."""
+
+    FULL_SINCE = GraphExportConf.FULL_SINCE
+    LAG_SECONDS = GraphExportConf.LAG_SECONDS
+    ISOLATION_LEVEL = GraphExportConf.ISOLATION_LEVEL
+    CHUNK_SIZE = 100_000
+    UUID_DTYPE = "V16"
+    NO_NODE = -1
+    ARRAYS = (
+        "ids",
+        "sorted_ids",
+        "sorted_nodes",
+        "parent",
+        "indptr",
+        "indices",
+    )
+    NPY_SUFFIX = ".npy"
+    PART_SUFFIX = GraphExportConf.PART_SUFFIX
+    META_FILE = "meta.json"
+    META_NODES = "nodes"
+    META_LAST_SEQ = "last_seq"
+    BENCH_EDGES = 10_000_000
+    BENCH_QUERIES = 100_000
+    BENCH_DEPTH = 3
+    BENCH_SEED = 42
+
+
+class RollupConf:
+    """Referrals per referrer and day."""
+
+    NAME = "referral_daily"
+    FULL_SINCE = GraphExportConf.FULL_SINCE
+    LAG_SECONDS = GraphExportConf.LAG_SECONDS
+    TIMEZONE = GraphExportConf.TIMEZONE
+    BATCH = 100_000
+    LOOP_SECONDS = 0.0
+    DEFAULT_DAYS = 30
+    MAX_DAYS = 366
+    CACHE_PREFIX = "referral_daily"
+    CACHE_EXPIRE = 60
+    REFER_FILES = "refer-*"
+    COLUMN_DAY = "day"
+    COLUMN_COUNT = "count"
+
+
 class RedisConf:
     """Redis conf data."""
 
@@ -248,6 +546,16 @@ class MessageError:
     MESSAGE_SERVER_ERROR = "An error occurred."
     MESSAGE_ENV_FILE_INCORRECT_OR_NOT_EXIST = "~/.env  incorrect or not exist"
     MESSAGE_NO_REFERRALS_FOUND = "No referrals found"
+    INVALID_QUERY_ERR = "Invalid query."
+    INVALID_CURSOR_ERR_MESSAGE = "Cursor is not correct."
+    INVALID_FIELDS_ERR_MESSAGE = "Allowed fields: id, name."
+    INVALID_DATE_RANGE_ERR_MESSAGE = (
+        f"`until` must not precede `since`, "
+        f"the range is up to {RollupConf.MAX_DAYS} days."
+    )
+    INVALID_ADMIN_KEY_ERR = "Invalid admin key."
+    INVALID_ADMIN_KEY_ERR_MESSAGE = "Admin API is disabled or key is wrong."
+    INVALID_IMPORT_FORMAT_ERR_MESSAGE = "Allowed files: .csv, .ndjson, .jsonl."
     MESSAGE_USER_NOT_FOUND = "User not found"
     MESSAGE_IF_EMAIL_ALREADY_EXIST = (
         "Registration failed. Please check your information."
@@ -270,6 +578,9 @@ class Headers:
     X_CACHE_MISS = "MISS"
     X_CACHE_HIT = "HIT"
     IF_NONE_MATCH = "if-none-match"
+    LAST_MODIFIED = "Last-Modified"
+    IF_MODIFIED_SINCE = "if-modified-since"
+    X_ADMIN_KEY = "X-Admin-Key"
 
 
 class Keys:
@@ -283,6 +594,11 @@ class Keys:
     AUTH_HEADER = "authorization"
     AUTH_HEADER_PREF_BEARER = 7
     REFERRER_INDEX = 0
+    USER_ID = "user_id"
+    CACHE_TAG = "tag"
+    CACHE_LOCK = "lock"
+    CACHE_LAST_MODIFIED = "last_modified"
+    UUID_VERSIONS = (4, 7)
 
 
 class TypeEncoding:
@@ -8,12 +8,18 @@ from pydantic import Field, ValidationError
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 from src.core.settings.constants import (
+    BloomConf,
+    BulkImportConf,
     CommonConfSettings,
     DBconf,
     GunicornConf,
     JWTconf,
     MessageError,
+    PgBouncerConf,
     RedisConf,
+    RegistrationBatchConf,
+    ReplicaConf,
+    ShardConf,
 )
 
 
@@ -62,6 +68,21 @@ class DataBaseEnvConf(UrlDBSettings, EnvironmentSetting):
         POSTGRES_DB (str): The name of the PostgreSQL database.
         POSTGRES_PASSWORD (str): The password for the PostgreSQL user.
         ECHO (bool): A flag to enable or disable SQLAlchemy query logging.
+        POSTGRES_REPLICA_URLS (str): Comma separated URLs of read replicas.
+        REPLICA_EJECT_SECONDS (float): Time out of rotation after a failure.
+        REPLICA_MAX_LAG_SECONDS (float): Max replication lag of a replica.
+        REPLICA_CHECK_SECONDS (float): Time between replica health checks.
+        READ_YOUR_WRITES_SECONDS (int): Reads go to the primary for this
+            time after a write of the user.
+        PGBOUNCER_MODE (bool): Connect through PgBouncer in transaction
+            pooling, prepared statements are not cached.
+        NULL_POOL (bool): Do not keep connections in workers.
+        POSTGRES_SHARD_URLS (str): Comma separated URLs of shards 1..N,
+            the primary is shard 0.
+        SHARD_VNODES (int): Points of every shard on the hash ring.
+        SHARD_MAP_FILE (str): JSON file of hash ranges moved between
+            shards, empty without moves.
+        SHARD_MAP_CHECK_SECONDS (float): Time between checks of the file.
     """
 
     POSTGRES_HOST: str = Field(default=DBconf.DB_HOST)
@@ -74,6 +95,27 @@ class DataBaseEnvConf(UrlDBSettings, EnvironmentSetting):
     POOL_SIZE_SQL_ALCHEMY_CONF: int = Field(default=5)
     MAX_OVERFLOW: int = Field(default=5)
     MODE: str = Field(min_length=2, default="PROD")
+    PGBOUNCER_MODE: bool = Field(default=PgBouncerConf.ENABLED)
+    NULL_POOL: bool = Field(default=PgBouncerConf.NULL_POOL)
+    POSTGRES_REPLICA_URLS: str = Field(default="")
+    REPLICA_EJECT_SECONDS: float = Field(
+        default=ReplicaConf.EJECT_SECONDS, ge=0
+    )
+    REPLICA_MAX_LAG_SECONDS: float = Field(
+        default=ReplicaConf.MAX_LAG_SECONDS, ge=0
+    )
+    REPLICA_CHECK_SECONDS: float = Field(
+        default=ReplicaConf.CHECK_SECONDS, ge=0
+    )
+    READ_YOUR_WRITES_SECONDS: int = Field(
+        default=ReplicaConf.READ_YOUR_WRITES_SECONDS, ge=1
+    )
+    POSTGRES_SHARD_URLS: str = Field(default="")
+    SHARD_VNODES: int = Field(default=ShardConf.VNODES, ge=1)
+    SHARD_MAP_FILE: str = Field(default="")
+    SHARD_MAP_CHECK_SECONDS: float = Field(
+        default=ShardConf.MAP_CHECK_SECONDS, ge=0
+    )
 
     @property
     def get_url_database(self) -> str:
@@ -91,6 +133,26 @@ class DataBaseEnvConf(UrlDBSettings, EnvironmentSetting):
             f"{self.POSTGRES_PORT}/{self.POSTGRES_DB}"
         )
 
+    @property
+    def get_replica_urls(self) -> list[str]:
+        """Return URLs of read replicas, empty without replicas."""
+        return [
+            url.strip()
+            for url in self.POSTGRES_REPLICA_URLS.split(
+                ReplicaConf.URLS_SEPARATOR
+            )
+            if url.strip()
+        ]
+
+    @property
+    def get_shard_urls(self) -> list[str]:
+        """Return URLs of shards after the primary, empty without shards."""
+        return [
+            url.strip()
+            for url in self.POSTGRES_SHARD_URLS.split(ShardConf.URLS_SEPARATOR)
+            if url.strip()
+        ]
+
 
 class JWTToken(EnvironmentSetting):
     """Class for handling JWT settings.
@@ -108,6 +170,8 @@ class JWTToken(EnvironmentSetting):
             access token in minutes, default is 15.
         refresh_token_expire_days (int): The expiration time for the
             refresh token in days, default is 30.
+        referral_short_codes (bool): Issue short random referral codes
+            kept in Redis instead of JWTs, default is False.
 
     Example:
         Usage of the class to load JWT configuration from an `.env` file:
@@ -136,6 +200,7 @@ class JWTToken(EnvironmentSetting):
     referral_token_expire_days: int = Field(
         default=JWTconf.REFRESH_EXPIRE_DAYS
     )
+    referral_short_codes: bool = Field(default=JWTconf.REFERRAL_SHORT_CODES)
 
     @property
     def set_referral_token_expire_days(self) -> int:
@@ -189,6 +254,69 @@ class GunicornENV(EnvironmentSetting):
     ERRORLOG: str = Field(default=GunicornConf.ERRORLOG)
 
 
+class RegistrationBatchEnv(EnvironmentSetting):
+    """Conf group commit of registrations.
+
+    Environments params:
+     - REGISTRATION_BATCH_ENABLED: bool
+     - REGISTRATION_BATCH_MAX_SIZE: int
+     - REGISTRATION_BATCH_MAX_DELAY_MS: int
+    """
+
+    REGISTRATION_BATCH_ENABLED: bool = Field(
+        default=RegistrationBatchConf.ENABLED
+    )
+    REGISTRATION_BATCH_MAX_SIZE: int = Field(
+        default=RegistrationBatchConf.MAX_SIZE, ge=1
+    )
+    REGISTRATION_BATCH_MAX_DELAY_MS: int = Field(
+        default=RegistrationBatchConf.MAX_DELAY_MS, ge=0
+    )
+
+    @property
+    def max_delay(self) -> float:
+        """Return the max wait of a batch in seconds."""
+        return (
+            self.REGISTRATION_BATCH_MAX_DELAY_MS
+            / RegistrationBatchConf.MS_IN_SECOND
+        )
+
+
+class BloomEnv(EnvironmentSetting):
+    """Conf per-worker Bloom filters.
+
+    Environments params:
+     - BLOOM_FILTERS_ENABLED: bool
+     - BLOOM_FALSE_POSITIVE_RATE: float
+     - BLOOM_MAX_MEMORY_MB: int, per filter
+     - BLOOM_REBUILD_SECONDS: int, pause of the build job, 0 builds once
+    """
+
+    BLOOM_FILTERS_ENABLED: bool = Field(default=BloomConf.ENABLED)
+    BLOOM_FALSE_POSITIVE_RATE: float = Field(
+        default=BloomConf.FALSE_POSITIVE_RATE, gt=0, lt=1
+    )
+    BLOOM_MAX_MEMORY_MB: int = Field(default=BloomConf.MAX_MEMORY_MB, ge=1)
+    BLOOM_REBUILD_SECONDS: int = Field(default=BloomConf.REBUILD_SECONDS, ge=0)
+
+    @property
+    def max_bytes(self) -> int:
+        """Return the max size of one filter in bytes."""
+        return self.BLOOM_MAX_MEMORY_MB * BloomConf.BYTES_IN_MB
+
+
+class AdminEnv(EnvironmentSetting):
+    """Conf admin API and bulk import.
+
+    Environments params:
+     - ADMIN_API_KEY: str, admin routes answer 403 while it is not set
+     - IMPORT_REJECTS_DIR: str
+    """
+
+    ADMIN_API_KEY: str | None = Field(default=None, min_length=16)
+    IMPORT_REJECTS_DIR: str = Field(default=BulkImportConf.REJECTS_DIR)
+
+
 class Settings:
     """Common settings for environments.
 
@@ -220,6 +348,9 @@ class Settings:
         self.jwt = JWTToken()
         self.redis = RedisEnv()
         self.gunicorn = GunicornENV()
+        self.registration_batch = RegistrationBatchEnv()
+        self.bloom = BloomEnv()
+        self.admin = AdminEnv()
 
 
 settings = Settings()
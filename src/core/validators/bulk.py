@@ -0,0 +1,65 @@
+"""Bulk import validators."""
+
+import pydantic
+
+from src.core.settings.constants import BulkImportConf
+
+
+class ImportUser(pydantic.BaseModel):
+    """**Row of users file**.
+
+    - `name`: User's name.
+    - `email`: User's email.
+    - `password`: Plain password, hashed on import.
+    - `hashed_password`: Ready bcrypt hash, stored as is.
+    """
+
+    name: str = pydantic.Field(
+        min_length=2, max_length=15, pattern=r"^[a-zA-Z0-9_]+$"
+    )
+    email: pydantic.EmailStr
+    password: str | None = pydantic.Field(
+        default=None, min_length=8, max_length=64
+    )
+    hashed_password: str | None = pydantic.Field(
+        default=None, pattern=BulkImportConf.HASHED_PASSWORD_PATTERN
+    )
+
+    @pydantic.model_validator(mode="after")
+    def one_password(self) -> "ImportUser":
+        """Check that exactly one of the passwords is given."""
+        if (self.password is None) == (self.hashed_password is None):
+            raise ValueError(BulkImportConf.REJECT_PASSWORD_REQUIRED)
+        return self
+
+
+class ImportEdge(pydantic.BaseModel):
+    """**Row of referral edges file**.
+
+    - `referrer_email`: Email of the referrer.
+    - `referred_email`: Email of the referred user.
+    """
+
+    referrer_email: pydantic.EmailStr
+    referred_email: pydantic.EmailStr
+
+
+class ImportReport(pydantic.BaseModel):
+    """**Result of bulk import**.
+
+    - `users_read`: Rows read from users file.
+    - `users_imported`: New users.
+    - `edges_read`: Rows read from edges file.
+    - `edges_imported`: New referral edges.
+    - `rejected`: Rows written to the rejects file.
+    - `rejects_file`: Path of the rejects file.
+    """
+
+    users_read: int = 0
+    users_imported: int = 0
+    edges_read: int = 0
+    edges_imported: int = 0
+    rejected: int = 0
+    rejects_file: str | None = None
+
+    model_config = pydantic.ConfigDict(title="Import report")
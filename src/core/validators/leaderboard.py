@@ -0,0 +1,29 @@
+"""Referral counters validator."""
+
+import pydantic
+
+
+class ReferralCount(pydantic.BaseModel):
+    """**Model for referrals of one referrer**.
+
+    - `id`: Identification of user.
+    - `count`: Referrals of the user.
+    - `rank`: Place on the leaderboard from 1, absent without referrals.
+    """
+
+    id: str
+    count: int
+    rank: int | None = None
+
+    model_config = pydantic.ConfigDict(title="Referral count")
+
+
+class TopReferrers(pydantic.BaseModel):
+    """**Model for the leaderboard of referrers**.
+
+    - `top`: Referrers with most referrals, the first is the top.
+    """
+
+    top: list[ReferralCount]
+
+    model_config = pydantic.ConfigDict(title="Top referrers")
@@ -0,0 +1,35 @@
+"""Daily referral rollup validator."""
+
+from datetime import date
+
+import pydantic
+
+
+class ReferralDay(pydantic.BaseModel):
+    """**Model for referrals of one day**.
+
+    - `day`: UTC date.
+    - `count`: Referrals made on the day.
+    """
+
+    day: date
+    count: int
+
+    model_config = pydantic.ConfigDict(title="Referral day")
+
+
+class UserReferralDaily(pydantic.BaseModel):
+    """**Model for referrals of a user per day**.
+
+    - `id`: Identification of user.
+    - `since`: First day of the range.
+    - `until`: Last day of the range.
+    - `days`: Days with referrals, days without them are absent.
+    """
+
+    id: str
+    since: date
+    until: date
+    days: list[ReferralDay]
+
+    model_config = pydantic.ConfigDict(title="User referrals per day")
@@ -4,7 +4,7 @@ import datetime
 
 import pydantic
 
-from src.core.settings.constants import JWT
+from src.core.settings.constants import JWT, ReferralCodeConf
 from src.core.settings.env import settings
 
 
@@ -36,3 +36,32 @@ class TokenReferral(pydantic.BaseModel):
     """
 
     referral_token: str = pydantic.Field()
+
+
+class ReferralCodes(pydantic.BaseModel):
+    """**Referral codes to check**.
+
+    - `codes`: Referral tokens from signup links.
+    """
+
+    codes: list[str] = pydantic.Field(
+        min_length=1, max_length=ReferralCodeConf.MAX_CODES
+    )
+
+
+class ReferralCodeStatus(pydantic.BaseModel):
+    """**Status of one referral code**.
+
+    - `status`: `valid`, `invalid` signature or type, `expired`, or
+      `inactive` when the referrer has no live code.
+    - `referrer`: Referrer's ID of a valid code.
+    """
+
+    status: str
+    referrer: str | None = None
+
+
+class ReferralCodeStatuses(pydantic.BaseModel):
+    """**Statuses of referral codes in the order of the request**."""
+
+    statuses: list[ReferralCodeStatus]
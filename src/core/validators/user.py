@@ -2,6 +2,8 @@
 
 import pydantic
 
+from src.core.settings.constants import ReferralBatchConf
+
 
 class User(pydantic.BaseModel):
     """**Model for tweet author details**.
@@ -13,8 +15,8 @@ class User(pydantic.BaseModel):
     id: str = pydantic.Field(
         description="Identification of user.",
     )
-    name: str = pydantic.Field(
-        ...,
+    name: str | None = pydantic.Field(
+        default=None,
         description="User's name.",
         min_length=2,
         max_length=15,
@@ -24,10 +26,72 @@ class User(pydantic.BaseModel):
 
 
 class UserReferrals(pydantic.BaseModel):
-    """Validate model for profile of user."""
+    """Validate model for profile of user.
+
+    - `next_cursor`: Cursor of the next page, absent on the last one.
+    - `last_seq`: Sequence of the last referral, use it as `since=`.
+    """
 
     id: str
-    name: str
+    name: str | None = None
     referrals: list[User | None]
+    next_cursor: str | None = None
+    last_seq: int | None = None
 
     model_config = pydantic.ConfigDict(title="User's referrals")
+
+
+class TreeNode(User):
+    """**Model for a user in the referral tree**.
+
+    - `referrer`: Identification of the user's referrer.
+    - `level`: Distance from the root, 1 for direct referrals.
+    """
+
+    referrer: str
+    level: int
+
+    model_config = pydantic.ConfigDict(title="Tree node")
+
+
+class UserReferralTree(pydantic.BaseModel):
+    """Validate model for referrals on several levels.
+
+    - `levels`: Referrals on levels 1, 2 and so on.
+    - `nodes`: Page of users ordered by the time they joined.
+    - `next_cursor`: Cursor of the next page, absent on the last one.
+    """
+
+    id: str
+    depth: int
+    levels: list[int]
+    nodes: list[TreeNode]
+    next_cursor: str | None = None
+
+    model_config = pydantic.ConfigDict(title="User's referral tree")
+
+
+class ReferralBatch(pydantic.BaseModel):
+    """**Model for referrers of a batch lookup**.
+
+    - `user_ids`: Referrers' IDs, repeated ones are looked up once.
+    """
+
+    user_ids: list[str] = pydantic.Field(
+        min_length=1, max_length=ReferralBatchConf.MAX_IDS
+    )
+
+    model_config = pydantic.ConfigDict(title="Referral batch")
+
+
+class UserReferralsBatch(pydantic.BaseModel):
+    """Validate model for first pages of referrals of many referrers.
+
+    - `found`: First page by referrer ID, as `GET /user/referral` has it.
+    - `not_found`: IDs of referrers without referrals.
+    """
+
+    found: dict[str, UserReferrals]
+    not_found: list[str]
+
+    model_config = pydantic.ConfigDict(title="Users' referrals")
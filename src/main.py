@@ -5,12 +5,20 @@ from contextlib import asynccontextmanager
 import uvicorn
 from fastapi import FastAPI
 
+from src.core.controllers.admin import admin
 from src.core.controllers.auth import auth
+from src.core.controllers.depends.utils.bloom_filters import (
+    close_bloom_filters,
+    start_bloom_filters,
+)
 from src.core.controllers.depends.utils.connect_db import disconnect_db
 from src.core.controllers.depends.utils.redis_chash import (
     close_redis,
     init_redis,
 )
+from src.core.controllers.depends.utils.registration_batcher import (
+    close_registration_batcher,
+)
 from src.core.controllers.referral import ref
 from src.core.controllers.registration import registration
 from src.core.settings.constants import Prefix
@@ -20,7 +28,10 @@ from src.core.settings.constants import Prefix
 async def lifespan(_: FastAPI):
     """Connect and close DB."""
     redis = await init_redis()
+    start_bloom_filters()
     yield
+    await close_bloom_filters()
+    await close_registration_batcher()
     await disconnect_db()
     await close_redis(client=redis)
 
@@ -34,6 +45,7 @@ def create_app() -> FastAPI:
     app_.include_router(router=registration)
     app_.include_router(router=auth)
     app_.include_router(router=ref)
+    app_.include_router(router=admin)
 
     return app_
 
@@ -0,0 +1,149 @@
+"""Fixtures of tests against local Postgres databases and Redis.
+
+Database tests run if `TEST_POSTGRES_URL` points to a server where the
+user may create databases, e.g.
+`postgresql://postgres@127.0.0.1:5432/postgres`, and are skipped
+otherwise. Every test gets its own databases, they are dropped after it.
+
+Redis tests run if `TEST_REDIS_URL` points to a server, e.g.
+`redis://127.0.0.1:6379/15`, and are skipped otherwise. Keys a test adds
+are deleted after it, use a database of its own.
+"""
+
+import os
+import uuid
+from typing import AsyncIterator, Awaitable, Callable
+
+from redis.asyncio.client import Redis
+
+import anyio
+import pytest
+from sqlalchemy import text
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from alembic import command
+from alembic.config import Config
+from src.core.controllers.depends.utils.redis_chash import (
+    close_redis,
+    setup_redis,
+)
+from src.core.orm.crud import create_crud_helper  # noqa F401, loads models
+from src.core.orm.models.base import BaseModel
+from src.core.settings.env import settings
+
+TEST_POSTGRES_URL = "TEST_POSTGRES_URL"
+TEST_REDIS_URL = "TEST_REDIS_URL"
+DATABASE_PREFIX = "referapi_test_"
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+POSTGRES_PORT = 5432
+
+
+@pytest.fixture
+def anyio_backend() -> str:
+    """Run async tests on asyncio, as the app does."""
+    return "asyncio"
+
+
+@pytest.fixture(scope="session")
+def postgres_url() -> URL:
+    """Return URL of the test server, skip the test without it."""
+    url = os.environ.get(TEST_POSTGRES_URL)
+    if not url:
+        pytest.skip(f"{TEST_POSTGRES_URL} is not set")
+    return make_url(url).set(drivername="postgresql+asyncpg")
+
+
+@pytest.fixture
+async def create_database(
+    postgres_url: URL,
+) -> AsyncIterator[Callable[..., Awaitable[URL]]]:
+    """Return a factory of empty databases, `schema=True` adds tables.
+
+    The tables are made by `create_all` of the models, as
+    `ManagerDB` makes them on shards.
+    """
+    admin = create_async_engine(postgres_url, isolation_level="AUTOCOMMIT")
+    names: list[str] = []
+
+    async def create(schema: bool = False) -> URL:
+        name = DATABASE_PREFIX + uuid.uuid4().hex[:12]
+        async with admin.connect() as connection:
+            await connection.execute(text(f"CREATE DATABASE {name}"))
+        names.append(name)
+        url = postgres_url.set(database=name)
+        if schema:
+            engine = create_async_engine(url)
+            async with engine.begin() as connection:
+                await connection.run_sync(BaseModel.metadata.create_all)
+            await engine.dispose()
+        return url
+
+    try:
+        async with admin.connect() as connection:
+            await connection.execute(text("SELECT 1"))
+    except OSError as e:
+        await admin.dispose()
+        pytest.skip(f"{TEST_POSTGRES_URL} is not reachable: {e}")
+    yield create
+    async with admin.connect() as connection:
+        for name in names:
+            await connection.execute(
+                text(f"DROP DATABASE IF EXISTS {name} WITH (FORCE)")
+            )
+    await admin.dispose()
+
+
+@pytest.fixture
+def migrate(
+    monkeypatch: pytest.MonkeyPatch,
+) -> Callable[[URL, str], Awaitable[None]]:
+    """Return a function that upgrades a database to a revision.
+
+    `alembic/env.py` takes the URL from the settings, so they are set to
+    the database for the time of the test. Alembic runs its own event
+    loop, so it runs in a thread.
+    """
+
+    async def upgrade(url: URL, revision: str) -> None:
+        for field, value in (
+            ("POSTGRES_HOST", url.host),
+            ("POSTGRES_PORT", url.port or POSTGRES_PORT),
+            ("POSTGRES_USER", url.username),
+            ("POSTGRES_PASSWORD", url.password or ""),
+            ("POSTGRES_DB", url.database),
+        ):
+            monkeypatch.setattr(settings.db, field, value)
+        config = Config(os.path.join(ROOT, "alembic.ini"))
+        config.set_main_option(
+            "script_location", os.path.join(ROOT, "alembic")
+        )
+        await anyio.to_thread.run_sync(command.upgrade, config, revision)
+
+    return upgrade
+
+
+@pytest.fixture(scope="session")
+def redis_url() -> str:
+    """Return URL of the test Redis, skip the test without it."""
+    url = os.environ.get(TEST_REDIS_URL, "")
+    if not url:
+        pytest.skip(f"{TEST_REDIS_URL} is not set")
+    return url
+
+
+@pytest.fixture
+async def redis_client(redis_url: str) -> AsyncIterator[Redis]:
+    """Return the shared client of the app, new keys deleted after.
+
+    It is made by `setup_redis` first, as at app startup, so the app
+    code under test gets the same client, decoding responses.
+    """
+    client = await setup_redis(url=redis_url)
+    assert client.get_encoder().decode_responses
+    before = set(await client.keys())
+    yield client
+    added = set(await client.keys()) - before
+    if added:
+        await client.delete(*added)
+    await close_redis(client)
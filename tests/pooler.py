@@ -0,0 +1,176 @@
+"""Stand-in of PgBouncer in transaction pooling mode.
+
+It speaks just enough of the Postgres wire protocol: clients are
+authenticated by the pooler itself, every client message goes to a
+server connection taken from the pool, and the connection goes back to
+the pool when the server reports ReadyForQuery outside of a transaction.
+Released connections are queued at the end, so the next transaction of
+a client usually runs on another server connection, as it does under
+load in PgBouncer. Servers must accept the user without a password.
+"""
+
+import asyncio
+import struct
+from collections import Counter
+
+from sqlalchemy.engine import URL
+
+SSL_REQUEST = 80877103
+GSSENC_REQUEST = 80877104
+PROTOCOL_VERSION = 196608
+READY_FOR_QUERY = b"Z"
+TERMINATE = b"X"
+PARSE = b"P"
+PARAMETER_STATUS = b"S"
+IDLE = b"I"
+
+
+async def read_message(reader: asyncio.StreamReader) -> tuple[bytes, bytes]:
+    """Return type and the whole raw message."""
+    header = await reader.readexactly(5)
+    (length,) = struct.unpack("!i", header[1:])
+    return header[:1], header + await reader.readexactly(length - 4)
+
+
+def startup_message(user: str, database: str) -> bytes:
+    """Return StartupMessage of protocol 3.0."""
+    body = struct.pack("!i", PROTOCOL_VERSION)
+    for key, value in (("user", user), ("database", database)):
+        body += key.encode() + b"\0" + value.encode() + b"\0"
+    body += b"\0"
+    return struct.pack("!i", len(body) + 4) + body
+
+
+class Server:
+    """Connection of the pooler to the database server."""
+
+    def __init__(
+        self, number: int, reader: asyncio.StreamReader, writer
+    ) -> None:
+        """Keep the streams of an authenticated connection."""
+        self.number = number
+        self.reader = reader
+        self.writer = writer
+
+
+class TransactionPooler:
+    """Pool of `size` server connections shared by any number of clients.
+
+    `assignments` counts transactions per server connection,
+    `statements` keeps names of statements the clients prepared, in
+    order, and `errors` keeps error messages the servers sent to clients.
+    """
+
+    def __init__(self, url: URL, size: int) -> None:
+        """Set the server, connections are opened by `start`."""
+        self._server_url = url
+        self._size = size
+        self._idle: asyncio.Queue[Server] = asyncio.Queue()
+        self._servers: list[Server] = []
+        self._parameters = b""
+        self._listener: asyncio.base_events.Server | None = None
+        self.port = 0
+        self.assignments: Counter[int] = Counter()
+        self.statements: list[str] = []
+        self.errors: list[bytes] = []
+
+    async def start(self) -> None:
+        """Open server connections and listen on a free local port."""
+        for number in range(self._size):
+            reader, writer = await asyncio.open_connection(
+                self._server_url.host, self._server_url.port
+            )
+            writer.write(
+                startup_message(
+                    self._server_url.username, self._server_url.database
+                )
+            )
+            parameters = b""
+            while True:
+                kind, message = await read_message(reader)
+                if kind == PARAMETER_STATUS:
+                    parameters += message
+                if kind == READY_FOR_QUERY:
+                    break
+            self._parameters = parameters
+            server = Server(number=number, reader=reader, writer=writer)
+            self._servers.append(server)
+            self._idle.put_nowait(server)
+        self._listener = await asyncio.start_server(
+            self._serve, "127.0.0.1", 0
+        )
+        self.port = self._listener.sockets[0].getsockname()[1]
+
+    @property
+    def url(self) -> URL:
+        """Return URL of the database through the pooler."""
+        return self._server_url.set(host="127.0.0.1", port=self.port)
+
+    async def close(self) -> None:
+        """Stop listening and close server connections."""
+        if self._listener is not None:
+            self._listener.close()
+        for server in self._servers:
+            server.writer.write(TERMINATE + struct.pack("!i", 4))
+            server.writer.close()
+
+    async def _startup(self, reader, writer) -> None:
+        """Refuse SSL, accept the client and replay server parameters."""
+        while True:
+            (length,) = struct.unpack("!i", await reader.readexactly(4))
+            payload = await reader.readexactly(length - 4)
+            (code,) = struct.unpack("!i", payload[:4])
+            if code not in (SSL_REQUEST, GSSENC_REQUEST):
+                break
+            writer.write(b"N")
+        writer.write(b"R" + struct.pack("!ii", 8, 0))
+        writer.write(self._parameters)
+        writer.write(b"K" + struct.pack("!iii", 12, 0, 0))
+        writer.write(READY_FOR_QUERY + struct.pack("!i", 5) + IDLE)
+
+    async def _relay(self, server: Server, writer, released) -> None:
+        """Send server messages to the client until the server is idle."""
+        while True:
+            kind, message = await read_message(server.reader)
+            if kind == b"E":
+                self.errors.append(message)
+            if kind == READY_FOR_QUERY and message[5:] == IDLE:
+                released(server)
+                writer.write(message)
+                return
+            writer.write(message)
+
+    async def _serve(self, reader, writer) -> None:
+        """Serve a client connection, transaction by transaction."""
+        await self._startup(reader, writer)
+        relay: asyncio.Task | None = None
+        current: list[Server] = []
+
+        def released(server: Server) -> None:
+            current.clear()
+            self._idle.put_nowait(server)
+
+        try:
+            while True:
+                kind, message = await read_message(reader)
+                if kind == TERMINATE:
+                    break
+                if kind == PARSE:
+                    name = message[5:].partition(b"\0")[0]
+                    self.statements.append(name.decode())
+                if not current:
+                    if relay is not None:
+                        await relay
+                    server = await self._idle.get()
+                    self.assignments[server.number] += 1
+                    current.append(server)
+                    relay = asyncio.create_task(
+                        self._relay(server, writer, released)
+                    )
+                current[0].writer.write(message)
+        except asyncio.IncompleteReadError:
+            pass
+        finally:
+            if relay is not None:
+                await relay
+            writer.close()
@@ -0,0 +1,182 @@
+"""Bloom filters built by the job and loaded by workers."""
+
+import asyncio
+import uuid
+from typing import AsyncIterator
+
+import pytest
+
+from src.core.controllers.depends.utils import bloom_filters
+from src.core.controllers.depends.utils.bloom_filters import (
+    BloomFilter,
+    WorkerFilters,
+    build_filters,
+)
+from src.core.controllers.depends.utils.redis_chash import (
+    close_redis,
+    gen_key,
+)
+from src.core.settings.constants import JWT, BloomConf, ReferralCodeConf
+
+EMAILS = BloomConf.FILTER_EMAILS
+REFERRALS = BloomConf.FILTER_REFERRALS
+ITEMS = 10_000
+RATE = 0.01
+MAX_BYTES = 1 << 20
+WAIT_SECONDS = 5
+POLL_SECONDS = 0.05
+
+
+def test_dumps_loads_keeps_items():
+    """A loaded filter finds the same items and keeps its numbers."""
+    filter_ = BloomFilter.sized(
+        capacity=ITEMS, false_positive_rate=RATE, max_bytes=MAX_BYTES
+    )
+    for index in range(ITEMS):
+        filter_.add(f"user_{index}@example.com")
+
+    loaded = BloomFilter.loads(filter_.dumps())
+
+    assert (loaded.size, loaded.hashes, loaded.capacity, loaded.count) == (
+        filter_.size,
+        filter_.hashes,
+        filter_.capacity,
+        ITEMS,
+    )
+    for index in range(ITEMS):
+        assert f"user_{index}@example.com" in loaded
+    false_positives = sum(
+        f"other_{index}@example.com" in loaded for index in range(ITEMS)
+    )
+    assert false_positives < ITEMS * RATE * 2
+
+
+def new_worker(redis_url: str) -> WorkerFilters:
+    """Return filters of a worker, as the app starts them."""
+    return WorkerFilters(
+        reload_seconds=BloomConf.RELOAD_SECONDS, redis_url=redis_url
+    )
+
+
+def use_sources(monkeypatch, items: dict[str, list[str]], during=None):
+    """Make the job read `items` of the filters given in it.
+
+    `during` runs while they are read, other filters keep their source.
+    """
+
+    def source(name: str):
+        async def read() -> tuple[int, AsyncIterator[list[str]]]:
+            async def batches() -> AsyncIterator[list[str]]:
+                yield items[name]
+                if during is not None:
+                    await during()
+
+            return len(items[name]), batches()
+
+        return read
+
+    monkeypatch.setattr(
+        bloom_filters,
+        "_SOURCES",
+        {
+            name: source(name) if name in items else read_source
+            for name, read_source in bloom_filters._SOURCES.items()
+        },
+    )
+
+
+async def wait_for(filters: WorkerFilters, name: str, item: str) -> None:
+    """Wait until the filters of a worker may contain an item."""
+    async with asyncio.timeout(WAIT_SECONDS):
+        while not filters.may_contain(name=name, item=item):
+            await asyncio.sleep(POLL_SECONDS)
+
+
+@pytest.mark.anyio
+async def test_worker_loads_filters_and_follows_the_stream(
+    redis_client, redis_url, monkeypatch
+):
+    """Items of the build, written during it and after it are found."""
+    writer = new_worker(redis_url)
+
+    async def register() -> None:
+        await writer.publish(name=EMAILS, item="during@example.com")
+
+    use_sources(
+        monkeypatch,
+        {EMAILS: ["built@example.com"], REFERRALS: ["code"]},
+        during=register,
+    )
+    assert await build_filters(
+        false_positive_rate=RATE, max_bytes=MAX_BYTES
+    ) == {EMAILS: 1, REFERRALS: 1}
+
+    worker = new_worker(redis_url)
+    worker.start()
+    try:
+        await wait_for(worker, EMAILS, "during@example.com")
+        assert worker.may_contain(name=EMAILS, item="built@example.com")
+        assert worker.may_contain(name=REFERRALS, item="code")
+        assert worker.may_contain(name=REFERRALS, item="other") is False
+
+        await writer.publish(name=REFERRALS, item="after")
+        await wait_for(worker, REFERRALS, "after")
+    finally:
+        await worker.close()
+
+
+@pytest.mark.anyio
+async def test_filters_are_not_trusted_without_their_stream(
+    redis_client, redis_url, monkeypatch
+):
+    """No snapshot, or a stream trimmed past it, leaves no filter."""
+    worker = new_worker(redis_url)
+    binary_client = worker._binary_redis()
+    await worker._load(binary_client)
+    assert worker.may_contain(name=EMAILS, item="built@example.com") is None
+
+    use_sources(monkeypatch, {EMAILS: ["built@example.com"], REFERRALS: []})
+    await build_filters(false_positive_rate=RATE, max_bytes=MAX_BYTES)
+    await worker._load(binary_client)
+    assert worker.may_contain(name=EMAILS, item="built@example.com")
+
+    await build_filters(false_positive_rate=RATE, max_bytes=MAX_BYTES)
+    await redis_client.xadd(BloomConf.STREAM, {EMAILS: "new@example.com"})
+    await redis_client.xtrim(BloomConf.STREAM, maxlen=1, approximate=False)
+    await worker._load(binary_client)
+    assert worker.may_contain(name=EMAILS, item="built@example.com") is None
+    await close_redis(binary_client)
+
+
+@pytest.mark.anyio
+async def test_referral_codes_are_read_from_their_keys(
+    redis_client, redis_url, monkeypatch
+):
+    """Owners of tokens and short codes are found, other keys are not."""
+    owner = str(uuid.uuid4())
+    code = uuid.uuid4().hex[:8]
+    keys = {
+        gen_key(prefix_key=JWT.TOKEN_TYPE_REFERRAL, id_user=owner): "jwt",
+        gen_key(prefix_key=ReferralCodeConf.SHORT_PREFIX, id_user=code): "1",
+        gen_key(
+            prefix_key=ReferralCodeConf.SHORT_PREFIX, id_user=f"{code}:x"
+        ): "1",
+    }
+    await redis_client.mset(keys)
+    use_sources(monkeypatch, {EMAILS: []})
+    try:
+        _, batches = await bloom_filters._referral_source()
+        items = {item async for batch in batches for item in batch}
+        assert {owner, code} <= items
+        assert f"{code}:x" not in items
+
+        await build_filters(false_positive_rate=RATE, max_bytes=MAX_BYTES)
+        worker = new_worker(redis_url)
+        worker.start()
+        try:
+            await wait_for(worker, REFERRALS, owner)
+            assert worker.may_contain(name=REFERRALS, item=code)
+        finally:
+            await worker.close()
+    finally:
+        await redis_client.delete(*keys)
@@ -0,0 +1,35 @@
+"""Referral codes of the registration form are rejected with 400."""
+
+import jwt
+import pytest
+from fastapi import HTTPException, status
+
+from src.core.controllers.depends.utils.check_valid_ref import (
+    live_referral_or_400,
+    referrer_id_or_400,
+)
+
+BROKEN = "not.a.token"
+FOREIGN_KEY = "a key the service does not sign with, 32+ bytes"
+UNSIGNED = jwt.encode({"sub": "owner"}, key=FOREIGN_KEY, algorithm="HS256")
+
+
+def test_live_referral_rejects_undecodable_code():
+    """A code that is no JWT fails before any I/O, no code passes."""
+    with pytest.raises(HTTPException) as error:
+        live_referral_or_400(token=BROKEN)
+
+    assert error.value.status_code == status.HTTP_400_BAD_REQUEST
+    assert live_referral_or_400(token=None) is None
+    assert live_referral_or_400(token=UNSIGNED) is None
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("token", [BROKEN, UNSIGNED])
+async def test_referrer_id_rejects_invalid_code(token):
+    """A broken or foreign token is a bad registration, as it was."""
+    with pytest.raises(HTTPException) as error:
+        await referrer_id_or_400(token=token)
+
+    assert error.value.status_code == status.HTTP_400_BAD_REQUEST
+    assert await referrer_id_or_400(token=None) is None
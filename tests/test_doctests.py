@@ -0,0 +1,16 @@
+"""Examples in docstrings, e.g. the connection budget formula."""
+
+import doctest
+
+import pytest
+
+from src.core.orm import engine, shards
+
+
+@pytest.mark.parametrize("module", [engine, shards])
+def test_docstring_examples(module):
+    """Every example of the module gives the shown output."""
+    result = doctest.testmod(module)
+
+    assert result.attempted
+    assert not result.failed
@@ -0,0 +1,56 @@
+"""Owners of emails cached in the worker and in Redis."""
+
+from collections import OrderedDict
+
+import pytest
+
+from src.core.controllers.depends.utils import email_owners
+from src.core.controllers.depends.utils.email_owners import (
+    email_owner_key,
+    get_email_owner,
+    set_email_owner,
+)
+from src.core.settings.constants import EmailOwnerConf
+
+MEMO_SIZE = 2
+
+
+@pytest.fixture
+def owners(monkeypatch) -> OrderedDict:
+    """Return an empty memo of the worker holding `MEMO_SIZE` owners."""
+    memo: OrderedDict[str, str] = OrderedDict()
+    monkeypatch.setattr(email_owners, "_owners", memo)
+    monkeypatch.setattr(EmailOwnerConf, "MEMO_SIZE", MEMO_SIZE)
+    return memo
+
+
+def test_remember_drops_the_least_recently_used(owners):
+    """A remembered owner is the newest, the oldest goes over the size."""
+    email_owners._remember(email="a@example.com", user_id="a")
+    email_owners._remember(email="b@example.com", user_id="b")
+    email_owners._remember(email="a@example.com", user_id="a")
+    email_owners._remember(email="c@example.com", user_id="c")
+
+    assert list(owners.items()) == [
+        ("a@example.com", "a"),
+        ("c@example.com", "c"),
+    ]
+
+
+@pytest.mark.anyio
+async def test_owner_is_found_in_the_worker_then_in_redis(
+    owners, redis_client
+):
+    """Reads refresh the memo, owners evicted from it come from Redis."""
+    await set_email_owner(email="A@Example.com", user_id="a")
+    await set_email_owner(email="b@example.com", user_id="b")
+    assert await get_email_owner(email="a@example.com") == "a"
+    await set_email_owner(email="c@example.com", user_id="c")
+    assert list(owners) == ["a@example.com", "c@example.com"]
+
+    assert await redis_client.get(email_owner_key("b@example.com")) == "b"
+    assert await get_email_owner(email="B@example.com") == "b"
+    assert list(owners) == ["c@example.com", "b@example.com"]
+
+    assert await get_email_owner(email="nobody@example.com") is None
+    assert "nobody@example.com" not in owners
@@ -0,0 +1,85 @@
+"""Plans of the list and email queries before and after `c4d8a1f3e6b2`.
+
+The fixture keeps `EXPLAIN (COSTS OFF)` of the queries on the schema of
+the previous revision and of this one, on the same data, and the index
+names of both tables. The test replays both and fails if a plan differs
+from the recorded one, e.g. when an index stops being used.
+"""
+
+import json
+from pathlib import Path
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.engine import URL
+from sqlalchemy.ext.asyncio import create_async_engine
+
+FIXTURE = Path(__file__).parent / "fixtures" / "explain_c4d8a1f3e6b2.json"
+BEFORE = "8b2e5d41c9a7"
+AFTER = "c4d8a1f3e6b2"
+USERS = 20_000
+REFERRERS = 100
+
+SEED = (
+    "INSERT INTO users (id, name) "
+    "SELECT md5(i::text)::uuid, 'user_' || i "
+    f"FROM generate_series(1, {USERS}) i",
+    "INSERT INTO auth (user_id, hashed_password, email, active) "
+    "SELECT md5(i::text)::uuid, 'hash', 'User' || i || '@Example.com', true "
+    f"FROM generate_series(1, {USERS}) i",
+    "INSERT INTO refer (id, id_referrer, id_referred) "
+    "SELECT md5('edge' || i)::uuid, "
+    f"md5((i % {REFERRERS} + 1)::text)::uuid, md5(i::text)::uuid "
+    f"FROM generate_series({REFERRERS + 1}, {USERS}) i",
+)
+
+
+async def execute(url: URL, statements: tuple[str, ...]) -> None:
+    """Run statements outside of a transaction, VACUUM needs it."""
+    engine = create_async_engine(url, isolation_level="AUTOCOMMIT")
+    async with engine.connect() as connection:
+        for statement in statements:
+            await connection.execute(text(statement))
+    await engine.dispose()
+
+
+async def explain(url: URL, queries: dict) -> dict[str, list[str]]:
+    """Return plan lines of every query, rows of `plain` queries."""
+    engine = create_async_engine(url)
+    plans = {}
+    async with engine.connect() as connection:
+        for name, query in queries.items():
+            sql = query["sql"]
+            if not query.get("plain"):
+                sql = "EXPLAIN (COSTS OFF) " + sql
+            rows = await connection.execute(text(sql))
+            plans[name] = [row[0] for row in rows]
+    await engine.dispose()
+    return plans
+
+
+async def plans_before_and_after(
+    url: URL, migrate, queries: dict
+) -> tuple[dict, dict]:
+    """Migrate to `BEFORE`, seed, explain, migrate to `AFTER`, explain."""
+    await migrate(url, BEFORE)
+    await execute(url, SEED + ("VACUUM ANALYZE",))
+    before = await explain(url, queries)
+    await migrate(url, AFTER)
+    await execute(url, ("VACUUM ANALYZE",))
+    return before, await explain(url, queries)
+
+
+@pytest.mark.anyio
+async def test_plans_before_and_after_migration(create_database, migrate):
+    """Covering and lower(email) indexes serve the queries."""
+    with open(FIXTURE) as file:
+        fixture = json.load(file)
+    before, after = await plans_before_and_after(
+        url=await create_database(),
+        migrate=migrate,
+        queries=fixture["queries"],
+    )
+
+    assert before == fixture["before"]
+    assert after == fixture["after"]
@@ -0,0 +1,94 @@
+"""Engines of `ManagerDB` behind a transaction pooler.
+
+The pooler stand-in shares two server connections between the clients
+and hands them out per transaction, so a client meets statements other
+clients prepared and loses the ones it prepared itself. Default asyncpg
+settings must fail there; `PGBOUNCER_MODE` must not.
+"""
+
+import asyncio
+import re
+import uuid
+from typing import AsyncIterator
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from src.core.orm.engine import ManagerDB
+from src.core.orm.models.user import UserORM
+from src.core.settings.constants import PgBouncerConf
+from src.core.settings.env import settings
+from tests.pooler import TransactionPooler
+
+SERVERS = 2
+CLIENTS = 4
+TRANSACTIONS = 10
+NAME = re.compile(
+    re.escape(PgBouncerConf.STATEMENT_NAME).replace(
+        re.escape("{}"), "[0-9a-f-]{36}"
+    )
+)
+
+
+@pytest.fixture
+async def pooler(create_database) -> AsyncIterator[TransactionPooler]:
+    """Return a pooler in front of a fresh database with tables."""
+    pooler = TransactionPooler(
+        url=await create_database(schema=True), size=SERVERS
+    )
+    await pooler.start()
+    yield pooler
+    await pooler.close()
+
+
+async def register_and_read(engine: AsyncEngine) -> None:
+    """Insert and read users, one transaction per pooled connection."""
+
+    async def client() -> None:
+        async with engine.connect() as connection:
+            for _ in range(TRANSACTIONS):
+                user_id = uuid.uuid4()
+                async with connection.begin():
+                    await connection.execute(
+                        UserORM.__table__.insert(),
+                        {"id": user_id, "name": "user"},
+                    )
+                async with connection.begin():
+                    name = await connection.scalar(
+                        select(UserORM.name).where(UserORM.id == user_id)
+                    )
+                assert name == "user"
+
+    await asyncio.gather(*(client() for _ in range(CLIENTS)))
+
+
+@pytest.mark.anyio
+async def test_default_statement_cache_fails_behind_pooler(pooler):
+    """Cached and default-named statements break, the stand-in is real."""
+    engine = create_async_engine(pooler.url)
+    with pytest.raises(DBAPIError, match="prepared statement"):
+        await register_and_read(engine)
+    await engine.dispose()
+
+
+@pytest.mark.anyio
+async def test_pgbouncer_mode_works_behind_pooler(pooler, monkeypatch):
+    """Every statement is prepared anew under a unique uuid name."""
+    monkeypatch.setattr(settings.db, "PGBOUNCER_MODE", True)
+    monkeypatch.setattr(ManagerDB, "_instance", None)
+    manager = ManagerDB(
+        url=pooler.url.render_as_string(hide_password=False), echo=False
+    )
+
+    await register_and_read(manager.async_engine)
+    await manager.async_engine.dispose()
+
+    names = [name for name in pooler.statements if name]
+    assert not pooler.errors
+    assert len(pooler.assignments) == SERVERS
+    assert len(names) >= CLIENTS * TRANSACTIONS * 2
+    assert len(set(names)) == len(names)
+    for name in names:
+        assert NAME.fullmatch(name)
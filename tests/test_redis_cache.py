@@ -0,0 +1,66 @@
+"""Cached responses, their `Last-Modified` and tag sets in Redis."""
+
+import pytest
+
+from src.core.controllers.depends.utils.redis_chash import (
+    del_cache_by_tag,
+    gen_key,
+    gen_last_modified_key,
+    gen_tag_key,
+    get_cached_response,
+    set_cached_response,
+)
+
+PREFIX = "test_cache"
+USER = "user"
+EXPIRE = 60
+LAST_MODIFIED = "Mon, 19 Oct 2026 10:00:00 GMT"
+
+
+@pytest.mark.anyio
+async def test_cached_response_is_tagged_and_dropped_with_its_tag(
+    redis_client,
+):
+    """The response and its header are in the tag, both go with it."""
+    cache_key = gen_key(prefix_key=PREFIX, id_user=USER)
+    tag_key = gen_tag_key(prefix_key=PREFIX, id_user=USER)
+
+    await set_cached_response(
+        cache_key=cache_key,
+        value="{}",
+        last_modified=LAST_MODIFIED,
+        tag_key=tag_key,
+        ex=EXPIRE,
+    )
+
+    assert await get_cached_response(cache_key=cache_key) == (
+        "{}",
+        LAST_MODIFIED,
+    )
+    assert await redis_client.smembers(tag_key) == {
+        cache_key,
+        gen_last_modified_key(cache_key=cache_key),
+    }
+    assert 0 < await redis_client.ttl(tag_key) <= EXPIRE
+
+    await del_cache_by_tag(prefix_key=PREFIX, id_user=USER)
+
+    assert await get_cached_response(cache_key=cache_key) == (None, None)
+    assert not await redis_client.exists(tag_key)
+
+
+@pytest.mark.anyio
+async def test_untagged_response_without_last_modified(redis_client):
+    """Only the response is stored, no tag set is made."""
+    cache_key = gen_key(prefix_key=PREFIX, id_user=None)
+
+    await set_cached_response(
+        cache_key=cache_key,
+        value="[]",
+        last_modified=None,
+        tag_key=None,
+        ex=EXPIRE,
+    )
+
+    assert await get_cached_response(cache_key=cache_key) == ("[]", None)
+    assert await redis_client.keys(f"{PREFIX}*") == [cache_key]
@@ -0,0 +1,144 @@
+"""Online partitioning of refer by `d7e3b9a0c5f1`.
+
+The benchmark seeds `REFER_BENCHMARK_ROWS` edges on the previous
+revision, measures the latency of the referrals page of random
+referrers, migrates and measures again. It checks that no edge is lost
+and that the page reads one partition; the latencies are only printed,
+run with `-s` to see them. The default size keeps the suite fast, set
+the variable to e.g. 100000000 on a server with room for it.
+
+The lock test holds a lock of `refer` until the swap has queued for its
+lock once and given it up on `lock_timeout`, so the swap must retry.
+"""
+
+import asyncio
+import os
+import random
+import statistics
+import time
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.engine import URL
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from tests.test_explain_indexes import execute
+
+BEFORE = "c4d8a1f3e6b2"
+AFTER = "d7e3b9a0c5f1"
+ROWS = int(os.environ.get("REFER_BENCHMARK_ROWS", 200_000))
+REFERRERS = 1_000
+QUERIES = 500
+PAGE = (
+    "SELECT id_referred, seq FROM refer "
+    "WHERE id_referrer = md5({referrer})::uuid AND seq > 0 "
+    "ORDER BY seq LIMIT 100"
+)
+EDGES = "SELECT count(*), sum(seq) FROM refer"
+WAITING = (
+    "SELECT count(*) FROM pg_locks "
+    "WHERE relation = 'refer'::regclass AND mode = 'AccessExclusiveLock' "
+    "AND NOT granted"
+)
+POLL_SECONDS = 0.1
+
+
+def seed(rows: int) -> tuple[str, ...]:
+    """Return statements adding `rows` edges of `REFERRERS` referrers."""
+    return (
+        "INSERT INTO users (id, name) "
+        "SELECT md5(i::text)::uuid, 'user_' || i "
+        f"FROM generate_series(1, {rows + REFERRERS}) i",
+        "INSERT INTO refer (id, id_referrer, id_referred) "
+        "SELECT md5('edge' || i)::uuid, "
+        f"md5((i % {REFERRERS} + 1)::text)::uuid, md5(i::text)::uuid "
+        f"FROM generate_series({REFERRERS + 1}, {rows + REFERRERS}) i",
+        "VACUUM ANALYZE",
+    )
+
+
+async def page_latency(url: URL) -> tuple[float, float]:
+    """Return p50 and p99 of the referrals page in milliseconds."""
+    engine = create_async_engine(url)
+    samples = []
+    async with engine.connect() as connection:
+        for _ in range(QUERIES):
+            referrer = str(random.randint(1, REFERRERS))
+            started = time.perf_counter()
+            await connection.execute(
+                text(PAGE.format(referrer=":referrer")),
+                {"referrer": referrer},
+            )
+            samples.append((time.perf_counter() - started) * 1000)
+    await engine.dispose()
+    percentiles = statistics.quantiles(samples, n=100)
+    return percentiles[49], percentiles[98]
+
+
+async def fetch(url: URL, sql: str, **params) -> list[tuple]:
+    """Return rows of a query."""
+    engine = create_async_engine(url)
+    async with engine.connect() as connection:
+        rows = [
+            tuple(row) for row in await connection.execute(text(sql), params)
+        ]
+    await engine.dispose()
+    return rows
+
+
+@pytest.mark.anyio
+async def test_list_latency_before_and_after_partitioning(
+    create_database, migrate
+):
+    """Every edge is kept and the page prunes to one partition."""
+    url = await create_database()
+    await migrate(url, BEFORE)
+    await execute(url, seed(ROWS))
+    edges = await fetch(url, EDGES)
+    before = await page_latency(url)
+
+    await migrate(url, AFTER)
+    await execute(url, ("VACUUM ANALYZE",))
+    after = await page_latency(url)
+    plan = await fetch(
+        url, "EXPLAIN (COSTS OFF) " + PAGE.format(referrer="'1'")
+    )
+    print(
+        f"\n{ROWS} edges, page p50/p99 ms: "
+        f"before {before[0]:.2f}/{before[1]:.2f}, "
+        f"after {after[0]:.2f}/{after[1]:.2f}"
+    )
+
+    assert await fetch(url, EDGES) == edges
+    assert await fetch(url, "SELECT count(*) FROM refer_referred") == [(ROWS,)]
+    scanned = {line for (line,) in plan if " on refer_p" in line}
+    assert len(scanned) == 1
+
+
+async def wait_for(url: URL, waiting: bool) -> None:
+    """Wait until the swap is queued for its lock, or no longer is."""
+    while bool((await fetch(url, WAITING))[0][0]) != waiting:
+        await asyncio.sleep(POLL_SECONDS)
+
+
+@pytest.mark.anyio
+async def test_swap_retries_a_timed_out_lock(create_database, migrate):
+    """The swap gives up its queued lock after `lock_timeout`, retries."""
+    url = await create_database()
+    await migrate(url, BEFORE)
+    await execute(url, seed(REFERRERS))
+    engine = create_async_engine(url)
+    async with engine.connect() as holder:
+        await holder.execute(text("LOCK TABLE refer IN ACCESS SHARE MODE"))
+
+        async def release() -> None:
+            await wait_for(url, waiting=True)
+            await wait_for(url, waiting=False)
+            await holder.rollback()
+
+        release_task = asyncio.create_task(release())
+        await migrate(url, AFTER)
+        await release_task
+    await engine.dispose()
+
+    assert await fetch(url, "SELECT count(*) FROM refer") == [(REFERRERS,)]
@@ -0,0 +1,98 @@
+"""Batch lookup of the first pages of many referrers."""
+
+import pytest
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from src.core.controllers.depends.referrals import referrals_by_user_ids
+from src.core.controllers.depends.utils.read_your_writes import (
+    mark_recent_write,
+)
+from src.core.controllers.depends.utils.referral_batch import batch_cache_key
+from src.core.orm.crud import create_crud_helper
+from src.core.orm.cruds.registration import Registration
+from src.core.orm.engine import ManagerDB
+from src.core.orm.models.refer import ReferORM
+from src.core.orm.models.summary import ReferralSummaryORM
+from src.core.validators.user import ReferralBatch
+from tests.test_registration import new_user
+
+LIMIT = 2
+
+
+@pytest.mark.anyio
+async def test_batch_reads_summaries_edges_and_cache(
+    create_database, redis_client
+):
+    """Pages come from summaries or edges, then from the cache."""
+    engine = create_async_engine(await create_database(schema=True))
+    session_factory = ManagerDB.create_session(engine)
+    with_summary, without_summary, alone, recent = (
+        new_user(name) for name in ("summary", "edges", "alone", "recent")
+    )
+    referrers = (with_summary, without_summary, recent)
+    referred = {
+        referrer["id"]: [
+            new_user(f"{referrer['name']}_{index}", referrer["id"])
+            for index in range(LIMIT + 1)
+        ]
+        for referrer in referrers
+    }
+    async with session_factory() as session, session.begin():
+        await Registration.create_users([*referrers, alone], session=session)
+    async with session_factory() as session, session.begin():
+        await Registration.create_users(
+            [user for users in referred.values() for user in users],
+            session=session,
+        )
+        await session.execute(
+            delete(ReferralSummaryORM).where(
+                ReferralSummaryORM.id_referrer == without_summary["id"]
+            )
+        )
+    await mark_recent_write(user_id=str(recent["id"]))
+
+    async def lookup():
+        return await referrals_by_user_ids(
+            batch=ReferralBatch(
+                user_ids=[
+                    str(user["id"])
+                    for user in (*referrers, alone, with_summary)
+                ]
+            ),
+            crud=create_crud_helper(),
+            read_session_factory=session_factory,
+            session_factory=session_factory,
+            shards=None,
+            limit=LIMIT,
+        )
+
+    first = await lookup()
+
+    assert list(first.found) == [str(user["id"]) for user in referrers]
+    assert first.not_found == [str(alone["id"])]
+    for referrer in referrers:
+        page = first.found[str(referrer["id"])]
+        assert page.name == referrer["name"]
+        assert [user.id for user in page.referrals] == [
+            str(user["id"]) for user in referred[referrer["id"]][:LIMIT]
+        ]
+        assert page.next_cursor is not None
+    cached = await redis_client.mget(
+        [batch_cache_key(str(user["id"]), LIMIT) for user in referrers]
+    )
+    assert [page is not None for page in cached] == [True, True, False]
+
+    async with session_factory() as session, session.begin():
+        await session.execute(delete(ReferORM))
+        await session.execute(delete(ReferralSummaryORM))
+    second = await lookup()
+    await engine.dispose()
+
+    assert list(second.found) == [
+        str(with_summary["id"]),
+        str(without_summary["id"]),
+    ]
+    for user_id, page in second.found.items():
+        assert page == first.found[user_id]
+    assert second.not_found == [str(recent["id"]), str(alone["id"])]
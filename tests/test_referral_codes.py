@@ -0,0 +1,122 @@
+"""Bulk check of referral codes, JWT and short ones mixed."""
+
+import datetime
+import uuid
+
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from src.core.controllers.depends.utils import referral_codes
+from src.core.controllers.depends.utils.jwt_token import encode_jwt
+from src.core.controllers.depends.utils.redis_chash import gen_key
+from src.core.controllers.depends.utils.referral_codes import (
+    VerifiedCode,
+    check_referral_codes,
+    verify_referral_codes,
+)
+from src.core.controllers.depends.utils.referral_short_codes import (
+    short_code_key,
+)
+from src.core.settings.constants import JWT, ReferralCodeConf
+from src.core.settings.env import settings
+
+VALID = ReferralCodeConf.STATUS_VALID
+INVALID = ReferralCodeConf.STATUS_INVALID
+EXPIRED = ReferralCodeConf.STATUS_EXPIRED
+INACTIVE = ReferralCodeConf.STATUS_INACTIVE
+KEY_BITS = 2048
+PUBLIC_EXPONENT = 65537
+LIFETIME = datetime.timedelta(minutes=1)
+
+
+@pytest.fixture
+def sign(monkeypatch):
+    """Return a signer of referral codes with a key pair of the test.
+
+    Memoized keys and results are dropped before and after the test.
+    """
+    private = rsa.generate_private_key(
+        public_exponent=PUBLIC_EXPONENT, key_size=KEY_BITS
+    )
+    public = private.public_key().public_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PublicFormat.SubjectPublicKeyInfo,
+    )
+    private_pem = private.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption(),
+    )
+    monkeypatch.setattr(settings.jwt, "jwt_public", public.decode())
+
+    def code(
+        owner: str,
+        expire_delta: datetime.timedelta = LIFETIME,
+        type_token: str = JWT.TOKEN_TYPE_REFERRAL,
+    ) -> str:
+        return encode_jwt(
+            payload={
+                JWT.TOKEN_TYPE_FIELD: type_token,
+                JWT.PAYLOAD_SUB_KEY: owner,
+            },
+            private_key=private_pem.decode(),
+            algorithm=settings.jwt.algorithm,
+            expire_delta=expire_delta,
+        )
+
+    referral_codes._public_key.cache_clear()
+    referral_codes._verify.cache_clear()
+    yield code
+    referral_codes._public_key.cache_clear()
+    referral_codes._verify.cache_clear()
+
+
+def test_verified_code_expires_while_memoized(sign, monkeypatch):
+    """A memoized result turns expired when the clock passes `exp`."""
+    code = sign(owner="owner")
+    [first] = verify_referral_codes([code])
+    assert first is not None
+    assert (first.status, first.owner) == (VALID, "owner")
+
+    later = first.expire + 1
+    monkeypatch.setattr(referral_codes.time, "time", lambda: later)
+    assert verify_referral_codes([code]) == [VerifiedCode(status=EXPIRED)]
+    assert referral_codes._verify.cache_info().hits == 1
+
+
+@pytest.mark.anyio
+async def test_check_mix_of_short_and_jwt_codes(sign, redis_client):
+    """Every code gets its status, owners are looked up for both kinds."""
+    live_owner, dead_owner, short_owner = (str(uuid.uuid4()) for _ in range(3))
+    live_short, dead_short = (
+        letter * ReferralCodeConf.SHORT_LENGTH for letter in "ab"
+    )
+    await redis_client.set(
+        gen_key(prefix_key=JWT.TOKEN_TYPE_REFERRAL, id_user=live_owner),
+        "token",
+    )
+    await redis_client.set(short_code_key(code=live_short), short_owner)
+    codes = [
+        sign(owner=live_owner),
+        live_short,
+        sign(owner=dead_owner),
+        dead_short,
+        "not.a.token",
+        sign(owner=live_owner, expire_delta=-LIFETIME),
+        sign(owner=live_owner, type_token=JWT.TOKEN_TYPE_ACCESS),
+    ]
+
+    verified = verify_referral_codes(codes)
+    assert verified[1] is None and verified[3] is None
+    checked = await check_referral_codes(codes=codes, verified=verified)
+
+    assert [(result.status, result.owner) for result in checked] == [
+        (VALID, live_owner),
+        (VALID, short_owner),
+        (INACTIVE, None),
+        (INACTIVE, None),
+        (INVALID, None),
+        (EXPIRED, None),
+        (INVALID, None),
+    ]
@@ -0,0 +1,54 @@
+"""Referral counters and the leaderboard in Redis."""
+
+from typing import AsyncIterator, Iterable
+
+import pytest
+
+from src.core.controllers.depends.utils.referral_counters import (
+    get_referral_count,
+    get_top_referrers,
+    incr_referral_count,
+    reconcile_referral_counts,
+)
+
+
+async def as_batches(
+    *batches: Iterable[tuple[str, int]],
+) -> AsyncIterator[Iterable[tuple[str, int]]]:
+    """Yield batches of counts, as the job reads them from Postgres."""
+    for batch in batches:
+        yield batch
+
+
+@pytest.mark.anyio
+async def test_increments_give_counts_and_ranks(redis_client):
+    """Every increment moves the count and the score together."""
+    for user_id, referrals in (("a", 1), ("b", 3), ("c", 2)):
+        for _ in range(referrals):
+            await incr_referral_count(user_id)
+
+    assert await get_referral_count("b") == (3, 1)
+    assert await get_referral_count("a") == (1, 3)
+    assert await get_referral_count("nobody") == (0, None)
+    assert await get_top_referrers(limit=2) == [("b", 3), ("c", 2)]
+
+
+@pytest.mark.anyio
+async def test_reconcile_replaces_the_board(redis_client):
+    """Counts of the job replace the live ones, no counts clear them."""
+    await incr_referral_count("stale")
+
+    written = await reconcile_referral_counts(
+        as_batches([("a", 5), ("b", 7)], [], [("c", 1)])
+    )
+
+    assert written == 3
+    assert await get_top_referrers(limit=10) == [
+        ("b", 7),
+        ("a", 5),
+        ("c", 1),
+    ]
+    assert await get_referral_count("stale") == (0, None)
+
+    assert await reconcile_referral_counts(as_batches()) == 0
+    assert await get_top_referrers(limit=10) == []
@@ -0,0 +1,66 @@
+"""Export of all referrals of a referrer as an NDJSON stream."""
+
+import json
+
+import pytest
+from fastapi import HTTPException, status
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from src.core.controllers.depends.referrals import export_referrals_by_user_id
+from src.core.orm.crud import create_crud_helper
+from src.core.orm.cruds.registration import Registration
+from src.core.orm.engine import ManagerDB
+from src.core.settings.constants import Export
+from tests.test_registration import new_user
+
+CHUNK_SIZE = 2
+REFERRALS = 5
+
+
+@pytest.mark.anyio
+async def test_export_streams_referrals_in_chunks(
+    create_database, monkeypatch
+):
+    """Every chunk holds `CHUNK_SIZE` lines, referrals in their order."""
+    monkeypatch.setattr(Export, "CHUNK_SIZE", CHUNK_SIZE)
+    engine = create_async_engine(await create_database(schema=True))
+    session_factory = ManagerDB.create_session(engine)
+    referrer = new_user("referrer")
+    referred = [
+        new_user(f"referred_{index}", id_referrer=referrer["id"])
+        for index in range(REFERRALS)
+    ]
+    async with session_factory() as session, session.begin():
+        await Registration.create_users([referrer], session=session)
+    async with session_factory() as session, session.begin():
+        await Registration.create_users(referred, session=session)
+
+    stream = await export_referrals_by_user_id(
+        user_id=str(referrer["id"]),
+        crud=create_crud_helper(),
+        session_factory=session_factory,
+        shards=None,
+    )
+    chunks = [chunk async for chunk in stream]
+    await engine.dispose()
+
+    lines = [chunk.count(Export.LINE_SEPARATOR) for chunk in chunks]
+    assert lines == [CHUNK_SIZE, CHUNK_SIZE, REFERRALS - 2 * CHUNK_SIZE]
+    assert all(chunk.endswith(Export.LINE_SEPARATOR) for chunk in chunks)
+    assert [json.loads(line) for line in "".join(chunks).splitlines()] == [
+        {"id": str(user["id"]), "name": user["name"]} for user in referred
+    ]
+
+
+@pytest.mark.anyio
+async def test_export_rejects_invalid_user_id():
+    """A user ID that is no UUID fails before the stream starts."""
+    with pytest.raises(HTTPException) as error:
+        await export_referrals_by_user_id(
+            user_id="not-a-uuid",
+            crud=create_crud_helper(),
+            session_factory=None,
+            shards=None,
+        )
+
+    assert error.value.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
@@ -0,0 +1,63 @@
+"""Short random referral codes kept in Redis."""
+
+import pytest
+from fastapi import HTTPException, status
+
+from src.core.controllers.depends.utils import referral_short_codes
+from src.core.controllers.depends.utils.referral_short_codes import (
+    is_short_code,
+    issue_short_code,
+    owner_of_short_code,
+    short_code_key,
+)
+from src.core.settings.constants import ReferralCodeConf
+
+TAKEN = "t" * ReferralCodeConf.SHORT_LENGTH
+FREE = "f" * ReferralCodeConf.SHORT_LENGTH
+
+
+def draw(monkeypatch, codes: list[str]) -> None:
+    """Make the random source return `codes` in turn."""
+    drawn = iter(codes)
+    monkeypatch.setattr(
+        referral_short_codes.secrets,
+        "token_urlsafe",
+        lambda nbytes: next(drawn),
+    )
+
+
+@pytest.mark.anyio
+async def test_issue_retries_a_taken_code(redis_client, monkeypatch):
+    """A code of another user is kept, the next drawn code is issued."""
+    await redis_client.set(short_code_key(code=TAKEN), "other")
+    draw(monkeypatch, [TAKEN, FREE])
+
+    token = await issue_short_code(owner_id="owner")
+
+    assert token.referral_token == FREE
+    assert await owner_of_short_code(code=FREE) == "owner"
+    assert await owner_of_short_code(code=TAKEN) == "other"
+    assert await redis_client.ttl(short_code_key(code=FREE)) > 0
+
+
+@pytest.mark.anyio
+async def test_issue_fails_when_every_code_is_taken(redis_client, monkeypatch):
+    """Attempts are limited, the user gets 500 instead of a loop."""
+    await redis_client.set(short_code_key(code=TAKEN), "other")
+    draw(monkeypatch, [TAKEN] * ReferralCodeConf.SHORT_ATTEMPTS)
+
+    with pytest.raises(HTTPException) as error:
+        await issue_short_code(owner_id="owner")
+
+    assert error.value.status_code == status.HTTP_500_INTERNAL_SERVER_ERROR
+    assert await owner_of_short_code(code=TAKEN) == "other"
+
+
+def test_real_codes_are_short():
+    """Drawn codes have the length short codes are told apart by."""
+    assert is_short_code(
+        referral_short_codes.secrets.token_urlsafe(
+            ReferralCodeConf.SHORT_BYTES
+        )
+    )
+    assert not is_short_code("a.b" + TAKEN[3:])
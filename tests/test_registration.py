@@ -0,0 +1,49 @@
+"""Registration of users in one statement."""
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from src.core.orm.cruds.registration import Registration
+from src.core.orm.engine import ManagerDB
+from src.core.orm.models.refer import ReferORM
+from src.core.orm.uuid7 import uuid7
+
+
+def new_user(name: str, id_referrer=None) -> dict:
+    """Return registration data of a user."""
+    return dict(
+        id=uuid7(),
+        name=name,
+        hashed_password="hash",
+        email=f"{name}@Example.com",
+        id_referrer=id_referrer,
+    )
+
+
+@pytest.mark.anyio
+async def test_create_users_with_and_without_referrers(create_database):
+    """Rows without a referrer alone, then mixed, taken emails fail."""
+    engine = create_async_engine(await create_database(schema=True))
+    session_factory = ManagerDB.create_session(engine)
+    referrer = new_user("referrer")
+    referred = new_user("referred", id_referrer=referrer["id"])
+
+    async with session_factory() as session, session.begin():
+        first = await Registration.create_users([referrer], session=session)
+    async with session_factory() as session, session.begin():
+        second = await Registration.create_users(
+            [referred, new_user("alone"), new_user("REFERRER")],
+            session=session,
+        )
+    async with session_factory() as session:
+        edges = (
+            await session.execute(
+                select(ReferORM.id_referrer, ReferORM.id_referred)
+            )
+        ).all()
+    await engine.dispose()
+
+    assert first == [True]
+    assert second == [True, True, False]
+    assert edges == [(referrer["id"], referred["id"])]
@@ -0,0 +1,398 @@
+"""Hash ring, cross-shard registration and moves of hash ranges.
+
+Database tests run two shards on two local databases, the first is the
+primary. Users are given IDs on the wanted shard by drawing uuid7 until
+one hashes there.
+"""
+
+import json
+import random
+import uuid
+from pathlib import Path
+from typing import AsyncIterator
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from src.core.controllers.depends.referrals import _tree_across_shards
+from src.core.orm.crud import create_crud_helper
+from src.core.orm.cruds.refer import Refer
+from src.core.orm.cruds.shards import ShardRebalance, Shards
+from src.core.orm.engine import ManagerDB
+from src.core.orm.models.directory import EmailDirectoryORM
+from src.core.orm.models.refer import ReferORM
+from src.core.orm.models.referred import ReferredORM
+from src.core.orm.models.user import UserORM
+from src.core.orm.shards import (
+    Shard,
+    ShardMap,
+    ShardRouter,
+    in_range,
+    key_hash,
+)
+from src.core.orm.uuid7 import uuid7
+from src.core.settings.constants import ReferralSummaryConf, ShardConf
+
+MIN_HASH = ShardConf.MIN_HASH
+MAX_HASH = ShardConf.MAX_HASH
+SHARDS = 3
+VNODES = 4
+SAMPLES = 2_000
+USERS_IN_RANGE = 12
+USERS_OUTSIDE = 12
+ITEM_NAME = ReferralSummaryConf.ITEM_NAME
+
+
+def quiet(line: str) -> None:
+    """Drop progress lines."""
+
+
+def test_with_move_wrapping_range():
+    """A move across the end of the ring covers both of its ends."""
+    shard_map = ShardMap(shards=SHARDS, vnodes=VNODES)
+    low, high = MAX_HASH - 10, MIN_HASH + 10
+
+    moved = shard_map.with_move(low=low, high=high, shard=2)
+
+    assert moved.moves == [(MIN_HASH, high, 2), (low, MAX_HASH, 2)]
+    for key in (low, MAX_HASH, MIN_HASH, high):
+        assert moved.owner(key) == 2
+    for key in (low - 1, high + 1):
+        assert moved.owner(key) == shard_map.owner(key)
+
+
+def test_with_move_splits_earlier_moves():
+    """A new move cuts an overlapped move, the rest keeps its shard."""
+    moved = ShardMap(shards=SHARDS, vnodes=VNODES).with_move(
+        low=MAX_HASH - 10, high=MIN_HASH + 10, shard=2
+    )
+
+    moved = moved.with_move(low=MIN_HASH + 5, high=MIN_HASH + 20, shard=1)
+
+    assert moved.moves == [
+        (MIN_HASH, MIN_HASH + 4, 2),
+        (MIN_HASH + 5, MIN_HASH + 20, 1),
+        (MAX_HASH - 10, MAX_HASH, 2),
+    ]
+
+
+def test_owners_of_wrapping_ring_range():
+    """The range after the last point belongs to the first point."""
+    shard_map = ShardMap(shards=SHARDS, vnodes=VNODES)
+    ranges = list(shard_map.ring_ranges())
+    low, high, shard = ranges[0]
+    _, last_point, last_shard = ranges[-1]
+
+    assert (low, high) == (last_point + 1, ranges[0][1])
+    assert low > high
+    assert shard_map.owners(low, high) == {shard}
+    assert shard_map.owner(MAX_HASH) == shard_map.owner(MIN_HASH) == shard
+    assert shard_map.owners(last_point, high) == {last_shard, shard}
+
+
+def test_owners_cover_every_key_of_random_ranges():
+    """Keys of a range, wrapping or not, are owned by its owners."""
+    rng = random.Random(0)
+    shard_map = ShardMap(shards=SHARDS, vnodes=VNODES).with_move(
+        low=MAX_HASH - 2**60, high=MIN_HASH + 2**60, shard=1
+    )
+    for _ in range(SAMPLES):
+        low = rng.randint(MIN_HASH, MAX_HASH)
+        high = rng.randint(MIN_HASH, MAX_HASH)
+        owners = shard_map.owners(low, high)
+        for _ in range(10):
+            key = rng.randint(MIN_HASH, MAX_HASH)
+            if in_range(key, low, high):
+                assert shard_map.owner(key) in owners
+
+
+def user_on(router: ShardRouter, shard: int, low=None, high=None):
+    """Return a new uuid7 on a shard, in `[low, high]` if given."""
+    while True:
+        user_id = uuid7()
+        if router.shard_of(user_id) != shard:
+            continue
+        if low is None or in_range(key_hash(user_id), low, high):
+            return user_id
+
+
+def new_user(user_id: uuid.UUID, id_referrer=None) -> dict:
+    """Return registration data of a user."""
+    return dict(
+        id=user_id,
+        name=f"user_{user_id.hex[:8]}",
+        hashed_password="hash",
+        email=f"{user_id.hex}@Example.com",
+        id_referrer=id_referrer,
+    )
+
+
+def as_row(row) -> tuple:
+    """Return a row as a hashable tuple, JSON as sorted text.
+
+    Names in first pages of summaries are dropped: they are kept only
+    for referred users on the shard of the summary and found at read
+    time for the others, so a move may fill them in.
+    """
+    return tuple(
+        (
+            json.dumps(
+                [
+                    {key: item[key] for key in item if key != ITEM_NAME}
+                    for item in value
+                ]
+            )
+            if isinstance(value, list)
+            else value
+        )
+        for value in row
+    )
+
+
+async def rows_by_shard(router: ShardRouter, table) -> list[set[tuple]]:
+    """Return all rows of a table, one set per shard."""
+    shards = []
+    for shard in range(len(router)):
+        async with router.session_factory(shard)() as session:
+            result = await session.execute(select(*table.__table__.columns))
+            shards.append({as_row(row) for row in result})
+    return shards
+
+
+async def all_rows(router: ShardRouter) -> dict[str, list[set[tuple]]]:
+    """Return rows of every table moved between shards."""
+    return {
+        table.__tablename__: await rows_by_shard(router, table)
+        for table, _ in ShardRebalance.tables
+    }
+
+
+@pytest.fixture
+async def router(create_database, tmp_path: Path) -> AsyncIterator:
+    """Return a router of two shards with tables."""
+    shards = []
+    for _ in range(2):
+        engine = create_async_engine(await create_database(schema=True))
+        shards.append(
+            Shard(
+                engine=engine,
+                session_factory=ManagerDB.create_session(engine),
+            )
+        )
+    router = ShardRouter(
+        shards=shards,
+        vnodes=ShardConf.VNODES,
+        map_file=str(tmp_path / "shards.json"),
+        check_interval=0,
+    )
+    yield router
+    await router.dispose()
+    await router.engine(ShardConf.PRIMARY).dispose()
+
+
+@pytest.mark.anyio
+async def test_register_across_shards(router):
+    """The edge is on the referrer's shard, the user on its own."""
+    referrer, referred = user_on(router, 0), user_on(router, 1)
+
+    assert await Shards.register_user(router, new_user(referrer))
+    assert await Shards.register_user(router, new_user(referred, referrer))
+
+    users = await rows_by_shard(router, UserORM)
+    edges = await rows_by_shard(router, ReferORM)
+    referred_rows = await rows_by_shard(router, ReferredORM)
+    assert {row[0] for row in users[1]} == {referred}
+    assert [(row[1], row[2]) for row in edges[0]] == [(referrer, referred)]
+    assert not edges[1]
+    assert referred_rows == [set(), {(referred,)}]
+
+
+@pytest.mark.anyio
+async def test_failed_cross_shard_edge_is_compensated(router, monkeypatch):
+    """A failed second step removes the user, its referrer row and email."""
+    referrer, referred = user_on(router, 0), user_on(router, 1)
+    await Shards.register_user(router, new_user(referrer))
+
+    async def fail(**kwargs) -> None:
+        raise RuntimeError("edge write failed")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(Refer, "add_edge", fail)
+        with pytest.raises(RuntimeError):
+            await Shards.register_user(router, new_user(referred, referrer))
+
+    assert [len(rows) for rows in await rows_by_shard(router, UserORM)] == [
+        1,
+        0,
+    ]
+    assert await rows_by_shard(router, ReferredORM) == [set(), set()]
+    assert await rows_by_shard(router, ReferORM) == [set(), set()]
+    directory = await rows_by_shard(router, EmailDirectoryORM)
+    assert {row[1] for row in directory[0]} == {referrer}
+
+    assert await Shards.register_user(router, new_user(referred, referrer))
+
+
+@pytest.mark.anyio
+async def test_copy_switch_delete_keeps_every_row(router, tmp_path):
+    """Rows of a wrapping range move once, a late write is not lost.
+
+    The range is copied, then a user is written to the source, as
+    workers do until they read the new map. After the switch the range
+    is copied again and deleted from the source, as `cleanup` does.
+    Copies of the first pass on the target may be stale, so the rows
+    expected are the ones of the shard owning them before the switch.
+    """
+    low, high, source = next(router.map.ring_ranges())
+    target = 1 - source
+    referrers = [user_on(router, source, low, high) for _ in range(2)]
+    users = [
+        new_user(user_on(router, source, low, high), random.choice(referrers))
+        for _ in range(USERS_IN_RANGE)
+    ] + [
+        new_user(user_on(router, shard), random.choice(referrers))
+        for shard in (0, 1)
+        for _ in range(USERS_OUTSIDE // 2)
+    ]
+    for user_id in referrers:
+        await Shards.register_user(router, new_user(user_id))
+    for user in users:
+        await Shards.register_user(router, user)
+    await ShardRebalance.copy_range(
+        source=router.session_factory(source),
+        target=router.session_factory(target),
+        low=low,
+        high=high,
+        progress=quiet,
+    )
+    late = new_user(user_on(router, source, low, high), referrers[0])
+    await Shards.register_user(router, late)
+    before = await all_rows(router)
+    old_map = router.map
+
+    router.map.with_move(low=low, high=high, shard=target).save(
+        str(tmp_path / "shards.json")
+    )
+    await ShardRebalance.copy_range(
+        source=router.session_factory(source),
+        target=router.session_factory(target),
+        low=low,
+        high=high,
+        progress=quiet,
+    )
+    await ShardRebalance.delete_range(
+        session_factory=router.session_factory(source),
+        low=low,
+        high=high,
+        progress=quiet,
+    )
+    after = await all_rows(router)
+
+    for table, owner in ShardRebalance.tables:
+        name = table.__tablename__
+        index = list(table.__table__.columns).index(owner)
+        expected = {
+            row
+            for shard, rows in enumerate(before[name])
+            for row in rows
+            if old_map.shard_of(row[index]) == shard
+        }
+        assert set().union(*after[name]) == expected
+        assert sum(map(len, after[name])) == len(expected)
+        for shard, rows in enumerate(after[name]):
+            for row in rows:
+                assert router.shard_of(row[index]) == shard
+    assert (await Shards.get_user(router, late["id"])) is not None
+    assert await Shards.login_user(router, late["email"]) == (
+        "hash",
+        late["id"],
+    )
+
+
+@pytest.mark.anyio
+async def test_fill_directory_restores_missing_emails(router):
+    """Emails of every shard are added, present ones are kept."""
+    user_ids = [user_on(router, shard) for shard in (0, 1, 1)]
+    for user_id in user_ids:
+        await Shards.register_user(router, new_user(user_id))
+    primary = router.session_factory(ShardConf.PRIMARY)
+    async with primary() as session, session.begin():
+        await session.execute(
+            EmailDirectoryORM.__table__.delete().where(
+                EmailDirectoryORM.user_id != user_ids[0]
+            )
+        )
+
+    read = [
+        await ShardRebalance.fill_directory(
+            source=router.session_factory(shard), primary=primary
+        )
+        for shard in range(len(router))
+    ]
+
+    directory = (await rows_by_shard(router, EmailDirectoryORM))[0]
+    assert read == [1, 2]
+    assert directory == {
+        (new_user(user_id)["email"].lower(), user_id) for user_id in user_ids
+    }
+
+
+async def register_chain(router: ShardRouter, shards: list[int]) -> list:
+    """Register a chain of referrals on the given shards, return IDs."""
+    chain: list[uuid.UUID] = []
+    for shard in shards:
+        user_id = user_on(router, shard)
+        await Shards.register_user(
+            router, new_user(user_id, chain[-1] if chain else None)
+        )
+        chain.append(user_id)
+    return chain
+
+
+@pytest.mark.anyio
+async def test_tree_and_ancestors_across_shards(router):
+    """Levels below the first are read from their referrers' shards."""
+    chain = await register_chain(router, [0, 1, 0, 1, 1])
+    sibling = user_on(router, 0)
+    await Shards.register_user(router, new_user(sibling, chain[1]))
+
+    edges = await Shards.get_tree(router, user_id=chain[0], depth=3)
+    ancestors = await Shards.get_ancestors(router, user_id=chain[4], depth=3)
+
+    assert [(edge[1], edge[2]) for edge in edges] == [
+        (chain[1], 1),
+        (chain[2], 2),
+        (sibling, 2),
+        (chain[3], 3),
+    ]
+    assert [edge[4] for edge in edges] == [0, 1, 1, 0]
+    assert ancestors == [chain[3], chain[2], chain[1]]
+    assert await Shards.get_ancestors(router, user_id=chain[0], depth=3) == []
+
+
+@pytest.mark.anyio
+async def test_tree_page_across_shards(router):
+    """Pages of the endpoint follow `seq`, levels count the whole tree."""
+    chain = await register_chain(router, [1, 0, 1, 0])
+
+    levels, rows = await _tree_across_shards(
+        root_id=chain[0],
+        depth=3,
+        limit=1,
+        after=None,
+        crud=create_crud_helper(),
+        shards=router,
+    )
+    _, next_rows = await _tree_across_shards(
+        root_id=chain[0],
+        depth=3,
+        limit=1,
+        after=rows[0].seq,
+        crud=create_crud_helper(),
+        shards=router,
+    )
+
+    assert levels == [1, 1, 1]
+    assert [row.id_referred for row in rows] == chain[1:3]
+    assert [row.id_referred for row in next_rows] == chain[2:4]
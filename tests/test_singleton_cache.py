@@ -0,0 +1,106 @@
+"""One cached token per user, issued at most once at a time."""
+
+import asyncio
+
+import pytest
+from fastapi import Request, Response
+
+from src.core.controllers.depends.utils import redis_chash
+from src.core.controllers.depends.utils.redis_chash import (
+    cache_http_singleton_value_by_user,
+    gen_key,
+    gen_lock_key,
+)
+from src.core.settings.constants import Keys
+from src.core.validators.token import TokenReferral
+
+PREFIX = "test_singleton"
+USER = "user"
+EXPIRE = 60
+CALLERS = 5
+cache_key = gen_key(prefix_key=PREFIX, id_user=USER)
+
+
+def new_request(method: str) -> Request:
+    """Return a request of the user with no body."""
+    return Request(
+        {
+            "type": "http",
+            "method": method,
+            "path": "/",
+            "headers": [],
+            "query_string": b"",
+        }
+    )
+
+
+@pytest.fixture
+def as_user(monkeypatch) -> None:
+    """Take the user from no token and load scripts on this client."""
+    monkeypatch.setattr(
+        redis_chash, "get_user_id_from_token", lambda request: USER
+    )
+    monkeypatch.setattr(redis_chash, "_scripts", {})
+
+
+async def call(endpoint, method: str):
+    """Call a decorated endpoint as FastAPI does, with keywords."""
+    return await endpoint(request=new_request(method), response=Response())
+
+
+@pytest.mark.anyio
+async def test_concurrent_posts_issue_one_token(redis_client, as_user):
+    """Callers that lose the claim wait for the token of the winner."""
+    issued: list[str] = []
+
+    @cache_http_singleton_value_by_user(expire=EXPIRE, prefix_key=PREFIX)
+    async def endpoint(request: Request, response: Response) -> TokenReferral:
+        issued.append(f"token_{len(issued)}")
+        await asyncio.sleep(0.05)
+        return TokenReferral(referral_token=issued[-1])
+
+    tokens = await asyncio.gather(
+        *(call(endpoint, Keys.POST) for _ in range(CALLERS))
+    )
+
+    assert issued == ["token_0"]
+    assert {token.referral_token for token in tokens} == {"token_0"}
+    assert not await redis_client.exists(gen_lock_key(cache_key))
+    assert 0 < await redis_client.ttl(cache_key) <= EXPIRE
+
+    assert await call(endpoint, Keys.DELETE) is True
+    assert not await redis_client.exists(cache_key)
+
+
+@pytest.mark.anyio
+async def test_delete_during_issue_drops_the_issued_token(
+    redis_client, as_user
+):
+    """An issue cut by DELETE does not store, its token is dropped."""
+    started, deleted = asyncio.Event(), asyncio.Event()
+    issued: list[str] = []
+    dropped: list[str] = []
+
+    async def on_delete(value: str) -> None:
+        dropped.append(TokenReferral.model_validate_json(value).referral_token)
+
+    @cache_http_singleton_value_by_user(
+        expire=EXPIRE, prefix_key=PREFIX, on_delete=on_delete
+    )
+    async def endpoint(request: Request, response: Response) -> TokenReferral:
+        issued.append(f"token_{len(issued)}")
+        if len(issued) == 1:
+            started.set()
+            await deleted.wait()
+        return TokenReferral(referral_token=issued[-1])
+
+    post = asyncio.create_task(call(endpoint, Keys.POST))
+    await started.wait()
+    assert await call(endpoint, Keys.DELETE) is True
+    deleted.set()
+    token = await post
+
+    assert issued == ["token_0", "token_1"]
+    assert dropped == ["token_0"]
+    assert token.referral_token == "token_1"
+    assert await redis_client.get(cache_key) == token.model_dump_json()
@@ -0,0 +1,112 @@
+"""Referral summaries written with the edges and rebuilt from them."""
+
+import pytest
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from src.core.orm.cruds.refer import Refer
+from src.core.orm.cruds.registration import Registration
+from src.core.orm.cruds.summary import ReferralSummary
+from src.core.orm.engine import ManagerDB
+from src.core.orm.models.refer import ReferORM
+from src.core.orm.models.referred import ReferredORM
+from src.core.settings.constants import ReferralSummaryConf
+from tests.test_registration import new_user
+
+PAGE_SIZE = 3
+ITEM_ID = ReferralSummaryConf.ITEM_ID
+ITEM_SEQ = ReferralSummaryConf.ITEM_SEQ
+
+
+def as_tuple(summary) -> tuple:
+    """Return the fields of a summary that rebuild must reproduce."""
+    return (
+        summary.name,
+        summary.count,
+        summary.first_page,
+        summary.last_seq,
+        summary.last_at,
+    )
+
+
+@pytest.mark.anyio
+async def test_summary_kept_on_write_matches_rebuild(
+    create_database, monkeypatch
+):
+    """Edges of batches and single referrals give the rebuilt summary."""
+    monkeypatch.setattr(ReferralSummaryConf, "PAGE_SIZE", PAGE_SIZE)
+    monkeypatch.setattr(
+        ReferralSummaryConf, "PAGE_PATH", f"$[0 to {PAGE_SIZE - 1}]"
+    )
+    engine = create_async_engine(await create_database(schema=True))
+    session_factory = ManagerDB.create_session(engine)
+    referrer = new_user("referrer")
+    referred = [
+        new_user(f"referred_{index}", id_referrer=referrer["id"])
+        for index in range(5)
+    ]
+    single = new_user("single")
+
+    async with session_factory() as session, session.begin():
+        await Registration.create_users([referrer, single], session=session)
+    for batch in (referred[:2], referred[2:]):
+        async with session_factory() as session, session.begin():
+            await Registration.create_users(batch, session=session)
+    async with session_factory() as session, session.begin():
+        await Refer.create_new_referral(
+            id_referrer=referrer["id"],
+            id_referred=single["id"],
+            session=session,
+        )
+
+    async with session_factory() as session:
+        written = await ReferralSummary.get_summary(
+            session=session, user_id=referrer["id"]
+        )
+        assert written is not None
+        kept = as_tuple(written)
+    async with session_factory() as session, session.begin():
+        assert (
+            await ReferralSummary.rebuild(
+                session=session, referrers=[referrer["id"], single["id"]]
+            )
+            == 1
+        )
+    async with session_factory() as session:
+        rebuilt = await ReferralSummary.get_summary(
+            session=session, user_id=referrer["id"]
+        )
+        assert rebuilt is not None
+        assert as_tuple(rebuilt) == kept
+        assert (
+            await ReferralSummary.get_summary(
+                session=session, user_id=single["id"]
+            )
+            is None
+        )
+
+    name, count, first_page, last_seq, _ = kept
+    assert (name, count) == ("referrer", len(referred) + 1)
+    assert [item[ITEM_ID] for item in first_page] == [
+        str(user["id"]) for user in referred[:PAGE_SIZE]
+    ]
+    seqs = [item[ITEM_SEQ] for item in first_page]
+    assert seqs == sorted(seqs) and last_seq > seqs[-1]
+
+    async with session_factory() as session, session.begin():
+        await session.execute(delete(ReferORM))
+        await session.execute(delete(ReferredORM))
+        assert (
+            await ReferralSummary.rebuild(
+                session=session, referrers=[referrer["id"]]
+            )
+            == 0
+        )
+    async with session_factory() as session:
+        assert (
+            await ReferralSummary.get_summary(
+                session=session, user_id=referrer["id"]
+            )
+            is None
+        )
+    await engine.dispose()
@@ -0,0 +1,86 @@
+"""UUIDv7 layout and the insert benchmark of v4 against v7 keys.
+
+The benchmark inserts the same number of users with random v4 and with
+time-ordered v7 IDs, in small batches committed one by one as
+registration does, and compares the time and the size of the primary
+key index. Random keys split pages all over the index and leave them
+about two thirds full, v7 keys fill the right-most page, so the v7
+index must be smaller. The time is only printed, it depends on the
+machine; run with `-s` to see it.
+
+With batches of thousands of IDs made within one millisecond the two
+indexes come out about the same size: such IDs are not ordered between
+themselves, see `uuid7`.
+"""
+
+import time
+import uuid
+from typing import Callable
+
+import pytest
+from sqlalchemy import insert, text
+from sqlalchemy.engine import URL
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from src.core.orm.models.user import UserORM
+from src.core.orm.uuid7 import uuid7
+
+USERS = 100_000
+BATCH = 100
+
+
+def test_uuid7_layout():
+    """Version 7, RFC variant and the current time in milliseconds."""
+    before = time.time_ns() // 1_000_000
+    user_id = uuid7()
+    after = time.time_ns() // 1_000_000
+
+    assert user_id.version == 7
+    assert user_id.variant == uuid.RFC_4122
+    assert before <= user_id.int >> 80 <= after
+
+
+def test_uuid7_ordered_across_milliseconds():
+    """An ID of a later millisecond sorts after an earlier one."""
+    first = uuid7()
+    time.sleep(0.002)
+
+    assert uuid7() > first
+
+
+async def insert_users(
+    url: URL, new_id: Callable[[], uuid.UUID]
+) -> tuple[float, int]:
+    """Insert `USERS` users, return seconds and bytes of the pkey index."""
+    engine = create_async_engine(url)
+    started = time.perf_counter()
+    for _ in range(USERS // BATCH):
+        async with engine.begin() as connection:
+            await connection.execute(
+                insert(UserORM),
+                [{"id": new_id(), "name": "user"} for _ in range(BATCH)],
+            )
+    elapsed = time.perf_counter() - started
+    async with engine.connect() as connection:
+        size = await connection.scalar(
+            text("SELECT pg_relation_size('users_pkey')")
+        )
+    await engine.dispose()
+    return elapsed, size
+
+
+@pytest.mark.anyio
+async def test_insert_benchmark_v4_against_v7(create_database):
+    """v7 keys keep the primary key index compact."""
+    v4_seconds, v4_bytes = await insert_users(
+        url=await create_database(schema=True), new_id=uuid.uuid4
+    )
+    v7_seconds, v7_bytes = await insert_users(
+        url=await create_database(schema=True), new_id=uuid7
+    )
+    print(
+        f"\n{USERS} users: v4 {v4_seconds:.2f}s, index {v4_bytes} bytes; "
+        f"v7 {v7_seconds:.2f}s, index {v7_bytes} bytes"
+    )
+
+    assert v7_bytes < v4_bytes